@@ -0,0 +1,188 @@
+'''
+bulk_import.py
+Export the processed parquet as neo4j-admin import files and generate the import command.
+
+neo4j-admin database import full builds the store offline without transactions, so an initial load takes minutes
+instead of the hours taken by load_into_db. The import requires a stopped, empty database, e.g. with docker compose:
+    docker compose stop neo4j
+    docker compose run --rm neo4j <generated command>
+Afterwards create the constraints and indexes with setup_full(..., load_data=False).
+The relationships derived while preprocessing, e.g. by PropertyJoins, are exported with the other relationship files.
+Relationships joined from the node files while loading, the propertyRelationships of load_into_db, are only imported
+when they are passed to export_bulk_import, setup_full(..., load_data=False) does not load them.
+'''
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import Optional
+import polars as pl
+from polars import LazyFrame
+from config import DATABASE_OUTPUT_DIR, GRAPH_START_ID, GRAPH_END_ID
+from ..utils.helpers import clear_directories
+from .conf import DatabaseConfig
+from .helpers import deduplicated, node_files_by_label, property_relationships, relationship_files_by_type
+from .relationships import PropertyRelationship
+
+ARRAY_DELIMITER = ';'
+# Mount point of DATABASE_OUTPUT_DIR inside the neo4j container, see database/docker-compose.yml
+CONTAINER_IMPORT_DIR = PurePosixPath('/var/lib/neo4j/import')
+
+_IMPORT_ID = '__import_id'
+
+@dataclass
+class ImportFile:
+    '''
+    A node label or relationship type with its header file and data file.
+    '''
+    name: str
+    header: Path
+    data: Path
+    rows: int
+
+def import_type(dtype: pl.DataType) -> Optional[str]:
+    '''
+    Type of a column in a neo4j-admin header, or None for columns that have to be JSON encoded.
+    '''
+    if isinstance(dtype, (pl.List, pl.Array)):
+        inner = import_type(dtype.inner)
+        return inner+'[]' if inner is not None and not inner.endswith('[]') else None
+    if dtype.is_integer():
+        return 'long'
+    if dtype.is_float():
+        return 'double'
+    if dtype == pl.Boolean:
+        return 'boolean'
+    if dtype == pl.String or isinstance(dtype, (pl.Categorical, pl.Enum)):
+        return 'string'
+    if dtype == pl.Date:
+        return 'date'
+    if isinstance(dtype, pl.Datetime):
+        return 'datetime' if dtype.time_zone else 'localdatetime'
+    return None
+
+def _csv_column(name: str, dtype: pl.DataType) -> tuple[pl.Expr, str]:
+    field_type = import_type(dtype)
+
+    if field_type is not None and field_type.endswith('[]'):
+        return pl.col(name).cast(pl.List(pl.String)).list.join(ARRAY_DELIMITER), field_type
+    if field_type is not None:
+        return pl.col(name), field_type
+    if isinstance(dtype, pl.Struct):
+        return pl.col(name).struct.json_encode(), 'string'
+    if isinstance(dtype, (pl.List, pl.Array)) and isinstance(dtype.inner, pl.Struct):
+        return pl.col(name).list.eval(pl.element().struct.json_encode()).list.join(ARRAY_DELIMITER), 'string[]'
+    return pl.col(name).cast(pl.String), 'string'
+
+def _write_import_file(name: str, data: LazyFrame, id_fields: dict[str, str], output_dir: Path) -> ImportFile:
+    '''
+    Write the header and data file for the data. id_fields maps the identifying columns to their header fields.
+    '''
+    expressions, header = [], []
+    for column, dtype in data.collect_schema().items():
+        if column in id_fields:
+            expressions.append(pl.col(column).cast(pl.String))
+            header.append(id_fields[column])
+        else:
+            expression, field_type = _csv_column(column, dtype)
+            expressions.append(expression)
+            header.append(f'{column}:{field_type}')
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    header_file = output_dir.joinpath(f'{name}.header.csv')
+    data_file = output_dir.joinpath(f'{name}.csv')
+
+    header_file.write_text(','.join(header)+'\n')
+    data.select(expressions).sink_csv(data_file, include_header=False)
+
+    return ImportFile(name=name, header=header_file, data=data_file,
+                      rows=pl.scan_csv(data_file, has_header=False).select(pl.len()).collect().item())
+
+def export_nodes(input_dir: Path, output_dir: Path) -> list[ImportFile]:
+    '''
+    Write one file per node label. Labels spread over several parquet files are combined and deduplicated on id,
+    and each label gets its own id space so ids only need to be unique within a label.
+    '''
+    exported = []
+    for label, (_, files) in node_files_by_label(input_dir).items():
+        print(f'Exporting {label} nodes from {len(files)} files')
+        data = deduplicated(files, ['id']).select(pl.col('id').alias(_IMPORT_ID), pl.all())
+        exported.append(_write_import_file(label, data, {_IMPORT_ID: f':ID({label})'}, output_dir.joinpath('nodes')))
+
+    return exported
+
+def export_relationships(input_dir: Path, output_dir: Path, propertyRelationships: list[PropertyRelationship] = []) -> list[ImportFile]:
+    '''
+    Write one file per relationship type and pair of node labels, deduplicated on the start and end node.
+    @param propertyRelationships - Relationships joined from the node files, added to the files of the same type and labels.
+    '''
+    ids = [GRAPH_START_ID, GRAPH_END_ID]
+    sources : dict[tuple[str, str, str], list[LazyFrame]] = {}
+    for key, (_, files) in relationship_files_by_type(input_dir).items():
+        print(f'Exporting ({key[1]})-[{key[0]}]->({key[2]}) relationships from {len(files)} files')
+        sources[key] = [deduplicated(files, ids)]
+    for propertyRelationship in propertyRelationships:
+        relationship = propertyRelationship.relationship
+        key = (relationship.rel_type, relationship.origin_node.name, relationship.target_node.name)
+        print(f'Exporting ({key[1]})-[{key[0]}]->({key[2]}) relationships joined on {propertyRelationship.properties}')
+        sources.setdefault(key, []).append(property_relationships(input_dir, propertyRelationship))
+
+    exported = []
+    for (rel_type, origin, target), frames in sources.items():
+        data = frames[0] if len(frames) == 1 else pl.concat(frames, how='diagonal_relaxed').unique(ids, keep='first', maintain_order=True)
+        id_fields = {GRAPH_START_ID: f'{GRAPH_START_ID}({origin})', GRAPH_END_ID: f'{GRAPH_END_ID}({target})'}
+        imported = _write_import_file(f'{rel_type}__{origin}__{target}', data, id_fields, output_dir.joinpath('relationships'))
+        imported.name = rel_type
+        exported.append(imported)
+
+    return exported
+
+def _command_path(file: Path, mounted_dir: Path, container_import_dir: Optional[PurePosixPath]) -> str:
+    if container_import_dir is None or not file.resolve().is_relative_to(mounted_dir.resolve()):
+        return file.resolve().as_posix()
+    return (container_import_dir / file.resolve().relative_to(mounted_dir.resolve()).as_posix()).as_posix()
+
+def import_command(nodes: list[ImportFile],
+                   relationships: list[ImportFile],
+                   database: str = DatabaseConfig.databaseName,
+                   mounted_dir: Path = DATABASE_OUTPUT_DIR,
+                   container_import_dir: Optional[PurePosixPath] = CONTAINER_IMPORT_DIR) -> str:
+    '''
+    Generate the neo4j-admin database import full command for the exported files.
+    Files below mounted_dir are referenced through container_import_dir, all other files by their local path.
+    Relationships to missing nodes are skipped, the same as the MATCH in load_relationships_into_db.
+    '''
+    path = lambda file: _command_path(file, mounted_dir, container_import_dir)
+    arguments = [
+        'neo4j-admin database import full',
+        '--overwrite-destination=true',
+        f'--array-delimiter="{ARRAY_DELIMITER}"',
+        '--multiline-fields=true',
+        '--skip-duplicate-nodes=true',
+        '--skip-bad-relationships=true'
+    ]
+    arguments += [f'--nodes={node.name}={path(node.header)},{path(node.data)}' for node in nodes]
+    arguments += [f'--relationships={rel.name}={path(rel.header)},{path(rel.data)}' for rel in relationships]
+    arguments.append(database)
+
+    return ' \\\n    '.join(arguments)
+
+def export_bulk_import(input_dir: Path = DATABASE_OUTPUT_DIR,
+                       output_dir: Optional[Path] = None,
+                       database: str = DatabaseConfig.databaseName,
+                       container_import_dir: Optional[PurePosixPath] = CONTAINER_IMPORT_DIR,
+                       propertyRelationships: list[PropertyRelationship] = []) -> str:
+    '''
+    Export the processed parquet under input_dir for neo4j-admin and write the import command to import.sh.
+    @param output_dir - Target directory for the import files. Defaults to input_dir/bulk_import, inside the mounted import directory.
+    @param container_import_dir - Mount point of input_dir in the container running neo4j-admin. Use local paths when None.
+    @param propertyRelationships - Relationships joined from the node files, as load_into_db joins them while loading.
+    '''
+    output_dir = output_dir or input_dir.joinpath('bulk_import')
+    clear_directories(output_dir)
+
+    nodes = export_nodes(input_dir, output_dir)
+    relationships = export_relationships(input_dir, output_dir, propertyRelationships)
+    command = import_command(nodes, relationships, database, input_dir, container_import_dir)
+
+    output_dir.joinpath('import.sh').write_text('#!/bin/sh\n' + command + '\n')
+    print(f'Exported {sum(n.rows for n in nodes)} nodes and {sum(r.rows for r in relationships)} relationships to: {output_dir}')
+    return command
@@ -0,0 +1,151 @@
+'''
+concurrent_loader.py
+Load a relationship file on several sessions at once.
+
+The rows are hash partitioned on the start node id, so all relationships of a start node are written by a single worker.
+The file is partitioned as it is read, one record batch at a time, and is never held in memory in full.
+Workers still share end nodes, e.g. the year nodes, so the deadlocks raised when two transactions lock the same
+end nodes in a different order are retried with jittered exponential backoff.
+'''
+import dataclasses, queue, random, shutil, time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional
+import polars as pl
+import pyarrow.parquet as pq
+from neo4j import Session
+from neo4j.exceptions import DriverError, Neo4jError
+from config import DATABASE_OUTPUT_DIR
+from .conf import ConcurrentLoadConfig, LoadMode, RemoteLoadConfig
+from .connect import N4J_Connection
+from .helpers import apoc_relationship_query
+from .load_report import LoadStatistics, execute_apoc_iterate
+from .relationships import RelationshipObject
+from .remote_loader import iter_record_batches, relationship_query, relationship_rows, slice_batches, write_rows
+
+PARTITION_DIRECTORY = DATABASE_OUTPUT_DIR.joinpath('.partitions')
+# Batches read ahead for every worker of a remote load
+QUEUED_BATCHES = 4
+
+def with_retries(config: ConcurrentLoadConfig, function: Callable, *args, statistics: Optional[LoadStatistics] = None, **kwargs):
+    '''
+    Call the function, retrying on transient errors with exponential backoff and random jitter.
+    Only wrap work the driver does not retry itself, such as explicit or auto-commit transactions.
+    @param statistics - Count the retries.
+    '''
+    for attempt in range(config.retries + 1):
+        try:
+            return function(*args, **kwargs)
+        except (Neo4jError, DriverError) as e:
+            if not e.is_retryable() or attempt == config.retries:
+                raise e
+            delay = config.backoff * 2**attempt * random.uniform(0.5, 1.5)
+            print(f'Transient error on attempt {attempt+1}, retrying in {delay:.2f}s: {e}')
+            if statistics is not None:
+                statistics.add_retry()
+            time.sleep(delay)
+
+def partition_key(relationshipObj: RelationshipObject, partitions: int) -> pl.Expr:
+    return pl.col(relationshipObj.origin_id).hash(seed=0) % partitions
+
+def partition_relationships(data: pl.DataFrame, relationshipObj: RelationshipObject, partitions: int) -> dict[int, pl.DataFrame]:
+    '''
+    Split the rows into partitions that never share a start node, by partition number.
+    '''
+    partitioned = data.with_columns(partition_key(relationshipObj, partitions).alias('__partition'))\
+        .partition_by('__partition', as_dict=True, include_key=False)
+    return {partition: rows for (partition,), rows in partitioned.items()}
+
+def write_batch(session: Session, query: str, rows: list[dict]):
+    '''
+    Write the rows in an explicit transaction. Unlike execute_write, the driver does not retry it, see with_retries.
+    '''
+    with session.begin_transaction() as tx:
+        write_rows(tx, query, rows)
+        tx.commit()
+
+def load_relationships_remote(connection: N4J_Connection,
+                              file: Path,
+                              relationshipObj: RelationshipObject,
+                              config: ConcurrentLoadConfig,
+                              remote_config: RemoteLoadConfig,
+                              mode: LoadMode = LoadMode.MERGE,
+                              statistics: Optional[LoadStatistics] = None) -> int:
+    '''
+    Stream every partition of the file to the database on its own session. Returns the number of rows loaded.
+    The record batches are read once and partitioned as they are read, every worker takes the batches of its partition
+    from a bounded queue.
+    '''
+    query = relationship_query(relationshipObj, mode)
+    queues = [queue.Queue(maxsize=QUEUED_BATCHES) for _ in range(config.workers)]
+
+    def load_partition(batches: queue.Queue) -> int:
+        loaded = 0
+        try:
+            with connection.session() as session:
+                while (partition := batches.get()) is not None:
+                    for batch in slice_batches(partition.to_arrow().to_batches(), remote_config):
+                        with_retries(config, write_batch, session, query, relationship_rows(batch, relationshipObj),
+                                     statistics=statistics)
+                        loaded += batch.num_rows
+                        if statistics is not None:
+                            statistics.add_batch(batch.num_rows)
+        except BaseException:
+            # Keep taking the batches, a full queue would block the reader
+            while batches.get() is not None:
+                pass
+            raise
+        return loaded
+
+    # Read as many rows at a time as the workers send together, so every partition fills a batch
+    read_config = dataclasses.replace(remote_config, max_batch_rows=remote_config.max_batch_rows * config.workers,
+                                      max_batch_bytes=remote_config.max_batch_bytes * config.workers)
+    with ThreadPoolExecutor(max_workers=config.workers) as executor:
+        futures = [executor.submit(load_partition, batches) for batches in queues]
+        try:
+            for batch in iter_record_batches(file, read_config):
+                for partition, rows in partition_relationships(pl.from_arrow(batch), relationshipObj, config.workers).items():
+                    queues[partition].put(rows)
+        finally:
+            for batches in queues:
+                batches.put(None)
+        return sum(future.result() for future in futures)
+
+def load_relationships_local(connection: N4J_Connection,
+                             file: Path,
+                             relationshipObj: RelationshipObject,
+                             config: ConcurrentLoadConfig,
+                             mode: LoadMode = LoadMode.MERGE,
+                             statistics: Optional[LoadStatistics] = None) -> int:
+    '''
+    Write the partitions of the file to the import directory and load them with concurrent apoc.periodic.iterate calls.
+    The partitions are written by the streaming engine, without reading the file into memory.
+    Returns the number of rows loaded.
+    '''
+    directory = PARTITION_DIRECTORY.joinpath(file.stem)
+    shutil.rmtree(directory, ignore_errors=True)
+
+    def load_partition(partition: Path) -> int:
+        rows = 0
+        # The files of a partition share start nodes, they load one after the other
+        for path in sorted(partition.glob('*.parquet')):
+            query = apoc_relationship_query(relationshipObj, path.relative_to(DATABASE_OUTPUT_DIR).as_posix(), mode)
+            apoc_statistics = with_retries(config, execute_apoc_iterate, connection, query, statistics=statistics)
+            if statistics is not None:
+                statistics.add_apoc(apoc_statistics)
+            rows += pq.read_metadata(path).num_rows
+        return rows
+
+    try:
+        pl.scan_parquet(file).sink_parquet(
+            pl.PartitionByKey(directory, by={'__partition': partition_key(relationshipObj, config.workers)}, include_key=False),
+            maintain_order=False,
+            compression='zstd',
+            mkdir=True,
+            engine='streaming'
+        )
+        partitions = sorted(entry for entry in directory.iterdir() if entry.is_dir()) if directory.exists() else []
+        with ThreadPoolExecutor(max_workers=config.workers) as executor:
+            return sum(executor.map(load_partition, partitions))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
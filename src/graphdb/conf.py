@@ -20,6 +20,12 @@ class GraphType(Enum):
     NODE = 0
     RELATIONSHIP = 1
 
+class LoadMode(Enum):
+    # MERGE into existing data, for incremental loads
+    MERGE = 0
+    # CREATE every node and relationship, for loads into an empty database
+    CREATE = 1
+
 @dataclass
 class GraphObject:
     prefix: str
@@ -41,4 +47,47 @@ ObjectNames = {
     NodeType.issn: GraphObject(prefix='issn', name=NodeType.issn.value),
     NodeType.authorship: GraphObject(prefix='aush', name=NodeType.authorship.value),
     NodeType.year: GraphObject(prefix='YR', name=NodeType.year.value)
-}
\ No newline at end of file
+}
+
+# Relationship properties the reports filter and aggregate on, indexed by setup_full. See index_advisor.py
+# The fields of a composite index are ordered, the same fields in another order make another index
+RelationshipIndexes = {
+    'AFFILIATED_WITH': ('years',),
+    'IN_YEAR': ('works_count', 'cited_by_count')
+}
+
+@dataclass
+class RemoteLoadConfig:
+    '''
+    Batch sizing of the remote loader. A batch is sent once either limit is reached.
+    @param max_batch_bytes - Arrow size of the rows sent in one transaction.
+    @param max_batch_rows - Rows sent in one transaction.
+    '''
+    max_batch_bytes: int = 4 * 1024 * 1024
+    max_batch_rows: int = 10000
+
+@dataclass
+class ConcurrentLoadConfig:
+    '''
+    Concurrent loading of relationship files, see concurrent_loader.py.
+    @param workers - Sessions loading partitions of a file at the same time.
+    @param retries - Attempts after a transient error such as a deadlock before the load fails.
+    @param backoff - Delay in seconds before the first retry. Doubles on every attempt and is jittered by up to 50%.
+    '''
+    workers: int = 4
+    retries: int = 5
+    backoff: float = 0.2
+
+@dataclass
+class PoolConfig:
+    '''
+    Driver and session settings of the connection pool, see pool.py.
+    @param max_connection_pool_size - Connections kept open by a shared driver, bounding the concurrent sessions.
+    @param connection_acquisition_timeout - Seconds a session waits for a free connection.
+    @param fetch_size - Records pulled from the server at a time.
+    @param read_workers - Read queries run at the same time by ConnectionPool.read_all.
+    '''
+    max_connection_pool_size: int = 32
+    connection_acquisition_timeout: float = 120.0
+    fetch_size: int = 10000
+    read_workers: int = 4
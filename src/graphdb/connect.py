@@ -2,10 +2,12 @@
 connect.py
 Connect to remote Neo4j database and perform actions upon it
 '''
+from contextlib import contextmanager
 from enum import Enum
-from typing import Optional
-from neo4j import GraphDatabase, Result
-from .conf import GraphType, GraphObject
+from typing import Iterable, Iterator, Optional
+from neo4j import EagerResult, Session
+from .conf import GraphType, GraphObject, PoolConfig
+from .pool import ConnectionPool, Query
 
 class ConnectionType(Enum):
     bolt = 'bolt://'
@@ -20,19 +22,22 @@ class N4J_Connection(object):
     def _connect(self):
         print("Combined address: ", self.combinedAddress)
         try:
-            self._driver = GraphDatabase.driver(self.combinedAddress, 
-                                                auth=(self.username, self.password),
-                                                keep_alive=True) if self.authentication else GraphDatabase.driver(self.combinedAddress)
+            self._pool = ConnectionPool(self.combinedAddress,
+                                        (self.username, self.password) if self.authentication else None,
+                                        self.database,
+                                        self.pool_config)
+            self._driver = self._pool.driver
             self._driver.verify_connectivity()
             print(f'Connected to database at address: {self.combinedAddress}')
         except Exception as e:
             print(f'Failed to connected to database with error: {e}')
-            self._driver = None
+            self.close()
             raise e
 
     def close(self):
-        if self._driver:
-            self._driver.close()
+        if self._pool:
+            self._pool.close()
+            self._pool = None
             self._driver = None
             print('Shut down database connection.')
     
@@ -44,7 +49,8 @@ class N4J_Connection(object):
         authentication: bool=False,
         username: Optional[str]=None,
         password: Optional[str]=None,
-        database: str = 'neo4j'
+        database: str = 'neo4j',
+        pool_config: Optional[PoolConfig] = None
     ):
         self.authentication = authentication
         self.username = username
@@ -55,6 +61,9 @@ class N4J_Connection(object):
         self.combinedAddress = '%s%s:%s' % (self.connectionType.value, self.targetAddress, self.port)
         # Community edition only allows for a single database
         self.database = database
+        # The driver is shared with every other connection to the same address, see pool.py
+        self.pool_config = pool_config
+        self._pool = None
         self._driver = None
 
         self._connect()
@@ -76,14 +85,22 @@ class N4J_Connection(object):
                 print(f"Error creating database: {e}")
     '''
 
+    @contextmanager
+    def session(self, read: bool = False) -> Iterator[Session]:
+        '''
+        Session on the shared driver, closed when the block exits.
+        '''
+        with self._pool.session(read=read) as session:
+            yield session
+
     def create_node_constraints(self, fullName: str, pfx: str, constraints : dict[str, str]):
         # Iterate throught the constraints and apply them
-        with self._driver.session(database=self.database) as session:
+        with self.session() as session:
             for field, condition in constraints.items():
                 query = f"""
                 CREATE CONSTRAINT IF NOT EXISTS FOR ({pfx}:{fullName}) REQUIRE {pfx}.{field} {condition};
                 """
-                session.run(query)
+                session.run(query).consume()
                 print(f"Executed constraint: {condition} on :{fullName}({field})")
 
 
@@ -91,46 +108,63 @@ class N4J_Connection(object):
                                         relationship_type: str,
                                         fields: set[str], 
                                         condition: str):
-        with self._driver.session(database=self.database) as session:
+        with self.session() as session:
             constraint_name = '_'.join([relationship_type] + list(fields) + [condition.lower().replace(' ', '_')])
             joined_fields = ', '.join(['r.'+f for f in fields])
             query = f"""
                 CREATE CONSTRAINT {constraint_name} IF NOT EXISTS
                 FOR ()-[r:{relationship_type}]-() REQUIRE ({joined_fields}) {condition}
             """
-            session.run(query)
+            session.run(query).consume()
             print(f'Executed constraint on [r: {relationship_type}] with: REQUIRE {joined_fields} {condition}')
 
     def create_indexes(self, 
                        fullName: str, 
                        pfx: str, 
-                       fields : set[str],
+                       fields : Iterable[str],
                        type : GraphType
                        ):
-        with self._driver.session(database=self.database) as session:
+        '''
+        @param fields - Fields of the index. Composite index fields are used in the given order, pass them ordered.
+        '''
+        with self.session() as session:
             if type == GraphType.NODE:
                 prefixed = [(pfx+'.'+field) for field in fields]
                 combined = ', '.join(prefixed)
                 cmd = f"""
                 CREATE INDEX IF NOT EXISTS FOR ({pfx}:{fullName}) ON ({combined});
                 """
-                session.run(cmd)
+                session.run(cmd).consume()
 
                 print(f'Created index on ({pfx}.{fullName}) for field: ({combined})')
 
             elif type==GraphType.RELATIONSHIP:
-                raise(f'Not yet implemented')
+                prefixed = [(pfx+'.'+field) for field in fields]
+                combined = ', '.join(prefixed)
+                cmd = f"""
+                CREATE INDEX IF NOT EXISTS FOR ()-[{pfx}:{fullName}]-() ON ({combined});
+                """
+                session.run(cmd).consume()
+
+                print(f'Created index on [{pfx}:{fullName}] for field: ({combined})')
             
             else:
-                raise(f'Error unsupported node type: {type}')
+                raise Exception(f'Error unsupported node type: {type}')
 
-    def execute_cypher_query(self, query, parameters=None) -> Result:
+    def execute_cypher_query(self, query, parameters=None) -> EagerResult:
+        '''
+        Run the query and return its records and summary, read in full before the session closes.
+        '''
         try:
-            with self._driver.session(database=self.database) as session:
-                res = session.run(query)
-                print(f"Executed query: {query}")
-                return res
+            res = self._pool.run(query, parameters)
+            print(f"Executed query: {query}")
+            return res
         except Exception as e:
             print(f"Failed to execute the query: {query}\n{e}")
             raise e
-            
\ No newline at end of file
+
+    def read_all(self, queries: dict[str, Query]) -> dict[str, EagerResult]:
+        '''
+        Run the read queries on parallel sessions, see ConnectionPool.read_all.
+        '''
+        return self._pool.read_all(queries)
@@ -1,7 +1,15 @@
 from enum import Enum
 from pathlib import Path
 import re
+import polars as pl
+from polars import LazyFrame
 from config import NodeType
+from .conf import GraphObject, LoadMode, ObjectNames
+from .relationships import Relationships, RelationshipObject, PropertyRelationship, PropertyType
+from ..utils.graph_data import infer_node_type_from_file, infer_node_types_from_file, parquet_file_name, property_join
+# Column holding the position of the file each row was read from, see deduplicated
+FILE_INDEX = '__file'
+
 # Enum class that will contain the values for helpful and reusable cypher queries
 class CypherQueryCollection(Enum):
     CLEAR_SCHEMA = """
@@ -19,23 +27,120 @@ class CypherQueryCollection(Enum):
         MATCH (n) RETURN n
     """
 
-def infer_node_type_from_file(file: Path) -> NodeType:
+def node_files_by_label(input_dir: Path) -> dict[str, tuple[GraphObject, list[Path]]]:
+    '''
+    Group the node files of the processed output by the label they are loaded as.
+    '''
+    files : dict[str, tuple[GraphObject, list[Path]]] = {}
+    for file in sorted(input_dir.glob('*/*/nodes/*.parquet')):
+        nodeType = infer_node_type_from_file(file)
+        if nodeType not in ObjectNames:
+            raise Exception(f'GraphObjectType not implemented for node type: {nodeType}')
+        graphObject = ObjectNames[nodeType]
+        files.setdefault(graphObject.name, (graphObject, []))[1].append(file)
+
+    return files
+
+def relationship_files_by_type(input_dir: Path) -> dict[tuple[str, str, str], tuple[RelationshipObject, list[Path]]]:
+    '''
+    Group the relationship files of the processed output by relationship type, origin label and target label.
+    '''
+    RelationshipsGen = Relationships()
+    files : dict[tuple[str, str, str], tuple[RelationshipObject, list[Path]]] = {}
+    for file in sorted(input_dir.glob('*/*/relationships/*.parquet')):
+        relationshipObj = RelationshipsGen.createRelationshipObject(*infer_node_types_from_file(file))
+        key = (relationshipObj.rel_type, relationshipObj.origin_node.name, relationshipObj.target_node.name)
+        files.setdefault(key, (relationshipObj, []))[1].append(file)
+
+    return files
+
+def property_relationships(input_dir: Path, propertyRelationship: PropertyRelationship) -> LazyFrame:
+    '''
+    The :START_ID/:END_ID pairs of a property relationship, hash-joined from the node files of both labels.
+    '''
+    if propertyRelationship.propertyType not in (PropertyType.ONE_TO_ONE, PropertyType.CONTAINED):
+        raise Exception('Property Type not implemented for: ', propertyRelationship.propertyType)
+
+    origin, target = propertyRelationship.relationship.origin_node, propertyRelationship.relationship.target_node
+    files = node_files_by_label(input_dir)
+    if origin.name not in files or target.name not in files:
+        raise Exception(f'No node files found for the property relationship: {origin.name} -> {target.name}')
+
+    return property_join(deduplicated(files[origin.name][1], ['id']), deduplicated(files[target.name][1], ['id']),
+                         propertyRelationship.properties, contained=propertyRelationship.propertyType == PropertyType.CONTAINED)
+
+def deduplicated(files: list[Path], subset: list[str]) -> LazyFrame:
+    '''
+    Combine the files the way MERGE loads them one after another with SET += row. For every value of subset, each
+    property takes its value from the last of the files, in the order given, that has the property.
+    '''
+    schemas = [pl.scan_parquet(file).collect_schema() for file in files]
+    names = list(dict.fromkeys(name for schema in schemas for name in schema.names()))
+    having = {name: [index for index, schema in enumerate(schemas) if name in schema] for name in names}
+
+    # Rows keep their order within each group, so the last row of a group comes from the last file
+    combined = pl.concat([pl.scan_parquet(file).with_columns(pl.lit(index).alias(FILE_INDEX)) for index, file in enumerate(files)],
+                         how='diagonal_relaxed')
+    return combined.group_by(subset, maintain_order=True)\
+        .agg(*[
+            (pl.col(name) if len(having[name]) == len(files) else pl.col(name).filter(pl.col(FILE_INDEX).is_in(having[name]))).last()
+            for name in names if name not in subset
+        ])\
+        .select(names)
+
+def apoc_node_query(graphObject: GraphObject, path: str, mode: LoadMode = LoadMode.MERGE) -> str:
+    '''
+    Query loading the nodes of a parquet file in the import directory with apoc.
+    '''
+    if mode == LoadMode.CREATE:
+        statement = f"CREATE ({graphObject.prefix}:{graphObject.name}) SET {graphObject.prefix} = row"
+    else:
+        statement = f"MERGE ({graphObject.prefix}:{graphObject.name} {{ id: row.id }})\n    SET {graphObject.prefix} += row"
+
+    return f"""
+    CALL apoc.periodic.iterate(
+    "CALL apoc.load.parquet('file:///{path}') YIELD value as row",
+    "{statement}",
+    {{
+        batchSize: 1000,
+        parallel: false,
+        retries: 5
+    }}
+    )
+    """
+
+def apoc_relationship_query(relationshipObj: RelationshipObject, path: str, mode: LoadMode = LoadMode.MERGE) -> str:
     '''
-    For singular node type
+    Query loading the relationships of a parquet file in the import directory with apoc.
     '''
-    try:
-        filename = file.stem.replace('__', '&&')
-        dlm_idx = filename.find('_')
-        stringType = filename[:dlm_idx].replace('&&', '_') if dlm_idx != -1 else file.stem.replace('__', '_')
-        return (NodeType(stringType))
-    except Exception:
-        raise Exception("Unable to infer node types from file with filename: ", file.name)
+    origin_node_prefix = relationshipObj.origin_node.prefix+'_ORIGIN_NODE'
+    target_node_prefix = relationshipObj.target_node.prefix+'_TARGET_NODE'
 
-def infer_node_types_from_file(file: Path) -> tuple[NodeType, NodeType]:
+    if mode == LoadMode.CREATE:
+        statement = f"""CREATE ({origin_node_prefix})-[r:{relationshipObj.rel_type}]->({target_node_prefix})
+            SET r = properties"""
+    else:
+        statement = f"""MERGE ({origin_node_prefix})-[r:{relationshipObj.rel_type}]->({target_node_prefix})
+            ON CREATE SET r = properties
+            ON MATCH SET r += properties"""
 
-    try:
-        filename = file.stem.replace('__', '&&').split('_')
-        start, target = filename[0].replace('&&', '_'), filename[1].replace('&&', '_')
-        return (NodeType(start), NodeType(target))
-    except Exception:
-        raise Exception('Unable to infer node types from file with filename: ', file.name)
\ No newline at end of file
+    return f"""
+    CALL apoc.periodic.iterate(
+        "CALL apoc.load.parquet ('file:///{path}') YIELD value AS ROW",
+        "
+            WITH ROW,
+                ROW.`{relationshipObj.origin_id}` AS origin_id,
+                ROW.`{relationshipObj.target_id}` AS target_id,
+                apoc.map.clean(ROW, [\\"{relationshipObj.origin_id}\\", \\"{relationshipObj.target_id}\\"], []) as properties
+            
+            MATCH ({origin_node_prefix}: {relationshipObj.origin_node.name} {{id: origin_id}})
+            MATCH ({target_node_prefix}: {relationshipObj.target_node.name} {{id: target_id}})
+            {statement}
+        ",
+        {{
+            batchSize: 1000,
+            parallel: false,
+            retries: 5
+        }}
+    )
+    """
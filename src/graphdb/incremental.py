@@ -0,0 +1,194 @@
+'''
+incremental.py
+Refresh a loaded graph from a delta of the processed output instead of clearing and reloading it.
+
+compute_delta compares the processed output that is loaded with a newer one and writes the delta:
+    nodes/          Nodes that are new or whose properties changed, with all of their properties and nulls for the
+                    properties they no longer have, which SET += removes
+    tombstones/     Ids of the nodes that were removed
+    stale/          For every start node whose relationships of a type changed, the ids of its current end nodes
+    relationships/  The current relationships of those start nodes
+load_delta applies the delta on a single session, so a refresh takes time proportional to the change volume.
+Deltas are small, so they are always streamed through UNWIND queries rather than loaded by apoc.
+'''
+from pathlib import Path
+from typing import Optional
+import polars as pl
+from polars import LazyFrame
+from config import DATABASE_OUTPUT_DIR, NodeType
+from ..utils.helpers import clear_directories
+from .conf import GraphObject, ObjectNames, RemoteLoadConfig
+from .connect import N4J_Connection
+from .helpers import deduplicated, infer_node_type_from_file, infer_node_types_from_file, node_files_by_label
+from .helpers import parquet_file_name, relationship_files_by_type
+from .relationships import Relationships, RelationshipObject
+from .remote_loader import load_file, node_rows, relationship_rows
+
+_ROW_HASH = '__row_hash'
+
+def _hashed(data: LazyFrame) -> LazyFrame:
+    # Columns are sorted so the hash does not depend on the column order of the files
+    return data.with_columns(pl.struct(sorted(data.collect_schema().names())).hash(seed=0).alias(_ROW_HASH))
+
+def _write(data: LazyFrame, file: Path) -> int:
+    file.parent.mkdir(parents=True, exist_ok=True)
+    data.sink_parquet(file)
+    return pl.scan_parquet(file).select(pl.len()).collect().item()
+
+def _with_columns_of(data: LazyFrame, other: LazyFrame) -> LazyFrame:
+    # Columns only other has are added as nulls, so both frames hash the same columns
+    schema, other_schema = data.collect_schema(), other.collect_schema()
+    return data.with_columns(pl.lit(None, dtype=dtype).alias(name) for name, dtype in other_schema.items() if name not in schema)
+
+def node_delta(previous: list[Path], current: list[Path]) -> tuple[LazyFrame, LazyFrame]:
+    '''
+    Nodes that are new or changed in current, and the ids of the nodes missing from current.
+    Properties the changed nodes had in previous but not in current are null, so SET += row removes them.
+    '''
+    if not previous:
+        return deduplicated(current, ['id']), deduplicated(current, ['id']).select('id').head(0)
+    if not current:
+        return deduplicated(previous, ['id']).head(0), deduplicated(previous, ['id']).select('id')
+
+    previous_data, current_data = deduplicated(previous, ['id']), deduplicated(current, ['id'])
+    previous_data, current_data = _with_columns_of(previous_data, current_data), _with_columns_of(current_data, previous_data)
+    previous_data, current_data = _hashed(previous_data), _hashed(current_data)
+    changed = current_data.join(previous_data.select('id', _ROW_HASH), on=['id', _ROW_HASH], how='anti').drop(_ROW_HASH)
+    tombstones = previous_data.select('id').join(current_data.select('id'), on='id', how='anti')
+    return changed, tombstones
+
+def relationship_delta(previous: list[Path], current: list[Path], relationshipObj: RelationshipObject) -> tuple[LazyFrame, LazyFrame]:
+    '''
+    The current relationships of the start nodes whose relationships changed, and for each of these start nodes
+    the ids of its current end nodes. Start nodes that lost all their relationships have no end nodes.
+    '''
+    start, end = relationshipObj.origin_id, relationshipObj.target_id
+    ids = [start, end]
+    previous_data = _hashed(deduplicated(previous, ids)) if previous else None
+    current_data = _hashed(deduplicated(current, ids)) if current else None
+
+    if previous_data is None:
+        changed_starts = current_data.select(start)
+    elif current_data is None:
+        changed_starts = previous_data.select(start)
+    else:
+        keys = [start, end, _ROW_HASH]
+        changed_starts = pl.concat([
+            current_data.select(keys).join(previous_data.select(keys), on=keys, how='anti'),
+            previous_data.select(keys).join(current_data.select(keys), on=keys, how='anti')
+        ]).select(start)
+    changed_starts = changed_starts.unique()
+
+    if current_data is None:
+        relationships = previous_data.drop(_ROW_HASH).head(0)
+    else:
+        relationships = current_data.join(changed_starts, on=start, how='semi').drop(_ROW_HASH)
+
+    stale = changed_starts.join(
+        relationships.group_by(start).agg(pl.col(end).alias('targets')), on=start, how='left'
+    ).select(pl.col(start).alias('id'), pl.col('targets').fill_null([]))
+    return relationships, stale
+
+def compute_delta(current_dir: Path, delta_dir: Path, previous_dir: Path = DATABASE_OUTPUT_DIR) -> dict[str, int]:
+    '''
+    Write the delta from the processed output in previous_dir to the one in current_dir.
+    Returns the number of changed nodes, tombstones, start nodes with changed relationships and their relationships.
+    '''
+    clear_directories(delta_dir)
+    counts = {'nodes': 0, 'tombstones': 0, 'stale': 0, 'relationships': 0}
+
+    previous_nodes, current_nodes = node_files_by_label(previous_dir), node_files_by_label(current_dir)
+    for label in sorted(previous_nodes.keys() | current_nodes.keys()):
+        changed, tombstones = node_delta(previous_nodes.get(label, (None, []))[1], current_nodes.get(label, (None, []))[1])
+        name = parquet_file_name(NodeType(label))
+        counts['nodes'] += _write(changed, delta_dir.joinpath('nodes', name))
+        counts['tombstones'] += _write(tombstones, delta_dir.joinpath('tombstones', name))
+
+    previous_relationships, current_relationships = relationship_files_by_type(previous_dir), relationship_files_by_type(current_dir)
+    for key in sorted(previous_relationships.keys() | current_relationships.keys()):
+        relationshipObj, previous = previous_relationships.get(key, (None, []))
+        relationshipObj, current = current_relationships.get(key, (relationshipObj, []))
+        relationships, stale = relationship_delta(previous, current, relationshipObj)
+        name = parquet_file_name(*infer_node_types_from_file((current or previous)[0]))
+        counts['relationships'] += _write(relationships, delta_dir.joinpath('relationships', name))
+        counts['stale'] += _write(stale, delta_dir.joinpath('stale', name))
+
+    print(f'Delta of {counts["nodes"]} changed nodes, {counts["tombstones"]} removed nodes and '
+          f'{counts["relationships"]} relationships of {counts["stale"]} changed start nodes written to: {delta_dir}')
+    return counts
+
+def upsert_node_query(graphObject: GraphObject) -> str:
+    return f"""
+    UNWIND $rows AS row
+    MERGE ({graphObject.prefix}:{graphObject.name} {{ id: row.id }})
+    SET {graphObject.prefix} += row
+    """
+
+def tombstone_query(graphObject: GraphObject) -> str:
+    return f"""
+    UNWIND $rows AS row
+    MATCH ({graphObject.prefix}:{graphObject.name} {{ id: row.id }})
+    DETACH DELETE {graphObject.prefix}
+    """
+
+def stale_relationship_query(relationshipObj: RelationshipObject) -> str:
+    origin_node_prefix = relationshipObj.origin_node.prefix+'_ORIGIN_NODE'
+    target_node_prefix = relationshipObj.target_node.prefix+'_TARGET_NODE'
+
+    return f"""
+    UNWIND $rows AS ROW
+    MATCH ({origin_node_prefix}: {relationshipObj.origin_node.name} {{id: ROW.id}})-[r:{relationshipObj.rel_type}]->({target_node_prefix}: {relationshipObj.target_node.name})
+    WHERE NOT {target_node_prefix}.id IN ROW.targets
+    DELETE r
+    """
+
+def upsert_relationship_query(relationshipObj: RelationshipObject) -> str:
+    origin_node_prefix = relationshipObj.origin_node.prefix+'_ORIGIN_NODE'
+    target_node_prefix = relationshipObj.target_node.prefix+'_TARGET_NODE'
+
+    return f"""
+    UNWIND $rows AS ROW
+    MATCH ({origin_node_prefix}: {relationshipObj.origin_node.name} {{id: ROW.origin_id}})
+    MATCH ({target_node_prefix}: {relationshipObj.target_node.name} {{id: ROW.target_id}})
+    MERGE ({origin_node_prefix})-[r:{relationshipObj.rel_type}]->({target_node_prefix})
+    SET r = ROW.properties
+    """
+
+def load_delta(connection: N4J_Connection, delta_dir: Path, remote_config: Optional[RemoteLoadConfig] = None) -> dict[str, int]:
+    '''
+    Upsert the changed nodes, delete the removed nodes with their relationships, delete the relationships that
+    are no longer in the data and upsert the current relationships of the changed start nodes.
+    Returns the number of rows applied from each part of the delta.
+    '''
+    remote_config = remote_config or RemoteLoadConfig()
+    RelationshipsGen = Relationships()
+    graph_object = lambda file: ObjectNames[infer_node_type_from_file(file)]
+    relationship_object = lambda file: RelationshipsGen.createRelationshipObject(*infer_node_types_from_file(file))
+    counts = {'nodes': 0, 'tombstones': 0, 'stale': 0, 'relationships': 0}
+
+    with connection.session() as session:
+        for file in sorted(delta_dir.glob('nodes/*.parquet')):
+            counts['nodes'] += load_file(session, file, upsert_node_query(graph_object(file)), node_rows, remote_config)
+        for file in sorted(delta_dir.glob('tombstones/*.parquet')):
+            counts['tombstones'] += load_file(session, file, tombstone_query(graph_object(file)), node_rows, remote_config)
+        for file in sorted(delta_dir.glob('stale/*.parquet')):
+            counts['stale'] += load_file(session, file, stale_relationship_query(relationship_object(file)), node_rows, remote_config)
+        for file in sorted(delta_dir.glob('relationships/*.parquet')):
+            relationshipObj = relationship_object(file)
+            counts['relationships'] += load_file(session, file, upsert_relationship_query(relationshipObj),
+                                                 lambda batch: relationship_rows(batch, relationshipObj), remote_config)
+
+    print(f'Applied delta from {delta_dir}: {counts}')
+    return counts
+
+def incremental_refresh(connection: N4J_Connection,
+                        current_dir: Path,
+                        previous_dir: Path = DATABASE_OUTPUT_DIR,
+                        remote_config: Optional[RemoteLoadConfig] = None) -> dict[str, int]:
+    '''
+    Compute the delta between the loaded output in previous_dir and the new output in current_dir, and apply it.
+    Afterwards move current_dir to previous_dir, e.g. with db_setup, so the next refresh starts from it.
+    '''
+    delta_dir = current_dir.joinpath('.delta')
+    compute_delta(current_dir, delta_dir, previous_dir)
+    return load_delta(connection, delta_dir, remote_config)
@@ -0,0 +1,112 @@
+'''
+index_advisor.py
+Propose indexes from the property predicates of Cypher queries, by default the report queries of VisualizationData.
+
+Node properties are proposed when a query filters on them, in a pattern map or a WHERE clause.
+Relationship properties are proposed whenever a query reads them, since the reports filter, unwind and aggregate
+on them. Properties read together on the same variable of a query are also proposed as a composite index.
+Node ids are left out, setup_full already creates their constraints and indexes.
+'''
+import re
+from dataclasses import dataclass, field
+from .conf import GraphType
+from .connect import N4J_Connection
+
+# Statements of the VisualizationData queries, see src/visualization/queries.py
+VISUALIZATION_QUERIES = (
+    'target_sfu',
+    'summary_node_information',
+    'summary_nodes_by_institution',
+    'summary_nodes_by_author',
+    'summary_counts_by_year',
+    'works_analysis',
+    'authors_analysis',
+    'topics_works',
+    'geographic_collaborations',
+    'geographic_topics_collaborations',
+    'institution_ids',
+    'institution_work_ids',
+    'geographic_collaborations_batch',
+    'geographic_topics_collaborations_batch'
+)
+
+_NODE_PATTERN = re.compile(r'\(\s*(\w*)\s*:\s*(\w+)\s*(\{[^}]*\})?\s*\)')
+_RELATIONSHIP_PATTERN = re.compile(r'\[\s*(\w*)\s*:\s*(\w+)\s*(\{[^}]*\})?\s*\]')
+_MAP_KEY = re.compile(r'(\w+)\s*:')
+_PROPERTY = re.compile(r'\b(\w+)\.(\w+)\b')
+_WHERE = re.compile(r'\bWHERE\b(.*?)(?=\b(?:OPTIONAL|MATCH|WITH|RETURN|UNWIND|CALL|ORDER)\b|}|$)', re.DOTALL)
+
+@dataclass
+class IndexProposal:
+    type: GraphType
+    name: str
+    fields: tuple[str, ...]
+    queries: list[str] = field(default_factory=list)
+
+    def create(self, connection: N4J_Connection):
+        prefix = 'n' if self.type == GraphType.NODE else 'r'
+        connection.create_indexes(self.name, prefix, set(self.fields), self.type)
+
+def _strip_comments(query: str) -> str:
+    return re.sub(r'//[^\n]*', '', query)
+
+def query_predicates(query: str) -> dict[tuple[GraphType, str, int], set[str]]:
+    '''
+    The properties of the query worth indexing, grouped by the variable or pattern they are read on.
+    Keys are the graph type, the label or relationship type and a number identifying the variable or pattern.
+    '''
+    query = _strip_comments(query)
+    variables : dict[str, tuple[GraphType, str]] = {}
+    predicates : dict[tuple[GraphType, str, int], set[str]] = {}
+
+    for graphType, pattern in ((GraphType.NODE, _NODE_PATTERN), (GraphType.RELATIONSHIP, _RELATIONSHIP_PATTERN)):
+        for idx, match in enumerate(pattern.finditer(query)):
+            variable, name, properties = match.groups()
+            if variable:
+                variables.setdefault(variable, (graphType, name))
+            if properties:
+                # Pattern maps without a variable each get their own key
+                key = (graphType, name, hash(variable) if variable else -idx-1)
+                predicates.setdefault(key, set()).update(_MAP_KEY.findall(properties))
+
+    filtered = {match for where in _WHERE.findall(query) for match in _PROPERTY.findall(where)}
+    for variable, property in _PROPERTY.findall(query):
+        if variable not in variables:
+            continue
+        graphType, name = variables[variable]
+        if graphType == GraphType.RELATIONSHIP or (variable, property) in filtered:
+            predicates.setdefault((graphType, name, hash(variable)), set()).add(property)
+
+    return {key: properties - {'id'} for key, properties in predicates.items() if properties - {'id'}}
+
+def advise_indexes(queries: dict[str, str]) -> list[IndexProposal]:
+    '''
+    Propose a range index for every property worth indexing and a composite index for every set of properties
+    read together. queries maps a name to the Cypher of the query.
+    '''
+    proposals : dict[tuple[GraphType, str, tuple[str, ...]], IndexProposal] = {}
+
+    for query_name, query in queries.items():
+        for (graphType, name, _), properties in query_predicates(query).items():
+            candidates = [(property,) for property in sorted(properties)]
+            if len(properties) > 1:
+                candidates.append(tuple(sorted(properties)))
+            for fields in candidates:
+                proposal = proposals.setdefault((graphType, name, fields), IndexProposal(graphType, name, fields))
+                if query_name not in proposal.queries:
+                    proposal.queries.append(query_name)
+
+    return sorted(proposals.values(), key=lambda p: (-len(p.queries), p.type.value, p.name, p.fields))
+
+def visualization_queries() -> dict[str, str]:
+    '''
+    The Cypher of the VisualizationData queries, from the statements registered in queries.py.
+    '''
+    from ..visualization.queries import Statements
+    return {name: Statements[name].text for name in VISUALIZATION_QUERIES}
+
+def advise_visualization_indexes() -> list[IndexProposal]:
+    proposals = advise_indexes(visualization_queries())
+    for proposal in proposals:
+        print(f'{proposal.type.name} {proposal.name}({", ".join(proposal.fields)}) used by: {", ".join(proposal.queries)}')
+    return proposals
@@ -0,0 +1,130 @@
+'''
+load_journal.py
+Journal of the parquet files loaded into the database, kept in a local SQLite file.
+
+Every file is recorded with its content hash, row count, status and the offset of the last committed batch.
+A rerun with the same journal skips committed files and resumes the remote loads of pending files from the last
+committed batch. The apoc loads only record whole files, so a pending file is loaded again from the start.
+A batch committed right before a failure can be sent again on resume. MERGE loads tolerate it, and a CREATE load
+loads every file an earlier run started with MERGE instead, see load_mode.
+'''
+import hashlib, sqlite3
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+from typing import Optional
+import pyarrow.parquet as pq
+from config import DATABASE_OUTPUT_DIR
+from .conf import LoadMode
+
+JOURNAL_PATH = DATABASE_OUTPUT_DIR.joinpath('.load_journal.sqlite')
+
+class JournalStatus(Enum):
+    PENDING = 'pending'
+    COMMITTED = 'committed'
+
+@dataclass
+class JournalEntry:
+    path: str
+    hash: str
+    rows: int
+    status: JournalStatus
+    batch_offset: int
+
+def file_hash(file: Path, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(file, 'rb') as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class LoadJournal:
+    def __init__(self, path: Path = JOURNAL_PATH):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.execute('''
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                hash TEXT NOT NULL,
+                rows INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                batch_offset INTEGER NOT NULL,
+                updated TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        self._connection.commit()
+
+    def entry(self, file: Path) -> Optional[JournalEntry]:
+        row = self._connection.execute(
+            'SELECT path, hash, rows, status, batch_offset FROM files WHERE path = ?', (_key(file),)
+        ).fetchone()
+        if row is None:
+            return None
+        path, hash, rows, status, batch_offset = row
+        return JournalEntry(path, hash, rows, JournalStatus(status), batch_offset)
+
+    def start(self, file: Path) -> Optional[int]:
+        '''
+        Record the start of a load. Returns the offset to resume from, or None when the file is already committed.
+        A file whose content changed since it was recorded starts from the beginning.
+        '''
+        hash, entry = file_hash(file), self.entry(file)
+
+        if entry is not None and entry.hash == hash:
+            if entry.status == JournalStatus.COMMITTED:
+                print(f'Skipping {file.name}, loaded by an earlier run')
+                return None
+            if entry.batch_offset:
+                print(f'Resuming {file.name} at row {entry.batch_offset} of {entry.rows}')
+            return entry.batch_offset
+
+        self._write(file, hash, pq.ParquetFile(file).metadata.num_rows, JournalStatus.PENDING, 0)
+        return 0
+
+    def commit_batch(self, file: Path, batch_offset: int):
+        '''
+        Record that the rows before batch_offset are committed.
+        '''
+        self._connection.execute(
+            'UPDATE files SET batch_offset = ?, updated = CURRENT_TIMESTAMP WHERE path = ?', (batch_offset, _key(file))
+        )
+        self._connection.commit()
+
+    def complete(self, file: Path):
+        self._connection.execute(
+            'UPDATE files SET status = ?, batch_offset = rows, updated = CURRENT_TIMESTAMP WHERE path = ?',
+            (JournalStatus.COMMITTED.value, _key(file))
+        )
+        self._connection.commit()
+
+    def reset(self):
+        '''
+        Forget every file, e.g. after the database was cleared.
+        '''
+        self._connection.execute('DELETE FROM files')
+        self._connection.commit()
+
+    def close(self):
+        self._connection.close()
+
+    def _write(self, file: Path, hash: str, rows: int, status: JournalStatus, batch_offset: int):
+        self._connection.execute(
+            'INSERT OR REPLACE INTO files (path, hash, rows, status, batch_offset) VALUES (?, ?, ?, ?, ?)',
+            (_key(file), hash, rows, status.value, batch_offset)
+        )
+        self._connection.commit()
+
+def load_mode(journal: Optional[LoadJournal], file: Path, mode: LoadMode) -> LoadMode:
+    '''
+    The mode to load the file with, called before the load starts. Some rows of a file an earlier run started may
+    already be in the database, so CREATE would write them twice: those files are merged instead.
+    '''
+    if mode != LoadMode.CREATE or journal is None or (entry := journal.entry(file)) is None:
+        return mode
+    if entry.status == JournalStatus.PENDING:
+        print(f'Merging {file.name}, started by an earlier run')
+    return LoadMode.MERGE
+
+def _key(file: Path) -> str:
+    return file.resolve().as_posix()
@@ -0,0 +1,279 @@
+'''
+load_report.py
+Record the throughput of every file loaded into the database.
+
+apoc loads record the statistics returned by apoc.periodic.iterate: batches, total, timeTaken, failedOperations,
+failedBatches, retries and errorMessages. Remote loads record the batches sent and the transactions retried.
+Progress is printed while a file loads, and the report ranks the node labels and relationship types by load time.
+A file whose load raises is recorded with the failed status and the error before the exception propagates.
+apoc.periodic.iterate only returns its statistics once the whole file is loaded, so apoc loads of files with more
+than APOC_CHUNK_ROWS rows are split into chunks of that many rows, each loaded and recorded on its own, whether or
+not a report is kept.
+
+Summarize a report log from the command line with:
+    python -m src.graphdb.load_report <report_log.parquet> [--run <run_id>] [--top <count>]
+'''
+import datetime, json, shutil, threading, time, uuid
+from contextlib import contextmanager, nullcontext, suppress
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
+from .connect import N4J_Connection
+from ..utils.run_log import append_run, summarize_run
+
+# Rows of the chunks an apoc load splits a parquet file into, see load_apoc_file
+APOC_CHUNK_ROWS = 100_000
+
+@dataclass
+class LoadStatistics:
+    '''
+    Statistics of a file while it loads. The loaders update it from several threads.
+    '''
+    file: str
+    kind: str
+    name: str
+    method: str
+    total_rows: int = 0
+    rows: int = 0
+    batches: int = 0
+    failed_batches: int = 0
+    failed_operations: int = 0
+    retries: int = 0
+    database_time: float = 0.0
+    errors: dict[str, int] = field(default_factory=dict)
+    progress_interval: float = 10.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+    _start: float = field(default_factory=time.perf_counter, init=False, repr=False)
+    _last_progress: float = field(default_factory=time.perf_counter, init=False, repr=False)
+
+    def add_batch(self, rows: int, retries: int = 0):
+        with self._lock:
+            self.rows += rows
+            self.batches += 1
+            self.retries += retries
+            self._progress()
+
+    def add_error(self, error: BaseException):
+        with self._lock:
+            message = f'{type(error).__name__}: {error}'
+            self.errors[message] = self.errors.get(message, 0) + 1
+
+    def add_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def add_apoc(self, statistics: dict):
+        '''
+        Add the statistics row returned by apoc.periodic.iterate.
+        '''
+        with self._lock:
+            self.rows += statistics.get('total', 0) - statistics.get('failedOperations', 0)
+            self.batches += statistics.get('batches', 0)
+            self.failed_batches += statistics.get('failedBatches', 0)
+            self.failed_operations += statistics.get('failedOperations', 0)
+            self.retries += statistics.get('retries', 0)
+            self.database_time += statistics.get('timeTaken', 0)
+            for message, count in (statistics.get('errorMessages') or {}).items():
+                self.errors[message] = self.errors.get(message, 0) + count
+            self._progress()
+
+    def _progress(self):
+        now = time.perf_counter()
+        if now - self._last_progress < self.progress_interval:
+            return
+        self._last_progress = now
+        rate = self.rows / max(now - self._start, 1e-9)
+        print(f'{self.name} {self.kind} from {self.file}: {self.rows}/{self.total_rows} rows, {rate:.0f} rows/s')
+
+@dataclass
+class LoadRecord:
+    run_id: str
+    started: datetime.datetime
+    file: str
+    kind: str
+    name: str
+    method: str
+    status: str
+    rows: int
+    wall_time: float
+    batches: int
+    failed_batches: int
+    failed_operations: int
+    retries: int
+    database_time: float
+    errors: str
+
+report_log_schema = pl.Schema({
+    'run_id': pl.String,
+    'started': pl.Datetime('us'),
+    'file': pl.String,
+    'kind': pl.String,
+    'name': pl.String,
+    'method': pl.String,
+    'status': pl.String,
+    'rows': pl.Int64,
+    'wall_time': pl.Float64,
+    'batches': pl.Int64,
+    'failed_batches': pl.Int64,
+    'failed_operations': pl.Int64,
+    'retries': pl.Int64,
+    'database_time': pl.Float64,
+    'errors': pl.String
+})
+
+def execute_apoc_iterate(connection: N4J_Connection, query: str) -> dict:
+    '''
+    Run an apoc.periodic.iterate query and return its statistics row.
+    '''
+    result = connection.execute_cypher_query(query)
+    assert result.summary.metadata.get('statuses')[0].get('status_description') == 'note: successful completion'
+    return result.records[0].data() if result.records else {}
+
+def load_apoc_file(connection: N4J_Connection, file: Path, query: Callable[[str], str], import_dir: Path,
+                   statistics: Optional[LoadStatistics] = None, chunk_rows: int = APOC_CHUNK_ROWS):
+    '''
+    Load a parquet file in the import directory with apoc.periodic.iterate, recording its statistics.
+    Files with more than chunk_rows rows are loaded in chunks of that many rows, each in its own call, so progress
+    is reported while the file loads and a single call never holds the whole file.
+    @param query - Builds the apoc query loading the parquet file at a path relative to the import directory.
+    @param import_dir - The import directory of the database.
+    @param statistics - Records the statistics of every call. The file is chunked the same way without it.
+    '''
+    parquet = pq.ParquetFile(file)
+    if parquet.metadata.num_rows <= chunk_rows:
+        apoc_statistics = execute_apoc_iterate(connection, query(file.relative_to(import_dir).as_posix()))
+        if statistics is not None:
+            statistics.add_apoc(apoc_statistics)
+        return
+
+    chunks = import_dir.joinpath('.chunks', '_'.join(file.relative_to(import_dir).with_suffix('').parts))
+    chunks.mkdir(parents=True, exist_ok=True)
+    try:
+        for index, batch in enumerate(parquet.iter_batches(batch_size=chunk_rows)):
+            chunk = chunks.joinpath(f'{index}.parquet')
+            pq.write_table(pa.Table.from_batches([batch]), chunk)
+            apoc_statistics = execute_apoc_iterate(connection, query(chunk.relative_to(import_dir).as_posix()))
+            if statistics is not None:
+                statistics.add_apoc(apoc_statistics)
+            chunk.unlink()
+    finally:
+        shutil.rmtree(chunks, ignore_errors=True)
+        with suppress(OSError):
+            chunks.parent.rmdir()
+
+class LoadReport:
+    '''
+    Collects a LoadRecord for every loaded file and appends them to a parquet report log.
+    '''
+
+    def __init__(self, report_log: Optional[Path] = None, progress_interval: float = 10.0):
+        self.report_log = report_log
+        self.progress_interval = progress_interval
+        self.run_id = uuid.uuid4().hex
+        self.records : list[LoadRecord] = []
+
+    @contextmanager
+    def file(self, file: Path, kind: str, name: str, method: str) -> Iterator[LoadStatistics]:
+        '''
+        Record the load of a file. Yields the LoadStatistics the loaders update.
+        A load that raises is recorded as failed, with its error, and the exception is raised again.
+        '''
+        statistics = LoadStatistics(file=file.name, kind=kind, name=name, method=method,
+                                    total_rows=pq.ParquetFile(file).metadata.num_rows,
+                                    progress_interval=self.progress_interval)
+        started = datetime.datetime.now()
+        start = time.perf_counter()
+
+        status = 'failed'
+        try:
+            yield statistics
+            status = 'loaded'
+        except BaseException as error:
+            statistics.add_error(error)
+            raise
+        finally:
+            self._record(file, statistics, status, started, time.perf_counter() - start)
+
+    def _record(self, file: Path, statistics: LoadStatistics, status: str, started: datetime.datetime, wall_time: float):
+        self.records.append(LoadRecord(
+            run_id=self.run_id,
+            started=started,
+            file=file.as_posix(),
+            kind=statistics.kind,
+            name=statistics.name,
+            method=statistics.method,
+            status=status,
+            rows=statistics.rows,
+            wall_time=wall_time,
+            batches=statistics.batches,
+            failed_batches=statistics.failed_batches,
+            failed_operations=statistics.failed_operations,
+            retries=statistics.retries,
+            database_time=statistics.database_time,
+            errors=json.dumps(statistics.errors)
+        ))
+        print(f'{"Loaded" if status == "loaded" else "Failed after loading"} {statistics.rows} {statistics.name} {statistics.kind} from {file.name} in {wall_time:.1f}s '
+              f'({statistics.rows / max(wall_time, 1e-9):.0f} rows/s, {statistics.batches} batches, '
+              f'{statistics.failed_batches} failed, {statistics.retries} retries)')
+        for message, count in statistics.errors.items():
+            print(f'    {count}x {message}')
+
+    def to_dataframe(self) -> pl.DataFrame:
+        return pl.DataFrame([asdict(record) for record in self.records], schema=report_log_schema)
+
+    def save(self):
+        '''
+        Append the records of this run to the report log.
+        '''
+        append_run(self.report_log, self.to_dataframe(), 'load report', self.run_id)
+
+    def summary(self, top: Optional[int] = None) -> str:
+        return summarize(self.to_dataframe(), top)
+
+def file_statistics(report: Optional[LoadReport], file: Path, kind: str, name: str, method: str):
+    '''
+    report.file when a report is given, otherwise a context yielding None.
+    '''
+    return report.file(file, kind, name, method) if report is not None else nullcontext()
+
+def load_times(data: pl.DataFrame) -> pl.DataFrame:
+    '''
+    Rank the node labels and relationship types of a report log by their total load time.
+    '''
+    return data.group_by(['kind', 'name'])\
+        .agg(
+            pl.col('wall_time').sum().alias('wall_time'),
+            pl.len().alias('files'),
+            pl.col('rows').sum().alias('rows'),
+            pl.col('batches').sum().alias('batches'),
+            pl.col('failed_batches').sum().alias('failed_batches'),
+            pl.col('retries').sum().alias('retries')
+        )\
+        .with_columns(
+            (pl.col('rows') / pl.col('wall_time')).alias('rows_per_second'),
+            (pl.col('rows') / pl.col('batches')).alias('rows_per_batch'),
+            (pl.col('wall_time') / pl.col('wall_time').sum() * 100).alias('share')
+        )\
+        .sort('wall_time', descending=True)
+
+def summarize(data: pl.DataFrame, top: Optional[int] = None) -> str:
+    ranked = load_times(data)
+    if top is not None:
+        ranked = ranked.head(top)
+
+    header = f"{'rank':>4}  {'kind':<13} {'name':<44} {'time (s)':>10} {'share':>7} {'files':>6} {'rows':>12} {'rows/s':>10} {'rows/batch':>11} {'failed':>7} {'retries':>8}"
+    lines = [header, '-' * len(header)]
+
+    for rank, row in enumerate(ranked.iter_rows(named=True), start=1):
+        lines.append(
+            f"{rank:>4}  {row['kind']:<13} {row['name']:<44} {row['wall_time']:>10.2f} {row['share'] or 0:>6.1f}% {row['files']:>6} "
+            f"{row['rows']:>12} {row['rows_per_second'] or 0:>10.0f} {row['rows_per_batch'] or 0:>11.0f} {row['failed_batches']:>7} {row['retries']:>8}"
+        )
+
+    return '\n'.join(lines)
+
+if __name__ == '__main__':
+    summarize_run('Rank the load times recorded in a load report log.', summarize)
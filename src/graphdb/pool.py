@@ -0,0 +1,106 @@
+'''
+pool.py
+Drivers shared by every connection to the same database, and sessions that fully consume their results.
+
+A neo4j driver owns a pool of connections, so opening a driver per connection or a session per query pays for the
+connection setup again and again. ConnectionPool keeps one driver per address, credentials and driver settings of
+its PoolConfig for the whole process, N4J_Connection and the visualization Client both run their sessions on it. The sessions of a ConnectionPool share a
+bookmark manager, so a read always sees the writes of earlier sessions, also when they ran on another connection.
+'''
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Iterator, Optional, Union
+from neo4j import Driver, EagerResult, GraphDatabase, ManagedTransaction, READ_ACCESS, Session, WRITE_ACCESS, unit_of_work
+from .conf import PoolConfig
+
+# Drivers by uri, auth and the driver settings of their PoolConfig
+_drivers : dict[tuple, Driver] = {}
+_references : dict[tuple, int] = {}
+_lock = threading.Lock()
+
+Query = Union[str, tuple[str, dict]]
+
+def _eager(tx: ManagedTransaction, query: str, parameters: Optional[dict]) -> EagerResult:
+    return tx.run(query, parameters).to_eager_result()
+
+class ConnectionPool:
+    '''
+    Sessions on the driver shared by every ConnectionPool with the same uri, auth, max_connection_pool_size and
+    connection_acquisition_timeout. The session settings of the config may differ between the pools sharing a driver.
+    '''
+
+    def __init__(self,
+                 uri: str,
+                 auth: Optional[tuple[str, str]] = None,
+                 database: str = 'neo4j',
+                 config: Optional[PoolConfig] = None):
+        self.config = config or PoolConfig()
+        self.database = database
+        self._key = (uri, tuple(auth) if auth else None,
+                     self.config.max_connection_pool_size, self.config.connection_acquisition_timeout)
+
+        with _lock:
+            if self._key not in _drivers:
+                _drivers[self._key] = GraphDatabase.driver(
+                    uri,
+                    auth=auth,
+                    keep_alive=True,
+                    max_connection_pool_size=self.config.max_connection_pool_size,
+                    connection_acquisition_timeout=self.config.connection_acquisition_timeout
+                )
+                _references[self._key] = 0
+            _references[self._key] += 1
+
+        self.driver = _drivers[self._key]
+        self.bookmark_manager = GraphDatabase.bookmark_manager()
+        self._closed = False
+
+    @contextmanager
+    def session(self, read: bool = False, database: Optional[str] = None) -> Iterator[Session]:
+        with self.driver.session(database=database or self.database,
+                                 fetch_size=self.config.fetch_size,
+                                 default_access_mode=READ_ACCESS if read else WRITE_ACCESS,
+                                 bookmark_manager=self.bookmark_manager) as session:
+            yield session
+
+    def run(self, query: str, parameters: Optional[dict] = None, database: Optional[str] = None) -> EagerResult:
+        '''
+        Run the query in an auto-commit transaction, as schema and apoc.periodic.iterate queries require,
+        and return its records and summary.
+        '''
+        with self.session(database=database) as session:
+            return session.run(query, parameters).to_eager_result()
+
+    def read(self, query: str, parameters: Optional[dict] = None, timeout: Optional[float] = None) -> EagerResult:
+        '''
+        Run the query in a read transaction, which the driver retries on transient errors.
+        @param timeout - Seconds before the database aborts the transaction. None keeps the timeout of the database.
+        '''
+        with self.session(read=True) as session:
+            return session.execute_read(unit_of_work(timeout=timeout)(_eager), query, parameters)
+
+    def read_all(self, queries: dict[str, Query], workers: Optional[int] = None, timeout: Optional[float] = None) -> dict[str, EagerResult]:
+        '''
+        Run the read queries on parallel sessions. queries maps a name to a query or a query with its parameters.
+        @param timeout - Seconds before the database aborts the transaction of each query.
+        '''
+        def read(query: Query) -> EagerResult:
+            return self.read(query, timeout=timeout) if isinstance(query, str) else self.read(*query, timeout=timeout)
+
+        with ThreadPoolExecutor(max_workers=workers or self.config.read_workers) as executor:
+            return dict(zip(queries.keys(), executor.map(read, queries.values())))
+
+    def close(self):
+        '''
+        Release the shared driver, which is closed once no ConnectionPool uses it.
+        '''
+        if self._closed:
+            return
+        self._closed = True
+
+        with _lock:
+            _references[self._key] -= 1
+            if _references[self._key] == 0:
+                _drivers.pop(self._key).close()
+                del _references[self._key]
@@ -40,6 +40,7 @@ class Relationships():
         (NodeType.SFU_U15_institution, NodeType.SFU_U15_institution) : 'IN_LINEAGE_WITH',
         (NodeType.SFU_U15_institution, NodeType.source) : 'HOSTS',
         (NodeType.SFU_U15_institution, NodeType.topic) : 'HAS_WORKS_CONCERNING',
+        (NodeType.SFU_U15_institution, NodeType.work) : 'HAS_AFFILIATED_WORK',
         (NodeType.SFU_U15_institution, NodeType.year) : 'IN_YEAR',
         (NodeType.source, NodeType.issn) : 'HAS_ISSN',
         (NodeType.source, NodeType.topic) : 'HAS_TOPIC',
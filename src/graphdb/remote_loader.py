@@ -0,0 +1,159 @@
+'''
+remote_loader.py
+Load parquet files into a remote database by streaming Arrow record batches through UNWIND queries
+'''
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional
+import pyarrow as pa
+import pyarrow.parquet as pq
+from neo4j import ManagedTransaction, Session
+from .conf import GraphObject, LoadMode, RemoteLoadConfig
+from .load_journal import LoadJournal
+from .load_report import LoadStatistics
+from .relationships import RelationshipObject
+
+def slice_batches(batches: Iterable[pa.RecordBatch], config: RemoteLoadConfig) -> Iterator[pa.RecordBatch]:
+    '''
+    Slice record batches into batches of at most max_batch_rows rows and roughly max_batch_bytes bytes.
+    '''
+    for batch in batches:
+        if batch.num_rows == 0:
+            continue
+
+        row_bytes = max(1, batch.nbytes // batch.num_rows)
+        rows = max(1, min(config.max_batch_rows, config.max_batch_bytes // row_bytes))
+        for offset in range(0, batch.num_rows, rows):
+            yield batch.slice(offset, rows)
+
+def skip_rows(batches: Iterable[pa.RecordBatch], offset: int) -> Iterator[pa.RecordBatch]:
+    for batch in batches:
+        if offset >= batch.num_rows:
+            offset -= batch.num_rows
+            continue
+        yield batch.slice(offset)
+        offset = 0
+
+def iter_record_batches(file: Path, config: RemoteLoadConfig, offset: int = 0) -> Iterator[pa.RecordBatch]:
+    '''
+    Stream the rows of a parquet file in batches sized by slice_batches.
+    @param offset - Rows to skip. Row groups before the offset are not read.
+    '''
+    parquet = pq.ParquetFile(file)
+    row_groups, skipped = [], 0
+    for row_group in range(parquet.num_row_groups):
+        rows = parquet.metadata.row_group(row_group).num_rows
+        if not row_groups and skipped + rows <= offset:
+            skipped += rows
+            continue
+        row_groups.append(row_group)
+
+    batches = parquet.iter_batches(batch_size=config.max_batch_rows, row_groups=row_groups)
+    return slice_batches(skip_rows(batches, offset - skipped), config)
+
+def node_rows(batch: pa.RecordBatch) -> list[dict]:
+    return batch.to_pylist()
+
+def relationship_rows(batch: pa.RecordBatch, relationshipObj: RelationshipObject) -> list[dict]:
+    '''
+    Nest the property columns of a relationship batch into a properties map next to the origin and target ids.
+    '''
+    ids = [relationshipObj.origin_id, relationshipObj.target_id]
+    names = [name for name in batch.schema.names if name not in ids]
+
+    if names:
+        properties = pa.StructArray.from_arrays([batch.column(name) for name in names], names=names)
+    else:
+        properties = pa.array([{}] * batch.num_rows, type=pa.struct([]))
+
+    return pa.StructArray.from_arrays(
+        [batch.column(relationshipObj.origin_id), batch.column(relationshipObj.target_id), properties],
+        names=['origin_id', 'target_id', 'properties']
+    ).to_pylist()
+
+def node_query(graphObject: GraphObject, mode: LoadMode = LoadMode.MERGE) -> str:
+    if mode == LoadMode.CREATE:
+        return f"""
+    UNWIND $rows AS row
+    CREATE ({graphObject.prefix}:{graphObject.name})
+    SET {graphObject.prefix} = row
+    """
+
+    return f"""
+    UNWIND $rows AS row
+    MERGE ({graphObject.prefix}:{graphObject.name} {{ id: row.id }})
+    SET {graphObject.prefix} += row
+    """
+
+def relationship_query(relationshipObj: RelationshipObject, mode: LoadMode = LoadMode.MERGE) -> str:
+    origin_node_prefix = relationshipObj.origin_node.prefix+'_ORIGIN_NODE'
+    target_node_prefix = relationshipObj.target_node.prefix+'_TARGET_NODE'
+
+    if mode == LoadMode.CREATE:
+        statement = f"""CREATE ({origin_node_prefix})-[r:{relationshipObj.rel_type}]->({target_node_prefix})
+    SET r = ROW.properties"""
+    else:
+        statement = f"""MERGE ({origin_node_prefix})-[r:{relationshipObj.rel_type}]->({target_node_prefix})
+    ON CREATE SET r = ROW.properties
+    ON MATCH SET r += ROW.properties"""
+
+    return f"""
+    UNWIND $rows AS ROW
+    MATCH ({origin_node_prefix}: {relationshipObj.origin_node.name} {{id: ROW.origin_id}})
+    MATCH ({target_node_prefix}: {relationshipObj.target_node.name} {{id: ROW.target_id}})
+    {statement}
+    """
+
+def write_rows(tx: ManagedTransaction, query: str, rows: list[dict]):
+    tx.run(query, rows=rows).consume()
+
+def load_batches(session: Session,
+                 batches: Iterable[pa.RecordBatch],
+                 query: str,
+                 to_rows: Callable[[pa.RecordBatch], list[dict]],
+                 on_commit: Optional[Callable[[int], None]] = None,
+                 statistics: Optional[LoadStatistics] = None) -> int:
+    '''
+    Write every batch in its own managed transaction, which the driver retries on transient errors.
+    Returns the number of rows loaded.
+    @param on_commit - Called with the number of rows loaded so far after every committed batch.
+    @param statistics - Count the batches, and the attempts of every transaction beyond the first as retries.
+    '''
+    loaded = 0
+    for batch in batches:
+        attempts = 0
+        def write(tx: ManagedTransaction, rows: list[dict]):
+            nonlocal attempts
+            attempts += 1
+            write_rows(tx, query, rows)
+
+        session.execute_write(write, to_rows(batch))
+        loaded += batch.num_rows
+        if on_commit is not None:
+            on_commit(loaded)
+        if statistics is not None:
+            statistics.add_batch(batch.num_rows, attempts - 1)
+
+    return loaded
+
+def load_file(session: Session,
+              file: Path,
+              query: str,
+              to_rows: Callable[[pa.RecordBatch], list[dict]],
+              config: RemoteLoadConfig,
+              journal: Optional[LoadJournal] = None,
+              statistics: Optional[LoadStatistics] = None) -> int:
+    '''
+    Load the file in batches. With a journal, committed files are skipped and pending files resume after the
+    last committed batch.
+    '''
+    if journal is None:
+        return load_batches(session, iter_record_batches(file, config), query, to_rows, statistics=statistics)
+
+    offset = journal.start(file)
+    if offset is None:
+        return 0
+
+    loaded = load_batches(session, iter_record_batches(file, config, offset), query, to_rows,
+                          lambda loaded: journal.commit_batch(file, offset + loaded), statistics)
+    journal.complete(file)
+    return loaded
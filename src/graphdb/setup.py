@@ -1,17 +1,23 @@
 import math
+from contextlib import nullcontext
 import polars as pl
 from neo4j import GraphDatabase, Result
-from .conf import DatabaseConfig, GraphObject
+import shutil
+from .conf import DatabaseConfig, GraphObject, LoadMode, RemoteLoadConfig, ConcurrentLoadConfig
 import os
 from ..utils.helpers import clear_directories, move_directories
 from pathlib import Path
-from .conf import ObjectNames, GraphType
+from .conf import ObjectNames, GraphType, RelationshipIndexes
 from .connect import N4J_Connection
 from config import TableMap, NodeType, DATABASE_OUTPUT_DIR
-from .helpers import infer_node_types_from_file, infer_node_type_from_file, CypherQueryCollection
+from .helpers import infer_node_types_from_file, infer_node_type_from_file, apoc_node_query, apoc_relationship_query, CypherQueryCollection
+from .helpers import deduplicated, node_files_by_label, property_relationships, relationship_files_by_type, parquet_file_name
 from .relationships import Relationships, RelationshipObject, PropertyType, PropertyRelationship
+from .remote_loader import load_file, node_query, node_rows, relationship_query, relationship_rows
+from .concurrent_loader import load_relationships_local, load_relationships_remote
+from .load_journal import LoadJournal, load_mode
+from .load_report import LoadReport, load_apoc_file, file_statistics
 from typing import Optional
-import pandas as pd
 
 def db_setup(input_directory: Path, 
              output_directory: Path,
@@ -40,12 +46,39 @@ def db_setup(input_directory: Path,
 
     move_directories(input_directory, output_directory)
 
+def stage_fresh_load(input_dir: Path, stage_nodes: bool = True, stage_relationships: bool = True) -> Path:
+    '''
+    Combine the node files of every label and the relationship files of every relationship type into one file each,
+    deduplicated across the shards, so CREATE never creates a node or relationship twice.
+    Returns the staging directory, which has a nodes and a relationships directory.
+    '''
+    staging_dir = input_dir.joinpath('.staged')
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    nodes = node_files_by_label(input_dir) if stage_nodes else {}
+    relationships = relationship_files_by_type(input_dir) if stage_relationships else {}
+
+    staging_dir.joinpath('nodes').mkdir(parents=True)
+    for _, (graphObject, files) in nodes.items():
+        deduplicated(files, ['id']).sink_parquet(staging_dir.joinpath('nodes', parquet_file_name(NodeType(graphObject.name))))
+
+    staging_dir.joinpath('relationships').mkdir(parents=True)
+    for _, (relationshipObj, files) in relationships.items():
+        deduplicated(files, [relationshipObj.origin_id, relationshipObj.target_id])\
+            .sink_parquet(staging_dir.joinpath('relationships', parquet_file_name(*infer_node_types_from_file(files[0]))))
+
+    return staging_dir
+
 def load_into_db(connection: N4J_Connection,
                  input_dir: Path,
                  load_nodes = True,
                  load_relationships = True,
                  propertyRelationships : list[PropertyRelationship] = [],
-                 remote: bool = False):
+                 remote: bool = False,
+                 remote_config: Optional[RemoteLoadConfig] = None,
+                 concurrency: Optional[ConcurrentLoadConfig] = None,
+                 mode: LoadMode = LoadMode.MERGE,
+                 journal: Optional[LoadJournal] = None,
+                 report: Optional[LoadReport] = None):
     '''
     Load into the database using folder structure to infer the type
     Assumes the structure:
@@ -53,243 +86,223 @@ def load_into_db(connection: N4J_Connection,
         NodeType
             DataType - (nodes, relationships)
                 Data
+    @param propertyRelationships - Relationships of shared property values, joined from the node files, see load_relationship_property_based.
+    @param remote_config - Batch sizing when streaming the files to a remote database.
+    @param concurrency - Load the partitions of every relationship file concurrently.
+    @param mode - LoadMode.CREATE loads the output of stage_fresh_load with CREATE instead of MERGE, for an empty database.
+    @param journal - Skip the files committed by an earlier run and resume pending ones, see load_journal.py.
+    @param report - Record the throughput of every file, see load_report.py.
     '''
 
     if not (load_nodes or load_relationships):
         return
 
-    top_level = [entry for entry in input_dir.iterdir() if entry.is_dir()]
+    if mode == LoadMode.CREATE:
+        staging_dir = stage_fresh_load(input_dir, load_nodes, load_relationships)
+        try:
+            if load_nodes:
+                load_nodes_into_db(connection, staging_dir.joinpath('nodes'), remote, remote_config, mode, journal, report)
+            if load_relationships:
+                load_relationships_into_db(connection, staging_dir.joinpath('relationships'), remote, remote_config, concurrency, mode, journal, report)
+                for prel in propertyRelationships:
+                    load_relationship_property_based(connection, prel.relationship, prel.properties, prel.propertyType, remote,
+                                                     input_dir, remote_config, mode, report)
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        return
+
+    # Files load in path order, the order stage_fresh_load combines them in, so the same properties win in both modes
+    top_level = sorted(entry for entry in input_dir.iterdir() if entry.is_dir())
     
     for tl in top_level:
-        types = [type for type in tl.iterdir() if tl.is_dir()]
+        types = sorted(type for type in tl.iterdir() if tl.is_dir())
 
         if load_nodes:
             for datatype in types:
                 load_nodes_into_db(connection=connection,
                                     node_dir=datatype.joinpath('nodes'),
-                                    remote=remote)
+                                    remote=remote,
+                                    remote_config=remote_config,
+                                    journal=journal,
+                                    report=report)
 
-    top_level = [entry for entry in input_dir.iterdir() if entry.is_dir()]
+    top_level = sorted(entry for entry in input_dir.iterdir() if entry.is_dir())
     
     for tl in top_level:
-        types = [type for type in tl.iterdir() if tl.is_dir()]
+        types = sorted(type for type in tl.iterdir() if tl.is_dir())
 
         if load_relationships:
             for datatype in types:
                 load_relationships_into_db(connection=connection,
     
                                             relationship_dir=datatype.joinpath('relationships'),
-                                            remote=remote)
-            
-            for prel in propertyRelationships:
-                load_relationship_property_based(connection, prel.relationship, prel.properties, prel.propertyType, remote=remote)
+                                            remote=remote,
+                                            remote_config=remote_config,
+                                            concurrency=concurrency,
+                                            journal=journal,
+                                            report=report)
+
+    # Derived once from the node files of every shard
+    if load_relationships:
+        for prel in propertyRelationships:
+            load_relationship_property_based(connection, prel.relationship, prel.properties, prel.propertyType, remote,
+                                             input_dir, remote_config, mode, report)
 
 
 def load_nodes_into_db(connection: N4J_Connection, 
                        node_dir: Path,
-                       remote: bool = False
+                       remote: bool = False,
+                       remote_config: Optional[RemoteLoadConfig] = None,
+                       mode: LoadMode = LoadMode.MERGE,
+                       journal: Optional[LoadJournal] = None,
+                       report: Optional[LoadReport] = None
                        ):
     
-    nodes = node_dir.glob('**/*.parquet')
-
-    for node in nodes:
-        nodeType = infer_node_type_from_file(node)
-        if nodeType not in ObjectNames:
-            raise(f'GraphObjectType not implemented for node type: {nodeType}')
-
-        graphObjectType = ObjectNames.get(nodeType)
-        if not remote:
-            path = node.relative_to(DATABASE_OUTPUT_DIR).as_posix()
-            query = f"""
-            CALL apoc.periodic.iterate(
-            "CALL apoc.load.parquet('file:///{path}') YIELD value as row",
-            "MERGE ({graphObjectType.prefix}:{graphObjectType.name} {{ id: row.id }})
-            SET {graphObjectType.prefix} += row",
-            {{
-                batchSize: 1000,
-                parallel: false,
-                retries: 5
-            }}
-            )
-            """
-            result = connection.execute_cypher_query(query)
-            assert result._metadata.get('statuses')[0].get('status_description') == 'note: successful completion'
-        else:
-                       
-            def create_nodes_batch(tx, batch):
-                query=f"""
-                UNWIND $batch AS row
-                MERGE ({graphObjectType.prefix}:{graphObjectType.name} {{ id: row.id }})
-                SET {graphObjectType.prefix} += row
-                """
-                tx.run(query, batch=batch)
-            
-
-            df = pd.read_parquet(node)
-            batch_size = 1000
-            batches = [df.iloc[i:i + batch_size].to_dict('records') for i in range(0, len(df), batch_size)]
-
-            with connection._driver.session() as session:
-                for batch in batches:
-                    session.execute_write(create_nodes_batch, batch)
-                                
+    nodes = sorted(node_dir.glob('**/*.parquet'))
+    remote_config = remote_config or RemoteLoadConfig()
+    # A single session is reused for every file in remote mode
+    with (connection.session() if remote else nullcontext()) as session:
+        for node in nodes:
+            nodeType = infer_node_type_from_file(node)
+            if nodeType not in ObjectNames:
+                raise Exception(f'GraphObjectType not implemented for node type: {nodeType}')
+
+            graphObjectType = ObjectNames.get(nodeType)
+            node_mode = load_mode(journal, node, mode)
+            if not remote:
+                if journal is not None and journal.start(node) is None:
+                    continue
+                with file_statistics(report, node, 'nodes', graphObjectType.name, 'apoc') as statistics:
+                    load_apoc_file(connection, node, lambda path: apoc_node_query(graphObjectType, path, node_mode),
+                                   DATABASE_OUTPUT_DIR, statistics)
+                if journal is not None:
+                    journal.complete(node)
+            else:
+                with file_statistics(report, node, 'nodes', graphObjectType.name, 'remote') as statistics:
+                    loaded = load_file(session, node, node_query(graphObjectType, node_mode), node_rows, remote_config, journal, statistics)
+                print(f'Loaded {loaded} {graphObjectType.name} nodes from: {node.name}')
 
 
 def load_relationship_property_based(connection: N4J_Connection, 
                                     relationship: RelationshipObject,
                                     properties: dict[str, str],
                                     propertyType: PropertyType,
-                                    remote: bool = False):
-    
+                                    remote: bool = False,
+                                    input_dir: Path = DATABASE_OUTPUT_DIR,
+                                    remote_config: Optional[RemoteLoadConfig] = None,
+                                    mode: LoadMode = LoadMode.MERGE,
+                                    report: Optional[LoadReport] = None):
+    '''
+    Derive the relationships with a hash-join of the node files in memory and load them by id like a relationship file,
+    instead of scanning the origin label for every target node.
+    Prefer deriving them while preprocessing, see PropertyJoins in src/processing/conf.py.
+    @param input_dir - The processed output holding the node files of both labels.
+    '''
     origin, target = relationship.origin_node, relationship.target_node
-    origin_node_prefix = origin.prefix+'_ORIGIN_NODE'
-    target_node_prefix = target.prefix+'_TARGET_NODE'
-
-    if propertyType == PropertyType.ONE_TO_ONE:
-        if not remote:
-            query = f"""
-                CALL apoc.periodic.iterate(
-                    "MATCH ({target_node_prefix}: {target.name}) RETURN {target_node_prefix}",
-                    "MATCH ({origin_node_prefix}: {origin.name} {properties})
-                    MERGE ({origin_node_prefix})-[r:{relationship.rel_type}]->({target_node_prefix})", 
-                    {{
-                        batchSize: 1000,
-                        parallel: false,
-                        retries: 5
-                    }}       
-                )
-            """
-        else:
-            query=f"""
-            MATCH ({target_node_prefix}: {target.name}) RETURN {target_node_prefix},
-            MATCH ({origin_node_prefix}: {origin.name} {properties})
-            MERGE ({origin_node_prefix})-[r:{relationship.rel_type}]->({target_node_prefix})
-            """
-            
-
-    elif propertyType == PropertyType.CONTAINED:
-        match = " AND ".join([origin_node_prefix+'.`'+key+'`' + " IN " +target_node_prefix+'.`'+value+'`' for key, value in properties.items()])
-        if not remote:
-            query = f"""
-            CALL apoc.periodic.iterate(
-                "MATCH ({target_node_prefix}: {target.name}) RETURN {target_node_prefix}",
-                "MATCH ({origin_node_prefix}: {origin.name})
-                WHERE {match}
-                MERGE ({origin_node_prefix})-[r:{relationship.rel_type}]->({target_node_prefix})", 
-                {{
-                    batchSize: 1000,
-                    parallel: false,
-                    retries: 5
-                }}       
-            )
-            """
-        else:
-            query=f"""
-                MATCH ({target_node_prefix}: {target.name}) RETURN {target_node_prefix}",
-                "MATCH ({origin_node_prefix}: {origin.name})
-                WHERE {match}
-                MERGE ({origin_node_prefix})-[r:{relationship.rel_type}]->({target_node_prefix})
-            """
-    else:
-        raise Exception('Property Type not implemented for: ', propertyType)
+    relationships = property_relationships(input_dir, PropertyRelationship(relationship, properties, propertyType))
 
-    result = connection.execute_cypher_query(query)
-    assert result._metadata.get('statuses')[0].get('status_description') == 'note: successful completion'
+    relationship_dir = input_dir.joinpath('.property', 'relationships')
+    shutil.rmtree(relationship_dir.parent, ignore_errors=True)
+    relationship_dir.mkdir(parents=True)
+    try:
+        relationships.sink_parquet(relationship_dir.joinpath(parquet_file_name(NodeType(origin.name), NodeType(target.name))))
+        load_relationships_into_db(connection, relationship_dir, remote, remote_config, mode=mode, report=report)
+    finally:
+        shutil.rmtree(relationship_dir.parent, ignore_errors=True)
 
 
 def load_relationships_into_db(connection: N4J_Connection, 
                                relationship_dir: Path,
-                               remote: bool = False):
-    files = relationship_dir.glob('**/*.parquet')
-
+                               remote: bool = False,
+                               remote_config: Optional[RemoteLoadConfig] = None,
+                               concurrency: Optional[ConcurrentLoadConfig] = None,
+                               mode: LoadMode = LoadMode.MERGE,
+                               journal: Optional[LoadJournal] = None,
+                               report: Optional[LoadReport] = None):
+    '''
+    Load the relationship files one after another.
+    @param concurrency - Load each file as partitions on several sessions at once, see concurrent_loader.py.
+    @param report - Record the throughput of every file, see load_report.py.
+    '''
+    files = sorted(relationship_dir.glob('**/*.parquet'))
+    remote_config = remote_config or RemoteLoadConfig()
     RelationshipsGen = Relationships()
-    
-    for file in files:
-        start_node, end_node = infer_node_types_from_file(file)
-        relationshipObj = RelationshipsGen.createRelationshipObject(start_node, end_node)
-
-        path = file.relative_to(DATABASE_OUTPUT_DIR).as_posix()
-
-        origin_node_prefix = relationshipObj.origin_node.prefix+'_ORIGIN_NODE'
-        target_node_prefix = relationshipObj.target_node.prefix+'_TARGET_NODE'
-
-        if not remote:
-
-            query = f"""
-            CALL apoc.periodic.iterate(
-                "CALL apoc.load.parquet ('file:///{path}') YIELD value AS ROW",
-                "
-                    WITH ROW,
-                        ROW.`{relationshipObj.origin_id}` AS origin_id,
-                        ROW.`{relationshipObj.target_id}` AS target_id,
-                        apoc.map.clean(ROW, [\\"{relationshipObj.origin_id}\\", \\"{relationshipObj.target_id}\\"], []) as properties
-                    
-                    MATCH ({origin_node_prefix}: {relationshipObj.origin_node.name} {{id: origin_id}})
-                    MATCH ({target_node_prefix}: {relationshipObj.target_node.name} {{id: target_id}})
-                    MERGE ({origin_node_prefix})-[r:{relationshipObj.rel_type}]->({target_node_prefix})
-                    ON CREATE SET r = properties
-                    ON MATCH SET r += properties
-                ",
-                {{
-                    batchSize: 1000,
-                    parallel: false,
-                    retries: 5
-                }}
-            )
-            """
-            result = connection.execute_cypher_query(query)
-            assert result._metadata.get('statuses')[0].get('status_description') == 'note: successful completion'
-        
-        else:
-            query = f"""
-            UNWIND $rows AS ROW
-            MATCH ({origin_node_prefix}: {relationshipObj.origin_node.name} {{id: ROW.origin_id}})
-            MATCH ({target_node_prefix}: {relationshipObj.target_node.name} {{id: ROW.target_id}})
-            MERGE ({origin_node_prefix})-[r:{relationshipObj.rel_type}]->({target_node_prefix})
-            ON CREATE SET r = ROW.properties
-            ON MATCH SET r += ROW.properties
-            """
-
-            df = pd.read_parquet(file)
-
-            origin_id_col = relationshipObj.origin_id
-            target_id_col = relationshipObj.target_id
-
-            prop_cols = [col for col in df.columns if col not in [origin_id_col, target_id_col]]
-
-            batch = []
-            batch_size = 1000
-
-            for _, row in df.iterrows():
-                properties = row[prop_cols].to_dict()
-
-                row_data = {
-                    "origin_id": row[origin_id_col],
-                    "target_id": row[target_id_col],
-                    "properties": properties
-                }
-                batch.append(row_data)
-
-                if len(batch) >= batch_size:
-                    with connection._driver.session() as session:
-                        session.run(query, rows=batch)
-                    batch = []
-                
-            if batch:
-                with connection._driver.session() as session:
-                        session.run(query, rows=batch)
+
+    with (connection.session() if remote and concurrency is None else nullcontext()) as session:
+        for file in files:
+            start_node, end_node = infer_node_types_from_file(file)
+            relationshipObj = RelationshipsGen.createRelationshipObject(start_node, end_node)
+            file_mode = load_mode(journal, file, mode)
+
+            if (concurrency is not None or not remote) and journal is not None and journal.start(file) is None:
+                continue
+
+            name = f'({relationshipObj.origin_node.name})-[{relationshipObj.rel_type}]->({relationshipObj.target_node.name})'
+            method = ('concurrent ' if concurrency is not None else '') + ('remote' if remote else 'apoc')
+
+            with file_statistics(report, file, 'relationships', name, method) as statistics:
+                if concurrency is not None:
+                    if remote:
+                        loaded = load_relationships_remote(connection, file, relationshipObj, concurrency, remote_config, file_mode, statistics)
+                    else:
+                        loaded = load_relationships_local(connection, file, relationshipObj, concurrency, file_mode, statistics)
+                    print(f'Loaded {loaded} {relationshipObj.rel_type} relationships from: {file.name} on {concurrency.workers} workers')
+
+                elif not remote:
+                    load_apoc_file(connection, file, lambda path: apoc_relationship_query(relationshipObj, path, file_mode),
+                                   DATABASE_OUTPUT_DIR, statistics)
+
+                else:
+                    loaded = load_file(session, file, relationship_query(relationshipObj, file_mode),
+                                       lambda batch: relationship_rows(batch, relationshipObj), remote_config, journal, statistics)
+                    print(f'Loaded {loaded} {relationshipObj.rel_type} relationships from: {file.name}')
+
+            if (concurrency is not None or not remote) and journal is not None:
+                journal.complete(file)
 
 def setup_full(connection: N4J_Connection,
                 clear_previous_contents: bool,
                 node_constraints: Optional[dict[GraphObject, dict[str, str]]] = None,
                 relationship_constraints: Optional[dict[tuple[GraphObject, GraphObject], dict[set[str], str]]] = None,
                 indexes: Optional[dict[GraphObject, set[str]]]= None,
-                remote: bool = False
+                relationship_indexes: Optional[dict[str, tuple[str, ...]]] = None,
+                remote: bool = False,
+                load_data: bool = True,
+                remote_config: Optional[RemoteLoadConfig] = None,
+                concurrency: Optional[ConcurrentLoadConfig] = None,
+                journal: Optional[LoadJournal] = None,
+                resume: bool = False,
+                report: Optional[LoadReport] = None,
+                propertyRelationships: list[PropertyRelationship] = []
                ):
+    '''
+    Create the constraints and indexes, then load the data.
+    Loads into a cleared database CREATE the nodes before the constraints exist, so uniqueness is verified once when
+    the constraints are created, and then CREATE the relationships. Loads into existing data MERGE after the constraints.
+    @param relationship_indexes - Fields of the range or composite index of each relationship type, in index order. Defaults to RelationshipIndexes.
+    @param load_data - Skip loading, e.g. after the data was imported with neo4j-admin, see bulk_import.py.
+    @param remote_config - Batch sizing when streaming the files to a remote database.
+    @param concurrency - Load the partitions of every relationship file concurrently.
+    @param journal - Record the loaded files, see load_journal.py. Clearing the contents resets the journal.
+    @param resume - Continue a failed load with the same arguments and journal, without clearing the contents again.
+    Files the failed load started are merged, so the rows it wrote before failing are not created twice.
+    @param report - Record the throughput of every file. Saved to its report log and summarized after the load.
+    @param propertyRelationships - Relationships joined from the node files while loading, see load_relationship_property_based.
+    With load_data=False they are not loaded, pass them to export_bulk_import to import them with the other relationships.
+    '''
+    mode = LoadMode.CREATE if clear_previous_contents else LoadMode.MERGE
+    load = lambda **kwargs: load_into_db(connection=connection, input_dir=DATABASE_OUTPUT_DIR, remote=remote,
+                                         remote_config=remote_config, concurrency=concurrency, mode=mode,
+                                         journal=journal, report=report, propertyRelationships=propertyRelationships, **kwargs)
 
-    if clear_previous_contents:
+    if clear_previous_contents and not resume:
         connection.execute_cypher_query(CypherQueryCollection.DELETE_NODES.value)
         connection.execute_cypher_query(CypherQueryCollection.CLEAR_SCHEMA.value)
+        if journal is not None:
+            journal.reset()
+
+    if load_data and mode == LoadMode.CREATE:
+        load(load_relationships=False)
 
     # Define constraints
     if node_constraints is not None:
@@ -322,5 +335,15 @@ def setup_full(connection: N4J_Connection,
         for _, GraphObject in ObjectNames.items():
             connection.create_indexes(GraphObject.name, GraphObject.prefix, set(['id']), GraphType.NODE)
 
-    # Load nodes into DB
-    load_into_db(connection=connection, input_dir=DATABASE_OUTPUT_DIR, remote=remote)
\ No newline at end of file
+    for rel_type, fields in (relationship_indexes if relationship_indexes is not None else RelationshipIndexes).items():
+        connection.create_indexes(rel_type, 'r', fields, GraphType.RELATIONSHIP)
+
+    # Load the data, only the relationships are left for a fresh load
+    if load_data and mode == LoadMode.CREATE:
+        load(load_nodes=False)
+    elif load_data:
+        load()
+
+    if report is not None:
+        report.save()
+        print(report.summary())
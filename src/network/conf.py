@@ -0,0 +1,30 @@
+from dataclasses import dataclass
+from typing import Optional
+
+@dataclass
+class NetworkConfig:
+    '''
+    Settings for building the co-authorship matrices and computing their metrics, see matrices.py and metrics.py.
+    @param max_authors_per_work - Works with more authors are left out, as each connects every pair of its authors. Keeps every work when None.
+    @param damping - Probability that the PageRank walk follows an edge rather than jumping to a random node.
+    @param tolerance - PageRank stops once the scores change by less than this in total.
+    @param max_iterations - Maximum number of PageRank iterations.
+    @param betweenness_samples - Number of sources of the betweenness approximation. Uses every node when None.
+    @param betweenness_batch - Number of sources traversed at once, each a dense column the size of the graph.
+    @param resolution - Louvain resolution, higher values give smaller communities.
+    @param max_levels - Maximum number of times the communities are aggregated into nodes.
+    @param max_passes - Maximum number of passes of moving nodes between communities on each level.
+    @param threshold - A level stops once a pass improves the modularity by less than this.
+    @param seed - Seed of the sampled sources and of the moves between communities.
+    '''
+    max_authors_per_work: Optional[int] = 100
+    damping: float = 0.85
+    tolerance: float = 1e-10
+    max_iterations: int = 100
+    betweenness_samples: Optional[int] = 256
+    betweenness_batch: int = 32
+    resolution: float = 1.0
+    max_levels: int = 10
+    max_passes: int = 50
+    threshold: float = 1e-7
+    seed: int = 0
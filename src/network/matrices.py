@@ -0,0 +1,81 @@
+'''
+matrices.py
+Build the co-authorship networks of the authors and of the institutions as sparse adjacency matrices.
+
+Both come from the authorship relationships of the processed output. The incidence matrix B has a row per author or
+institution and a column per work, and the adjacency B @ B.T holds the number of works every pair shares, without
+the diagonal. Works with very many authors are left out, see NetworkConfig.max_authors_per_work.
+'''
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+import numpy as np
+import polars as pl
+import scipy.sparse as sp
+from config import NodeType, GRAPH_START_ID, GRAPH_END_ID, DATABASE_OUTPUT_DIR
+from src.graphdb.helpers import deduplicated
+from src.processing.raw import relationship_files_of_type
+from .conf import NetworkConfig
+
+@dataclass
+class CoauthorshipNetwork:
+    '''
+    A symmetric weighted adjacency matrix, whose rows and columns are the nodes in ids.
+    '''
+    ids: np.ndarray
+    adjacency: sp.csr_array
+
+def incidence(pairs: pl.DataFrame, node: str, work: str, max_authors_per_work: Optional[int] = None) -> tuple[np.ndarray, sp.csr_array]:
+    '''
+    The node×work incidence matrix of the distinct (node, work) pairs, with the ids of its rows in order.
+    @param max_authors_per_work - Works with more distinct nodes are left out.
+    '''
+    pairs = pairs.select(node, work).unique()
+    if max_authors_per_work is not None:
+        pairs = pairs.filter(pl.len().over(work) <= max_authors_per_work)
+    nodes = pairs.select(pl.col(node).unique().sort()).with_row_index('row')
+    works = pairs.select(pl.col(work).unique()).with_row_index('column')
+    indices = pairs.join(nodes, on=node).join(works, on=work)
+
+    matrix = sp.csr_array((np.ones(len(indices)), (indices['row'].to_numpy(), indices['column'].to_numpy())),
+                          shape=(len(nodes), len(works)))
+    return nodes[node].to_numpy(), matrix
+
+def coauthorship(ids: np.ndarray, incidence: sp.csr_array) -> CoauthorshipNetwork:
+    '''
+    The network of the rows of an incidence matrix, weighted by the number of shared works.
+    '''
+    adjacency = incidence @ incidence.T
+    adjacency = (adjacency - sp.diags_array(adjacency.diagonal())).tocsr()
+    adjacency.eliminate_zeros()
+    return CoauthorshipNetwork(ids, adjacency)
+
+def _relationships(input_dir: Path, start: NodeType, target: NodeType, start_name: str, target_name: str) -> pl.LazyFrame:
+    files = relationship_files_of_type(input_dir, start, target)
+    if not files:
+        raise Exception(f'No relationship files from {start.value} to {target.value} in {input_dir}')
+    return deduplicated(files, [GRAPH_START_ID, GRAPH_END_ID])\
+        .select(pl.col(GRAPH_START_ID).alias(start_name), pl.col(GRAPH_END_ID).alias(target_name))
+
+def _authorship_works(input_dir: Path) -> pl.LazyFrame:
+    return _relationships(input_dir, NodeType.authorship, NodeType.work, 'authorship', 'work')
+
+def author_network(input_dir: Path = DATABASE_OUTPUT_DIR, config: Optional[NetworkConfig] = None) -> CoauthorshipNetwork:
+    '''
+    The authors connected by the works they wrote together.
+    '''
+    config = config or NetworkConfig()
+    pairs = _relationships(input_dir, NodeType.author, NodeType.authorship, 'author', 'authorship')\
+        .join(_authorship_works(input_dir), on='authorship')\
+        .collect()
+    return coauthorship(*incidence(pairs, 'author', 'work', config.max_authors_per_work))
+
+def institution_network(input_dir: Path = DATABASE_OUTPUT_DIR, config: Optional[NetworkConfig] = None) -> CoauthorshipNetwork:
+    '''
+    The affiliated institutions connected by the works their authors wrote together.
+    '''
+    config = config or NetworkConfig()
+    pairs = _relationships(input_dir, NodeType.authorship, NodeType.affiliated_institution, 'authorship', 'institution')\
+        .join(_authorship_works(input_dir), on='authorship')\
+        .collect()
+    return coauthorship(*incidence(pairs, 'institution', 'work', config.max_authors_per_work))
@@ -0,0 +1,208 @@
+'''
+metrics.py
+Centrality and community metrics of a co-authorship network, computed on its sparse adjacency matrix.
+
+Every metric works on whole vectors or blocks of columns at a time rather than on single nodes:
+- degree and strength are row counts and row sums of the adjacency
+- PageRank is a power iteration of the weighted transition matrix
+- betweenness follows Brandes' algorithm from a sample of sources, a batch of breadth first searches per sparse product
+- communities are found with Louvain, moving every node whose best community improves the modularity in the same pass.
+  Like the refinement of Leiden, every community is split into its connected parts before it is aggregated.
+'''
+from typing import Optional
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+from .conf import NetworkConfig
+from .matrices import CoauthorshipNetwork
+
+def degree(adjacency: sp.csr_array) -> np.ndarray:
+    '''
+    The number of neighbours of every node.
+    '''
+    return np.diff(adjacency.indptr)
+
+def strength(adjacency: sp.csr_array) -> np.ndarray:
+    '''
+    The total weight of the edges of every node.
+    '''
+    return np.asarray(adjacency.sum(axis=1)).ravel()
+
+def pagerank(adjacency: sp.csr_array, damping: float = 0.85, tolerance: float = 1e-10, max_iterations: int = 100) -> np.ndarray:
+    '''
+    Weighted PageRank, the walk follows every edge in proportion to its weight. Nodes without edges jump to any node.
+    '''
+    n = adjacency.shape[0]
+    if n == 0:
+        return np.zeros(0)
+    weights = strength(adjacency)
+    dangling = weights == 0
+    # Row i of the transition matrix holds the probabilities of moving from i to each neighbour
+    transition = (sp.diags_array(np.divide(1.0, weights, out=np.zeros(n), where=~dangling)) @ adjacency).T.tocsr()
+
+    scores = np.full(n, 1.0 / n)
+    for _ in range(max_iterations):
+        previous = scores
+        scores = damping * (transition @ previous) + (damping * previous[dangling].sum() + 1 - damping) / n
+        if np.abs(scores - previous).sum() < tolerance:
+            break
+    return scores
+
+def betweenness(adjacency: sp.csr_array, samples: Optional[int] = None, batch: int = 32, seed: int = 0) -> np.ndarray:
+    '''
+    Normalized betweenness over the unweighted shortest paths, estimated from a sample of sources.
+    Exact when samples is None or at least the number of nodes.
+    '''
+    n = adjacency.shape[0]
+    if n < 3:
+        return np.zeros(n)
+    edges = (adjacency != 0).astype(np.float64).tocsr()
+    sources = np.arange(n) if samples is None or samples >= n\
+        else np.random.default_rng(seed).choice(n, size=samples, replace=False)
+
+    centrality = np.zeros(n)
+    for start in range(0, len(sources), batch):
+        columns = sources[start:start + batch]
+        width = len(columns)
+        # Number of shortest paths from every source, and the distance of every node from it
+        paths = np.zeros((n, width))
+        distance = np.full((n, width), -1)
+        paths[columns, np.arange(width)] = 1
+        distance[columns, np.arange(width)] = 0
+        frontier = distance == 0
+        depth = 0
+        while frontier.any():
+            depth += 1
+            reached = edges @ np.where(frontier, paths, 0)
+            frontier = (reached > 0) & (distance < 0)
+            paths[frontier] = reached[frontier]
+            distance[frontier] = depth
+
+        # Dependencies of the sources on every node, accumulated from the furthest nodes back
+        dependency = np.zeros((n, width))
+        for level in range(depth - 1, 0, -1):
+            successors = np.where(distance == level + 1, (1 + dependency) / np.where(paths > 0, paths, 1), 0)
+            dependency += np.where(distance == level, paths * (edges @ successors), 0)
+        centrality += dependency.sum(axis=1)
+
+    # Every pair is counted from both ends, and the sample stands in for every source
+    return centrality * (n / len(sources)) / ((n - 1) * (n - 2))
+
+def modularity(adjacency: sp.csr_array, communities: np.ndarray, resolution: float = 1.0) -> float:
+    '''
+    The modularity of the communities, numbered from 0.
+    '''
+    total = adjacency.sum()
+    if total == 0:
+        return 0.0
+    edges = adjacency.tocoo()
+    inside = edges.data[communities[edges.row] == communities[edges.col]].sum()
+    degrees = np.bincount(communities, weights=strength(adjacency))
+    return float(inside / total - resolution * np.square(degrees / total).sum())
+
+def _connected_parts(adjacency: sp.csr_array, communities: np.ndarray) -> np.ndarray:
+    '''
+    Split every community into its connected parts, numbered from 0.
+    '''
+    edges = adjacency.tocoo()
+    inside = communities[edges.row] == communities[edges.col]
+    within = sp.coo_array((edges.data[inside], (edges.row[inside], edges.col[inside])), shape=adjacency.shape)
+    return connected_components(within, directed=False)[1]
+
+def _move_nodes(adjacency: sp.csr_array, resolution: float, max_passes: int, threshold: float, rng: np.random.Generator) -> np.ndarray:
+    '''
+    Move the nodes between communities until a pass improves the modularity by less than the threshold, starting from
+    a community per node.
+    '''
+    n = adjacency.shape[0]
+    weights = strength(adjacency)
+    total = weights.sum()
+    if total == 0:
+        return np.arange(n)
+    # The self loops of aggregated communities count in the degree, but not as a link to a community
+    links = (adjacency - sp.diags_array(adjacency.diagonal())).tocsr()
+    communities = np.arange(n)
+    nodes = np.arange(n)
+    loops = adjacency.diagonal().sum()
+    previous = -np.inf
+
+    for _ in range(max_passes):
+        community_weights = np.bincount(communities, weights=weights, minlength=n)
+        membership = sp.csr_array((np.ones(n), (nodes, communities)), shape=(n, n))
+        candidates = (links @ membership).tocsr()
+        candidates.sort_indices()
+        rows = np.repeat(nodes, np.diff(candidates.indptr))
+
+        # Gain of joining a community once the node has left its own, up to a common factor
+        def gain(node: np.ndarray, community: np.ndarray, weight: np.ndarray) -> np.ndarray:
+            others = community_weights[community] - np.where(community == communities[node], weights[node], 0)
+            return weight - resolution * weights[node] * others / total
+
+        own_links = np.zeros(n)
+        is_own = candidates.indices == communities[rows]
+        own_links[rows[is_own]] = candidates.data[is_own]
+        stay = gain(nodes, communities, own_links)
+
+        current = (own_links.sum() + loops) / total - resolution * np.square(community_weights / total).sum()
+        if current - previous < threshold:
+            # Nodes moving at once can lower the modularity, keep the communities before the pass then
+            communities = communities if current >= previous else last
+            break
+        previous = current
+
+        scores = gain(rows, candidates.indices, candidates.data)
+        # The best community of every node with links, ties to the lowest community
+        linked = np.diff(candidates.indptr) > 0
+        starts = candidates.indptr[:-1][linked]
+        if len(starts) == 0:
+            break
+        best = np.maximum.reduceat(scores, starts)
+        positions = np.arange(len(scores))
+        first = np.minimum.reduceat(np.where(scores == np.repeat(best, np.diff(candidates.indptr)[linked]), positions, len(scores)), starts)
+        best_nodes, best_communities, best_scores = nodes[linked], candidates.indices[first], best
+
+        improves = (best_scores > stay[best_nodes] + 1e-12) & (best_communities != communities[best_nodes])
+        if not improves.any():
+            break
+        # Moving half of the nodes at random keeps neighbours from swapping communities back and forth
+        moving = improves & (rng.random(len(best_nodes)) < 0.5)
+        last = communities
+        communities = communities.copy()
+        communities[best_nodes[moving]] = best_communities[moving]
+    return np.unique(communities, return_inverse=True)[1]
+
+def louvain(adjacency: sp.csr_array, resolution: float = 1.0, max_levels: int = 10, max_passes: int = 50, threshold: float = 1e-7,
+            seed: int = 0) -> np.ndarray:
+    '''
+    The community of every node, numbered from 0, found by moving nodes and aggregating the communities into nodes
+    until the modularity stops improving.
+    '''
+    n = adjacency.shape[0]
+    rng = np.random.default_rng(seed)
+    membership = np.arange(n)
+    graph = adjacency.tocsr()
+    for _ in range(max_levels):
+        communities = _connected_parts(graph, _move_nodes(graph, resolution, max_passes, threshold, rng))
+        count = communities.max() + 1 if len(communities) else 0
+        if count == graph.shape[0]:
+            break
+        membership = communities[membership]
+        aggregation = sp.csr_array((np.ones(len(communities)), (np.arange(len(communities)), communities)), shape=(len(communities), count))
+        graph = (aggregation.T @ graph @ aggregation).tocsr()
+    return membership
+
+def network_metrics(network: CoauthorshipNetwork, config: Optional[NetworkConfig] = None) -> pd.DataFrame:
+    '''
+    The degree, strength, PageRank, betweenness and community of every node of the network.
+    '''
+    config = config or NetworkConfig()
+    adjacency = network.adjacency
+    return pd.DataFrame({
+        'id': network.ids,
+        'degree': degree(adjacency),
+        'strength': strength(adjacency),
+        'pagerank': pagerank(adjacency, config.damping, config.tolerance, config.max_iterations),
+        'betweenness': betweenness(adjacency, config.betweenness_samples, config.betweenness_batch, config.seed),
+        'community': louvain(adjacency, config.resolution, config.max_levels, config.max_passes, config.threshold, config.seed)
+    })
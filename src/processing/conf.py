@@ -1,7 +1,8 @@
 from dataclasses import dataclass
 import polars as pl
 from polars import LazyFrame
-from typing import Iterable
+from typing import Iterable, Optional
+from pathlib import Path
 from config import NodeType
 
 @dataclass
@@ -20,6 +21,42 @@ class GraphTable:
 class GraphDataCollection:
     relationships: Iterable[GraphRelationship]
     nodes: Iterable[GraphTable]
+    # Name of the function that derived the collection
+    stage: str = ''
+
+@dataclass
+class OutOfCoreConfig:
+    '''
+    Settings for deriving the authorship tables out-of-core.
+    @param memory_budget - Approximate number of bytes the exploded rows of a single batch, or a partition being
+    deduplicated, may occupy once decompressed.
+    @param batch_size - Maximum number of works staged to disk per batch.
+    @param partitions - Number of hash partitions the exploded rows are first spilled into. Partitions that outgrow the
+    memory budget are split into as many partitions as their size needs before they are deduplicated.
+    @param spill_directory - Parent directory for the spilled data. Uses the system temporary directory otherwise.
+    '''
+    memory_budget: int = 512 * 1024 * 1024
+    batch_size: int = 10000
+    partitions: int = 32
+    spill_directory: Optional[Path] = None
+
+@dataclass
+class PropertyJoin:
+    '''
+    A relationship between the nodes of two types that share property values, derived as :START_ID/:END_ID pairs.
+    @param properties - Maps a property of the start nodes to a property of the target nodes.
+    @param contained - The target property is a list that contains the start property, otherwise the values are equal.
+    '''
+    start_type: NodeType
+    target_type: NodeType
+    properties: dict[str, str]
+    contained: bool = True
+
+# Relationships derived from shared property values once every node file has been written
+PropertyJoins : list[PropertyJoin] = [
+    # The geographic nodes are keyed by their country code
+    PropertyJoin(NodeType.SFU_U15_institution, NodeType.geographic, {'country_code': 'id'}, contained=False)
+]
 
 designatedDirectories = {
     'authors': NodeType.author,
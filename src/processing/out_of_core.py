@@ -0,0 +1,183 @@
+'''
+out_of_core.py
+Utilities to process large tables in bounded batches by spilling rows to disk
+'''
+import math, shutil
+import polars as pl
+import pyarrow.parquet as pq
+from polars import LazyFrame, DataFrame
+from pathlib import Path
+from typing import Iterator, Optional
+
+PARTITION_COLUMN = '__partition'
+# A batch is held about this many times over while it is hashed, partitioned and written
+SPILL_COPIES = 4
+
+def stage_batches(data: LazyFrame, directory: Path, batch_size: int) -> list[Path]:
+    '''
+    Stream the data to disk as parquet files holding at most batch_size rows each.
+    '''
+    directory.mkdir(parents=True, exist_ok=True)
+    data.sink_parquet(
+        pl.PartitionMaxSize(directory, max_size=batch_size),
+        maintain_order=False,
+        row_group_size=1000,
+        compression='zstd',
+        engine='streaming'
+    )
+    return sorted(directory.glob('*.parquet'))
+
+def decompressed_size(files: list[Path]) -> int:
+    '''
+    Size of the rows of the parquet files once decompressed, read from their metadata.
+    '''
+    size = 0
+    for file in files:
+        metadata = pq.read_metadata(file)
+        size += sum(metadata.row_group(index).total_byte_size for index in range(metadata.num_row_groups))
+    return size
+
+def parquet_rows(files: list[Path]) -> int:
+    return sum(pq.read_metadata(file).num_rows for file in files)
+
+def split_by_weight(data: DataFrame, weights: pl.Series, max_weight: int) -> Iterator[DataFrame]:
+    '''
+    Split the data into consecutive slices whose summed weight does not exceed max_weight.
+    Rows heavier than max_weight are returned on their own.
+    '''
+    start, total = 0, 0
+    for idx, weight in enumerate(weights.to_list()):
+        if idx > start and total + weight > max_weight:
+            yield data.slice(start, idx - start)
+            start, total = idx, 0
+        total += weight
+
+    if start < data.height:
+        yield data.slice(start, data.height - start)
+
+def write_partitions(data: DataFrame, key: str, directory: Path, partitions: int, file_name: str, seed: int = 0):
+    '''
+    Write the rows into hash partitions of the key, as directory/<partition>/file_name.
+    '''
+    if data.is_empty():
+        return
+
+    partitioned = data.with_columns(
+        (pl.col(key).hash(seed=seed) % partitions).alias(PARTITION_COLUMN)
+    ).partition_by(PARTITION_COLUMN, as_dict=True, include_key=False)
+
+    for (partition,), rows in partitioned.items():
+        target = directory.joinpath(str(partition))
+        target.mkdir(parents=True, exist_ok=True)
+        rows.write_parquet(target.joinpath(file_name), row_group_size=1000, compression='zstd')
+
+class HashPartitionedSpill:
+    '''
+    Spill rows of several tables into hash partitions on disk.
+    Rows sharing a partition key always land in the same partition, so each partition can be deduplicated on its own.
+    The number of partitions follows the size of the spilled rows: partitions larger than the memory budget are split
+    on another hash of the key before they are deduplicated, until they fit the budget.
+    Every batch of a table is written as <name>/<partition>/<batch>.parquet.
+
+    The partitioned sinks of Polars buffer rows for every open partition, growing with the rows spilled. Rows are
+    partitioned here in batches read from a single parquet file instead, so memory follows the batch size.
+    '''
+
+    def __init__(self, directory: Path, partitions: int, memory_budget: Optional[int] = None):
+        '''
+        @param partitions - Number of partitions the rows are first spilled into.
+        @param memory_budget - Decompressed size of the largest partition deduplicated at once. Unbounded when None.
+        '''
+        self.directory = directory
+        self.partitions = partitions
+        self.memory_budget = memory_budget
+        self.schemas : dict[str, pl.Schema] = {}
+        self.keys : dict[str, str] = {}
+        self._batches : dict[str, int] = {}
+
+    def write(self, name: str, data: DataFrame, key: str):
+        self.schemas.setdefault(name, data.schema)
+        self.keys[name] = key
+        batch = self._batches.get(name, 0)
+        self._batches[name] = batch + 1
+
+        write_partitions(data, key, self.directory.joinpath(name), self.partitions, f'{batch}.parquet')
+
+    def sink(self, name: str, data: LazyFrame, key: str):
+        '''
+        Stream a LazyFrame into the partitions of a table without collecting it.
+        '''
+        staged = self.directory.joinpath(name+'_staged.parquet')
+        data.sink_parquet(staged, maintain_order=False, row_group_size=1000, compression='zstd', mkdir=True, engine='streaming')
+        self.schemas.setdefault(name, pl.scan_parquet(staged).collect_schema())
+
+        for rows in self.read_batches([staged]):
+            self.write(name, rows, key)
+        staged.unlink()
+
+    def read_batches(self, files: list[Path]) -> Iterator[DataFrame]:
+        '''
+        Read the rows of the parquet files in batches that fit the memory budget.
+        '''
+        rows = parquet_rows(files)
+        if self.memory_budget is None or rows == 0:
+            batch_size = max(rows, 1)
+        else:
+            batch_size = max(1, int(self.memory_budget / SPILL_COPIES / (decompressed_size(files) / rows)))
+
+        for file in files:
+            file_rows = parquet_rows([file])
+            for offset in range(0, file_rows, batch_size):
+                yield pl.scan_parquet(file).slice(offset, batch_size).collect()
+
+    def deduplicate(self, name: str, subset: Optional[list[str]] = None) -> LazyFrame:
+        '''
+        Deduplicate every partition of a table independently and return a scan over the results.
+        '''
+        output = self.directory.joinpath(name+'_deduplicated')
+        output.mkdir(parents=True, exist_ok=True)
+
+        table_dir = self.directory.joinpath(name)
+        partitions = [entry for entry in table_dir.iterdir() if entry.is_dir()] if table_dir.exists() else []
+
+        for partition in partitions:
+            self._deduplicate_partition(name, partition, output, subset)
+
+        if not partitions:
+            return pl.LazyFrame(schema=self.schemas.get(name, {}))
+
+        return pl.scan_parquet(output.joinpath('*.parquet'))
+
+    def _deduplicate_partition(self, name: str, partition: Path, output: Path, subset: Optional[list[str]], splits: int = 0, parent_size: Optional[int] = None):
+        files = sorted(partition.glob('*.parquet'))
+        size = decompressed_size(files)
+
+        if self.memory_budget is not None and size > self.memory_budget:
+            if parent_size is None or size < parent_size:
+                self._split_partition(name, partition, output, subset, splits, size, files)
+                return
+
+            # Splitting no longer shrinks the partition, its rows share a handful of keys
+            print(f'Partition {partition.name} of {name} holds {size} bytes after {splits} splits, over the memory budget '
+                  f'of {self.memory_budget} bytes. Deduplicating it in memory.')
+
+        rows = pl.scan_parquet(files)
+        rows = rows.unique(keep='first', subset=subset) if subset else rows.unique()
+        rows.sink_parquet(output.joinpath(partition.name+'.parquet'),
+                          maintain_order=False,
+                          row_group_size=1000,
+                          compression='zstd',
+                          engine='streaming')
+
+    def _split_partition(self, name: str, partition: Path, output: Path, subset: Optional[list[str]], splits: int, size: int, files: list[Path]):
+        # Another seed spreads the rows of the partition, rows sharing a key still land together
+        count = max(2, math.ceil(size / self.memory_budget))
+        split_dir = self.directory.joinpath(name+'_split', partition.name)
+        for batch, rows in enumerate(self.read_batches(files)):
+            write_partitions(rows, self.keys[name], split_dir, count, f'{batch}.parquet', seed=splits + 1)
+        shutil.rmtree(partition)
+
+        for split in [entry for entry in split_dir.iterdir() if entry.is_dir()]:
+            # The deduplicated file is named after the partition, keep the names of the splits apart
+            named = split.rename(split_dir.joinpath(f'{partition.name}-{split.name}'))
+            self._deduplicate_partition(name, named, output, subset, splits + 1, size)
@@ -0,0 +1,167 @@
+'''
+profiling.py
+Record the time and memory used by each stage of the preprocessing pipeline.
+
+Building the LazyFrames is cheap, the work happens when a table is sunk to disk. Plan building is recorded
+as 'plan' stages, while every sink is recorded as a 'sink' stage attributed to the function that derived the table.
+Every file is pruned and then cleaned into a sink of its own, the PruningFunction and process_strings stages, so the
+sinks of the derived tables read the cleaned rows and only time their own work.
+
+Summarize a run log from the command line with:
+    python -m src.processing.profiling <run_log.parquet> [--run <run_id>] [--top <count>]
+'''
+import datetime, resource, time, uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Optional
+import polars as pl
+from ..utils.run_log import append_run, summarize_run
+
+_PROC_STATUS = Path('/proc/self/status')
+_PROC_CLEAR_REFS = Path('/proc/self/clear_refs')
+
+@dataclass
+class StageRecord:
+    run_id: str
+    started: datetime.datetime
+    entity: str
+    stage: str
+    table: str
+    kind: str
+    wall_time: float
+    rows_out: Optional[int]
+    bytes_written: Optional[int]
+    peak_rss: int
+
+run_log_schema = pl.Schema({
+    'run_id': pl.String,
+    'started': pl.Datetime('us'),
+    'entity': pl.String,
+    'stage': pl.String,
+    'table': pl.String,
+    'kind': pl.String,
+    'wall_time': pl.Float64,
+    'rows_out': pl.Int64,
+    'bytes_written': pl.Int64,
+    'peak_rss': pl.Int64
+})
+
+def reset_peak_rss() -> bool:
+    '''
+    Reset the high water mark of the resident set size. Only supported on Linux.
+    '''
+    try:
+        _PROC_CLEAR_REFS.write_text('5')
+        return True
+    except OSError:
+        return False
+
+def peak_rss() -> int:
+    '''
+    Peak resident set size in bytes since the last reset, or over the lifetime of the process if resetting is unsupported.
+    '''
+    try:
+        for line in _PROC_STATUS.read_text().splitlines():
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class PipelineProfiler:
+    '''
+    Collects a StageRecord for every profiled stage and appends them to a parquet run log.
+    '''
+
+    def __init__(self, run_log: Optional[Path] = None):
+        self.run_log = run_log
+        self.run_id = uuid.uuid4().hex
+        self.entity = ''
+        self.records : list[StageRecord] = []
+
+    @contextmanager
+    def stage(self, stage: str, table: str = '', kind: str = 'plan'):
+        '''
+        Record the wall time and peak RSS of the enclosed block.
+        Yields a dictionary in which rows_out and bytes_written can be supplied.
+        '''
+        output = {'rows_out': None, 'bytes_written': None}
+        reset_peak_rss()
+        started = datetime.datetime.now()
+        start = time.perf_counter()
+
+        yield output
+
+        self.records.append(StageRecord(
+            run_id=self.run_id,
+            started=started,
+            entity=self.entity,
+            stage=stage,
+            table=table,
+            kind=kind,
+            wall_time=time.perf_counter() - start,
+            rows_out=output['rows_out'],
+            bytes_written=output['bytes_written'],
+            peak_rss=peak_rss()
+        ))
+
+    @contextmanager
+    def sink(self, stage: str, path: Path):
+        '''
+        Record a table being written to a parquet file at path.
+        '''
+        with self.stage(stage, table=path.stem, kind='sink') as output:
+            yield output
+            output['bytes_written'] = path.stat().st_size
+            output['rows_out'] = pl.scan_parquet(path).select(pl.len()).collect().item()
+
+    def to_dataframe(self) -> pl.DataFrame:
+        return pl.DataFrame([asdict(record) for record in self.records], schema=run_log_schema)
+
+    def save(self):
+        '''
+        Append the records of this run to the run log.
+        '''
+        append_run(self.run_log, self.to_dataframe(), 'profile', self.run_id)
+
+    def summary(self, top: Optional[int] = None) -> str:
+        return summarize(self.to_dataframe(), top)
+
+def hotspots(data: pl.DataFrame) -> pl.DataFrame:
+    '''
+    Rank the stages of a run log by their total wall time.
+    '''
+    return data.group_by(['entity', 'stage'])\
+        .agg(
+            pl.col('wall_time').sum().alias('wall_time'),
+            pl.len().alias('calls'),
+            pl.col('rows_out').sum().alias('rows_out'),
+            pl.col('bytes_written').sum().alias('bytes_written'),
+            pl.col('peak_rss').max().alias('peak_rss')
+        )\
+        .with_columns(
+            (pl.col('wall_time') / pl.col('wall_time').sum() * 100).alias('share')
+        )\
+        .sort('wall_time', descending=True)
+
+def summarize(data: pl.DataFrame, top: Optional[int] = None) -> str:
+    ranked = hotspots(data)
+    if top is not None:
+        ranked = ranked.head(top)
+
+    header = f"{'rank':>4}  {'entity':<22} {'stage':<36} {'time (s)':>10} {'share':>7} {'calls':>6} {'rows out':>12} {'MB written':>11} {'peak RSS MB':>12}"
+    lines = [header, '-' * len(header)]
+
+    for rank, row in enumerate(ranked.iter_rows(named=True), start=1):
+        mb_written = (row['bytes_written'] or 0) / 1024**2
+        lines.append(
+            f"{rank:>4}  {row['entity']:<22} {row['stage']:<36} {row['wall_time']:>10.2f} {row['share']:>6.1f}% {row['calls']:>6} "
+            f"{row['rows_out'] or 0:>12} {mb_written:>11.1f} {row['peak_rss'] / 1024**2:>12.1f}"
+        )
+
+    return '\n'.join(lines)
+
+if __name__ == '__main__':
+    summarize_run('Rank the preprocessing hotspots recorded in a run log.', summarize)
@@ -6,8 +6,13 @@ Configuration to help map out desired fields and types for select OpenAlex objec
 from enum import Enum
 from polars import LazyFrame
 import polars as pl
-from .conf import GraphTable, GraphRelationship, GraphDataCollection
-from typing import Iterator
+from .conf import GraphTable, GraphRelationship, GraphDataCollection, OutOfCoreConfig
+from .out_of_core import HashPartitionedSpill, stage_batches, split_by_weight
+from .profiling import PipelineProfiler
+from contextlib import nullcontext
+from typing import Iterator, Optional
+from pathlib import Path
+import tempfile, shutil
 from config import NodeType, TableMap, GRAPH_START_ID, GRAPH_END_ID
 
 class ObjectFields(Enum):
@@ -15,6 +20,7 @@ class ObjectFields(Enum):
     institution= (
         'id',
         'display_name',
+        'country_code',
         'lineage',
         'works_count',
         'summary_stats',
@@ -279,13 +285,28 @@ class PruningFunction:
         NodeType.topic: pruneTopics,
     }
 
-    def __init__(self, nodeType: NodeType):
+    def __init__(self, nodeType: NodeType, deduplicate: bool = True):
+        '''
+        @param deduplicate - Keep the first row per id. Disable when deduplicating out-of-core instead.
+        '''
         self.prune = self.pruning_functions.get(nodeType, (lambda x: x))
         self.nodeType = nodeType
+        self.deduplicate = deduplicate
     
     def __call__(self, data: LazyFrame) -> tuple[LazyFrame, NodeType]:
+        return (self.clean(self.prune_fields(data)), self.nodeType)
+
+    def prune_fields(self, data: LazyFrame) -> LazyFrame:
+        '''
+        Select the fields of the node type and adjust them.
+        '''
         data = self.prune(self, data)
-        data = self.targetedManipulateFields(data)
+        return self.targetedManipulateFields(data)
+
+    def clean(self, data: LazyFrame) -> LazyFrame:
+        '''
+        Clean the strings of the pruned data and fill its nulls.
+        '''
         data = process_strings(data)
         
         data = data.with_columns(
@@ -293,9 +314,10 @@ class PruningFunction:
             pl.selectors.string().fill_null(''),
         )
         
-        data = data.unique(subset=['id'], keep='first')
+        if self.deduplicate:
+            data = data.unique(subset=['id'], keep='first')
 
-        return (data, self.nodeType)
+        return data
     
 class SecondaryInformation():
     '''
@@ -502,9 +524,9 @@ class SecondaryInformation():
             nodes=[]
         )
 
-    def _deriveAuthorships(originalTable: GraphTable, data:LazyFrame) -> GraphDataCollection:
+    def _explodeAuthorships(data: LazyFrame) -> LazyFrame:
         # The works data is large, so minimize the data size
-        exploded = data.select(
+        return data.select(
             pl.col('id').alias('work_id'),
             pl.col('authorships')
         ).explode('authorships')\
@@ -517,14 +539,10 @@ class SecondaryInformation():
         )\
         .explode('institutions')
 
+    def _authorshipFrames(exploded: LazyFrame) -> dict[str, LazyFrame]:
         '''
-        All authors that had relation to the U15+SFU are contained within the AUTHORS table
-        Best to leave out unless want to include another degree of separation to include non-target authors.
-
-        authorship_rl = exploded.select(
-            pl.col('author_id'),
-            pl.col('institutions').struct.field('id').alias('institution_id'),
-        ).drop_nulls().unique()
+        Row-wise projections of the exploded authorships, before deduplication.
+        Keys match those in authorshipOutputs.
         '''
         institutions_nodes = exploded.select(
             pl.col('institutions').struct.field('id'),
@@ -539,12 +557,12 @@ class SecondaryInformation():
                     .alias('lineage_root')
         )\
         .drop('lineage')\
-        .drop_nulls().unique(keep='first', subset=['id'])
+        .drop_nulls()
 
         institution_geo_rl = exploded.select(
             pl.col('institutions').struct.field('id').alias(GRAPH_START_ID),
             pl.col('institutions').struct.field('country_code').alias(GRAPH_END_ID)
-        ).drop_nulls().unique()
+        ).drop_nulls()
 
         lineage_rl = exploded.select(
             pl.col('institutions')
@@ -558,9 +576,7 @@ class SecondaryInformation():
                 "id": GRAPH_START_ID,
                 "lineage": GRAPH_END_ID
             }
-        ).drop_nulls().unique()
-    
-        
+        ).drop_nulls()
 
         authorship_nodes = exploded\
                     .select(
@@ -576,40 +592,71 @@ class SecondaryInformation():
                                     pl.col('id').alias(GRAPH_START_ID),
                                     pl.col('institution_id').alias(GRAPH_END_ID)
                                     )\
-                                    .drop_nulls().unique()
+                                    .drop_nulls()
 
         author_authorship_rl = authorship_nodes.select(
                                     pl.col('author_id').alias(GRAPH_START_ID),
                                     pl.col('id').alias(GRAPH_END_ID)
                                 )\
-                                .drop_nulls().unique()
+                                .drop_nulls()
 
         authorship_work_rl = authorship_nodes.select(
                                 pl.col('id').alias(GRAPH_START_ID),
                                 pl.col('work_id').alias(GRAPH_END_ID)
                             )\
-                            .drop_nulls().unique()
-        
-        authorship_nodes = authorship_nodes.drop(['institution_id', 'work_id', 'author_id'])\
-            .drop_nulls().unique(keep='first', subset=['id'])
+                            .drop_nulls()
+
+        return {
+            'institution_nodes': institutions_nodes,
+            'authorship_nodes': authorship_nodes.drop(['institution_id', 'work_id', 'author_id']).drop_nulls(),
+            'institution_geo_rl': institution_geo_rl,
+            'lineage_rl': lineage_rl,
+            'authorship_institution_rl': authorship_insitution_rl,
+            'author_authorship_rl': author_authorship_rl,
+            'authorship_work_rl': authorship_work_rl
+        }
 
-        originalTable.data = originalTable.data\
-            .drop('authorships')
+    '''
+    Deduplication key for each of the authorship frames.
+    Node tables keep the first row per id, relationship tables drop exact duplicates.
+    '''
+    authorshipOutputs = {
+        'institution_nodes': ['id'],
+        'authorship_nodes': ['id'],
+        'institution_geo_rl': None,
+        'lineage_rl': None,
+        'authorship_institution_rl': None,
+        'author_authorship_rl': None,
+        'authorship_work_rl': None
+    }
 
+    def _authorshipCollection(frames: dict[str, LazyFrame]) -> GraphDataCollection:
         return GraphDataCollection(
             nodes=[
-                GraphTable(name=NodeType.affiliated_institution.value, type=NodeType.affiliated_institution, data=institutions_nodes),
-                GraphTable(name=NodeType.authorship.value, type=NodeType.authorship, data=authorship_nodes)
+                GraphTable(name=NodeType.affiliated_institution.value, type=NodeType.affiliated_institution, data=frames['institution_nodes']),
+                GraphTable(name=NodeType.authorship.value, type=NodeType.authorship, data=frames['authorship_nodes'])
             ],
             relationships=[
-                GraphRelationship(data=institution_geo_rl, start_type=NodeType.affiliated_institution, target_type=NodeType.geographic),
-                GraphRelationship(data=lineage_rl, start_type=NodeType.affiliated_institution, target_type=NodeType.affiliated_institution),
-                GraphRelationship(data=authorship_insitution_rl, start_type=NodeType.authorship, target_type=NodeType.affiliated_institution),
-                GraphRelationship(data=author_authorship_rl, start_type=NodeType.author, target_type=NodeType.authorship),
-                GraphRelationship(data=authorship_work_rl, start_type=NodeType.authorship, target_type=NodeType.work)
+                GraphRelationship(data=frames['institution_geo_rl'], start_type=NodeType.affiliated_institution, target_type=NodeType.geographic),
+                GraphRelationship(data=frames['lineage_rl'], start_type=NodeType.affiliated_institution, target_type=NodeType.affiliated_institution),
+                GraphRelationship(data=frames['authorship_institution_rl'], start_type=NodeType.authorship, target_type=NodeType.affiliated_institution),
+                GraphRelationship(data=frames['author_authorship_rl'], start_type=NodeType.author, target_type=NodeType.authorship),
+                GraphRelationship(data=frames['authorship_work_rl'], start_type=NodeType.authorship, target_type=NodeType.work)
             ]
         )
 
+    def _deriveAuthorships(originalTable: GraphTable, data:LazyFrame) -> GraphDataCollection:
+        exploded = SecondaryInformation._explodeAuthorships(data)
+        frames = SecondaryInformation._authorshipFrames(exploded)
+
+        for name, subset in SecondaryInformation.authorshipOutputs.items():
+            frames[name] = frames[name].unique(keep='first', subset=subset) if subset else frames[name].unique()
+
+        originalTable.data = originalTable.data\
+            .drop('authorships')
+
+        return SecondaryInformation._authorshipCollection(frames)
+
     def _deriveIssn(originalTable: GraphTable, data: LazyFrame) -> GraphDataCollection:
         columns = data.collect_schema().names()
         nodes, relationships = [], []
@@ -715,6 +762,79 @@ class SecondaryInformation():
     }
 
 
+    def __init__(self, out_of_core: Optional[OutOfCoreConfig] = None, profiler: Optional[PipelineProfiler] = None):
+        self.out_of_core = out_of_core
+        self.profiler = profiler
+        self.spill_directories : list[Path] = []
+
+    def _deriveAuthorshipsOutOfCore(self, originalTable: GraphTable, data: LazyFrame) -> GraphDataCollection:
+        '''
+        Same output as _deriveAuthorships, but the works are exploded in bounded batches.
+        Exploded rows are spilled into hash partitions on disk and every partition is deduplicated independently.
+        Partitions larger than the memory budget are split again first, so the memory used does not grow with the number
+        of works.
+        '''
+        config = self.out_of_core
+        if config.spill_directory is not None:
+            config.spill_directory.mkdir(parents=True, exist_ok=True)
+        directory = Path(tempfile.mkdtemp(prefix='authorships_', dir=config.spill_directory))
+        self.spill_directories.append(directory)
+
+        spill = HashPartitionedSpill(directory.joinpath('partitions'), config.partitions, config.memory_budget)
+        keys = {
+            name: ('id' if subset else GRAPH_START_ID) for name, subset in self.authorshipOutputs.items()
+        }
+
+        # Rows produced when exploding each work: one per (authorship, institution) pair
+        exploded_rows = pl.col('authorships').list.eval(
+            pl.element().struct.field('institutions').list.len().clip(lower_bound=1)
+        ).list.sum().fill_null(0).clip(lower_bound=1)
+
+        # Start with a conservative guess, then use the measured size of the previous batch
+        bytes_per_row = 1024
+        batches = stage_batches(
+            data.select(pl.col('id'), pl.col('authorships')),
+            directory.joinpath('works'),
+            config.batch_size
+        )
+
+        for batch in batches:
+            works = pl.read_parquet(batch)
+            weights = works.select(exploded_rows).to_series()
+
+            for subset in split_by_weight(works, weights, max(1, config.memory_budget // bytes_per_row)):
+                exploded = SecondaryInformation._explodeAuthorships(subset.lazy())
+                frames = SecondaryInformation._authorshipFrames(exploded)
+                collected = dict(zip(frames.keys(), pl.collect_all(list(frames.values()))))
+
+                rows = max(1, subset.select(exploded_rows.sum()).item())
+                measured = sum(frame.estimated_size() for frame in collected.values()) // rows
+                bytes_per_row = max(bytes_per_row, measured)
+
+                for name, frame in collected.items():
+                    spill.write(name, frame, keys[name])
+
+                del collected
+
+            batch.unlink()
+
+        frames = {
+            name: spill.deduplicate(name, subset) for name, subset in self.authorshipOutputs.items()
+        }
+
+        originalTable.data = originalTable.data\
+            .drop('authorships')
+
+        return SecondaryInformation._authorshipCollection(frames)
+
+    def cleanup(self):
+        '''
+        Remove data spilled to disk. Only call once the derived tables have been saved.
+        '''
+        for directory in self.spill_directories:
+            shutil.rmtree(directory, ignore_errors=True)
+        self.spill_directories.clear()
+
     def derive(self, table : GraphTable) -> list[GraphDataCollection]:
         type = table.type
         sublist : list[GraphDataCollection] = []
@@ -723,9 +843,15 @@ class SecondaryInformation():
             base = table.data
             for subtable in secondary:
                 newTable = base
-                sublist.append(
-                    self.derivedFunctions[subtable](table, newTable)
-                )
+                deriveFunction = self.derivedFunctions[subtable]
+                if subtable == NodeType.authorship and self.out_of_core is not None:
+                    deriveFunction = self._deriveAuthorshipsOutOfCore
+
+                with (self.profiler.stage(deriveFunction.__name__) if self.profiler else nullcontext()):
+                    collection = deriveFunction(table, newTable)
+
+                collection.stage = deriveFunction.__name__
+                sublist.append(collection)
             
 
         return sublist
\ No newline at end of file
@@ -1,44 +1,79 @@
 import polars as pl
 from pathlib import Path
 from typing import Optional
-from .pruning_conf import PruningFunction, SecondaryInformation
+from .pruning_conf import PruningFunction, SecondaryInformation, process_strings
 from ..utils import helpers
-from .conf import GraphTable,GraphDataCollection,GraphRelationship, designatedDirectories, schemas
-from config import GEOGRAPHIC_DATA_LOCATION, NodeType
-import datetime
+from .conf import GraphTable,GraphDataCollection,GraphRelationship, OutOfCoreConfig, PropertyJoin, PropertyJoins, designatedDirectories, schemas
+from .streaming import StreamingVerifier, stage_compressed_ndjson
+from .out_of_core import HashPartitionedSpill
+from .profiling import PipelineProfiler
+from ..utils.graph_data import infer_node_type_from_file, infer_node_types_from_file, property_join
+from contextlib import nullcontext
+from config import GEOGRAPHIC_DATA_LOCATION, NodeType, GRAPH_START_ID, GRAPH_END_ID
+import datetime, tempfile, shutil
 
 def preprocess_data_item(
     type: NodeType,
     data: pl.LazyFrame,
-    output_path: Path
+    output_path: Path,
+    out_of_core: Optional[OutOfCoreConfig] = None,
+    streaming: Optional[StreamingVerifier] = None,
+    profiler: Optional[PipelineProfiler] = None
 ):
     print('Cleaning Data..')
-    nodes = clean_data(type, data)
+    if profiler is not None:
+        profiler.entity = type.value
+
+    # The cleaned rows are written here once for every derived table to read, see clean_data
+    parent = out_of_core.spill_directory if out_of_core is not None else None
+    if parent is not None:
+        parent.mkdir(parents=True, exist_ok=True)
+    spill_directory = Path(tempfile.mkdtemp(prefix=type.value+'_', dir=parent))
+
+    nodes = clean_data(type, data, out_of_core, spill_directory, profiler, streaming)
     print('Deriving secondary data from original dataset')
     node_path = output_path.joinpath('nodes')
     relationship_path = output_path.joinpath('relationships')
-    generate_secondary_data(nodes, node_path, relationship_path)
+    generate_secondary_data(nodes, node_path, relationship_path, out_of_core, streaming, profiler)
     print(f'Saving data to output directory: {output_path}')
     print('Saving nodes...')
-    save_graphtables_as_parquet([nodes], node_path)
+    save_graphtables_as_parquet([nodes], node_path, streaming, profiler, PruningFunction.__name__)
+
+    shutil.rmtree(spill_directory, ignore_errors=True)
     print('Finished writing to disk.')
 
-def process_files(directory: Path, output_path: Path, single: bool = False):
+def process_files(directory: Path, output_path: Path, single: bool = False, out_of_core: Optional[OutOfCoreConfig] = None, streaming: Optional[StreamingVerifier] = None, profiler: Optional[PipelineProfiler] = None):
     # Provide schema for certain columns that may be problematic
     try:
         schema = schemas[directory.name] if directory.name in schemas else None
         files = directory.glob('**/*.json.zst')
         for file in [file for file in files if file.is_file()]:
-            lazyframe = pl.scan_ndjson(file, batch_size=1024, schema=schema, infer_schema_length=300, low_memory=True).lazy()
+            if streaming is None:
+                lazyframe = pl.scan_ndjson(file, batch_size=1024, schema=schema, infer_schema_length=300, low_memory=True).lazy()
+            else:
+                if streaming.staging_directory is not None:
+                    streaming.staging_directory.mkdir(parents=True, exist_ok=True)
+                staging = Path(tempfile.mkdtemp(prefix='staged_', dir=streaming.staging_directory))
+                if profiler is not None:
+                    profiler.entity = designatedDirectories[directory.name].value
+                with (profiler.stage(stage_compressed_ndjson.__name__, table=file.name, kind='spill') if profiler else nullcontext()):
+                    lazyframe = stage_compressed_ndjson(file, staging, schema, streaming.chunk_size)
+
             preprocess_data_item(designatedDirectories[directory.name], 
                                  lazyframe,
-                                 output_path.joinpath(file.name.split('.')[0], directory.name))
+                                 output_path.joinpath(file.name.split('.')[0], directory.name),
+                                 out_of_core,
+                                 streaming,
+                                 profiler)
+
+            if streaming is not None:
+                shutil.rmtree(staging, ignore_errors=True)
 
     except Exception as e:
         raise Exception(f'Unable to scan files for {file.name}\n{e}')
     
 
-def process_data(input_dir: Path, output_dir: Path, target_dir : Optional[str] = None):
+def process_data(input_dir: Path, output_dir: Path, target_dir : Optional[str] = None, out_of_core: Optional[OutOfCoreConfig] = None, streaming: Optional[StreamingVerifier] = None, profiler: Optional[PipelineProfiler] = None):
 
     if target_dir:
         child_directories = [Path(input_dir.joinpath(target_dir))]
@@ -49,22 +84,63 @@ def process_data(input_dir: Path, output_dir: Path, target_dir : Optional[str] =
     for directory in child_directories:
         if directory.name not in designatedDirectories:
             raise Exception(f'Directory {directory.name} not found in designated directories. Update root config.')
-        process_files(directory, output_dir)
+        process_files(directory, output_dir, out_of_core=out_of_core, streaming=streaming, profiler=profiler)
+
+def clean_data(nodetype: NodeType,
+               data: pl.LazyFrame,
+               out_of_core: Optional[OutOfCoreConfig] = None,
+               spill_directory: Optional[Path] = None,
+               profiler: Optional[PipelineProfiler] = None,
+               streaming: Optional[StreamingVerifier] = None) -> GraphTable:
+    '''
+    Prune the data, clean its strings and keep the first row per id.
+    With a spill_directory the pruned rows, then the cleaned rows, are written there once. The derived tables read the
+    cleaned rows instead of pruning and cleaning them again in every sink, and both steps are profiled on their own.
+    When out_of_core is supplied the cleaned rows are spilled into hash partitions under spill_directory and deduplicated one partition at a time.
+    '''
+    pruning = PruningFunction(nodetype, deduplicate=out_of_core is None)
+    type = pruning.nodeType
+    engine = 'streaming' if streaming is not None else 'auto'
+
+    with (profiler.stage(PruningFunction.__name__) if profiler else nullcontext()):
+        data = pruning.prune_fields(data)
+
+    if spill_directory is not None:
+        pruned_path = spill_directory.joinpath('pruned.parquet')
+        with (profiler.sink(PruningFunction.__name__, pruned_path) if profiler else nullcontext()):
+            data.sink_parquet(pruned_path, maintain_order=False, row_group_size=1000, compression='zstd', engine=engine)
+        data = pl.scan_parquet(pruned_path)
 
-def clean_data(nodetype: NodeType, data: pl.LazyFrame) -> GraphTable:
-    pruned_data,type = PruningFunction(nodetype).__call__(data)
-    return GraphTable(name=type.value, type=type, data=pruned_data)
+    with (profiler.stage(process_strings.__name__) if profiler else nullcontext()):
+        data = pruning.clean(data)
 
-def generate_secondary_data(table: GraphTable, node_path: Path, relationship_path: Path):
-    secondaryInfo = SecondaryInformation()    
+    if out_of_core is not None:
+        spill = HashPartitionedSpill(spill_directory, out_of_core.partitions, out_of_core.memory_budget)
+        with (profiler.stage(process_strings.__name__, table=type.value, kind='spill') if profiler else nullcontext()):
+            spill.sink(type.value, data, 'id')
+        with (profiler.stage(HashPartitionedSpill.deduplicate.__name__, table=type.value, kind='spill') if profiler else nullcontext()):
+            data = spill.deduplicate(type.value, ['id'])
+
+    elif spill_directory is not None:
+        cleaned_path = spill_directory.joinpath('cleaned.parquet')
+        with (profiler.sink(process_strings.__name__, cleaned_path) if profiler else nullcontext()):
+            data.sink_parquet(cleaned_path, maintain_order=False, row_group_size=1000, compression='zstd', engine=engine)
+        data = pl.scan_parquet(cleaned_path)
+
+    return GraphTable(name=type.value, type=type, data=data)
+
+def generate_secondary_data(table: GraphTable, node_path: Path, relationship_path: Path, out_of_core: Optional[OutOfCoreConfig] = None, streaming: Optional[StreamingVerifier] = None, profiler: Optional[PipelineProfiler] = None):
+    secondaryInfo = SecondaryInformation(out_of_core, profiler)    
     
     print('Getting derived table information')
     derivedList = secondaryInfo.derive(table)
 
     print('Saving derived data to disk...')
     for data in derivedList:
-        save_graphtables_as_parquet(data.nodes, node_path)
-        save_relationships_as_parquet(data.relationships, relationship_path)
+        save_graphtables_as_parquet(data.nodes, node_path, streaming, profiler, data.stage)
+        save_relationships_as_parquet(data.relationships, relationship_path, streaming, profiler, data.stage)
+
+    secondaryInfo.cleanup()
 
 
 def save_lazyframe_as_parquet(data: dict[str, pl.LazyFrame], output_path: Path):
@@ -80,7 +156,7 @@ def save_lazyframe_as_parquet(data: dict[str, pl.LazyFrame], output_path: Path):
                        row_group_size=1000,
                        compression='zstd')
 
-def save_as_parquet(data : pl.LazyFrame, output_path: Path):
+def save_as_parquet(data : pl.LazyFrame, output_path: Path, streaming: Optional[StreamingVerifier] = None, profiler: Optional[PipelineProfiler] = None, stage: str = ''):
     sfx = 0
     output_path = Path.joinpath(output_path.parent, (output_path.stem+'_'+str(sfx))+output_path.suffix)
     while output_path.exists():
@@ -90,30 +166,35 @@ def save_as_parquet(data : pl.LazyFrame, output_path: Path):
         output_path = Path.joinpath(output_path.parent, ('_'.join(splitText))+output_path.suffix)
         print(f'File with name already exists. Trying again with: {output_path}')
 
+    if streaming is not None:
+        streaming(output_path.stem, data)
+
     print(f'Saving data to: {output_path}')
-    data.sink_parquet(
-        path=output_path,
-        maintain_order=False,
-        row_group_size=100,
-        compression='zstd'
-    )
+    with (profiler.sink(stage, output_path) if profiler else nullcontext()):
+        data.sink_parquet(
+            path=output_path,
+            maintain_order=False,
+            row_group_size=100,
+            compression='zstd',
+            engine='streaming' if streaming is not None else 'auto'
+        )
 
-def save_graphtables_as_parquet(data: list[GraphTable], output_path: Path):
+def save_graphtables_as_parquet(data: list[GraphTable], output_path: Path, streaming: Optional[StreamingVerifier] = None, profiler: Optional[PipelineProfiler] = None, stage: str = ''):
     output_path.mkdir(parents=True, exist_ok=True)
     
     for table in data:
         target_path = Path.joinpath(output_path, table.name.replace('_', '__')+'.parquet')
         print(f'Saving node data...')
-        save_as_parquet(table.data, target_path)
+        save_as_parquet(table.data, target_path, streaming, profiler, stage)
 
     return
 
-def save_relationships_as_parquet(data: list[GraphRelationship], output_path: Path):
+def save_relationships_as_parquet(data: list[GraphRelationship], output_path: Path, streaming: Optional[StreamingVerifier] = None, profiler: Optional[PipelineProfiler] = None, stage: str = ''):
     output_path.mkdir(parents=True, exist_ok=True)
     for table in data:
         target_path = Path.joinpath(output_path, table.start_type.value.replace('_', '__')+'_'+table.target_type.value.replace('_', '__')+'_relationship.parquet')
         print(f'Saving relationship data...')
-        save_as_parquet(table.data, target_path)
+        save_as_parquet(table.data, target_path, streaming, profiler, stage)
         
     return
 
@@ -149,20 +230,122 @@ def generate_years(output_path: Path):
     output_path.parent.mkdir(parents=True, exist_ok=True)
     df.write_parquet(output_path, compression='zstd')
 
+def node_files_of_type(output_path: Path, nodeType: NodeType) -> list[Path]:
+    '''
+    The node files of a node type across the shards of the processed output.
+    '''
+    return [file for file in sorted(output_path.glob('*/*/nodes/*.parquet')) if infer_node_type_from_file(file) == nodeType]
+
+def derive_property_relationships(output_path: Path, joins: list[PropertyJoin], streaming: Optional[StreamingVerifier] = None, profiler: Optional[PipelineProfiler] = None):
+    '''
+    Write the relationships of shared property values as relationship files, so they load by id like every other relationship.
+    Run once every node file has been written, the files are saved to output_path/property_data/<start type>/relationships.
+    '''
+    for join in joins:
+        start_files, target_files = node_files_of_type(output_path, join.start_type), node_files_of_type(output_path, join.target_type)
+        if not (start_files and target_files):
+            print(f'No node files for {join.start_type.value} -> {join.target_type.value}, skipping property relationships')
+            continue
+
+        relationship = GraphRelationship(
+            data=property_join(pl.scan_parquet(start_files), pl.scan_parquet(target_files), join.properties, join.contained),
+            start_type=join.start_type,
+            target_type=join.target_type
+        )
+        save_relationships_as_parquet([relationship], output_path.joinpath('property_data', join.start_type.value, 'relationships'),
+                                      streaming, profiler, derive_property_relationships.__name__)
+
+def relationship_files_of_type(output_path: Path, start: NodeType, target: NodeType) -> list[Path]:
+    '''
+    The relationship files between two node types across the shards of the processed output.
+    '''
+    return [file for file in sorted(output_path.glob('*/*/relationships/*.parquet')) if infer_node_types_from_file(file) == (start, target)]
+
+def institution_works(affiliations: pl.LazyFrame, lineage: pl.LazyFrame, authorship_affiliations: pl.LazyFrame, authorship_works: pl.LazyFrame) -> pl.LazyFrame:
+    '''
+    The works of every institution as :START_ID/:END_ID pairs, with the number of distinct authorships on the work that
+    are affiliated with the institution itself (authorships), and with the institution or any institution below it in
+    its lineage (lineage_authorships). Works only reached through the lineage have no authorships of their own.
+    '''
+    institutions = affiliations.select(pl.col(GRAPH_END_ID).alias('institution'), pl.col(GRAPH_START_ID).alias('affiliation'))
+    # Lineage relationships point from an institution to every institution above it
+    descendants = lineage.select(pl.col(GRAPH_END_ID).alias('affiliation'), pl.col(GRAPH_START_ID).alias('member'))
+    subtree = pl.concat([
+        institutions.select('institution', pl.col('affiliation').alias('member'), pl.lit(True).alias('own')),
+        institutions.join(descendants, on='affiliation').select('institution', 'member', pl.lit(False).alias('own'))
+    ])
+
+    authorships = authorship_affiliations.select(pl.col(GRAPH_START_ID).alias('authorship'), pl.col(GRAPH_END_ID).alias('member'))\
+        .join(authorship_works.select(pl.col(GRAPH_START_ID).alias('authorship'), pl.col(GRAPH_END_ID).alias('work')), on='authorship')
+
+    return subtree.join(authorships, on='member')\
+        .group_by('institution', 'work')\
+        .agg(
+            pl.col('authorship').filter(pl.col('own')).n_unique().cast(pl.Int64).alias('authorships'),
+            pl.col('authorship').n_unique().cast(pl.Int64).alias('lineage_authorships')
+        )\
+        .rename({'institution': GRAPH_START_ID, 'work': GRAPH_END_ID})
+
+def derive_institution_works(output_path: Path, streaming: Optional[StreamingVerifier] = None, profiler: Optional[PipelineProfiler] = None):
+    '''
+    Materialize the works of every institution as relationships, so the aggregation queries reach them in one hop
+    instead of through the affiliated institutions and authorships. Run once every relationship file has been written,
+    the files are saved to output_path/membership_data/SFU_U15_institution/relationships.
+    '''
+    files = {
+        key: relationship_files_of_type(output_path, *key) for key in [
+            (NodeType.affiliated_institution, NodeType.SFU_U15_institution),
+            (NodeType.affiliated_institution, NodeType.affiliated_institution),
+            (NodeType.authorship, NodeType.affiliated_institution),
+            (NodeType.authorship, NodeType.work)
+        ]
+    }
+    scan = lambda key: pl.scan_parquet(files[key]).select(GRAPH_START_ID, GRAPH_END_ID) if files[key]\
+        else pl.LazyFrame(schema={GRAPH_START_ID: pl.String, GRAPH_END_ID: pl.String})
+
+    if not all(files[key] for key in files if key != (NodeType.affiliated_institution, NodeType.affiliated_institution)):
+        print('No affiliation or authorship relationships, skipping the works of the institutions')
+        return
+
+    relationship = GraphRelationship(
+        data=institution_works(*[scan(key) for key in files]),
+        start_type=NodeType.SFU_U15_institution,
+        target_type=NodeType.work
+    )
+    save_relationships_as_parquet([relationship], output_path.joinpath('membership_data', NodeType.SFU_U15_institution.value, 'relationships'),
+                                  streaming, profiler, derive_institution_works.__name__)
+
 def preprocess(
         input_dir: Path,
         output_path: Path,
-        optional_target_dir: Optional[str] = None
+        optional_target_dir: Optional[str] = None,
+        out_of_core: Optional[OutOfCoreConfig] = None,
+        streaming: Optional[StreamingVerifier] = None,
+        profiler: Optional[PipelineProfiler] = None,
+        property_joins: Optional[list[PropertyJoin]] = None
 ):
     '''
     Convenience function that will just to run the processing, cleaning and saving of data in one go.
+    @param out_of_core - Derive the authorship tables in bounded batches spilled to disk, see OutOfCoreConfig.
+    @param streaming - Run every sink with the streaming engine and report the tables that fall back to the in-memory engine.
+    @param profiler - Record the time, rows, bytes and peak RSS of every stage, and save them to the profiler run log.
+    @param property_joins - Relationships derived from shared property values. Defaults to PropertyJoins.
     '''
     # Clear the previous parquet
     helpers.clear_directories(output_path)
     print('Loading Data...')
-    process_data(input_dir, output_path, optional_target_dir)
+    process_data(input_dir, output_path, optional_target_dir, out_of_core, streaming, profiler)
     print('Adding additional data...')
     print('Processing geographic information')
     process_geographic_data(GEOGRAPHIC_DATA_LOCATION, output_path.joinpath('geographic_data', NodeType.geographic.value))
     generate_years(output_path.joinpath('year_data', NodeType.year.value))
+    print('Deriving property relationships')
+    derive_property_relationships(output_path, property_joins if property_joins is not None else PropertyJoins, streaming, profiler)
+    print('Materializing the works of every institution')
+    derive_institution_works(output_path, streaming, profiler)
+    if streaming is not None:
+        print(streaming.summary())
+    if profiler is not None:
+        profiler.save()
+        print(profiler.summary())
     print('Finished generating Parquet.')
\ No newline at end of file
@@ -0,0 +1,150 @@
+'''
+streaming.py
+Verify that the preprocessing plans run on the Polars streaming engine
+'''
+import re, io
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+import polars as pl
+import pyarrow as pa
+import pyarrow.json as pa_json
+import zstandard
+from polars import LazyFrame
+
+# Fill colours used by Polars when drawing the physical plan of the streaming engine
+IN_MEMORY_FALLBACK_COLOR = '0.0 0.3 1.0'
+MEMORY_INTENSIVE_COLOR = '0.16 0.3 1.0'
+
+_node_pattern = re.compile(r'^\d+ \[label="(?P<label>.*?)"(?:,style=filled,fillcolor="(?P<color>[^"]*)")?\];$', re.MULTILINE | re.DOTALL)
+
+@dataclass
+class StreamingPlanReport:
+    name: str
+    fallback_nodes: list[str] = field(default_factory=list)
+    memory_intensive_nodes: list[str] = field(default_factory=list)
+
+    @property
+    def streams(self) -> bool:
+        return not self.fallback_nodes
+
+def _node_description(label: str) -> str:
+    # Labels hold the operator on the first line followed by its details
+    lines = label.replace('\\n', '\n').splitlines()
+    operator = lines[0].strip() if lines else ''
+    details = ' '.join(line.strip() for line in lines[1:] if line.strip())
+    return f'{operator}: {details}' if details else operator
+
+def inspect_streaming_plan(name: str, data: LazyFrame) -> StreamingPlanReport:
+    '''
+    Inspect the physical plan of the streaming engine for nodes that fall back to the in-memory engine.
+    '''
+    graph = data.show_graph(engine='streaming', plan_stage='physical', raw_output=True, show=False)
+    report = StreamingPlanReport(name=name)
+
+    for node in _node_pattern.finditer(graph):
+        color = node.group('color')
+        if color == IN_MEMORY_FALLBACK_COLOR:
+            report.fallback_nodes.append(_node_description(node.group('label')))
+        elif color == MEMORY_INTENSIVE_COLOR:
+            report.memory_intensive_nodes.append(_node_description(node.group('label')))
+
+    return report
+
+def _json_type(dtype: pa.DataType) -> pa.DataType:
+    # The arrow JSON reader only converts to the regular string and list types
+    if pa.types.is_large_string(dtype):
+        return pa.string()
+    if pa.types.is_large_list(dtype) or pa.types.is_list(dtype):
+        return pa.list_(_json_type(dtype.value_type))
+    if pa.types.is_struct(dtype):
+        return pa.struct([child.with_type(_json_type(child.type)) for child in dtype])
+    return dtype
+
+def json_parse_options(schema: Optional[pl.Schema]) -> pa_json.ParseOptions:
+    '''
+    Options for the arrow JSON reader reading the fields of the schema, or inferring them when there is none.
+    '''
+    if schema is None:
+        return pa_json.ParseOptions()
+
+    fields = pl.DataFrame(schema=schema).to_arrow().schema
+    return pa_json.ParseOptions(explicit_schema=pa.schema([field.with_type(_json_type(field.type)) for field in fields]),
+                                unexpected_field_behavior='ignore')
+
+def stage_compressed_ndjson(file: Path, directory: Path, schema: Optional[pl.Schema], chunk_size: int) -> LazyFrame:
+    '''
+    Decompress a .json.zst file in line aligned chunks of roughly chunk_size bytes and stage each chunk as parquet.
+    Scanning the compressed file directly decompresses all of it into memory. The chunks are parsed with the arrow
+    JSON reader, pl.read_ndjson holds on to tens of times the size of every chunk it parses.
+    '''
+    directory.mkdir(parents=True, exist_ok=True)
+    parse_options = json_parse_options(schema)
+    part, remainder = 0, b''
+
+    with open(file, 'rb') as f:
+        reader = zstandard.ZstdDecompressor().stream_reader(f)
+        while True:
+            chunk = reader.read(chunk_size)
+            if not chunk and not remainder:
+                break
+
+            chunk = remainder + chunk
+            cut = chunk.rfind(b'\n')
+            if chunk and cut != -1 and len(chunk) >= chunk_size:
+                chunk, remainder = chunk[:cut+1], chunk[cut+1:]
+            else:
+                remainder = b''
+
+            if not chunk.strip():
+                continue
+
+            rows = pa_json.read_json(io.BytesIO(chunk), parse_options=parse_options)
+            pl.from_arrow(rows).write_parquet(directory.joinpath(f'{part}.parquet'), row_group_size=1000, compression='zstd')
+            part += 1
+
+    return pl.scan_parquet(directory.joinpath('*.parquet'))
+
+class StreamingVerifier:
+    '''
+    Collects a StreamingPlanReport for every table sunk during preprocessing.
+    Supplying a verifier to the preprocessing functions also runs every sink with the streaming engine.
+    '''
+
+    def __init__(self, strict: bool = False, chunk_size: int = 16 * 1024 * 1024, staging_directory: Optional[Path] = None):
+        '''
+        @param strict - Raise an exception as soon as a table falls back to the in-memory engine.
+        @param chunk_size - Uncompressed bytes of the input files decompressed at a time, see stage_compressed_ndjson.
+        @param staging_directory - Parent directory for the staged input. Uses the system temporary directory otherwise.
+        '''
+        self.strict = strict
+        self.chunk_size = chunk_size
+        self.staging_directory = staging_directory
+        self.reports : list[StreamingPlanReport] = []
+
+    def __call__(self, name: str, data: LazyFrame) -> StreamingPlanReport:
+        report = inspect_streaming_plan(name, data)
+        self.reports.append(report)
+
+        if self.strict and not report.streams:
+            raise Exception(f'Table {name} falls back to the in-memory engine:\n' + '\n'.join(report.fallback_nodes))
+
+        return report
+
+    @property
+    def fallbacks(self) -> list[StreamingPlanReport]:
+        return [report for report in self.reports if not report.streams]
+
+    def summary(self) -> str:
+        lines = [f'{len(self.reports) - len(self.fallbacks)} of {len(self.reports)} tables run fully on the streaming engine.']
+
+        for report in self.fallbacks:
+            lines.append(f'{report.name} falls back to the in-memory engine for:')
+            lines.extend(f'    - {node}' for node in report.fallback_nodes)
+
+        for report in self.reports:
+            if report.memory_intensive_nodes:
+                lines.append(f'{report.name} streams with potentially memory-intensive nodes:')
+                lines.extend(f'    - {node}' for node in report.memory_intensive_nodes)
+
+        return '\n'.join(lines)
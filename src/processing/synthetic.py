@@ -0,0 +1,507 @@
+'''
+synthetic.py
+Generate a synthetic OpenAlex corpus for scale benchmarks.
+
+The corpus follows the directory layout written by api.collect_data.extract:
+    <output>/<works|authors|institutions|sources|funders|topics>/<prefix>-<n>.json.zst
+Works conform to conf.schemas, and every entity carries the fields read by pruning_conf.ObjectFields.
+
+Generate a corpus from the command line with:
+    python -m src.processing.synthetic <output_dir> [--scale <factor>] [--seed <seed>]
+'''
+import argparse, json, math
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Iterator, Optional
+import numpy as np
+import polars as pl
+import zstandard
+from .conf import schemas
+
+OPENALEX_URI = 'https://openalex.org/'
+ROR_URI = 'https://ror.org/'
+
+COUNTRY_CODES = ('CA', 'US', 'GB', 'FR', 'DE', 'CN', 'JP', 'AU', 'IN', 'BR', 'IT', 'ES', 'NL', 'CH', 'SE', 'KR', 'MX', 'ZA')
+WORK_TYPES = ('article', 'book-chapter', 'dataset', 'preprint', 'review', 'dissertation', 'book', 'other')
+OA_STATUSES = ('gold', 'green', 'hybrid', 'bronze', 'diamond')
+ASSOCIATION_TYPES = ('child', 'related', 'parent')
+
+@dataclass
+class SyntheticCorpusConfig:
+    '''
+    Sizes and distributions of the synthetic corpus.
+    @param seed - Seed for every random draw. The same config always produces the same files.
+    @param root_institutions - Number of top level target institutions (the SFU + U15).
+    @param lineage_depth - Levels of child institutions below each root.
+    @param children_per_institution - Children of each institution at every lineage level.
+    @param external_institutions - Collaborating institutions that only appear inside works and authors.
+    @param authorship_mean, authorship_sigma - Log-normal distribution of the number of authorships per work.
+    @param consortium_rate, consortium_size - Fraction of works that are large consortium papers, and their number of authors.
+    @param local_author_rate - Probability that an authorship belongs to an author of the corpus rather than an external author.
+    @param domains, fields_per_domain, subfields_per_field, topics_per_subfield - Size of the topic hierarchy.
+    @param shard_size - Records written per .json.zst file.
+    '''
+    seed: int = 0
+    works: int = 10000
+    authors: int = 2000
+    root_institutions: int = 16
+    lineage_depth: int = 2
+    children_per_institution: int = 3
+    external_institutions: int = 500
+    sources: int = 200
+    funders: int = 16
+    authorship_mean: float = 5.0
+    authorship_sigma: float = 0.8
+    max_authorships: int = 200
+    consortium_rate: float = 0.001
+    consortium_size: int = 2000
+    local_author_rate: float = 0.4
+    institutions_per_authorship: float = 1.3
+    topics_per_work: int = 3
+    domains: int = 4
+    fields_per_domain: int = 6
+    subfields_per_field: int = 5
+    topics_per_subfield: int = 10
+    first_year: int = 2000
+    last_year: int = 2025
+    shard_size: int = 5000
+
+    def scale(self, factor: float) -> 'SyntheticCorpusConfig':
+        '''
+        Scale the number of works, authors, external institutions and sources.
+        The target institutions and the topic hierarchy keep their size.
+        '''
+        return replace(
+            self,
+            works=math.ceil(self.works * factor),
+            authors=math.ceil(self.authors * factor),
+            external_institutions=math.ceil(self.external_institutions * factor),
+            sources=math.ceil(self.sources * factor)
+        )
+
+def _fake_value(dtype: pl.DataType, rng: np.random.Generator):
+    '''
+    Type conforming filler for the fields not read by the preprocessing.
+    '''
+    if isinstance(dtype, pl.Struct):
+        return {f.name: _fake_value(f.dtype, rng) for f in dtype.fields}
+    if isinstance(dtype, pl.List):
+        return [_fake_value(dtype.inner, rng) for _ in range(int(rng.integers(0, 3)))]
+    if dtype == pl.String:
+        return f'value-{int(rng.integers(0, 1000))}'
+    if dtype == pl.Boolean:
+        return bool(rng.integers(0, 2))
+    if dtype.is_float():
+        return round(float(rng.random()), 4)
+    if dtype.is_integer():
+        return int(rng.integers(0, 100))
+    return None
+
+def conform(record: dict, schema: pl.Schema, rng: np.random.Generator) -> dict:
+    '''
+    Fill every field of the schema that is missing from the record.
+    '''
+    for name, dtype in schema.items():
+        if name not in record:
+            record[name] = _fake_value(dtype, rng)
+    return record
+
+@dataclass
+class _Institution:
+    id: str
+    display_name: str
+    country_code: str
+    type: str
+    lineage: list[str] = field(default_factory=list)
+
+    def dehydrated(self) -> dict:
+        return {
+            'id': self.id,
+            'display_name': self.display_name,
+            'ror': ROR_URI + self.id.split('/')[-1].lower(),
+            'country_code': self.country_code,
+            'type': self.type,
+            'lineage': self.lineage
+        }
+
+class SyntheticCorpus:
+    '''
+    Draws the entities of the corpus. Each entity type uses its own random stream, so changing
+    the number of works does not change the generated authors, institutions, etc.
+    '''
+
+    entity_streams = ('topics', 'institutions', 'sources', 'funders', 'authors', 'works')
+
+    def __init__(self, config: SyntheticCorpusConfig):
+        self.config = config
+        self._build_topics()
+        self._build_institutions()
+        self.source_ids = [f'{OPENALEX_URI}S{idx+1}' for idx in range(config.sources)]
+        self.source_issns = [f'{idx // 10000:04d}-{idx % 10000:04d}' for idx in range(config.sources)]
+        self.funder_ids = [f'{OPENALEX_URI}F{idx+1}' for idx in range(config.funders)]
+        self.years = list(range(config.first_year, config.last_year + 1))
+        self._build_author_affiliations()
+
+    def rng(self, entity: str) -> np.random.Generator:
+        return np.random.default_rng([self.config.seed, self.entity_streams.index(entity)])
+
+    def _build_topics(self):
+        config = self.config
+        self.topics = []
+        for d in range(config.domains):
+            domain = {'id': f'{OPENALEX_URI}domains/{d+1}', 'display_name': f'Domain {d+1}'}
+            for f in range(config.fields_per_domain):
+                field_idx = d * config.fields_per_domain + f + 1
+                field_ = {'id': f'{OPENALEX_URI}fields/{field_idx}', 'display_name': f'Field {field_idx}'}
+                for s in range(config.subfields_per_field):
+                    subfield_idx = (field_idx - 1) * config.subfields_per_field + s + 1
+                    subfield = {'id': f'{OPENALEX_URI}subfields/{subfield_idx}', 'display_name': f'Subfield {subfield_idx}'}
+                    for t in range(config.topics_per_subfield):
+                        topic_idx = (subfield_idx - 1) * config.topics_per_subfield + t + 1
+                        self.topics.append({
+                            'id': f'{OPENALEX_URI}T{10000 + topic_idx}',
+                            'display_name': f'Topic {topic_idx}',
+                            'subfield': subfield,
+                            'field': field_,
+                            'domain': domain
+                        })
+
+    def _build_institutions(self):
+        config = self.config
+        rng = self.rng('institutions')
+        self.target_institutions : list[_Institution] = []
+        self.roots : list[_Institution] = []
+        counter = 1
+
+        for r in range(config.root_institutions):
+            root = _Institution(f'{OPENALEX_URI}I{counter}', f'Target University {r+1}', 'CA', 'education')
+            root.lineage = [root.id]
+            counter += 1
+            self.roots.append(root)
+            self.target_institutions.append(root)
+
+            level = [root]
+            for depth in range(config.lineage_depth):
+                children = []
+                for parent in level:
+                    for c in range(config.children_per_institution):
+                        child = _Institution(f'{OPENALEX_URI}I{counter}', f'{parent.display_name} Unit {c+1}', 'CA',
+                                             str(rng.choice(('facility', 'healthcare', 'education'))))
+                        child.lineage = [child.id] + parent.lineage
+                        counter += 1
+                        children.append(child)
+                self.target_institutions.extend(children)
+                level = children
+
+        self.external_institutions : list[_Institution] = []
+        for e in range(config.external_institutions):
+            institution = _Institution(f'{OPENALEX_URI}I{counter}', f'External Institution {e+1}',
+                                       str(rng.choice(COUNTRY_CODES)), str(rng.choice(('education', 'company', 'government'))))
+            institution.lineage = [institution.id]
+            counter += 1
+            self.external_institutions.append(institution)
+
+    def _build_author_affiliations(self):
+        # Every author of the corpus is affiliated with at least one target institution
+        rng = self.rng('authors')
+        config = self.config
+        self.author_affiliations = []
+        for _ in range(config.authors):
+            count = int(rng.integers(1, 4))
+            targets = [self.target_institutions[i] for i in rng.choice(len(self.target_institutions), size=min(count, len(self.target_institutions)), replace=False)]
+            if self.external_institutions and rng.random() < 0.3:
+                targets.append(self.external_institutions[int(rng.integers(0, len(self.external_institutions)))])
+            self.author_affiliations.append(targets)
+
+    def _counts_by_year(self, rng: np.random.Generator, works: bool = True) -> list[dict]:
+        years = self.years[-10:]
+        counts = []
+        for year in years:
+            count = {'year': year, 'cited_by_count': int(rng.integers(0, 500))}
+            if works:
+                count['works_count'] = int(rng.integers(0, 50))
+            counts.append(count)
+        return counts
+
+    def _summary_stats(self, rng: np.random.Generator) -> dict:
+        return {
+            '2yr_mean_citedness': round(float(rng.gamma(2.0, 1.5)), 4),
+            'h_index': int(rng.integers(0, 80)),
+            'i10_index': int(rng.integers(0, 200))
+        }
+
+    def _topic_list(self, rng: np.random.Generator, count: int, value_field: str) -> list[dict]:
+        chosen = rng.choice(len(self.topics), size=min(count, len(self.topics)), replace=False)
+        return [{**self.topics[i], value_field: round(float(rng.random()), 4)} for i in chosen]
+
+    def topic_records(self) -> Iterator[dict]:
+        for topic in self.topics:
+            yield dict(topic)
+
+    def institution_records(self) -> Iterator[dict]:
+        rng = self.rng('institutions')
+        by_id = {institution.id: institution for institution in self.target_institutions}
+
+        for institution in self.target_institutions:
+            associated = []
+            if len(institution.lineage) > 1:
+                parent = by_id[institution.lineage[1]]
+                associated.append({**parent.dehydrated(), 'relationship': 'parent'})
+            for child in self.target_institutions:
+                if len(child.lineage) > 1 and child.lineage[1] == institution.id:
+                    associated.append({**child.dehydrated(), 'relationship': 'child'})
+
+            for association in associated:
+                association.pop('lineage')
+
+            yield {
+                'id': institution.id,
+                'display_name': institution.display_name,
+                'country_code': institution.country_code,
+                'type': institution.type,
+                'lineage': institution.lineage,
+                'works_count': int(rng.integers(100, 100000)),
+                'cited_by_count': int(rng.integers(1000, 1000000)),
+                'summary_stats': self._summary_stats(rng),
+                'counts_by_year': self._counts_by_year(rng),
+                'topic_share': self._topic_list(rng, 5, 'value'),
+                'associated_institutions': associated
+            }
+
+    def source_records(self) -> Iterator[dict]:
+        rng = self.rng('sources')
+        for idx, source_id in enumerate(self.source_ids):
+            host = self.roots[int(rng.integers(0, len(self.roots)))] if self.roots else None
+            yield {
+                'id': source_id,
+                'display_name': f'Journal {idx+1}',
+                'issn_l': self.source_issns[idx],
+                'issn': [self.source_issns[idx]],
+                'host_organization': host.id if host else None,
+                'country_code': str(rng.choice(COUNTRY_CODES)),
+                'type': 'journal',
+                'apc_usd': int(rng.integers(0, 4000)),
+                'cited_by_count': int(rng.integers(0, 100000)),
+                'works_count': int(rng.integers(0, 10000)),
+                'is_core': bool(rng.integers(0, 2)),
+                'is_in_doaj': bool(rng.integers(0, 2)),
+                'is_oa': bool(rng.integers(0, 2)),
+                'summary_stats': self._summary_stats(rng),
+                'counts_by_year': self._counts_by_year(rng),
+                'topics': self._topic_list(rng, 3, 'count')
+            }
+
+    def funder_records(self) -> Iterator[dict]:
+        rng = self.rng('funders')
+        for idx, funder_id in enumerate(self.funder_ids):
+            root = self.roots[idx % len(self.roots)] if self.roots else None
+            roles = [{'role': 'funder', 'id': funder_id, 'works_count': int(rng.integers(0, 1000))}]
+            if root is not None:
+                roles.append({'role': 'institution', 'id': root.id, 'works_count': int(rng.integers(0, 1000))})
+            yield {
+                'id': funder_id,
+                'display_name': f'Funder {idx+1}',
+                'country_code': 'CA',
+                'grants_count': int(rng.integers(0, 5000)),
+                'cited_by_count': int(rng.integers(0, 100000)),
+                'works_count': int(rng.integers(0, 10000)),
+                'roles': roles,
+                'summary_stats': self._summary_stats(rng),
+                'counts_by_year': self._counts_by_year(rng)
+            }
+
+    def author_records(self) -> Iterator[dict]:
+        rng = np.random.default_rng([self.config.seed, len(self.entity_streams)])
+        for idx, affiliations in enumerate(self.author_affiliations):
+            yield {
+                'id': f'{OPENALEX_URI}A{idx+1}',
+                'display_name': f'Author {idx+1}',
+                'affiliations': [
+                    {
+                        'institution': institution.dehydrated(),
+                        'years': sorted(int(y) for y in rng.choice(self.years, size=int(rng.integers(1, 6)), replace=False))
+                    } for institution in affiliations
+                ],
+                'last_known_institutions': [affiliations[0].dehydrated()],
+                'works_count': int(rng.integers(1, 300)),
+                'cited_by_count': int(rng.integers(0, 20000)),
+                'summary_stats': self._summary_stats(rng),
+                'counts_by_year': self._counts_by_year(rng),
+                'topics': self._topic_list(rng, 3, 'count')
+            }
+
+    def _authorship_count(self, rng: np.random.Generator) -> int:
+        config = self.config
+        if rng.random() < config.consortium_rate:
+            return config.consortium_size
+        count = int(round(rng.lognormal(math.log(max(config.authorship_mean, 1.0)), config.authorship_sigma)))
+        return min(max(count, 1), config.max_authorships)
+
+    def _authorship(self, rng: np.random.Generator, position: str) -> dict:
+        config = self.config
+        if config.authors and rng.random() < config.local_author_rate:
+            author_idx = int(rng.integers(0, config.authors))
+            author_id = f'{OPENALEX_URI}A{author_idx+1}'
+            candidates = self.author_affiliations[author_idx]
+        else:
+            author_id = f'{OPENALEX_URI}A{config.authors + int(rng.integers(0, max(config.authors, 1) * 10)) + 1}'
+            candidates = self.external_institutions or self.target_institutions
+
+        count = min(len(candidates), max(1, int(rng.poisson(config.institutions_per_authorship - 1) + 1)))
+        institutions = [candidates[i].dehydrated() for i in rng.choice(len(candidates), size=count, replace=False)]
+
+        return {
+            'author_position': position,
+            'author': {'id': author_id, 'display_name': f'Author {author_id.split("A")[-1]}', 'orcid': None},
+            'institutions': institutions,
+            'countries': sorted({institution['country_code'] for institution in institutions}),
+            'is_corresponding': position == 'first',
+            'raw_author_name': f'Author {author_id.split("A")[-1]}',
+            'raw_affiliation_strings': [institution['display_name'] for institution in institutions],
+            'affiliations': [
+                {'raw_affiliation_string': institution['display_name'], 'institution_ids': [institution['id']]}
+                for institution in institutions
+            ]
+        }
+
+    def work_records(self) -> Iterator[dict]:
+        config = self.config
+        rng = self.rng('works')
+        schema = schemas['works']
+
+        for idx in range(config.works):
+            count = self._authorship_count(rng)
+            authorships = [
+                self._authorship(rng, 'first' if a == 0 else ('last' if a == count - 1 else 'middle'))
+                for a in range(count)
+            ]
+            institutions = {institution['id'] for authorship in authorships for institution in authorship['institutions']}
+            countries = {country for authorship in authorships for country in authorship['countries']}
+
+            source_idx = int(rng.integers(0, len(self.source_ids))) if self.source_ids else None
+            location = {
+                'is_oa': bool(rng.integers(0, 2)),
+                'source': {
+                    'id': self.source_ids[source_idx],
+                    'display_name': f'Journal {source_idx+1}',
+                    'issn_l': self.source_issns[source_idx],
+                    'issn': [self.source_issns[source_idx]],
+                    'type': 'journal',
+                    'host_organization': None
+                } if source_idx is not None else None
+            }
+
+            topics = self._topic_list(rng, config.topics_per_work, 'score')
+            is_oa = bool(rng.integers(0, 2))
+            year = int(rng.choice(self.years))
+            apc = int(rng.integers(0, 4000))
+
+            record = {
+                'id': f'{OPENALEX_URI}W{idx+1}',
+                'display_name': f'Work {idx+1}',
+                'title': f'Work {idx+1}',
+                'publication_year': year,
+                'publication_date': f'{year}-01-01',
+                'type': str(rng.choice(WORK_TYPES)),
+                'authorships': authorships,
+                'countries_distinct_count': len(countries),
+                'institutions_distinct_count': len(institutions),
+                'cited_by_count': int(rng.integers(0, 1000)),
+                'fwci': round(float(rng.gamma(1.5, 1.0)), 4),
+                'citation_normalized_percentile': {
+                    'value': round(float(rng.random()), 4), 'is_in_top_1_percent': False, 'is_in_top_10_percent': False
+                },
+                'apc_paid': {'value': apc, 'currency': 'USD', 'provenance': 'doaj', 'value_usd': apc},
+                'open_access': {
+                    'is_oa': is_oa,
+                    'oa_status': str(rng.choice(OA_STATUSES)) if is_oa else 'closed',
+                    'oa_url': None,
+                    'any_repository_has_fulltext': False
+                },
+                'primary_location': location,
+                'locations': [location],
+                'primary_topic': topics[0] if topics else None,
+                'topics': topics,
+                'grants': [
+                    {'funder': self.funder_ids[int(i)], 'funder_display_name': f'Funder {int(i)+1}', 'award_id': None}
+                    for i in rng.choice(len(self.funder_ids), size=min(int(rng.integers(0, 3)), len(self.funder_ids)), replace=False)
+                ],
+                'counts_by_year': [{'year': y, 'cited_by_count': int(rng.integers(0, 100))} for y in self.years[-3:] if y >= year]
+            }
+
+            yield conform(record, schema, rng)
+
+    def records(self, entity: str) -> Iterator[dict]:
+        return {
+            'topics': self.topic_records,
+            'institutions': self.institution_records,
+            'sources': self.source_records,
+            'funders': self.funder_records,
+            'authors': self.author_records,
+            'works': self.work_records
+        }[entity]()
+
+def write_shards(records: Iterator[dict], directory: Path, prefix: str, shard_size: int) -> int:
+    '''
+    Write the records as compressed ndjson shards named like the extracted data. Returns the number of records.
+    '''
+    directory.mkdir(parents=True, exist_ok=True)
+    compressor = zstandard.ZstdCompressor(level=3)
+    total, shard, file, writer = 0, 0, None, None
+
+    try:
+        for record in records:
+            if total % shard_size == 0:
+                if writer is not None:
+                    writer.close()
+                shard += 1
+                file = open(directory.joinpath(f'{prefix}-{shard}.json.zst'), 'wb')
+                writer = compressor.stream_writer(file, closefd=True)
+            writer.write((json.dumps(record)+'\n').encode('utf-8'))
+            total += 1
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return total
+
+def generate_corpus(output_dir: Path, config: Optional[SyntheticCorpusConfig] = None, entities: Optional[list[str]] = None) -> dict[str, int]:
+    '''
+    Write a synthetic corpus to output_dir. Returns the number of records written per entity.
+    '''
+    config = config or SyntheticCorpusConfig()
+    corpus = SyntheticCorpus(config)
+    counts = {}
+
+    for entity in entities or SyntheticCorpus.entity_streams:
+        print(f'Generating synthetic {entity}...')
+        counts[entity] = write_shards(corpus.records(entity), output_dir.joinpath(entity), f'synthetic-{config.seed}', config.shard_size)
+
+    print(f'Finished generating synthetic corpus in: {output_dir}')
+    return counts
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic OpenAlex corpus.')
+    parser.add_argument('output_dir', type=Path)
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiply the number of works, authors and sources.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--works', type=int, default=None)
+    parser.add_argument('--authors', type=int, default=None)
+    parser.add_argument('--authorship-mean', type=float, default=None)
+    parser.add_argument('--consortium-rate', type=float, default=None)
+    parser.add_argument('--lineage-depth', type=int, default=None)
+    parser.add_argument('--topics-per-subfield', type=int, default=None)
+    args = parser.parse_args()
+
+    overrides = {
+        key: value for key, value in {
+            'seed': args.seed,
+            'works': args.works,
+            'authors': args.authors,
+            'authorship_mean': args.authorship_mean,
+            'consortium_rate': args.consortium_rate,
+            'lineage_depth': args.lineage_depth,
+            'topics_per_subfield': args.topics_per_subfield
+        }.items() if value is not None
+    }
+    print(generate_corpus(args.output_dir, replace(SyntheticCorpusConfig(), **overrides).scale(args.scale)))
@@ -0,0 +1,51 @@
+'''
+graph_data.py
+Helpers for the processed graph data shared by the preprocessing and the database loaders: the node types read from
+the names of the node and relationship files, and the property joins deriving relationships from the node files.
+'''
+from pathlib import Path
+import polars as pl
+from config import NodeType, GRAPH_START_ID, GRAPH_END_ID
+
+def infer_node_type_from_file(file: Path) -> NodeType:
+    '''
+    For singular node type
+    '''
+    try:
+        filename = file.stem.replace('__', '&&')
+        dlm_idx = filename.find('_')
+        stringType = filename[:dlm_idx].replace('&&', '_') if dlm_idx != -1 else file.stem.replace('__', '_')
+        return (NodeType(stringType))
+    except Exception:
+        raise Exception("Unable to infer node types from file with filename: ", file.name)
+
+def infer_node_types_from_file(file: Path) -> tuple[NodeType, NodeType]:
+
+    try:
+        filename = file.stem.replace('__', '&&').split('_')
+        start, target = filename[0].replace('&&', '_'), filename[1].replace('&&', '_')
+        return (NodeType(start), NodeType(target))
+    except Exception:
+        raise Exception('Unable to infer node types from file with filename: ', file.name)
+
+def parquet_file_name(*nodeTypes: NodeType) -> str:
+    '''
+    File name that infer_node_type_from_file and infer_node_types_from_file read back as the node types.
+    '''
+    return '_'.join(nodeType.value.replace('_', '__') for nodeType in nodeTypes) + '.parquet'
+
+def property_join(start: pl.LazyFrame, target: pl.LazyFrame, properties: dict[str, str], contained: bool = True) -> pl.LazyFrame:
+    '''
+    Hash-join the start and target nodes on their shared property values into :START_ID/:END_ID pairs.
+    Contained target properties are lists, which are exploded so every value is joined on by equality.
+    '''
+    keys = [f'key_{index}' for index in range(len(properties))]
+    start = start.select(pl.col('id').alias(GRAPH_START_ID), *[pl.col(field).alias(key) for field, key in zip(properties.keys(), keys)])
+    target = target.select(pl.col('id').alias(GRAPH_END_ID), *[pl.col(field).alias(key) for field, key in zip(properties.values(), keys)])
+    if contained:
+        for key in keys:
+            target = target.explode(key)
+
+    return start.join(target, on=keys, how='inner')\
+        .select(GRAPH_START_ID, GRAPH_END_ID)\
+        .unique()
@@ -0,0 +1,48 @@
+'''
+run_log.py
+Append-only parquet logs of the runs recorded by the load report, the pipeline profiler and the query plan profiler.
+Every row of a run log carries the run_id and started columns of its run.
+'''
+import argparse
+from pathlib import Path
+from typing import Callable, Optional
+import polars as pl
+
+def append_run(run_log: Optional[Path], data: pl.DataFrame, description: str, run_id: str):
+    '''
+    Append the rows of a run to a run log, creating it if needed.
+    @param run_log - The parquet run log. Nothing is written when it is None.
+    @param description - What the rows are, printed once they are saved.
+    '''
+    if run_log is None:
+        return
+
+    if run_log.exists():
+        # Columns added since the log was started are null in its earlier runs
+        data = pl.concat([pl.read_parquet(run_log), data], how='diagonal_relaxed')
+
+    run_log.parent.mkdir(parents=True, exist_ok=True)
+    data.write_parquet(run_log, compression='zstd')
+    print(f'Saved {description} of run {run_id} to: {run_log}')
+
+def run_ids(log: pl.DataFrame) -> list[str]:
+    '''
+    The run ids of a run log, from the earliest to the latest run.
+    '''
+    return log.group_by('run_id').agg(pl.col('started').min()).sort('started').get_column('run_id').to_list()
+
+def summarize_run(description: str, summarize: Callable[[pl.DataFrame, Optional[int]], str]):
+    '''
+    Command line summary of one run of a run log, the latest run unless --run is given.
+    @param summarize - Formats the rows of the run, keeping the top rows when --top is given.
+    '''
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('run_log', type=Path)
+    parser.add_argument('--run', help='Run id to summarize. Defaults to the latest run.')
+    parser.add_argument('--top', type=int, default=None)
+    args = parser.parse_args()
+
+    log = pl.read_parquet(args.run_log)
+    run_id = args.run or run_ids(log)[-1]
+    print(f'Run: {run_id}')
+    print(summarize(log.filter(pl.col('run_id') == run_id), args.top))
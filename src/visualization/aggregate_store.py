@@ -0,0 +1,265 @@
+'''
+aggregate_store.py
+Store the aggregation results as Parquet with native nested columns, and load them ready to plot.
+
+The maps returned by the aggregation queries, such as apoc.coll.frequenciesAsMap, are stored as Arrow maps and the
+lists of maps as lists of structs, so they are read back as dictionaries and lists without parsing strings.
+Years used as map keys are stored as integers. Every other column keeps the type it has in the DataFrame.
+
+The works of every institution and topic are also rolled up to every level of the topic hierarchy once, when they
+are aggregated, and loaded as a TopicCube that looks up the rows of a domain, field, subfield or topic by id.
+
+Every stored aggregate records whether it was computed by the queries or converted from a CSV of earlier versions,
+and a fingerprint of the statements of queries.py it was computed with. outdated lists the aggregates to compute again.
+'''
+import hashlib
+from ast import literal_eval
+from pathlib import Path
+from typing import Iterable, Optional
+import pandas as pd
+import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
+from .config import VisualizationDataPaths
+from .queries import Statements
+
+_COUNTS = pa.map_(pa.string(), pa.int64())
+_COUNTS_BY_YEAR = pa.map_(pa.int32(), pa.int64())
+
+# Nested columns of the stored aggregates, the other columns are inferred
+AggregateColumns : dict[VisualizationDataPaths, dict[str, pa.DataType]] = {
+    VisualizationDataPaths.summary_node_information: {
+        'labels': _COUNTS
+    },
+    VisualizationDataPaths.work_analysis: {
+        'is_open_access': _COUNTS,
+        'type': _COUNTS,
+        'total_by_publication_year': _COUNTS_BY_YEAR,
+        'open_access_status': _COUNTS
+    },
+    VisualizationDataPaths.author_analysis: {
+        'author_counts_by_year': pa.list_(pa.struct([
+            ('year', pa.int32()),
+            ('works_count', pa.int64()),
+            ('cited_by_count', pa.int64())
+        ])),
+        'affiliated_per_year': _COUNTS_BY_YEAR
+    }
+}
+
+# Levels of the topic hierarchy, from the broadest
+TOPIC_LEVELS = ('domain', 'field', 'subfield', 'topic')
+
+# Columns of topics_works summed at every level of the topic rollup, averaged over the total works when loaded
+TOPIC_ROLLUP_SUMS = ('sum_distinct_countries', 'sum_distinct_institutions', 'sum_fwci', 'sum_citation_normalized_percentile', 'sum_apc_paid')
+
+def topic_rollup(topics: pd.DataFrame) -> pd.DataFrame:
+    '''
+    Roll the works of every institution and topic, as returned by topics_works, up to every level of the hierarchy.
+    One row per level, entry of the level and institution, with the parent of the entry, the total works and the sums.
+    The rows are kept apart by publication_year when topics has that column.
+    '''
+    data = pl.from_pandas(topics).drop_nulls('topic_id')
+    year = [column for column in ('publication_year',) if column in data.columns]
+    levels = []
+    for depth, level in enumerate(TOPIC_LEVELS):
+        parent = TOPIC_LEVELS[depth - 1] if depth else None
+        keys = [f'{parent}_id', f'{parent}_display_name'] if parent else []
+        levels.append(
+            data.group_by('id', 'institution_display_name', *year, *keys, f'{level}_id', f'{level}_display_name')
+                .agg(pl.col('total_works').sum(), *[pl.col(column).sum() for column in TOPIC_ROLLUP_SUMS])
+                .select(
+                    pl.lit(level).alias('level'),
+                    pl.col(f'{level}_id').alias('level_id'),
+                    pl.col(f'{level}_display_name').alias('level_display_name'),
+                    *([pl.col(key).alias(key.replace(parent, 'parent', 1)) for key in keys] if parent
+                      else [pl.lit(None, pl.String).alias('parent_id'), pl.lit(None, pl.String).alias('parent_display_name')]),
+                    'id', 'institution_display_name', *year, 'total_works', *TOPIC_ROLLUP_SUMS
+                )
+        )
+    return pl.concat(levels).sort('level', 'level_id', 'id').to_pandas()
+
+class TopicCube:
+    '''
+    The topic rollup indexed by level, so the rows of an entry, the entries below a parent and the rows of an
+    institution are dictionary lookups.
+    '''
+
+    def __init__(self, rollup: pd.DataFrame):
+        '''
+        @param rollup - The rows of topic_rollup.
+        '''
+        rollup = rollup.copy()
+        for column in TOPIC_ROLLUP_SUMS:
+            rollup[column.replace('sum_', 'avg_', 1)] = rollup[column] / rollup['total_works']
+        rollup = rollup.drop(columns=list(TOPIC_ROLLUP_SUMS))
+
+        # The rows of every level, with the columns named after the level and its parent
+        self.levels : dict[str, pd.DataFrame] = {}
+        for depth, level in enumerate(TOPIC_LEVELS):
+            parent = TOPIC_LEVELS[depth - 1] if depth else None
+            frame = rollup[rollup['level'] == level].drop(columns='level')
+            frame = frame.drop(columns=['parent_id', 'parent_display_name']) if parent is None\
+                else frame.rename(columns={'parent_id': f'{parent}_id', 'parent_display_name': f'{parent}_display_name'})
+            frame = frame.rename(columns={'level_id': f'{level}_id', 'level_display_name': f'{level}_display_name'})
+            leading = ['id', 'institution_display_name'] + ([f'{parent}_id', f'{parent}_display_name'] if parent else [])
+            self.levels[level] = frame[leading + [column for column in frame.columns if column not in leading]].reset_index(drop=True)
+
+        self._entries = {(level, key): rows for level, frame in self.levels.items()
+                         for key, rows in frame.groupby(f'{level}_id', sort=False)}
+        self._institutions = {(level, key): rows for level, frame in self.levels.items()
+                              for key, rows in frame.groupby('id', sort=False)}
+        self._children : dict[tuple[str, Optional[str]], dict[str, str]] = {}
+        for depth, level in enumerate(TOPIC_LEVELS):
+            parent = TOPIC_LEVELS[depth - 1] if depth else None
+            entries = self.levels[level][([f'{parent}_id'] if parent else []) + [f'{level}_display_name', f'{level}_id']]\
+                .drop_duplicates()\
+                .sort_values(f'{level}_display_name')
+            for row in entries.itertuples(index=False):
+                parent_id = row[0] if parent else None
+                self._children.setdefault((level, parent_id), {})[row[-2]] = row[-1]
+
+    def rows(self, level: str, entry_id: str) -> pd.DataFrame:
+        '''
+        The rows of every institution for one domain, field, subfield or topic.
+        '''
+        return self._entries.get((level, entry_id), self.levels[level].iloc[0:0])
+
+    def institution(self, level: str, institution_id: str) -> pd.DataFrame:
+        '''
+        The rows of one institution at a level.
+        '''
+        return self._institutions.get((level, institution_id), self.levels[level].iloc[0:0])
+
+    def options(self, level: str, parent_id: Optional[str] = None) -> dict[str, str]:
+        '''
+        The entries of a level below the parent, as {display_name: id} sorted by display name. Domains have no parent.
+        '''
+        return self._children.get((level, parent_id), {})
+
+def _nested_values(values: pd.Series, dataType: pa.DataType) -> list:
+    '''
+    The values of a nested column, with the map keys converted to the key type.
+    '''
+    values = [None if not isinstance(value, (dict, list)) else value for value in values]
+    if pa.types.is_map(dataType) and pa.types.is_integer(dataType.key_type):
+        return [None if value is None else {int(key): count for key, count in value.items()} for value in values]
+    return values
+
+# Schema metadata of the stored aggregates
+_ORIGIN = b'origin'
+_STATEMENTS = b'statements'
+
+def statements_fingerprint() -> str:
+    '''
+    Hash of the name and text of every statement of queries.py.
+    '''
+    return hashlib.sha256('\n'.join(f'{statement.name}\n{statement.text}' for statement in Statements).encode()).hexdigest()
+
+class AggregateStore:
+    '''
+    Reads and writes the aggregation results, one Parquet file per VisualizationDataPaths entry.
+    '''
+
+    def __init__(self, directory: Optional[Path] = None):
+        '''
+        @param directory - Directory of the files. Defaults to the directories of VisualizationDataPaths.
+        '''
+        self.directory = directory
+
+    def path(self, dataset: VisualizationDataPaths) -> Path:
+        return dataset.value if self.directory is None else self.directory.joinpath(dataset.value.name)
+
+    def to_arrow(self, dataset: VisualizationDataPaths, frame: pd.DataFrame) -> pa.Table:
+        nested = AggregateColumns.get(dataset, {})
+        arrays = [pa.array(_nested_values(frame[column], nested[column]), type=nested[column]) if column in nested
+                  else pa.Array.from_pandas(frame[column].reset_index(drop=True))
+                  for column in frame.columns]
+        return pa.Table.from_arrays(arrays, names=[str(column) for column in frame.columns])
+
+    def save(self, dataset: VisualizationDataPaths, frame: pd.DataFrame, origin: str = 'query'):
+        '''
+        @param origin - query for the results of the current statements, csv for the conversions of import_csv.
+        '''
+        path = self.path(dataset)
+        print("Writing dataframe to directory ", path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        table = self.to_arrow(dataset, frame)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), _ORIGIN: origin.encode(),
+                                               _STATEMENTS: statements_fingerprint().encode()})
+        pq.write_table(table, path, compression='zstd')
+
+    def read(self, dataset: VisualizationDataPaths) -> pa.Table:
+        return pq.read_table(self.path(dataset))
+
+    def load(self, dataset: VisualizationDataPaths) -> pd.DataFrame:
+        '''
+        The stored aggregate, maps as dictionaries and lists of structs as lists of dictionaries.
+        '''
+        return self.read(dataset).to_pandas(maps_as_pydicts='strict')
+
+    def import_csv(self, dataset: VisualizationDataPaths, csv_path: Path):
+        '''
+        Convert an aggregate written as CSV by earlier versions, whose nested columns are Python literals.
+        '''
+        frame = pd.read_csv(csv_path)
+        for column in AggregateColumns.get(dataset, {}):
+            frame[column] = frame[column].apply(lambda value: literal_eval(value) if isinstance(value, str) else None)
+        self.save(dataset, frame, origin='csv')
+
+    def outdated(self, datasets: Iterable[VisualizationDataPaths]) -> list[VisualizationDataPaths]:
+        '''
+        The datasets that are missing, were converted from CSV, or were computed with other statements than the current ones.
+        '''
+        fingerprint = statements_fingerprint().encode()
+        outdated = []
+        for dataset in datasets:
+            path = self.path(dataset)
+            metadata = (pq.read_schema(path).metadata or {}) if path.exists() else None
+            if metadata is None or metadata.get(_ORIGIN) != b'query' or metadata.get(_STATEMENTS) != fingerprint:
+                outdated.append(dataset)
+        return outdated
+
+    def topic_cube(self) -> TopicCube:
+        return TopicCube(self.load(VisualizationDataPaths.topic_rollup))
+
+    def _exploded(self, dataset: VisualizationDataPaths, column: str, key: str, value: str) -> pd.DataFrame:
+        '''
+        One row per entry of a map column, next to the institution id and display name.
+        '''
+        return pl.from_arrow(self.read(dataset).select(['id', 'display_name', column]))\
+            .explode(column)\
+            .drop_nulls(column)\
+            .unnest(column)\
+            .rename({'key': key, 'value': value})\
+            .to_pandas()
+
+    def node_labels(self) -> tuple[dict[str, int], int, int]:
+        '''
+        The node count of every label, the total node count and the total relationship count.
+        '''
+        row = self.load(VisualizationDataPaths.summary_node_information).iloc[0]
+        return row['labels'], int(row['nodeCount']), int(row['relCount'])
+
+    def works_by_publication_year(self) -> pd.DataFrame:
+        '''
+        The works of every institution by publication year, as id, display_name, year and total.
+        '''
+        return self._exploded(VisualizationDataPaths.work_analysis, 'total_by_publication_year', 'year', 'total')
+
+    def affiliations_by_year(self) -> pd.DataFrame:
+        '''
+        The affiliated authors of every institution by year, as id, display_name, year and affiliations.
+        '''
+        return self._exploded(VisualizationDataPaths.author_analysis, 'affiliated_per_year', 'year', 'affiliations')
+
+    def authors_by_year(self) -> pd.DataFrame:
+        '''
+        The works and citations of the authors of every institution by year.
+        '''
+        return pl.from_arrow(self.read(VisualizationDataPaths.author_analysis).select(['id', 'display_name', 'author_counts_by_year']))\
+            .explode('author_counts_by_year')\
+            .drop_nulls('author_counts_by_year')\
+            .unnest('author_counts_by_year')\
+            .select(['cited_by_count', 'works_count', 'year', 'id', 'display_name'])\
+            .to_pandas()
@@ -0,0 +1,395 @@
+'''
+analytics.py
+Compute the aggregation queries with Polars, straight from the node and relationship parquet of the processed output.
+
+Every query returns the same columns and values as its Cypher statement in queries.py, so either backend can
+compute it, see AnalyticsBackend. The graph is read as the database would load it: the node files of every shard
+are deduplicated by id, the relationship files by their :START_ID/:END_ID pair, and relationships whose nodes are
+missing are left out. Traversals are joins, and aggregations that count paths in Cypher count the joined rows.
+The works of an institution are read from the HAS_AFFILIATED_WORK relationships, with the same authorship counts.
+Map values such as apoc.coll.frequenciesAsMap are dictionaries with string keys, as returned by the database.
+'''
+from functools import cached_property
+from pathlib import Path
+from typing import Callable, Optional
+import pandas as pd
+import polars as pl
+from polars import LazyFrame
+from config import NodeType, GRAPH_START_ID, GRAPH_END_ID, DATABASE_OUTPUT_DIR
+from src.graphdb.helpers import deduplicated, infer_node_type_from_file, infer_node_types_from_file
+from .collaborations import GEOGRAPHIC_KEYS, GEOGRAPHIC_TOPIC_KEYS
+from .queries import DEFAULT_PARAMETERS, GEOGRAPHIC_TOPIC_AVERAGES
+
+# Work properties summed by topics_works, as (property, column)
+TOPIC_SUMS = (
+    ('countries_distinct_count', 'sum_distinct_countries'),
+    ('institutions_distinct_count', 'sum_distinct_institutions'),
+    ('fwci', 'sum_fwci'),
+    ('citation_normalized_percentile', 'sum_citation_normalized_percentile'),
+    ('apc_paid', 'sum_apc_paid')
+)
+
+# Work properties averaged by works_analysis, as (property, column)
+WORK_AVERAGES = (
+    ('countries_distinct_count', 'avg_distinct_countries'),
+    ('citation_normalized_percentile', 'avg_citation_normalized_percentile'),
+    ('fwci', 'avg_fwci'),
+    ('institutions_distinct_count', 'avg_distinct_institutions'),
+    ('apc_paid', 'avg_apc_paid')
+)
+
+TOPIC_HIERARCHY = ['domain_id', 'domain_display_name', 'field_id', 'field_display_name',
+                   'subfield_id', 'subfield_display_name', 'topic_id', 'topic_display_name']
+
+def _cypher_string(value) -> str:
+    '''
+    A value as a map key, as converted by the database.
+    '''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+def _frequencies(data: pl.DataFrame, key: str, column: str) -> dict:
+    '''
+    apoc.coll.frequenciesAsMap of the column for every key, missing values are not counted.
+    '''
+    frequencies : dict = {}
+    for row_key, value, count in data.drop_nulls(column).group_by([key, column]).len().iter_rows():
+        frequencies.setdefault(row_key, {})[_cypher_string(value)] = count
+    return frequencies
+
+class ParquetAnalytics:
+    '''
+    The aggregation queries over the processed output, by the name of their statement.
+    '''
+    queries = ('summary_nodes_by_institution', 'works_analysis', 'authors_analysis', 'topics_works',
+               'geographic_collaborations', 'geographic_topics_collaborations')
+
+    def __init__(self, input_dir: Path = DATABASE_OUTPUT_DIR):
+        '''
+        @param input_dir - The processed output, laid out as <shard>/<entity>/<nodes|relationships>/*.parquet.
+        '''
+        self.input_dir = input_dir
+
+    def __call__(self, name: str, parameters: Optional[dict] = None) -> pd.DataFrame:
+        '''
+        Compute the query of a statement with the parameters it was bound to.
+        '''
+        if name not in self.queries:
+            raise Exception(f'No parquet implementation of query: {name}')
+        query : Callable[..., pd.DataFrame] = getattr(self, name)
+        return query(**(parameters or {}))
+
+    @cached_property
+    def _node_files(self) -> dict[NodeType, list[Path]]:
+        files : dict[NodeType, list[Path]] = {}
+        for file in sorted(self.input_dir.glob('*/*/nodes/*.parquet')):
+            files.setdefault(infer_node_type_from_file(file), []).append(file)
+        return files
+
+    @cached_property
+    def _relationship_files(self) -> dict[tuple[NodeType, NodeType], list[Path]]:
+        files : dict[tuple[NodeType, NodeType], list[Path]] = {}
+        for file in sorted(self.input_dir.glob('*/*/relationships/*.parquet')):
+            files.setdefault(infer_node_types_from_file(file), []).append(file)
+        return files
+
+    def nodes(self, nodeType: NodeType) -> LazyFrame:
+        '''
+        The nodes of a type across the shards, one row per id.
+        '''
+        files = self._node_files.get(nodeType)
+        if not files:
+            raise Exception(f'No node files for node type: {nodeType.value}')
+        return deduplicated(files, ['id'])
+
+    def relationships(self, start: NodeType, target: NodeType) -> LazyFrame:
+        '''
+        The relationships between two node types, one row per :START_ID/:END_ID pair whose nodes both exist.
+        '''
+        start_ids, target_ids = self.nodes(start).select('id'), self.nodes(target).select('id')
+        files = self._relationship_files.get((start, target))
+        if not files:
+            return pl.LazyFrame(schema={GRAPH_START_ID: start_ids.collect_schema()['id'], GRAPH_END_ID: target_ids.collect_schema()['id']})
+
+        return deduplicated(files, [GRAPH_START_ID, GRAPH_END_ID])\
+            .with_columns(
+                pl.col(GRAPH_START_ID).cast(start_ids.collect_schema()['id']),
+                pl.col(GRAPH_END_ID).cast(target_ids.collect_schema()['id'])
+            )\
+            .join(start_ids, left_on=GRAPH_START_ID, right_on='id', how='semi')\
+            .join(target_ids, left_on=GRAPH_END_ID, right_on='id', how='semi')
+
+    def _institutions(self, lineage_root: bool) -> LazyFrame:
+        return self.nodes(NodeType.SFU_U15_institution).filter(pl.col('lineage_root') == lineage_root)
+
+    def _affiliations(self) -> LazyFrame:
+        '''
+        The affiliated institutions of every institution, as institution and affiliation.
+        '''
+        return self.relationships(NodeType.affiliated_institution, NodeType.SFU_U15_institution)\
+            .select(pl.col(GRAPH_END_ID).alias('institution'), pl.col(GRAPH_START_ID).alias('affiliation'))
+
+    def _authorship_works(self) -> LazyFrame:
+        '''
+        The work and affiliated institution of every authorship, as affiliation, authorship and work.
+        '''
+        affiliations = self.relationships(NodeType.authorship, NodeType.affiliated_institution)\
+            .select(pl.col(GRAPH_START_ID).alias('authorship'), pl.col(GRAPH_END_ID).alias('affiliation'))
+        works = self.relationships(NodeType.authorship, NodeType.work)\
+            .select(pl.col(GRAPH_START_ID).alias('authorship'), pl.col(GRAPH_END_ID).alias('work'))
+        return affiliations.join(works, on='authorship')
+
+    def _memberships(self, include_lineage: bool) -> LazyFrame:
+        '''
+        The works of every institution with the authorships of the institution on them, as institution, work and authorships.
+        '''
+        authorships = 'lineage_authorships' if include_lineage else 'authorships'
+        return self.relationships(NodeType.SFU_U15_institution, NodeType.work)\
+            .select(pl.col(GRAPH_START_ID).alias('institution'), pl.col(GRAPH_END_ID).alias('work'), pl.col(authorships).alias('authorships'))\
+            .filter(pl.col('authorships') > 0)
+
+    def _institution_works(self, lineage_root: bool, include_lineage: bool) -> LazyFrame:
+        return self._institutions(lineage_root).select(pl.col('id').alias('institution'))\
+            .join(self._memberships(include_lineage), on='institution')
+
+    def _topic_hierarchy(self) -> LazyFrame:
+        '''
+        The subfield, field and domain of every topic, with their ids and display names.
+        '''
+        def level(nodeType: NodeType) -> LazyFrame:
+            return self.nodes(nodeType).select(pl.col('id').alias(f'{nodeType.value}_id'),
+                                               pl.col('display_name').alias(f'{nodeType.value}_display_name'))
+
+        def parent(start: NodeType, target: NodeType) -> LazyFrame:
+            return self.relationships(start, target).select(pl.col(GRAPH_START_ID).alias(f'{start.value}_id'),
+                                                            pl.col(GRAPH_END_ID).alias(f'{target.value}_id'))
+
+        return level(NodeType.topic)\
+            .join(parent(NodeType.topic, NodeType.subfield), on='topic_id')\
+            .join(level(NodeType.subfield), on='subfield_id')\
+            .join(parent(NodeType.subfield, NodeType.field), on='subfield_id')\
+            .join(level(NodeType.field), on='field_id')\
+            .join(parent(NodeType.field, NodeType.domain), on='field_id')\
+            .join(level(NodeType.domain), on='domain_id')\
+            .select(TOPIC_HIERARCHY)
+
+    def summary_nodes_by_institution(self,
+                                    lineage_root: bool = DEFAULT_PARAMETERS['lineage_root'],
+                                    include_lineage: bool = DEFAULT_PARAMETERS['include_lineage']) -> pd.DataFrame:
+        '''
+        summary_nodes_by_institution, with the institution node as a dictionary of its properties.
+        '''
+        institutions = self._institutions(lineage_root)
+        authors = self.relationships(NodeType.author, NodeType.affiliated_institution)\
+            .select(pl.col(GRAPH_START_ID).alias('author'), pl.col(GRAPH_END_ID).alias('affiliation'))\
+            .join(self._affiliations(), on='affiliation')\
+            .group_by('institution').agg(pl.col('author').n_unique().alias('author_count'))
+
+        paths = self._institution_works(lineage_root, include_lineage)
+        works = paths.group_by('institution').agg(
+            pl.col('authorships').sum().alias('authorship_count'),
+            pl.col('work').n_unique().alias('openalex_paper_count')
+        )
+        # Every authorship of the works, including those of other institutions
+        total_authors = paths.select('institution', 'work').unique()\
+            .join(self.relationships(NodeType.authorship, NodeType.work)
+                  .select(pl.col(GRAPH_START_ID).alias('authorship'), pl.col(GRAPH_END_ID).alias('work')), on='work', how='left')\
+            .group_by('institution').agg(pl.col('authorship').n_unique().alias('total_author_count'))
+
+        # Institutions without works are not returned, as their collected works unwind to no rows
+        data = institutions.rename({'id': 'institution'})\
+            .join(works, on='institution')\
+            .join(authors, on='institution', how='left')\
+            .join(total_authors, on='institution', how='left')\
+            .with_columns(pl.col('author_count').fill_null(0))\
+            .sort('institution')\
+            .collect()
+
+        properties = [column for column in data.columns if column not in ('author_count', 'authorship_count', 'openalex_paper_count', 'total_author_count')]
+        # Null properties are not stored on the node
+        nodes = [{('id' if key == 'institution' else key): value for key, value in row.items() if value is not None}
+                 for row in data.select(properties).iter_rows(named=True)]
+
+        return pd.DataFrame({
+            'I': nodes,
+            'author_count': data['author_count'].to_list(),
+            'authorship_count': data['authorship_count'].to_list(),
+            'openalex_paper_count': data['openalex_paper_count'].to_list(),
+            'total_author_count': data['total_author_count'].to_list()
+        })
+
+    def works_analysis(self,
+                      lineage_root: bool = DEFAULT_PARAMETERS['lineage_root'],
+                      include_lineage: bool = DEFAULT_PARAMETERS['include_lineage']) -> pd.DataFrame:
+        '''
+        works_analysis: averages and frequencies of the distinct works of every institution.
+        '''
+        institutions = self._institutions(lineage_root).select(pl.col('id').alias('institution'), 'display_name')
+        work_properties = [property for property, _ in WORK_AVERAGES] + ['is_oa', 'type', 'publication_year', 'oa_status']
+        works = institutions.join(self._institution_works(lineage_root, include_lineage).select('institution', 'work').unique(), on='institution', how='left')\
+            .join(self.nodes(NodeType.work).select(pl.col('id').alias('work'), *work_properties), on='work', how='left')\
+            .collect()
+
+        data = works.group_by('institution', 'display_name')\
+            .agg(*[pl.col(property).cast(pl.Float64).mean().alias(column) for property, column in WORK_AVERAGES])\
+            .sort('institution')
+
+        is_open_access = _frequencies(works, 'institution', 'is_oa')
+        types = _frequencies(works, 'institution', 'type')
+        by_year = _frequencies(works, 'institution', 'publication_year')
+        oa_status = _frequencies(works.filter(pl.col('is_oa')), 'institution', 'oa_status')
+
+        frame = data.rename({'institution': 'id'}).to_pandas()
+        frame['is_open_access'] = [is_open_access.get(id, {}) for id in frame['id']]
+        frame['type'] = [types.get(id, {}) for id in frame['id']]
+        frame['total_by_publication_year'] = [by_year.get(id, {}) for id in frame['id']]
+        frame['open_access_status'] = [oa_status.get(id, {}) for id in frame['id']]
+        return frame
+
+    def authors_analysis(self, lineage_root: bool = DEFAULT_PARAMETERS['lineage_root']) -> pd.DataFrame:
+        '''
+        authors_analysis: works and citations of the affiliated authors by year, and the affiliations by year.
+        '''
+        institutions = self._institutions(lineage_root).select(pl.col('id').alias('institution'), 'display_name')
+        affiliated = self.relationships(NodeType.author, NodeType.affiliated_institution)\
+            .select(pl.col(GRAPH_START_ID).alias('author'), pl.col(GRAPH_END_ID).alias('affiliation'), 'years')\
+            .join(self._affiliations(), on='affiliation')\
+            .join(institutions.select('institution'), on='institution')
+
+        counts = affiliated.join(self.relationships(NodeType.author, NodeType.year)
+                                 .select(pl.col(GRAPH_START_ID).alias('author'), pl.col(GRAPH_END_ID).alias('year'), 'works_count', 'cited_by_count'),
+                                 on='author')\
+            .group_by('institution', 'year')\
+            .agg(pl.col('works_count').sum(), pl.col('cited_by_count').sum())\
+            .sort('institution', 'year')\
+            .group_by('institution', maintain_order=True)\
+            .agg(pl.struct('year', 'works_count', 'cited_by_count').alias('author_counts_by_year'))
+
+        # Affiliations without years unwind to no rows, so institutions without any are not returned
+        per_year = affiliated.explode('years')\
+            .drop_nulls('years')\
+            .group_by('institution', 'years')\
+            .agg(pl.len().alias('affiliations'))\
+            .collect()
+
+        data = institutions.join(per_year.lazy().select('institution').unique(), on='institution')\
+            .join(counts, on='institution', how='left')\
+            .sort('institution')\
+            .collect()
+
+        affiliated_per_year : dict[str, dict[str, int]] = {}
+        for institution, year, count in per_year.iter_rows():
+            affiliated_per_year.setdefault(institution, {})[_cypher_string(year)] = count
+
+        return pd.DataFrame({
+            'id': data['institution'].to_list(),
+            'display_name': data['display_name'].to_list(),
+            'author_counts_by_year': [counts or [] for counts in data['author_counts_by_year'].to_list()],
+            'affiliated_per_year': [affiliated_per_year[institution] for institution in data['institution']]
+        })
+
+    def topics_works(self,
+                    lineage_root: bool = DEFAULT_PARAMETERS['lineage_root'],
+                    include_lineage: bool = DEFAULT_PARAMETERS['include_lineage']) -> pd.DataFrame:
+        '''
+        topics_works: the works of every institution and topic, counted and summed once per authorship of the institution.
+        '''
+        institutions = self._institutions(lineage_root).select(pl.col('id').alias('institution'), pl.col('display_name').alias('institution_display_name'))
+        paths = self._institution_works(lineage_root, include_lineage)\
+            .join(self.relationships(NodeType.work, NodeType.topic)
+                  .select(pl.col(GRAPH_START_ID).alias('work'), pl.col(GRAPH_END_ID).alias('topic_id')), on='work')\
+            .join(self._topic_hierarchy(), on='topic_id')\
+            .join(self.nodes(NodeType.work).select(pl.col('id').alias('work'), *[property for property, _ in TOPIC_SUMS]), on='work')
+
+        # Institutions without a path keep a single row without a topic
+        data = institutions.join(paths, on='institution', how='left')\
+            .group_by('institution', 'institution_display_name', *TOPIC_HIERARCHY)\
+            .agg(
+                pl.col('authorships').sum().alias('total_works'),
+                *[(pl.col(property) * pl.col('authorships')).sum().alias(column) for property, column in TOPIC_SUMS]
+            )\
+            .sort('institution', 'topic_id', nulls_last=True)\
+            .rename({'institution': 'id'})\
+            .select('id', 'institution_display_name', *TOPIC_HIERARCHY, 'total_works', *[column for _, column in TOPIC_SUMS])
+
+        return data.collect().to_pandas()
+
+    def _target_works(self, institution_ids: list[str], include_lineage: bool) -> LazyFrame:
+        '''
+        The works of every target institution, as institution_id and work.
+        '''
+        return self.nodes(NodeType.SFU_U15_institution)\
+            .filter(pl.col('id').is_in(institution_ids))\
+            .select(pl.col('id').alias('institution'))\
+            .join(self._memberships(include_lineage), on='institution')\
+            .select(pl.col('institution').alias('institution_id'), 'work')
+
+    def _collaborators(self) -> LazyFrame:
+        '''
+        The country of the affiliated institution of every authorship on a work, as work, collaborator and the geographic columns.
+        '''
+        return self._authorship_works()\
+            .rename({'affiliation': 'collaborator'})\
+            .join(self.relationships(NodeType.affiliated_institution, NodeType.geographic)
+                  .select(pl.col(GRAPH_START_ID).alias('collaborator'), pl.col(GRAPH_END_ID).alias('country_id')), on='collaborator')\
+            .join(self.nodes(NodeType.geographic)
+                  .select(pl.col('id').alias('country_id'), 'continent', 'country_name'), on='country_id')\
+            .select('work', 'collaborator', 'country_id', 'continent', 'country_name')
+
+    def _geographic_collaborations(self, institution_ids: list[str], include_lineage: bool) -> LazyFrame:
+        return self._target_works(institution_ids, include_lineage)\
+            .join(self._collaborators(), on='work')\
+            .filter(pl.col('collaborator') != pl.col('institution_id'))\
+            .group_by('institution_id', 'country_id', 'continent', 'country_name')\
+            .agg(pl.len().cast(pl.Int64).alias('number_of_collaborations'))\
+            .rename({'country_id': 'id', 'country_name': 'country'})\
+            .sort(['institution_id', 'number_of_collaborations', 'id'], descending=[False, True, False])\
+            .select('institution_id', *GEOGRAPHIC_KEYS, 'number_of_collaborations')
+
+    def _geographic_topics_collaborations(self, institution_ids: list[str], include_lineage: bool) -> LazyFrame:
+        averages = [pl.col(property).cast(pl.Float64).mean().alias(column) for property, column in GEOGRAPHIC_TOPIC_AVERAGES]
+        return self._target_works(institution_ids, include_lineage)\
+            .join(self.relationships(NodeType.work, NodeType.topic)
+                  .select(pl.col(GRAPH_START_ID).alias('work'), pl.col(GRAPH_END_ID).alias('topic_id')), on='work')\
+            .join(self._collaborators(), on='work')\
+            .filter(pl.col('collaborator') != pl.col('institution_id'))\
+            .join(self._topic_hierarchy(), on='topic_id')\
+            .join(self.nodes(NodeType.work).select(pl.col('id').alias('work'), *[property for property, _ in GEOGRAPHIC_TOPIC_AVERAGES]), on='work')\
+            .group_by('institution_id', *GEOGRAPHIC_TOPIC_KEYS)\
+            .agg(pl.len().cast(pl.Int64).alias('number_of_collaborations'), *averages)\
+            .sort(['institution_id', 'domain_display_name', 'field_display_name', 'subfield_display_name', 'topic_display_name', 'number_of_collaborations', 'country_id'],
+                  descending=[False, False, False, False, False, True, False])\
+            .select('institution_id', *GEOGRAPHIC_TOPIC_KEYS, 'number_of_collaborations', *[column for _, column in GEOGRAPHIC_TOPIC_AVERAGES])
+
+    def geographic_collaborations(self,
+                                  target_id: str = DEFAULT_PARAMETERS['target_id'],
+                                  include_lineage: bool = DEFAULT_PARAMETERS['include_lineage']) -> pd.DataFrame:
+        '''
+        geographic_collaborations: the countries of the institutions collaborating on the works of the target institution.
+        '''
+        return self._geographic_collaborations([target_id], include_lineage).drop('institution_id').collect().to_pandas()
+
+    def geographic_topics_collaborations(self,
+                                         target_id: str = DEFAULT_PARAMETERS['target_id'],
+                                         include_lineage: bool = DEFAULT_PARAMETERS['include_lineage']) -> pd.DataFrame:
+        '''
+        geographic_topics_collaborations: the collaborating countries of the target institution by topic.
+        '''
+        return self._geographic_topics_collaborations([target_id], include_lineage).drop('institution_id').collect().to_pandas()
+
+    def institution_collaborations(self,
+                                   institution_ids: list[str],
+                                   include_lineage: bool = DEFAULT_PARAMETERS['include_lineage']) -> tuple[pd.DataFrame, pd.DataFrame]:
+        '''
+        The geographic collaborations and geographic topic collaborations of every institution, as computed by
+        collaborations.institution_collaborations, in a single pass over the works of all institutions.
+        '''
+        if not institution_ids:
+            raise Exception('No institutions to compute the collaborations of')
+        collaborations, topics_collaborations = pl.collect_all([self._geographic_collaborations(institution_ids, include_lineage),
+                                                                self._geographic_topics_collaborations(institution_ids, include_lineage)])
+        return collaborations.to_pandas(), topics_collaborations.to_pandas()
+
+    def institution_ids(self, lineage_root: bool = DEFAULT_PARAMETERS['lineage_root']) -> list[str]:
+        return self._institutions(lineage_root).select('id').sort('id').collect()['id'].to_list()
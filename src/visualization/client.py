@@ -1,5 +1,14 @@
 from graphdatascience import GraphDataScience
+from neo4j import EagerResult
+from typing import Iterator, Optional
+from contextlib import contextmanager
 from os import environ
+import threading
+import pandas as pd
+from ..graphdb.pool import ConnectionPool, Query
+
+def _dataframe(result: EagerResult) -> pd.DataFrame:
+    return pd.DataFrame([record.values() for record in result.records], columns=result.keys)
 
 class Client(object):
     _instance = None
@@ -8,11 +17,11 @@ class Client(object):
         if cls._instance is None:
             cls._instance = super(Client, cls).__new__(cls)
         return cls._instance
-    
+
     def __init__(self):
 
         if not hasattr(self, '_initialized'):
-            
+
             TARGET_ADDRESS = environ.get('TARGET_ADDRESS', 'localhost')
             PORT = environ.get('BOLT_PORT', '7687')
             URI = 'bolt+s://'+TARGET_ADDRESS+':'+PORT
@@ -21,21 +30,60 @@ class Client(object):
             USER = environ.get('CONNECTION_USER', '')
             PW = environ.get('CONNECTION_PASSWORD', '')
 
+            self._pool = None
             self._gds_client = None
+            self._local = threading.local()
             try:
-                self._gds_client = GraphDataScience(
-                    URI, auth=(USER, PW)
-                )
+                # Cypher queries and the GDS client share the pooled driver, see src/graphdb/pool.py
+                self._pool = ConnectionPool(URI, (USER, PW))
+                self._gds_client = GraphDataScience.from_neo4j_driver(self._pool.driver)
                 print("Connected to Neo4j database.")
             except Exception as e:
                 print(f'Error connecting to database: {e}')
+                if self._pool is not None:
+                    self._pool.close()
+                self._pool = None
                 self._gds_client = None
                 raise e
             self._initialized = True
-    
-    def __call__(self, query: str):
+
+    def __call__(self, query: str, parameters: dict | None = None) -> pd.DataFrame:
         try:
-            return self._gds_client.run_cypher(query)
+            return _dataframe(self._pool.read(query, parameters, getattr(self._local, 'timeout', None)))
         except Exception as e:
             print(f'Error executing query: {e}')
-            raise e
\ No newline at end of file
+            raise e
+
+    def profile(self, query: str, parameters: dict | None = None) -> dict:
+        '''
+        Run the query with PROFILE and return its profiled plan, see query_profiles.py.
+        '''
+        try:
+            return self._pool.read('PROFILE ' + query, parameters, getattr(self._local, 'timeout', None)).summary.profile
+        except Exception as e:
+            print(f'Error profiling query: {e}')
+            raise e
+
+    def read_all(self, queries: dict[str, Query], workers: Optional[int] = None) -> dict[str, pd.DataFrame]:
+        '''
+        Run the read queries on parallel sessions, each with the timeout of this thread.
+        @param workers - Number of parallel sessions. Defaults to PoolConfig.read_workers.
+        '''
+        results = self._pool.read_all(queries, workers, getattr(self._local, 'timeout', None))
+        return {name: _dataframe(result) for name, result in results.items()}
+
+    @contextmanager
+    def timeout(self, seconds: Optional[float]) -> Iterator[None]:
+        '''
+        Abort the transactions of the queries run by this thread after the given seconds.
+        '''
+        previous = getattr(self._local, 'timeout', None)
+        self._local.timeout = seconds
+        try:
+            yield
+        finally:
+            self._local.timeout = previous
+
+    @property
+    def gds(self) -> GraphDataScience:
+        return self._gds_client
@@ -0,0 +1,98 @@
+'''
+collaborations.py
+Compute the geographic collaboration tables of any number of institutions, in batches of works.
+
+The works of every institution are split into ranges of ids, and a batch query computes the collaborations of
+the works in one range. The batches of all institutions run in parallel on separate read sessions and their
+partial aggregates are merged here: counts and sums add up, and averages are divided out of the merged sums
+and counts. The merged tables are the same as those of geographic_collaborations and
+geographic_topics_collaborations, with an institution_id column in front.
+'''
+from typing import Optional, TYPE_CHECKING
+import pandas as pd
+from .config import CollaborationFanOutConfig
+from .queries import GEOGRAPHIC_TOPIC_AVERAGES, Statements
+
+if TYPE_CHECKING:
+    from .client import Client
+
+GEOGRAPHIC_KEYS = ['id', 'continent', 'country']
+GEOGRAPHIC_TOPIC_KEYS = ['domain_id', 'domain_display_name', 'field_id', 'field_display_name',
+                         'subfield_id', 'subfield_display_name', 'topic_id', 'topic_display_name',
+                         'country_id', 'continent', 'country_name']
+
+def work_id_ranges(ids: list[str], batch_size: int) -> list[tuple[str, str]]:
+    '''
+    Split the ordered work ids into ranges of at most batch_size ids, as the first and last id of each range.
+    '''
+    return [(ids[start], ids[min(start + batch_size, len(ids)) - 1]) for start in range(0, len(ids), batch_size)]
+
+def merge_geographic_collaborations(partials: list[pd.DataFrame]) -> pd.DataFrame:
+    '''
+    Merge the batches of geographic_collaborations_batch.
+    '''
+    if not partials:
+        return pd.DataFrame(columns=GEOGRAPHIC_KEYS + ['number_of_collaborations'])
+
+    merged = pd.concat(partials, ignore_index=True)\
+        .groupby(GEOGRAPHIC_KEYS, dropna=False, as_index=False)['number_of_collaborations'].sum()
+    return merged.sort_values('number_of_collaborations', ascending=False, kind='stable', ignore_index=True)
+
+def merge_geographic_topics_collaborations(partials: list[pd.DataFrame]) -> pd.DataFrame:
+    '''
+    Merge the batches of geographic_topics_collaborations_batch, averaging the summed work properties.
+    '''
+    averages = [column for _, column in GEOGRAPHIC_TOPIC_AVERAGES]
+    if not partials:
+        return pd.DataFrame(columns=GEOGRAPHIC_TOPIC_KEYS + ['number_of_collaborations'] + averages)
+
+    merged = pd.concat(partials, ignore_index=True)\
+        .groupby(GEOGRAPHIC_TOPIC_KEYS, dropna=False, as_index=False).sum(numeric_only=True)
+
+    for column in averages:
+        sums, counts = column.replace('avg_', 'sum_', 1), column.replace('avg_', 'count_', 1)
+        # avg ignores missing values and is null without any value
+        merged[column] = merged[sums].where(merged[counts] > 0) / merged[counts].where(merged[counts] > 0)
+        merged = merged.drop(columns=[sums, counts])
+
+    return merged.sort_values(['domain_display_name', 'field_display_name', 'subfield_display_name', 'topic_display_name', 'number_of_collaborations'],
+                              ascending=[True, True, True, True, False], kind='stable', ignore_index=True)
+
+def institution_collaborations(client: 'Client',
+                               institution_ids: list[str],
+                               config: Optional[CollaborationFanOutConfig] = None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    '''
+    The geographic collaborations and geographic topic collaborations of every institution.
+    '''
+    config = config or CollaborationFanOutConfig()
+    if not institution_ids:
+        raise Exception('No institutions to compute the collaborations of')
+
+    work_ids = client.read_all({institution: Statements.bind('institution_work_ids', target_id=institution)
+                                for institution in institution_ids}, config.workers)
+
+    batches : dict[str, tuple[str, str]] = {}
+    for institution in institution_ids:
+        ranges = work_id_ranges(work_ids[institution]['id'].tolist(), config.batch_size)
+        print(f'{institution}: {len(work_ids[institution])} works in {len(ranges)} batches')
+        for index, (from_id, to_id) in enumerate(ranges):
+            for kind in ('geographic_collaborations_batch', 'geographic_topics_collaborations_batch'):
+                batches[f'{institution}/{kind}/{index}'] = (institution, kind, Statements.bind(kind, target_id=institution, from_id=from_id, to_id=to_id))
+
+    results = client.read_all({name: query for name, (_, _, query) in batches.items()}, config.workers)
+
+    collaborations, topics_collaborations = [], []
+    for institution in institution_ids:
+        partials = lambda kind: [results[name] for name, (batch_institution, batch_kind, _) in batches.items()
+                                 if batch_institution == institution and batch_kind == kind]
+        collaborations.append(merge_geographic_collaborations(partials('geographic_collaborations_batch'))
+                              .assign(institution_id=institution))
+        topics_collaborations.append(merge_geographic_topics_collaborations(partials('geographic_topics_collaborations_batch'))
+                                     .assign(institution_id=institution))
+
+    def combined(frames: list[pd.DataFrame]) -> pd.DataFrame:
+        # Institutions without works only contribute their columns
+        frame = pd.concat([frame for frame in frames if not frame.empty] or frames[:1], ignore_index=True)
+        return frame[['institution_id'] + [column for column in frame.columns if column != 'institution_id']]
+
+    return combined(collaborations), combined(topics_collaborations)
@@ -1,21 +1,34 @@
+from dataclasses import dataclass, field
 from enum import Enum
+from typing import Optional
 from config import VISUALIZATION_DATA_DIR
 
 class VisualizationDataPaths(Enum):
     '''
-    Enum class containing all the paths for compiled CSV outputs
+    Enum class containing all the paths for compiled aggregate outputs, see aggregate_store.py
     '''
 
-    summary_node_information = VISUALIZATION_DATA_DIR.joinpath("summary_node_information.csv")
-    summary_nodes_by_institution_works = VISUALIZATION_DATA_DIR.joinpath("summary_nodes_institution.csv")
-    summary_nodes_by_institution_authors = VISUALIZATION_DATA_DIR.joinpath("summary_nodes_authors.csv")
-    summary_counts_by_year = VISUALIZATION_DATA_DIR.joinpath("summary_counts_by_year.csv")
+    summary_node_information = VISUALIZATION_DATA_DIR.joinpath("summary_node_information.parquet")
+    summary_nodes_by_institution_works = VISUALIZATION_DATA_DIR.joinpath("summary_nodes_institution.parquet")
+    summary_nodes_by_institution_authors = VISUALIZATION_DATA_DIR.joinpath("summary_nodes_authors.parquet")
+    summary_counts_by_year = VISUALIZATION_DATA_DIR.joinpath("summary_counts_by_year.parquet")
     
-    work_analysis = VISUALIZATION_DATA_DIR.joinpath('work_analysis.csv')
-    author_analysis = VISUALIZATION_DATA_DIR.joinpath('author_analysis.csv')
-    topics_works = VISUALIZATION_DATA_DIR.joinpath('topics_works.csv')
-    geographic_collaborations = VISUALIZATION_DATA_DIR.joinpath('geographic_collaborations.csv')
-    geographic_topics_collaborations = VISUALIZATION_DATA_DIR.joinpath("geographic_topics_collaborations.csv")
+    work_analysis = VISUALIZATION_DATA_DIR.joinpath('work_analysis.parquet')
+    author_analysis = VISUALIZATION_DATA_DIR.joinpath('author_analysis.parquet')
+    topics_works = VISUALIZATION_DATA_DIR.joinpath('topics_works.parquet')
+    topic_rollup = VISUALIZATION_DATA_DIR.joinpath('topic_rollup.parquet')
+    geographic_collaborations = VISUALIZATION_DATA_DIR.joinpath('geographic_collaborations.parquet')
+    geographic_topics_collaborations = VISUALIZATION_DATA_DIR.joinpath("geographic_topics_collaborations.parquet")
+    institution_geographic_collaborations = VISUALIZATION_DATA_DIR.joinpath('institution_geographic_collaborations.parquet')
+    institution_geographic_topics_collaborations = VISUALIZATION_DATA_DIR.joinpath('institution_geographic_topics_collaborations.parquet')
+
+    graph_pagerank = VISUALIZATION_DATA_DIR.joinpath('graph_pagerank.parquet')
+    graph_louvain = VISUALIZATION_DATA_DIR.joinpath('graph_louvain.parquet')
+    graph_node_similarity = VISUALIZATION_DATA_DIR.joinpath('graph_node_similarity.parquet')
+    graph_wcc = VISUALIZATION_DATA_DIR.joinpath('graph_wcc.parquet')
+
+# Run log of the query plans recorded by VisualizationData.profile_queries, see query_profiles.py
+QUERY_PROFILE_LOG = VISUALIZATION_DATA_DIR.joinpath('query_profiles.parquet')
 
 colors =[
     '#0077BB',  # Blue
@@ -38,4 +51,43 @@ colors =[
 
 GRAPH_WIDTH = 750
 GRAPH_HEIGHT = 550
-SFU_TARGET_INSTITUTION_ID = 'I18014758' 
\ No newline at end of file
+SFU_TARGET_INSTITUTION_ID = 'I18014758' 
+@dataclass
+class QueryScheduleConfig:
+    '''
+    Settings for running the aggregation queries concurrently, see schedule.py.
+    @param max_concurrency - Maximum number of queries running at once, each on its own read session.
+    @param timeout - Seconds a query may run before its transaction is aborted. None keeps the timeout of the database.
+    @param timeouts - Timeouts of single queries by name, overriding timeout.
+    '''
+    max_concurrency: int = 4
+    timeout: Optional[float] = 3600.0
+    timeouts: dict[str, float] = field(default_factory=dict)
+
+@dataclass
+class CollaborationFanOutConfig:
+    '''
+    Settings for computing the geographic collaborations of many institutions in batches, see collaborations.py.
+    @param batch_size - Number of works of an institution per batch.
+    @param workers - Number of batches running at once, each on its own read session.
+    '''
+    batch_size: int = 2000
+    workers: int = 8
+
+class AnalyticsBackend(Enum):
+    '''
+    Computes an aggregation query, chosen per query by VisualizationData.
+    '''
+    # The Cypher statement of queries.py, run on the database
+    CYPHER = 'cypher'
+    # Joins over the processed parquet with Polars, see analytics.py
+    POLARS = 'polars'
+
+class GraphAlgorithmMode(Enum):
+    '''
+    How graph_algorithms.py runs a Graph Data Science algorithm.
+    '''
+    # Return the results without changing the database
+    STREAM = 'stream'
+    # Write the results to the database as node properties or relationships, then read them back
+    WRITE = 'write'
@@ -0,0 +1,207 @@
+'''
+graph_algorithms.py
+Run Graph Data Science algorithms on named in-memory projections, through the GDS client of Client.
+
+A projection is created once with a Cypher aggregation and stays in the graph catalog of the database, so later
+runs reuse it until it is dropped or refreshed. Every algorithm runs in stream mode, returning its results, or in
+write mode, writing them to the database and reading them back. Either way the results are saved to the aggregate
+store with the id property of the nodes in place of the internal GDS node ids, and a graph column naming the
+projection.
+'''
+from dataclasses import dataclass
+from typing import Any, Optional, TYPE_CHECKING
+import pandas as pd
+from config import NodeType
+from src.graphdb.conf import ObjectNames
+from src.graphdb.relationships import Relationships
+from .aggregate_store import AggregateStore
+from .config import GraphAlgorithmMode, VisualizationDataPaths
+
+if TYPE_CHECKING:
+    from .client import Client
+
+@dataclass(frozen=True)
+class GraphProjection:
+    '''
+    A named projection of the nodes of one label, built by a Cypher aggregation over $graph_name.
+    @param weight - Relationship property the weighted algorithms use.
+    '''
+    name: str
+    label: str
+    query: str
+    weight: Optional[str] = None
+
+@dataclass(frozen=True)
+class GraphAlgorithm:
+    '''
+    A GDS algorithm and where its results are stored.
+    @param procedure - Name of the algorithm in the GDS client, such as gds.pageRank.
+    @param columns - Columns of the stream results: the node id columns, then the result column.
+    @param write_property - Property written by write mode, prefixed with the projection name.
+    @param write_relationship_type - Relationship type written by write mode, for algorithms relating pairs of nodes.
+    '''
+    procedure: str
+    dataset: VisualizationDataPaths
+    columns: tuple[str, ...]
+    write_property: str
+    weighted: bool = True
+    write_relationship_type: Optional[str] = None
+
+    @property
+    def node_columns(self) -> tuple[str, ...]:
+        return self.columns[:-1]
+
+def institution_collaborations() -> GraphProjection:
+    '''
+    The top level institutions, connected by the number of works they share. Institutions without shared works are
+    projected without relationships.
+    '''
+    sfu_15 = ObjectNames[NodeType.SFU_U15_institution]
+    paper = ObjectNames[NodeType.work]
+    membership = Relationships.RelationshipTypeMap[(NodeType.SFU_U15_institution, NodeType.work)]
+    query = f"""
+    MATCH (source:{sfu_15.name} {{lineage_root: true}})
+    OPTIONAL MATCH (source)-[m:{membership}]->({paper.prefix}:{paper.name})<-[n:{membership}]-(target:{sfu_15.name} {{lineage_root: true}})
+    WHERE source <> target AND m.authorships > 0 AND n.authorships > 0
+    WITH source, target, count({paper.prefix}) AS shared_works
+    RETURN gds.graph.project($graph_name, source, target, {{relationshipProperties: {{shared_works: shared_works}}}})
+    """
+    return GraphProjection('institution_collaborations', sfu_15.name, query, 'shared_works')
+
+def affiliated_institution_collaborations() -> GraphProjection:
+    '''
+    Every affiliated institution, connected to the others by the number of works their authors wrote together.
+    '''
+    afl = ObjectNames[NodeType.affiliated_institution]
+    authorship = ObjectNames[NodeType.authorship]
+    paper = ObjectNames[NodeType.work]
+    affiliation = Relationships.RelationshipTypeMap[(NodeType.authorship, NodeType.affiliated_institution)]
+    on_work = Relationships.RelationshipTypeMap[(NodeType.authorship, NodeType.work)]
+    query = f"""
+    MATCH (source:{afl.name})<-[:{affiliation}]-(:{authorship.name})-[:{on_work}]->({paper.prefix}:{paper.name})<-[:{on_work}]-(:{authorship.name})-[:{affiliation}]->(target:{afl.name})
+    WHERE source <> target
+    WITH source, target, count(DISTINCT {paper.prefix}) AS shared_works
+    RETURN gds.graph.project($graph_name, source, target, {{relationshipProperties: {{shared_works: shared_works}}}})
+    """
+    return GraphProjection('affiliated_institution_collaborations', afl.name, query, 'shared_works')
+
+GraphProjections = {projection.name: projection for projection in [institution_collaborations(), affiliated_institution_collaborations()]}
+
+GraphAlgorithms = {
+    'pagerank': GraphAlgorithm('pageRank', VisualizationDataPaths.graph_pagerank, ('nodeId', 'score'), 'pagerank'),
+    'louvain': GraphAlgorithm('louvain', VisualizationDataPaths.graph_louvain, ('nodeId', 'communityId'), 'community'),
+    'node_similarity': GraphAlgorithm('nodeSimilarity', VisualizationDataPaths.graph_node_similarity, ('node1', 'node2', 'similarity'),
+                                      'similarity', write_relationship_type='SIMILAR'),
+    # Components follow every relationship, whatever its weight
+    'wcc': GraphAlgorithm('wcc', VisualizationDataPaths.graph_wcc, ('nodeId', 'componentId'), 'component', weighted=False)
+}
+
+class GraphAlgorithmRunner:
+    '''
+    Runs the graph algorithms on the projections and stores their results, keeping the projections between runs.
+    '''
+
+    def __init__(self, client: 'Client', store: Optional[AggregateStore] = None, mode: GraphAlgorithmMode = GraphAlgorithmMode.STREAM):
+        '''
+        @param client - Connection to the database, whose GDS client runs the algorithms.
+        @param store - Where the results are written, see aggregate_store.py.
+        @param mode - Stream the results, or write them to the database and read them back.
+        '''
+        self.client = client
+        self.store = store or AggregateStore()
+        self.mode = mode
+        self._projections : dict[str, Any] = {}
+
+    @property
+    def gds(self):
+        return self.client.gds
+
+    def projection(self, projection: GraphProjection, refresh: bool = False):
+        '''
+        The projected graph, from this runner, from the graph catalog, or projected when neither has it.
+        @param refresh - Drop the projection and project it again, after the database changed.
+        '''
+        if refresh:
+            self.drop(projection)
+        if projection.name in self._projections:
+            return self._projections[projection.name]
+
+        if self.gds.graph.exists(projection.name)['exists']:
+            print(f'Reusing projection {projection.name}')
+            graph = self.gds.graph.get(projection.name)
+        else:
+            graph, result = self.gds.graph.cypher.project(projection.query, graph_name=projection.name)
+            print(f"Projected {projection.name}: {result['nodeCount']} nodes and {result['relationshipCount']} relationships in {result['projectMillis']}ms")
+        self._projections[projection.name] = graph
+        return graph
+
+    def drop(self, projection: GraphProjection):
+        self._projections.pop(projection.name, None)
+        if self.gds.graph.exists(projection.name)['exists']:
+            self.gds.graph.drop(projection.name)
+
+    def node_ids(self, node_ids: pd.Series) -> pd.Series:
+        '''
+        The id property of the nodes with the internal GDS node ids.
+        '''
+        ids = self.client("UNWIND $nodeIds AS nodeId RETURN nodeId, gds.util.asNode(nodeId).id AS id",
+                          {'nodeIds': node_ids.drop_duplicates().tolist()})
+        return node_ids.map(dict(zip(ids['nodeId'], ids['id'])))
+
+    def _stream(self, algorithm: GraphAlgorithm, graph, configuration: dict) -> pd.DataFrame:
+        result = getattr(self.gds, algorithm.procedure).stream(graph, **configuration)[list(algorithm.columns)].copy()
+        for column in algorithm.node_columns:
+            result[column] = self.node_ids(result[column])
+        return result
+
+    def _write(self, algorithm: GraphAlgorithm, projection: GraphProjection, graph, configuration: dict) -> pd.DataFrame:
+        property = f'{projection.name}_{algorithm.write_property}'
+        result = algorithm.columns[-1]
+        if algorithm.write_relationship_type is None:
+            getattr(self.gds, algorithm.procedure).write(graph, writeProperty=property, **configuration)
+            return self.client(f"MATCH (n:{projection.label}) WHERE n.{property} IS NOT NULL RETURN n.id AS nodeId, n.{property} AS {result}")
+
+        relationship = f'{projection.name.upper()}_{algorithm.write_relationship_type}'
+        # Relationships written by earlier runs would be counted twice
+        self.gds.run_cypher(f"MATCH (:{projection.label})-[r:{relationship}]->(:{projection.label}) DELETE r")
+        getattr(self.gds, algorithm.procedure).write(graph, writeRelationshipType=relationship, writeProperty=property, **configuration)
+        first, second = algorithm.node_columns
+        return self.client(f"""
+            MATCH (a:{projection.label})-[r:{relationship}]->(b:{projection.label})
+            RETURN a.id AS {first}, b.id AS {second}, r.{property} AS {result}
+            """)
+
+    def run(self, algorithm: GraphAlgorithm, projection: GraphProjection, mode: Optional[GraphAlgorithmMode] = None) -> pd.DataFrame:
+        '''
+        The results of an algorithm on a projection, with the id property of the nodes.
+        @param mode - Defaults to the mode of the runner.
+        '''
+        graph = self.projection(projection)
+        configuration = {'relationshipWeightProperty': projection.weight} if algorithm.weighted and projection.weight else {}
+        if (mode or self.mode) == GraphAlgorithmMode.STREAM:
+            result = self._stream(algorithm, graph, configuration)
+        else:
+            result = self._write(algorithm, projection, graph, configuration)
+
+        result = result.rename(columns={'nodeId': 'id'})
+        result.insert(0, 'graph', projection.name)
+        return result
+
+    def run_all(self,
+                algorithms: Optional[list[str]] = None,
+                projections: Optional[list[str]] = None,
+                mode: Optional[GraphAlgorithmMode] = None,
+                refresh: bool = False):
+        '''
+        Run the algorithms on every projection and store the results of each algorithm.
+        @param algorithms - Names in GraphAlgorithms, all of them by default.
+        @param projections - Names in GraphProjections, all of them by default.
+        @param refresh - Project the graphs again before the first algorithm runs.
+        '''
+        if refresh:
+            for projection in projections or list(GraphProjections):
+                self.drop(GraphProjections[projection])
+        for name in algorithms or list(GraphAlgorithms):
+            algorithm = GraphAlgorithms[name]
+            results = [self.run(algorithm, GraphProjections[projection], mode) for projection in projections or list(GraphProjections)]
+            self.store.save(algorithm.dataset, pd.concat(results, ignore_index=True))
@@ -0,0 +1,521 @@
+'''
+queries.py
+The Cypher statements of the aggregation queries, built once from ObjectNames and the RelationshipTypeMap.
+
+Labels and relationship types are templated into the statements when they are registered. Every value is a
+parameter, such as $target_id and $lineage_root, so the database plans each statement once and reuses the plan
+for every institution. Run warmup at startup to plan the statements before the first query.
+
+The works of an institution are one hop away, over the HAS_AFFILIATED_WORK relationships materialized by
+processing.raw.derive_institution_works. Their authorships property is the number of authorships of the
+institution on the work, which stands in for the paths through the authorships. $include_lineage counts the
+authorships of the institutions in its lineage as well.
+'''
+import re, time
+from dataclasses import dataclass
+from typing import Callable, Iterator
+from config import NodeType
+from src.graphdb.conf import ObjectNames
+from src.graphdb.relationships import Relationships
+from .config import SFU_TARGET_INSTITUTION_ID
+
+_PARAMETER = re.compile(r'\$(\w+)')
+
+# Parameter values used unless the caller binds others
+DEFAULT_PARAMETERS = {
+    'target_id': SFU_TARGET_INSTITUTION_ID,
+    'lineage_root': True,
+    'include_lineage': False
+}
+
+@dataclass(frozen=True)
+class Statement:
+    name: str
+    text: str
+    parameters: tuple[str, ...]
+
+class QueryRegistry:
+    '''
+    Statements registered by name, bound to parameter values when they run.
+    '''
+
+    def __init__(self, defaults: dict):
+        self.defaults = defaults
+        self._statements : dict[str, Statement] = {}
+
+    def register(self, name: str, text: str) -> Statement:
+        if name in self._statements:
+            raise Exception(f'Statement already registered: {name}')
+        statement = Statement(name, text, tuple(dict.fromkeys(_PARAMETER.findall(text))))
+        self._statements[name] = statement
+        return statement
+
+    def __getitem__(self, name: str) -> Statement:
+        return self._statements[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._statements
+
+    def __iter__(self) -> Iterator[Statement]:
+        return iter(self._statements.values())
+
+    def __len__(self) -> int:
+        return len(self._statements)
+
+    def bind(self, name: str, **parameters) -> tuple[str, dict]:
+        '''
+        The text of the statement and the values of its parameters, the defaults unless given.
+        '''
+        statement = self._statements[name]
+        values = {**self.defaults, **parameters}
+        missing = [parameter for parameter in statement.parameters if parameter not in values]
+        if missing:
+            raise Exception(f'Missing parameters for statement {name}: {missing}')
+        return statement.text, {parameter: values[parameter] for parameter in statement.parameters}
+
+Statements = QueryRegistry(DEFAULT_PARAMETERS)
+
+def statement(build: Callable[[], str]) -> Callable[[], str]:
+    '''
+    Register the statement built by the function under its name.
+    '''
+    Statements.register(build.__name__, build())
+    return build
+
+def warmup(read_all: Callable[[dict], dict], registry: QueryRegistry = Statements):
+    '''
+    Plan every statement with EXPLAIN, which compiles and caches the plan without running the query.
+    @param read_all - Runs the named queries concurrently, such as Client.read_all.
+    '''
+    start = time.perf_counter()
+    # Parameters without a default, such as the id range of a batch, are planned without a value
+    read_all({statement.name: ('EXPLAIN ' + statement.text, {parameter: registry.defaults.get(parameter) for parameter in statement.parameters})
+              for statement in registry})
+    print(f'Planned {len(registry)} statements in {time.perf_counter() - start:.1f}s')
+
+def _affiliated_work(institution: str, work: str, membership: str = 'm') -> str:
+    '''
+    Pattern from an institution to one of its works over the materialized membership relationship.
+    '''
+    return f"({institution})-[{membership}:{Relationships.RelationshipTypeMap[(NodeType.SFU_U15_institution, NodeType.work)]}]->({work}:{ObjectNames[NodeType.work].name})"
+
+def _authorships(membership: str = 'm') -> str:
+    '''
+    The authorships of the institution on the work, including those of its lineage with $include_lineage.
+    The work belongs to the institution when there is at least one.
+    '''
+    return f"CASE WHEN $include_lineage THEN {membership}.lineage_authorships ELSE {membership}.authorships END"
+
+@statement
+def target_sfu() -> str:
+    query = f"""
+    MATCH (n: {NodeType.SFU_U15_institution.value})
+    UNWIND keys(n) AS colName
+    RETURN
+        apoc.node.id(n) as nodeId,
+        colName,
+        n[colName] as colValue
+    """
+    return query
+
+@statement
+def summary_node_information() -> str:
+    '''
+    Get the counts of each object type stored in the database.
+    '''
+    query = """
+    CALL apoc.meta.stats()
+    YIELD labels, nodeCount, relCount
+    RETURN labels, nodeCount, relCount
+    """
+    return query
+
+@statement
+def summary_nodes_by_institution() -> str:
+    '''
+    Get some summary data for comparison between institutions
+    '''
+    sfu_15 = ObjectNames[NodeType.SFU_U15_institution]
+    afl = ObjectNames[NodeType.affiliated_institution]
+    authorship = ObjectNames[NodeType.authorship]
+    author = ObjectNames[NodeType.author]
+    paper = ObjectNames[NodeType.work]
+
+    # lineage_root=TRUE since only looking at top level.
+    # Remember that authors not related to the U15+SFU have no been included into the data set
+    # Authorships without that author will simply just point to the institution of note
+    query = f"""
+    MATCH ({sfu_15.prefix}:{sfu_15.name} {{lineage_root: $lineage_root}})
+
+    CALL ({sfu_15.prefix}) {{
+        OPTIONAL MATCH ({sfu_15.prefix})<-[:{Relationships.RelationshipTypeMap[(NodeType.affiliated_institution),(NodeType.SFU_U15_institution)]}]-({afl.prefix}:{afl.name})<-[:{Relationships.RelationshipTypeMap[(NodeType.author, NodeType.affiliated_institution)]}]-({author.prefix}:{author.name})
+        RETURN count(DISTINCT {author.prefix}) AS author_count
+    }}
+
+    CALL({sfu_15.prefix}) {{
+        OPTIONAL MATCH {_affiliated_work(sfu_15.prefix, paper.prefix)}
+        WHERE {_authorships()} > 0
+        RETURN sum({_authorships()}) AS authorship_count, count(DISTINCT {paper.prefix}) AS openalex_paper_count, collect(DISTINCT {paper.prefix}) as works
+    }}
+
+    // Unwind the collected works to count total authorships
+    UNWIND works as work
+    OPTIONAL MATCH (work)<-[:{Relationships.RelationshipTypeMap[(NodeType.authorship),(NodeType.work)]}]-({'t_'+authorship.prefix}:{authorship.name})
+
+    RETURN I, author_count, authorship_count, openalex_paper_count, count(DISTINCT {'t_'+authorship.prefix}) as total_author_count
+    """
+    return query
+
+@statement
+def summary_nodes_by_author() -> str:
+    '''
+    Get information pertaining to authors by institution
+    No need for extended data, because that will be done more in-depth later
+    '''
+
+    author = ObjectNames[NodeType.author]
+    sfu_15 = ObjectNames[NodeType.SFU_U15_institution]
+    afl = ObjectNames[NodeType.affiliated_institution]
+
+    query = f"""
+        MATCH (all_{author.prefix}:{author.name})
+        WHERE all_{author.prefix}.works_count > 0 AND all_{author.prefix}.i10_index IS NOT NULL
+        WITH avg(toFloat(all_{author.prefix}.i10_index) / all_{author.prefix}.works_count) AS global_mean_efficiency,
+            stdev(toFloat(all_{author.prefix}.i10_index) / all_{author.prefix}.works_count) AS global_stdev_efficiency
+
+        MATCH ({sfu_15.prefix}:{sfu_15.name} {{lineage_root: $lineage_root}})
+        OPTIONAL MATCH ({sfu_15.prefix})<-[{afl.prefix}_{sfu_15.prefix}: {Relationships.RelationshipTypeMap[(NodeType.affiliated_institution, NodeType.SFU_U15_institution)]}]-({afl.prefix}:{afl.name})
+        MATCH ({afl.prefix})<-[:{Relationships.RelationshipTypeMap[(NodeType.author, NodeType.affiliated_institution)]}]-({author.prefix}:{author.name})
+        WITH DISTINCT {sfu_15.prefix}, {author.prefix}, global_mean_efficiency, global_stdev_efficiency
+        WHERE {author.prefix}.works_count > 0 AND {author.prefix}.i10_index IS NOT NULL
+
+        WITH {sfu_15.prefix}, {author.prefix},
+            CASE
+            WHEN global_stdev_efficiency > 0 THEN
+                ( (toFloat({author.prefix}.i10_index) / {author.prefix}.works_count) - global_mean_efficiency) / global_stdev_efficiency
+            ELSE 0 // Avoid division by zero if all authors globally have the same efficiency
+            END AS adjusted_i10_score
+
+        RETURN
+            {sfu_15.prefix}.id AS id,
+            {sfu_15.prefix}.display_name AS display_name,
+
+            // The new adjusted score. This will NOT be zero anymore.
+            avg(adjusted_i10_score) AS mean_adjusted_i10_score,
+
+            // Your original metrics, calculated only for the authors at this institution
+            avg({author.prefix}.cited_by_count) AS mean_cited_by_count,
+            avg({author.prefix}.h_index) AS mean_h_index,
+            avg({author.prefix}.i10_index) AS mean_i10_index,
+            avg({author.prefix}.works_count) AS mean_works_count,
+            avg({author.prefix}.`2yr_mean_citedness`) AS mean_2yr_mean_citedness,
+            apoc.agg.median({author.prefix}.cited_by_count) AS median_cited_by_count,
+            apoc.agg.median({author.prefix}.h_index) AS median_h_index,
+            apoc.agg.median({author.prefix}.i10_index) AS median_i10_index,
+            apoc.agg.median({author.prefix}.works_count) AS median_works_count,
+            apoc.agg.median({author.prefix}.`2yr_mean_citedness`) AS median_2yr_mean_citedness        
+    """
+    return query
+
+@statement
+def summary_counts_by_year() -> str:
+    '''
+    Get the number of citations and works by year per institution
+    '''
+
+    sfu15 = ObjectNames[NodeType.SFU_U15_institution]
+    year = ObjectNames[NodeType.year]
+    relName = sfu15.prefix+'_'+year.prefix
+
+    query = f"""
+        MATCH ({sfu15.prefix}:{sfu15.name} {{lineage_root: $lineage_root}})-[{relName}:{Relationships.RelationshipTypeMap[(NodeType.SFU_U15_institution),(NodeType.year)]}]->({year.prefix}:{year.name})
+        RETURN {sfu15.prefix}.id as id, {sfu15.prefix}.display_name as display_name,  {year.prefix}.id as year, {relName}.cited_by_count as cited_by_count, {relName}.works_count as works_count;
+    """
+    return query
+
+@statement
+def works_analysis() -> str:
+    '''
+    Get more in depth information relating to works by institution
+    '''
+
+    sfu_15 = ObjectNames[NodeType.SFU_U15_institution]
+    paper = ObjectNames[NodeType.work]
+
+    query = f"""
+        MATCH ({sfu_15.prefix}:{sfu_15.name} {{lineage_root: $lineage_root}})
+        OPTIONAL MATCH {_affiliated_work(sfu_15.prefix, paper.prefix)}
+        WHERE {_authorships()} > 0
+
+        WITH DISTINCT {sfu_15.prefix}, {paper.prefix}
+
+        RETURN
+            {sfu_15.prefix}.id as id,
+            {sfu_15.prefix}.display_name as display_name,
+            avg({paper.prefix}.countries_distinct_count) as avg_distinct_countries,
+            avg({paper.prefix}.citation_normalized_percentile) as avg_citation_normalized_percentile,
+            avg({paper.prefix}.fwci) as avg_fwci,
+            avg({paper.prefix}.institutions_distinct_count) as avg_distinct_institutions,
+            avg({paper.prefix}.apc_paid) as avg_apc_paid,
+
+            apoc.coll.frequenciesAsMap(collect({paper.prefix}.is_oa)) as is_open_access,
+            apoc.coll.frequenciesAsMap(collect({paper.prefix}.type)) as type,
+            apoc.coll.frequenciesAsMap(collect({paper.prefix}.publication_year)) as total_by_publication_year,
+            apoc.coll.frequenciesAsMap(
+                collect(
+                    CASE
+                        WHEN {paper.prefix}.is_oa = true THEN {paper.prefix}.oa_status
+                        ELSE null
+                    END
+                )
+            ) as open_access_status
+
+    """
+    return query
+
+@statement
+def authors_analysis() -> str:
+    '''
+    Affiliated authors by year
+    Cited by per year
+    Works Count per year
+    '''
+
+    sfu_15 = ObjectNames[NodeType.SFU_U15_institution]
+    afl = ObjectNames[NodeType.affiliated_institution]
+    author = ObjectNames[NodeType.author]
+    year = ObjectNames[NodeType.year]
+    author_afl_rel = author.prefix+'_'+afl.prefix
+    author_year_rel = author.prefix+'_'+year.prefix
+
+    query = f"""
+    MATCH ({sfu_15.prefix}: {sfu_15.name} {{lineage_root: $lineage_root}})
+    OPTIONAL MATCH ({sfu_15.prefix})<-[:{Relationships.RelationshipTypeMap[(NodeType.affiliated_institution),(NodeType.SFU_U15_institution)]}]-({afl.prefix}:{afl.name})<-[{author_afl_rel}:{Relationships.RelationshipTypeMap[(NodeType.author, NodeType.affiliated_institution)]}]-({author.prefix}:{author.name})-[{author_year_rel}:{Relationships.RelationshipTypeMap[(NodeType.author), (NodeType.year)]}]->({year.prefix}:{year.name})
+
+    WITH {sfu_15.prefix},
+        {year.prefix}.id as year,
+        sum({author_year_rel}.works_count) as total_works,
+        sum({author_year_rel}.cited_by_count) as total_citations
+
+    WITH {sfu_15.prefix}, collect(
+        CASE
+            WHEN year IS NOT NULL THEN {{
+                year: year,
+                works_count: total_works,
+                cited_by_count: total_citations
+            }}
+        END
+    ) as author_counts_by_year
+
+    OPTIONAL MATCH ({sfu_15.prefix})<-[:{Relationships.RelationshipTypeMap[(NodeType.affiliated_institution),(NodeType.SFU_U15_institution)]}]-(:{afl.name})<-[{author_afl_rel}:{Relationships.RelationshipTypeMap[(NodeType.author, NodeType.affiliated_institution)]}]-({author.prefix}_2:{author.name})
+
+    UNWIND {author_afl_rel}.years AS affiliation_year
+
+    WITH {sfu_15.prefix}, author_counts_by_year, affiliation_year, count({author_afl_rel}) as count_per_year
+
+    WITH {sfu_15.prefix}, author_counts_by_year, apoc.map.fromPairs(collect([affiliation_year, count_per_year])) as affiliated_per_year
+
+    RETURN 
+        {sfu_15.prefix}.id as id,
+        {sfu_15.prefix}.display_name as display_name,
+        author_counts_by_year,
+        affiliated_per_year
+    """
+    return query
+
+@statement
+def topics_works() -> str:
+    '''
+    Get works data by institution and topic
+
+    Hierarchy is domain -> field -> subfield -> topic
+    '''
+    sfu_15 = ObjectNames[NodeType.SFU_U15_institution]
+    paper = ObjectNames[NodeType.work]
+    topic = ObjectNames[NodeType.topic]
+    subfield = ObjectNames[NodeType.subfield]
+    field = ObjectNames[NodeType.field]
+    domain = ObjectNames[NodeType.domain]
+
+    query = f"""
+        MATCH ({sfu_15.prefix}:{sfu_15.name} {{lineage_root: $lineage_root}})
+        OPTIONAL MATCH {_affiliated_work(sfu_15.prefix, paper.prefix)}-[:{Relationships.RelationshipTypeMap[(NodeType.work), (NodeType.topic)]}]->({topic.prefix}:{topic.name})-[:{Relationships.RelationshipTypeMap[(NodeType.topic), (NodeType.subfield)]}]->({subfield.prefix}:{subfield.name})-[:{Relationships.RelationshipTypeMap[(NodeType.subfield), (NodeType.field)]}]->({field.prefix}:{field.name})-[:{Relationships.RelationshipTypeMap[(NodeType.field), (NodeType.domain)]}]->({domain.prefix}:{domain.name})
+
+        WHERE {_authorships()} > 0
+
+        // Every work counts once per authorship of the institution
+        WITH {sfu_15.prefix}, {domain.prefix}, {field.prefix}, {subfield.prefix}, {topic.prefix}, {paper.prefix}, {_authorships()} AS authorships
+        WITH DISTINCT {sfu_15.prefix}, {domain.prefix}, {field.prefix}, {subfield.prefix}, {topic.prefix},
+            sum(authorships) as total_works,
+            sum({paper.prefix}.countries_distinct_count * authorships) as sum_distinct_countries,
+            sum({paper.prefix}.citation_normalized_percentile * authorships) as sum_citation_normalized_percentile,
+            sum({paper.prefix}.fwci * authorships) as sum_fwci,
+            sum({paper.prefix}.institutions_distinct_count * authorships) as sum_distinct_institutions,
+            sum({paper.prefix}.apc_paid * authorships) as sum_apc_paid
+
+        RETURN 
+            {sfu_15.prefix}.id as id, 
+            {sfu_15.prefix}.display_name as institution_display_name,
+            {domain.prefix}.id as domain_id,
+            {domain.prefix}.display_name as domain_display_name,
+            {field.prefix}.id as field_id,
+            {field.prefix}.display_name as field_display_name,
+            {subfield.prefix}.id as subfield_id,
+            {subfield.prefix}.display_name as subfield_display_name,
+            {topic.prefix}.id as topic_id,
+            {topic.prefix}.display_name as topic_display_name,
+            total_works,
+            sum_distinct_countries,
+            sum_distinct_institutions,
+            sum_fwci,
+            sum_citation_normalized_percentile,
+            sum_apc_paid
+
+    """
+    return query
+
+# Work properties averaged by the geographic topic collaborations, as (property, column)
+GEOGRAPHIC_TOPIC_AVERAGES = (
+    ('countries_distinct_count', 'avg_distinct_countries'),
+    ('citation_normalized_percentile', 'avg_citation_normalized_percentile'),
+    ('fwci', 'avg_fwci'),
+    ('institutions_distinct_count', 'avg_distinct_institutions'),
+    ('apc_paid', 'avg_apc_paid')
+)
+
+def _work_range(work: str, batched: bool) -> str:
+    '''
+    Restrict a batch to the works with ids between $from_id and $to_id.
+    '''
+    return f"AND {work}.id >= $from_id AND {work}.id <= $to_id" if batched else ""
+
+def _geographic_collaborations(batched: bool) -> str:
+    sfu_15 = ObjectNames[NodeType.SFU_U15_institution]
+    afl = ObjectNames[NodeType.affiliated_institution]
+    authorship = ObjectNames[NodeType.authorship]
+    geo = ObjectNames[NodeType.geographic]
+
+    query=f"""
+        MATCH {_affiliated_work(f'{sfu_15.prefix}:{sfu_15.name} {{id: $target_id}}', 'w')}
+        WHERE {_authorships()} > 0 {_work_range('w', batched)}
+
+        MATCH (w)<-[:{Relationships.RelationshipTypeMap[(NodeType.authorship), (NodeType.work)]}]-(:{authorship.name})-[:{Relationships.RelationshipTypeMap[(NodeType.authorship), (NodeType.affiliated_institution)]}]->(collaborating_AFL_INS:{afl.name})-[:{Relationships.RelationshipTypeMap[(NodeType.affiliated_institution), (NodeType.geographic)]}]->({geo.prefix}:{geo.name})
+
+        // The affiliated institution of an institution has the same id
+        WHERE collaborating_AFL_INS.id <> {sfu_15.prefix}.id
+
+        RETURN
+            {geo.prefix}.id as id,
+            {geo.prefix}.continent as continent,
+            {geo.prefix}.country_name AS country,
+            count({geo.prefix}) AS number_of_collaborations
+        ORDER BY number_of_collaborations DESC        
+    """
+    return query
+
+def _geographic_topics_collaborations(batched: bool) -> str:
+    sfu_15 = ObjectNames[NodeType.SFU_U15_institution]
+    afl = ObjectNames[NodeType.affiliated_institution]
+    authorship = ObjectNames[NodeType.authorship]
+    topic = ObjectNames[NodeType.topic]
+    subfield = ObjectNames[NodeType.subfield]
+    field = ObjectNames[NodeType.field]
+    domain = ObjectNames[NodeType.domain]
+    geo = ObjectNames[NodeType.geographic]
+
+    # Batches return the sums and counts behind the averages, which merge across batches
+    if batched:
+        aggregates = ',\n        '.join(f'sum(w.{property}) as {column.replace("avg_", "sum_", 1)}, count(w.{property}) as {column.replace("avg_", "count_", 1)}'
+                                          for property, column in GEOGRAPHIC_TOPIC_AVERAGES)
+        order = ""
+    else:
+        aggregates = ',\n        '.join(f'avg(w.{property}) as {column}' for property, column in GEOGRAPHIC_TOPIC_AVERAGES)
+        order = "ORDER BY\n        domain_display_name, field_display_name, subfield_display_name, topic_display_name, number_of_collaborations DESC"
+
+    query = f"""
+    MATCH {_affiliated_work(f'{sfu_15.prefix}:{sfu_15.name} {{id: $target_id}}', 'w')}
+    WHERE {_authorships()} > 0 {_work_range('w', batched)}
+
+    MATCH (w)-[:{Relationships.RelationshipTypeMap[(NodeType.work), (NodeType.topic)]}]->(t:{topic.name})
+    WITH {sfu_15.prefix}, w, t
+
+    MATCH (w)<-[:{Relationships.RelationshipTypeMap[(NodeType.authorship), (NodeType.work)]}]-(:{authorship.name})-[:{Relationships.RelationshipTypeMap[(NodeType.authorship), (NodeType.affiliated_institution)]}]->(collaborating_AFL_INS:{afl.name})-[:{Relationships.RelationshipTypeMap[(NodeType.affiliated_institution), (NodeType.geographic)]}]->(g:{geo.name})
+
+    WHERE collaborating_AFL_INS.id <> {sfu_15.prefix}.id
+
+    WITH w, t, g
+    MATCH (t)-[:{Relationships.RelationshipTypeMap[(NodeType.topic), (NodeType.subfield)]}]->(sf:{subfield.name})-[:{Relationships.RelationshipTypeMap[(NodeType.subfield), (NodeType.field)]}]->(f:{field.name})-[:{Relationships.RelationshipTypeMap[(NodeType.field), (NodeType.domain)]}]->(d:{domain.name})
+
+    RETURN
+        d.id AS domain_id,
+        d.display_name AS domain_display_name,
+        f.id AS field_id,
+        f.display_name AS field_display_name,
+        sf.id AS subfield_id,
+        sf.display_name AS subfield_display_name,
+        t.id AS topic_id,
+        t.display_name AS topic_display_name,
+        g.id as country_id,
+        g.continent as continent,
+        g.country_name AS country_name,
+        count(g) AS number_of_collaborations,
+        {aggregates}
+    {order}
+    """
+    return query
+
+@statement
+def geographic_collaborations() -> str:
+    '''
+    What institutions and what countries are SFU authors working with?
+    '''
+    return _geographic_collaborations(batched=False)
+
+@statement
+def geographic_topics_collaborations() -> str:
+    '''
+    Collaborating countries of the target institution by topic
+    '''
+    return _geographic_topics_collaborations(batched=False)
+
+@statement
+def institution_ids() -> str:
+    '''
+    The top level institutions, whose collaborations can be compared.
+    '''
+    sfu_15 = ObjectNames[NodeType.SFU_U15_institution]
+    query = f"""
+    MATCH ({sfu_15.prefix}:{sfu_15.name} {{lineage_root: $lineage_root}})
+    RETURN {sfu_15.prefix}.id AS id
+    ORDER BY id
+    """
+    return query
+
+@statement
+def institution_work_ids() -> str:
+    '''
+    The ids of the works of the target institution, in order, to split into batches.
+    '''
+    sfu_15 = ObjectNames[NodeType.SFU_U15_institution]
+    paper = ObjectNames[NodeType.work]
+    query = f"""
+    MATCH {_affiliated_work(f':{sfu_15.name} {{id: $target_id}}', paper.prefix)}
+    WHERE {_authorships()} > 0
+    RETURN {paper.prefix}.id AS id
+    ORDER BY id
+    """
+    return query
+
+@statement
+def geographic_collaborations_batch() -> str:
+    '''
+    geographic_collaborations for the works of the target institution between $from_id and $to_id.
+    '''
+    return _geographic_collaborations(batched=True)
+
+@statement
+def geographic_topics_collaborations_batch() -> str:
+    '''
+    geographic_topics_collaborations for the works of the target institution between $from_id and $to_id.
+    '''
+    return _geographic_topics_collaborations(batched=True)
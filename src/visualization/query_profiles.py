@@ -0,0 +1,182 @@
+'''
+query_profiles.py
+Record the PROFILE plans of the aggregation queries, and compare the plans of two runs.
+
+Every query is run once with PROFILE, and each operator of its plan is appended to a parquet run log with its db
+hits, rows and page cache hits and misses. An operator is identified by its path in the plan: the root is 0, its
+children 0.0 and 0.1, and so on. The operators of two runs are matched by query, path and operator type, so the
+diff shows which operators grew after a schema or index change, and which appeared or disappeared from the plan.
+
+Compare the latest two runs of a run log from the command line with:
+    python -m src.visualization.query_profiles <run_log.parquet> [--baseline <run_id>] [--run <run_id>] [--min-growth <db hits>]
+'''
+import argparse, datetime, time, uuid
+from pathlib import Path
+from typing import Optional, TYPE_CHECKING
+import polars as pl
+from ..utils.run_log import append_run, run_ids
+
+if TYPE_CHECKING:
+    from .client import Client
+
+plan_log_schema = pl.Schema({
+    'run_id': pl.String,
+    'started': pl.Datetime('us'),
+    'query': pl.String,
+    'wall_time': pl.Float64,
+    'path': pl.String,
+    'depth': pl.Int32,
+    'operator': pl.String,
+    'details': pl.String,
+    'identifiers': pl.String,
+    'db_hits': pl.Int64,
+    'rows': pl.Int64,
+    'page_cache_hits': pl.Int64,
+    'page_cache_misses': pl.Int64,
+    'time': pl.Int64
+})
+
+def plan_operators(profile: dict, path: str = '0', depth: int = 0) -> list[dict]:
+    '''
+    The operators of a profiled plan, as returned in the summary of the driver, in depth first order.
+    '''
+    arguments = profile.get('args', {})
+    operator = {
+        'path': path,
+        'depth': depth,
+        # Operator types carry the runtime, such as Expand(All)@neo4j
+        'operator': profile['operatorType'].split('@')[0],
+        'details': arguments.get('Details'),
+        'identifiers': ', '.join(sorted(profile.get('identifiers', []))),
+        'db_hits': profile.get('dbHits', 0),
+        'rows': profile.get('rows', 0),
+        'page_cache_hits': profile.get('pageCacheHits', 0),
+        'page_cache_misses': profile.get('pageCacheMisses', 0),
+        'time': profile.get('time')
+    }
+    return [operator] + [child_operator for index, child in enumerate(profile.get('children', []))
+                         for child_operator in plan_operators(child, f'{path}.{index}', depth + 1)]
+
+class PlanProfiler:
+    '''
+    Runs queries with PROFILE and collects the operators of their plans, then appends them to a parquet run log.
+    '''
+
+    def __init__(self, client: 'Client', run_log: Optional[Path] = None):
+        '''
+        @param client - Runs the profiled queries, see Client.profile.
+        @param run_log - Parquet file the operators of every run are appended to.
+        '''
+        self.client = client
+        self.run_log = run_log
+        self.run_id = uuid.uuid4().hex
+        self.records : list[dict] = []
+
+    def profile(self, name: str, query: str, parameters: Optional[dict] = None) -> pl.DataFrame:
+        '''
+        Run the query with PROFILE and record the operators of its plan under the name.
+        '''
+        started = datetime.datetime.now()
+        start = time.perf_counter()
+        profile = self.client.profile(query, parameters)
+        wall_time = time.perf_counter() - start
+
+        records = [{'run_id': self.run_id, 'started': started, 'query': name, 'wall_time': wall_time, **operator}
+                   for operator in plan_operators(profile)]
+        self.records.extend(records)
+        return pl.DataFrame(records, schema=plan_log_schema)
+
+    def to_dataframe(self) -> pl.DataFrame:
+        return pl.DataFrame(self.records, schema=plan_log_schema)
+
+    def save(self):
+        '''
+        Append the operators of this run to the run log.
+        '''
+        append_run(self.run_log, self.to_dataframe(), 'query plans', self.run_id)
+
+def plan_totals(data: pl.DataFrame) -> pl.DataFrame:
+    '''
+    The db hits, page cache hits and misses of every query of every run, with the rows it returned.
+    '''
+    return data.group_by(['run_id', 'query'], maintain_order=True)\
+        .agg(
+            pl.col('started').first(),
+            pl.col('wall_time').first(),
+            pl.col('db_hits').sum(),
+            pl.col('rows').filter(pl.col('path') == '0').first(),
+            pl.col('page_cache_hits').sum(),
+            pl.col('page_cache_misses').sum()
+        )
+
+def diff_plans(baseline: pl.DataFrame, current: pl.DataFrame, min_growth: int = 0) -> pl.DataFrame:
+    '''
+    The operators whose db hits grew by more than min_growth from the baseline run to the current run, the largest
+    growth first. Operators only in the current plan grow from 0, those only in the baseline plan are not listed.
+    '''
+    columns = ['query', 'path', 'operator', 'details', 'db_hits', 'rows']
+    return current.select(columns)\
+        .join(baseline.select(columns), on=['query', 'path', 'operator'], how='left', suffix='_baseline')\
+        .select(
+            'query', 'path', 'operator', 'details',
+            pl.col('db_hits_baseline'),
+            pl.col('db_hits'),
+            (pl.col('db_hits') - pl.col('db_hits_baseline').fill_null(0)).alias('growth'),
+            pl.col('rows_baseline'),
+            pl.col('rows')
+        )\
+        .filter(pl.col('growth') > min_growth)\
+        .sort(['growth', 'query', 'path'], descending=[True, False, False])
+
+def removed_operators(baseline: pl.DataFrame, current: pl.DataFrame) -> pl.DataFrame:
+    '''
+    The operators of the baseline plans that are not in the current plans.
+    '''
+    return baseline.join(current, on=['query', 'path', 'operator'], how='anti')\
+        .select('query', 'path', 'operator', 'details', 'db_hits')
+
+def format_plan(data: pl.DataFrame) -> str:
+    '''
+    The operator tree of the plan of one query, with the db hits and rows of every operator.
+    '''
+    return '\n'.join(f"{'  ' * row['depth']}{row['operator']} {row['details'] or ''} (db hits: {row['db_hits']:,}, rows: {row['rows']:,})"
+                     for row in data.iter_rows(named=True))
+
+def summarize(baseline: pl.DataFrame, current: pl.DataFrame, min_growth: int = 0) -> str:
+    totals = plan_totals(baseline).select('query', pl.col('db_hits').alias('baseline'))\
+        .join(plan_totals(current).select('query', 'db_hits'), on='query', how='full', coalesce=True)
+
+    header = f"{'query':<40} {'baseline db hits':>18} {'db hits':>14} {'change':>8}"
+    lines = [header, '-' * len(header)]
+    for row in totals.sort('query').iter_rows(named=True):
+        change = f"{(row['db_hits'] / row['baseline'] - 1) * 100:>+7.1f}%" if row['baseline'] and row['db_hits'] is not None else f"{'':>8}"
+        lines.append(f"{row['query']:<40} {row['baseline'] or 0:>18,} {row['db_hits'] or 0:>14,} {change}")
+
+    grown = diff_plans(baseline, current, min_growth)
+    lines += ['', f"Operators whose db hits grew by more than {min_growth:,}:"]
+    for row in grown.iter_rows(named=True):
+        before = 'new' if row['db_hits_baseline'] is None else f"{row['db_hits_baseline']:,}"
+        lines.append(f"  {row['query']} {row['path']} {row['operator']} {row['details'] or ''}: {before} -> {row['db_hits']:,} (+{row['growth']:,})")
+
+    removed = removed_operators(baseline, current)
+    if not removed.is_empty():
+        lines += ['', 'Operators no longer in the plans:']
+        lines += [f"  {row['query']} {row['path']} {row['operator']} {row['details'] or ''}" for row in removed.iter_rows(named=True)]
+    return '\n'.join(lines)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the db hits of the query plans of two runs.')
+    parser.add_argument('run_log', type=Path)
+    parser.add_argument('--baseline', help='Run id to compare against. Defaults to the run before the compared run.')
+    parser.add_argument('--run', help='Run id to compare. Defaults to the latest run.')
+    parser.add_argument('--min-growth', type=int, default=0)
+    args = parser.parse_args()
+
+    log = pl.read_parquet(args.run_log)
+    runs = run_ids(log)
+    run_id = args.run or runs[-1]
+    if args.baseline is None and runs.index(run_id) == 0:
+        raise Exception(f'No earlier run to compare run {run_id} with')
+    baseline_id = args.baseline or runs[runs.index(run_id) - 1]
+    print(f'Baseline: {baseline_id}, run: {run_id}')
+    print(summarize(log.filter(pl.col('run_id') == baseline_id), log.filter(pl.col('run_id') == run_id), args.min_growth))
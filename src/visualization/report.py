@@ -7,9 +7,9 @@ from .visualization_data import VisualizationData, GraphVisualization, Visualiza
 import pandas as pd
 from config import NodeType
 from .config import VisualizationDataPaths, SFU_TARGET_INSTITUTION_ID
+from .aggregate_store import AggregateStore
 import holoviews as hv
 from . import css
-from ast import literal_eval
 from math import floor
 from bokeh.models.widgets.tables import NumberFormatter
 
@@ -27,17 +27,25 @@ def custom_number_format(number):
     
 graph_viz = GraphVisualization()
 
+# Aggregates read by the pages of the report
+REPORT_AGGREGATES = (
+    VisualizationDataPaths.summary_node_information,
+    VisualizationDataPaths.summary_nodes_by_institution_works,
+    VisualizationDataPaths.summary_nodes_by_institution_authors,
+    VisualizationDataPaths.summary_counts_by_year,
+    VisualizationDataPaths.work_analysis,
+    VisualizationDataPaths.author_analysis,
+    VisualizationDataPaths.topic_rollup,
+    VisualizationDataPaths.geographic_topics_collaborations
+)
+
 class Report():
 
     def _introduction_section(self):
         '''
         Opening section that provides basic details.
         '''
-        summary_node_information = pd.read_csv(VisualizationDataPaths.summary_node_information.value)
-
-        labels : dict = literal_eval(summary_node_information['labels'].iloc[0])
-        node_count : int = summary_node_information['nodeCount'].iloc[0]
-        relationship_count: int = summary_node_information['relCount'].iloc[0] 
+        labels, node_count, relationship_count = self.store.node_labels()
         
         return pn.Column(
             pn.pane.Markdown(
@@ -75,7 +83,7 @@ class Report():
 
         def work_comparison():
             # For each SFU + U15, numbers for each role
-            information = pd.read_csv(VisualizationDataPaths.summary_nodes_by_institution_works.value)
+            information = self.store.load(VisualizationDataPaths.summary_nodes_by_institution_works)
             
             U15_information = information[information['id'] != SFU_TARGET_INSTITUTION_ID]
             SFU_information = information[information['id'] == SFU_TARGET_INSTITUTION_ID]
@@ -151,7 +159,7 @@ class Report():
             
 
         def author_comparison():
-            information = pd.read_csv(VisualizationDataPaths.summary_nodes_by_institution_authors.value)
+            information = self.store.load(VisualizationDataPaths.summary_nodes_by_institution_authors)
             U15_information = information[information['id'] != SFU_TARGET_INSTITUTION_ID]
             SFU_information = information[information['id'] == SFU_TARGET_INSTITUTION_ID]
 
@@ -258,7 +266,7 @@ class Report():
         
         def general_output_over_time():
 
-            df = pd.read_csv(VisualizationDataPaths.summary_counts_by_year.value)
+            df = self.store.load(VisualizationDataPaths.summary_counts_by_year)
 
             target_columns = ['works_count', 'cited_by_count']
 
@@ -393,16 +401,17 @@ class Report():
                     Institutions -> bar
             '''
 
-            df = pd.read_csv(VisualizationDataPaths.work_analysis.value)
+            df = self.store.load(VisualizationDataPaths.work_analysis)
 
 
             '''
             Categorical Dataframe
             '''
 
+            # The maps are loaded as dictionaries
             categorical_columns = ['type', 'is_open_access', 'open_access_status']
             for category in categorical_columns:
-                df[category] = df[category].apply(literal_eval).fillna(0)
+                df[category] = df[category].fillna(0)
 
             categorical = pn.Column(
                 graph_viz.create_choice_graph(
@@ -430,16 +439,7 @@ class Report():
             '''
             Over Time
             '''
-            temporal_columns = ['total_by_publication_year']
-            local_df = df.copy(deep=True)
-            local_df = local_df[['id', 'display_name', 'total_by_publication_year']]
-            publication_data = local_df['total_by_publication_year'].apply(literal_eval)
-            local_df.loc[:,'year'] = [list(d.keys()) for d in publication_data]
-            local_df.loc[:,'total'] = [list(d.values()) for d in publication_data]
-            local_df = local_df.drop(columns=temporal_columns)
-
-            publication_data = local_df.explode(['year', 'total'])
-            publication_data['year'] = publication_data['year'].apply(literal_eval)
+            publication_data = self.store.works_by_publication_year()
 
             # Filter out all years before 2000
             publication_data = publication_data[(publication_data['year'] >=2000)&(publication_data['year']<2025)]
@@ -592,15 +592,7 @@ class Report():
                 )
 
             def works_composition_temporal_markdown():
-                local_df = df.copy(deep=True)
-                local_df = local_df[['id', 'display_name', 'total_by_publication_year']]
-                publication_data = local_df['total_by_publication_year'].apply(literal_eval)
-                local_df.loc[:,'year'] = [list(d.keys()) for d in publication_data]
-                local_df.loc[:,'total'] = [list(d.values()) for d in publication_data]
-                local_df = local_df.drop(columns=temporal_columns)
-
-                publication_data = local_df.explode(['year', 'total'])
-                publication_data['year'] = publication_data['year'].apply(literal_eval)
+                publication_data = self.store.works_by_publication_year()
 
                 # Filter out all years before 2000
                 publication_data = publication_data[(publication_data['year'] >=2000)&(publication_data['year']<2025)]
@@ -653,37 +645,12 @@ class Report():
             affiliated per year
             '''
             
-            df = pd.read_csv(VisualizationDataPaths.author_analysis.value)
-
             # Split the dataframe in two due to large discrepancy between year values
-
-            # author_counts_by_year is nested list
-            authors_by_year = df.copy(deep=True)
-            authors_by_year['author_counts_by_year'] = authors_by_year['author_counts_by_year'].apply(literal_eval)
-
-            authors_by_year = authors_by_year[['id','display_name', 'author_counts_by_year']].to_dict('records')
-
-            authors_by_year = pd.json_normalize(
-                authors_by_year,
-                record_path='author_counts_by_year',
-                meta=['id', 'display_name']
-            )
-
+            authors_by_year = self.store.authors_by_year()
             authors_by_year = authors_by_year[authors_by_year['year'] < 2025]
 
-            # Split them because of the timeframe distance
-            affiliated_per_year = df.copy(deep=True)
-            affiliated_per_year = affiliated_per_year[['id', 'display_name', 'affiliated_per_year']]
-            affiliated_data = affiliated_per_year['affiliated_per_year'].apply(literal_eval)
-
-            affiliated_per_year.loc[:, 'year'] = [list(d.keys()) for d in affiliated_data]
-            affiliated_per_year.loc[:, 'affiliations'] = [list(d.values()) for d in affiliated_data]
-
-            affiliated_per_year = affiliated_per_year.drop(columns=['affiliated_per_year'])
-            affiliated_per_year = affiliated_per_year.explode(['year', 'affiliations'])
-
-            # Filter out affiliations before 2000
-            affiliated_per_year['year'] = affiliated_per_year['year'].apply(literal_eval)
+            # Split them because of the timeframe distance, filter out affiliations before 2000
+            affiliated_per_year = self.store.affiliations_by_year()
             affiliated_per_year = affiliated_per_year[(affiliated_per_year['year'] >= 2000)&(affiliated_per_year['year'] < 2025)]
 
             authors = graph_viz.create_choice_graph(
@@ -807,88 +774,8 @@ class Report():
             Overview + filtering based on topics
             '''
 
-            def process_topics_dataframes():
-                '''
-                Will break down the topics dataframe and return corresponding dataframes for each level in the hierarchy
-                '''
-                df = pd.read_csv(VisualizationDataPaths.topics_works.value)
-
-
-                metric_cols = ['sum_distinct_countries', 'sum_distinct_institutions', 'sum_fwci', 'sum_citation_normalized_percentile', 'sum_apc_paid']
-                topics = df.copy(deep=True)[['id', 'institution_display_name', 
-                                            'subfield_id', 'subfield_display_name',
-                                            'topic_id', 'topic_display_name',
-                                            'total_works',
-                                            'sum_distinct_countries',
-                                            'sum_distinct_institutions',
-                                            'sum_fwci',
-                                            'sum_citation_normalized_percentile',
-                                            'sum_apc_paid'
-                                            ]]
-
-                averaged_cols = ['avg_distinct_countries', 'avg_distinct_institutions', 'avg_fwci', 'avg_citation_normalized_percentile', 'avg_apc_paid']
-                for i in range(len(metric_cols)):
-                    topics[averaged_cols[i]] = topics[metric_cols[i]]/topics['total_works']
-                    topics = topics.drop(columns=[metric_cols[i]])
-                topics = topics.reset_index()
-
-                subfields = df.copy(deep=True)[['id', 'institution_display_name',
-                                                'field_id', 'field_display_name',
-                                            'subfield_id', 'subfield_display_name',
-                                            'total_works',
-                                            'sum_distinct_countries',
-                                            'sum_distinct_institutions',
-                                            'sum_fwci',
-                                            'sum_citation_normalized_percentile',
-                                            'sum_apc_paid'
-                                            ]]
-
-                subfields = subfields.groupby(['id', 'institution_display_name', 'field_id', 'field_display_name', 'subfield_id', 'subfield_display_name']).agg('sum')
-                for i in range(len(metric_cols)):
-                    subfields[averaged_cols[i]] = subfields[metric_cols[i]]/subfields['total_works']
-                    subfields = subfields.drop(columns=[metric_cols[i]])
-                subfields = subfields.reset_index()
-
-                fields = df.copy(deep=True)[['id', 'institution_display_name',
-                                            'domain_id', 'domain_display_name',
-                                            'field_id', 'field_display_name',
-                                            'total_works',
-                                            'sum_distinct_countries',
-                                            'sum_distinct_institutions',
-                                            'sum_fwci',
-                                            'sum_citation_normalized_percentile',
-                                            'sum_apc_paid'
-                                            ]]
-
-                fields_group = fields.groupby(['id', 'institution_display_name', 'domain_id', 'domain_display_name', 'field_id', 'field_display_name'])
-                fields = fields_group.agg('sum')
-                for i in range(len(metric_cols)):
-                    fields[averaged_cols[i]] = fields[metric_cols[i]]/fields['total_works']
-                    fields = fields.drop(columns=[metric_cols[i]])
-                fields = fields.reset_index()
-
-                domains = df.copy(deep=True)[['id', 'institution_display_name', 
-                                            'domain_id', 'domain_display_name',
-                                            'total_works',
-                                            'sum_distinct_countries',
-                                            'sum_distinct_institutions',
-                                            'sum_fwci',
-                                            'sum_citation_normalized_percentile',
-                                            'sum_apc_paid'
-                                            ]]
-
-                domains = domains.groupby(['id', 'institution_display_name', 'domain_id', 'domain_display_name']).agg('sum')
-                for i in range(len(metric_cols)):
-                    domains[averaged_cols[i]] = domains[metric_cols[i]]/domains['total_works']
-                    domains = domains.drop(columns=[metric_cols[i]])
-                domains = domains.reset_index()
-                
-                return {
-                    'domain': domains, 
-                    'field': fields, 
-                    'subfield':subfields, 
-                    'topic': topics
-                }
+            # Topic rollup of every level, computed once when the topics are aggregated
+            cube = self.store.topic_cube()
             
             def topic_overview():
                 '''
@@ -897,13 +784,7 @@ class Report():
 
                 topic_app = graph_viz.topic_hierarchy(
                     graph_types=[VisualizationType.BAR_CHART, VisualizationType.BUBBLE_CHART, VisualizationType.PIE_CHART],
-                    dataframes=process_topics_dataframes(),
-                    filters=[
-                        ('domain_display_name', 'domain_id'),
-                        ('field_display_name', 'field_id'),
-                        ('subfield_display_name', 'subfield_id'),
-                        ('topic_display_name', 'topic_id'),
-                    ]
+                    cube=cube
                 )
 
                 return topic_app.layout()
@@ -944,18 +825,11 @@ class Report():
                     return f"<ul>{list_items}</ul>"
                 
             def topics_composition_markdown():
-                dataframes = process_topics_dataframes()
-
-                domain = dataframes['domain']
-                field = dataframes['field']
-                subfield = dataframes['subfield']
-                topic = dataframes['topic']
-
                 # Only look at SFU for all of them
-                domain = domain[domain['id']==SFU_TARGET_INSTITUTION_ID]
-                field = field[field['id']==SFU_TARGET_INSTITUTION_ID]
-                subfield = subfield[subfield['id']==SFU_TARGET_INSTITUTION_ID]
-                topic = topic[topic['id']==SFU_TARGET_INSTITUTION_ID]
+                domain = cube.institution('domain', SFU_TARGET_INSTITUTION_ID)
+                field = cube.institution('field', SFU_TARGET_INSTITUTION_ID)
+                subfield = cube.institution('subfield', SFU_TARGET_INSTITUTION_ID)
+                topic = cube.institution('topic', SFU_TARGET_INSTITUTION_ID)
                 
                 return pn.Column(
                     pn.pane.Markdown("### Total Works"),
@@ -1070,8 +944,7 @@ class Report():
         '''
         Detail the collaborations between SFU and other institutions
         '''
-        path = VisualizationDataPaths.geographic_topics_collaborations.value
-        df = pd.read_csv(path)
+        df = self.store.load(VisualizationDataPaths.geographic_topics_collaborations)
 
         df = df[['country_id', 'country_name',
                 'number_of_collaborations',
@@ -1381,7 +1254,7 @@ class Report():
 
             ### Utilizing the Graph Database
 
-            The parquet data is imported into the Neo4J graph database using the APOC plugin. The data is the grouped and analysed within the database. The data used for data visualization is saved in .csv format locally as running the Cypher queries can take some time. 
+            The parquet data is imported into the Neo4J graph database using the APOC plugin. The data is the grouped and analysed within the database. The data used for data visualization is saved locally as typed Parquet files in visualization_data, as running the Cypher queries can take some time. They are computed again with VisualizationData.query_all_information, and the report lists any of them that were computed by earlier versions of the queries. 
             """)
         )
     
@@ -1391,6 +1264,12 @@ class Report():
 
     def __init__(self):
 
+        self.store = AggregateStore()
+        outdated = self.store.outdated(REPORT_AGGREGATES)
+        if outdated:
+            print('Aggregates missing or not computed by the current queries, compute them with VisualizationData.query_all_information: '
+                  + ', '.join(dataset.name for dataset in outdated))
+
         self.pages = {
             "Introduction": self.introduction_page,
             "General Comparison": self.general_comparison_page,
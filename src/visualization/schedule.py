@@ -0,0 +1,156 @@
+'''
+schedule.py
+Run the aggregation queries concurrently while respecting the dependencies between them.
+
+Every query runs on its own read session, at most max_concurrency at once. A query starts as soon as the queries it
+depends on have finished, the longest queries are listed first so they start first, and the total time approaches
+that of the slowest query. A query that runs past its timeout is reported as timed out and the queries depending
+on it are skipped. The database aborts its transaction once the timeout passed, and a query that does not run on the
+database is cancelled: it raises QueryCancelled at the next raise_if_cancelled, e.g. before writing its results.
+'''
+import threading, time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Callable, Optional
+from .config import QueryScheduleConfig
+
+class QueryStatus(Enum):
+    FINISHED = 'finished'
+    FAILED = 'failed'
+    TIMED_OUT = 'timed out'
+    SKIPPED = 'skipped'
+
+class QueryCancelled(Exception):
+    pass
+
+# The cancellation event of the scheduled query running on each thread
+_current = threading.local()
+
+def raise_if_cancelled():
+    '''
+    Raise QueryCancelled when the scheduled query running on this thread timed out.
+    '''
+    cancelled = getattr(_current, 'cancelled', None)
+    if cancelled is not None and cancelled.is_set():
+        raise QueryCancelled('The query timed out')
+
+@dataclass
+class ScheduledQuery:
+    '''
+    @param run - Runs the query with the timeout of its transaction.
+    @param depends_on - Names of the queries that must have finished before this one starts.
+    '''
+    name: str
+    run: Callable[[Optional[float]], None]
+    depends_on: tuple[str, ...] = ()
+
+@dataclass
+class QueryOutcome:
+    name: str
+    status: QueryStatus
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+@dataclass
+class _Running:
+    query: ScheduledQuery
+    timeout: Optional[float]
+    started: list[float] = field(default_factory=list)
+    cancelled: threading.Event = field(default_factory=threading.Event)
+
+def validate_schedule(queries: list[ScheduledQuery]):
+    '''
+    Raise when a dependency is unknown or the dependencies form a cycle.
+    '''
+    names = {query.name for query in queries}
+    if len(names) != len(queries):
+        raise Exception('Scheduled query names must be unique')
+
+    for query in queries:
+        unknown = set(query.depends_on) - names
+        if unknown:
+            raise Exception(f'Query {query.name} depends on unknown queries: {sorted(unknown)}')
+
+    remaining = {query.name: set(query.depends_on) for query in queries}
+    while remaining:
+        ready = [name for name, depends_on in remaining.items() if not depends_on & remaining.keys()]
+        if not ready:
+            raise Exception(f'The dependencies of the queries form a cycle: {sorted(remaining)}')
+        for name in ready:
+            del remaining[name]
+
+def run_schedule(queries: list[ScheduledQuery], config: Optional[QueryScheduleConfig] = None) -> dict[str, QueryOutcome]:
+    '''
+    Run the queries, at most config.max_concurrency at once, in list order once their dependencies finished.
+    Returns the outcome of every query by name.
+    '''
+    config = config or QueryScheduleConfig()
+    validate_schedule(queries)
+
+    outcomes : dict[str, QueryOutcome] = {}
+    pending = list(queries)
+    running : dict[Future, _Running] = {}
+    lock = threading.Lock()
+
+    def execute(entry: _Running):
+        with lock:
+            entry.started.append(time.perf_counter())
+        _current.cancelled = entry.cancelled
+        try:
+            entry.query.run(entry.timeout)
+        finally:
+            _current.cancelled = None
+
+    def finish(entry: _Running, status: QueryStatus, error: Optional[str] = None):
+        seconds = time.perf_counter() - entry.started[0] if entry.started else 0.0
+        outcomes[entry.query.name] = QueryOutcome(entry.query.name, status, seconds, error)
+        print(f'{status.value.capitalize()} {entry.query.name} after {seconds:.1f}s' + (f': {error}' if error else ''))
+
+    executor = ThreadPoolExecutor(max_workers=config.max_concurrency)
+    try:
+        while pending or running:
+            # Skip the queries whose dependencies did not finish
+            for query in list(pending):
+                failed = [name for name in query.depends_on if name in outcomes and outcomes[name].status != QueryStatus.FINISHED]
+                if failed:
+                    pending.remove(query)
+                    outcomes[query.name] = QueryOutcome(query.name, QueryStatus.SKIPPED, error=f'dependencies did not finish: {failed}')
+                    print(f'Skipped {query.name}, dependencies did not finish: {failed}')
+
+            for query in list(pending):
+                if len(running) >= config.max_concurrency:
+                    break
+                if all(name in outcomes for name in query.depends_on):
+                    pending.remove(query)
+                    entry = _Running(query, config.timeouts.get(query.name, config.timeout))
+                    print(f'Starting {query.name}.')
+                    running[executor.submit(execute, entry)] = entry
+
+            if not running:
+                continue
+
+            now = time.perf_counter()
+            with lock:
+                deadlines = [entry.started[0] + entry.timeout - now for entry in running.values() if entry.timeout is not None and entry.started]
+            done, _ = wait(running.keys(), timeout=max(min(deadlines), 0) if deadlines else None, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                entry = running.pop(future)
+                error = future.exception()
+                finish(entry, QueryStatus.FAILED if error is not None else QueryStatus.FINISHED, str(error) if error is not None else None)
+
+            now = time.perf_counter()
+            with lock:
+                expired = [future for future, entry in running.items()
+                           if entry.timeout is not None and entry.started and now - entry.started[0] >= entry.timeout]
+            for future in expired:
+                entry = running.pop(future)
+                entry.cancelled.set()
+                finish(entry, QueryStatus.TIMED_OUT, f'exceeded the timeout of {entry.timeout}s')
+    finally:
+        for entry in running.values():
+            entry.cancelled.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return outcomes
@@ -2,16 +2,22 @@
 Retrieve and format extracted data for later usage
 '''
 
-from ast import literal_eval
-import math
+import math, time
 from .client import Client
 from config import NodeType, VISUALIZATION_DATA_DIR, SFU_RED, institution_abbreviations
-from .config import VisualizationDataPaths, colors as config_colors, GRAPH_HEIGHT, GRAPH_WIDTH, SFU_TARGET_INSTITUTION_ID
+from .config import VisualizationDataPaths, colors as config_colors, GRAPH_HEIGHT, GRAPH_WIDTH, SFU_TARGET_INSTITUTION_ID, QueryScheduleConfig, CollaborationFanOutConfig, AnalyticsBackend, GraphAlgorithmMode, QUERY_PROFILE_LOG
+from .aggregate_store import AggregateStore, TopicCube, topic_rollup
+from .analytics import ParquetAnalytics
+from .collaborations import institution_collaborations
+from .graph_algorithms import GraphAlgorithmRunner
+from .query_profiles import PlanProfiler
+from .queries import Statements, warmup as warmup_statements
+from .schedule import QueryOutcome, QueryStatus, ScheduledQuery, raise_if_cancelled, run_schedule
 import pandas as pd
 from src.graphdb.conf import ObjectNames
-from src.graphdb.relationships import Relationships
 from enum import Enum
-from typing import Iterable
+from pathlib import Path
+from typing import Callable, Iterable, Optional
 import panel as pn
 from panel.pane import ECharts
 import numpy as np
@@ -41,20 +47,60 @@ def clean_options(all_columns):
 
 class VisualizationData():
 
-    def __init__(self):
-        self.client = Client()
+    def __init__(self,
+                 target_id: str = SFU_TARGET_INSTITUTION_ID,
+                 warmup: bool = False,
+                 store: Optional[AggregateStore] = None,
+                 backends: Optional[dict[str, AnalyticsBackend]] = None,
+                 analytics: Optional[ParquetAnalytics] = None):
+        '''
+        @param target_id - Institution of the geographic collaboration queries.
+        @param warmup - Plan every statement before the first query, see queries.py.
+        @param store - Where the aggregates are written, see aggregate_store.py.
+        @param backends - Backend of each query by name. Queries not given run their Cypher statement on the database.
+        @param analytics - Computes the queries of the Polars backend. Defaults to the processed output in DATABASE_OUTPUT_DIR.
+        '''
+        self._client = None
+        self._graph_algorithms = None
+        self._institution_ids : Optional[list[str]] = None
+        self.target_id = target_id
+        self.store = store or AggregateStore()
+        self.backends = backends or {}
+        self.analytics = analytics or ParquetAnalytics()
+        if warmup:
+            warmup_statements(self.client.read_all)
+
+    @property
+    def client(self) -> Client:
+        # Only connect once a query runs on the database
+        if self._client is None:
+            self._client = Client()
+        return self._client
+
+    def backend(self, name: str) -> AnalyticsBackend:
+        return self.backends.get(name, AnalyticsBackend.CYPHER)
+
+    def bind(self, name: str) -> tuple[str, dict]:
+        return Statements.bind(name, target_id=self.target_id)
+
+    def fetch(self, name: str) -> pd.DataFrame:
+        '''
+        Run the query of a statement on its backend.
+        '''
+        query, parameters = self.bind(name)
+        if self.backend(name) == AnalyticsBackend.POLARS:
+            return self.analytics(name, parameters)
+        return self.client(query, parameters)
+
+    def save(self, dataset: VisualizationDataPaths, frame: pd.DataFrame):
+        '''
+        Write an aggregate to the store, unless its scheduled query timed out while it was computed.
+        '''
+        raise_if_cancelled()
+        self.store.save(dataset, frame)
 
     def target_sfu(self):
-        query = f"""
-        MATCH (n: {NodeType.SFU_U15_institution.value})
-        UNWIND keys(n) AS colName
-        RETURN
-            apoc.node.id(n) as nodeId,
-            colName,
-            n[colName] as colValue
-        """
-        
-        df = self.client(query)
+        df = self.client(*self.bind('target_sfu'))
         df = df.pivot(
             index='nodeId',
             columns='colName',
@@ -67,72 +113,18 @@ class VisualizationData():
         '''
         Get the counts of each object type stored in the database.
         '''
+        res = self.client(*self.bind('summary_node_information'))
 
-        query = """
-        CALL apoc.meta.stats()
-        YIELD labels, nodeCount, relCount
-        RETURN labels, nodeCount, relCount
-        """
-        res = self.client(query)
-
-        path = VisualizationDataPaths.summary_node_information.value
-        print("Writing summary data to directory ", path)
-        path.parent.mkdir(parents=True, exist_ok=True)
-        
-        res.to_csv(path, index=False)
+        self.save(VisualizationDataPaths.summary_node_information, res)
 
     def summary_nodes_by_institution(self):
         '''
         Get some summary data for comparison between institutions 
         '''
         sfu_15 = ObjectNames[NodeType.SFU_U15_institution]
-        afl = ObjectNames[NodeType.affiliated_institution]
-        authorship = ObjectNames[NodeType.authorship]
-        author = ObjectNames[NodeType.author]
-        paper = ObjectNames[NodeType.work]
-
-        # lineage_root=TRUE since only looking at top level.
-        # Remember that authors not related to the U15+SFU have no been included into the data set
-        # Authorships without that author will simply just point to the institution of note     
-        '''
-        query = f"""
-        MATCH ({sfu_15.prefix}: {sfu_15.name} {{lineage_root: TRUE}})
-        OPTIONAL MATCH ({sfu_15.prefix})<-[{afl.prefix}_{sfu_15.prefix}: {Relationships.RelationshipTypeMap[(NodeType.affiliated_institution, NodeType.SFU_U15_institution)]}]-({afl.prefix}:{afl.name})
-        WITH {sfu_15.prefix}, {afl.prefix}
-        OPTIONAL MATCH ({afl.prefix})<-[:{Relationships.RelationshipTypeMap[(NodeType.author, NodeType.affiliated_institution)]}]-({author.prefix}:{author.name})
-        WITH {sfu_15.prefix}, {afl.prefix}, count(DISTINCT {author.prefix}) as author_count
-        OPTIONAL MATCH ({afl.prefix})<-[:{Relationships.RelationshipTypeMap[(NodeType.authorship, NodeType.affiliated_institution)]}]-({authorship.prefix}:{authorship.name})
-        OPTIONAL MATCH ({authorship.prefix})-[:{Relationships.RelationshipTypeMap[(NodeType.authorship),(NodeType.work)]}]->({paper.prefix}: {paper.name})
-        WITH {sfu_15.prefix}, author_count, count(DISTINCT {authorship.prefix}) as authorship_count, {paper.prefix}
-        OPTIONAL MATCH ({paper.prefix})<-[:{Relationships.RelationshipTypeMap[(NodeType.authorship), (NodeType.work)]}]-({'t_'+ authorship.prefix}: {authorship.name})
-        RETURN {sfu_15.prefix}, author_count, authorship_count, count(DISTINCT {paper.prefix}) as openalex_paper_count, count(DISTINCT {'t_'+authorship.prefix}) as total_author_count;
-        """
-        '''
-
-        query = f"""
-        MATCH ({sfu_15.prefix}:{sfu_15.name} {{lineage_root: TRUE}})
-
-        CALL ({sfu_15.prefix}) {{
-            OPTIONAL MATCH ({sfu_15.prefix})<-[:{Relationships.RelationshipTypeMap[(NodeType.affiliated_institution),(NodeType.SFU_U15_institution)]}]-({afl.prefix}:{afl.name})<-[:{Relationships.RelationshipTypeMap[(NodeType.author, NodeType.affiliated_institution)]}]-({author.prefix}:{author.name})
-            RETURN count(DISTINCT {author.prefix}) AS author_count
-        }}
-
-        CALL({sfu_15.prefix}) {{
-            OPTIONAL MATCH ({sfu_15.prefix})<-[:{Relationships.RelationshipTypeMap[(NodeType.affiliated_institution),(NodeType.SFU_U15_institution)]}]-({afl.prefix}:{afl.name})<-[:{Relationships.RelationshipTypeMap[(NodeType.authorship), (NodeType.affiliated_institution)]}]-({authorship.prefix}:{authorship.name})-[:{Relationships.RelationshipTypeMap[(NodeType.authorship),(NodeType.work)]}]->({paper.prefix}:{paper.name})
-            RETURN count(DISTINCT {authorship.prefix}) AS authorship_count, count(DISTINCT {paper.prefix}) AS openalex_paper_count, collect(DISTINCT {paper.prefix}) as works
-        }}
-
-        // Unwind the collected works to count total authorships
-        UNWIND works as work
-        OPTIONAL MATCH (work)<-[:{Relationships.RelationshipTypeMap[(NodeType.authorship),(NodeType.work)]}]-({'t_'+authorship.prefix}:{authorship.name})
-
-        RETURN I, author_count, authorship_count, openalex_paper_count, count(DISTINCT {'t_'+authorship.prefix}) as total_author_count
-        """
-
-        res = self.client(query)
+        res = self.fetch('summary_nodes_by_institution')
 
         # Format the results, Node Objects need restructuring.
-        # sfu_u15 = ObjectNames[NodeType.SFU_U15_institution]
         res[sfu_15.prefix] = [dict(Node) for Node in res[sfu_15.prefix]]
         flattened = pd.json_normalize(res[sfu_15.prefix])
         
@@ -143,11 +135,7 @@ class VisualizationData():
         res['total_authorship_ratio'] = np.floor(res['total_author_count']/res['openalex_paper_count']*100)/100
         sorted = res.sort_values(by='works_count', ascending=False)        
 
-        path = VisualizationDataPaths.summary_nodes_by_institution_works.value
-        print("Writing dataframe to directory ", path)
-        path.parent.mkdir(parents=True, exist_ok=True)
-        
-        sorted.to_csv(path, index=False)
+        self.save(VisualizationDataPaths.summary_nodes_by_institution_works, sorted)
 
         return
 
@@ -156,51 +144,7 @@ class VisualizationData():
         Get information pertaining to authors by institution
         No need for extended data, because that will be done more in-depth later
         '''
-
-        author = ObjectNames[NodeType.author]
-        sfu_15 = ObjectNames[NodeType.SFU_U15_institution]
-        afl = ObjectNames[NodeType.affiliated_institution]
-
-        query = f"""
-            MATCH (all_{author.prefix}:{author.name})
-            WHERE all_{author.prefix}.works_count > 0 AND all_{author.prefix}.i10_index IS NOT NULL
-            WITH avg(toFloat(all_{author.prefix}.i10_index) / all_{author.prefix}.works_count) AS global_mean_efficiency,
-                stdev(toFloat(all_{author.prefix}.i10_index) / all_{author.prefix}.works_count) AS global_stdev_efficiency
-
-            MATCH ({sfu_15.prefix}:{sfu_15.name} {{lineage_root: TRUE}})
-            OPTIONAL MATCH ({sfu_15.prefix})<-[{afl.prefix}_{sfu_15.prefix}: {Relationships.RelationshipTypeMap[(NodeType.affiliated_institution, NodeType.SFU_U15_institution)]}]-({afl.prefix}:{afl.name})
-            MATCH ({afl.prefix})<-[:{Relationships.RelationshipTypeMap[(NodeType.author, NodeType.affiliated_institution)]}]-({author.prefix}:{author.name})
-            WITH DISTINCT {sfu_15.prefix}, {author.prefix}, global_mean_efficiency, global_stdev_efficiency
-            WHERE {author.prefix}.works_count > 0 AND {author.prefix}.i10_index IS NOT NULL
-
-
-            WITH {sfu_15.prefix}, {author.prefix},
-                CASE
-                WHEN global_stdev_efficiency > 0 THEN
-                    ( (toFloat({author.prefix}.i10_index) / {author.prefix}.works_count) - global_mean_efficiency) / global_stdev_efficiency
-                ELSE 0 // Avoid division by zero if all authors globally have the same efficiency
-                END AS adjusted_i10_score
-
-            RETURN
-                {sfu_15.prefix}.id AS id,
-                {sfu_15.prefix}.display_name AS display_name,
-
-                // The new adjusted score. This will NOT be zero anymore.
-                avg(adjusted_i10_score) AS mean_adjusted_i10_score,
-
-                // Your original metrics, calculated only for the authors at this institution
-                avg({author.prefix}.cited_by_count) AS mean_cited_by_count,
-                avg({author.prefix}.h_index) AS mean_h_index,
-                avg({author.prefix}.i10_index) AS mean_i10_index,
-                avg({author.prefix}.works_count) AS mean_works_count,
-                avg({author.prefix}.`2yr_mean_citedness`) AS mean_2yr_mean_citedness,
-                apoc.agg.median({author.prefix}.cited_by_count) AS median_cited_by_count,
-                apoc.agg.median({author.prefix}.h_index) AS median_h_index,
-                apoc.agg.median({author.prefix}.i10_index) AS median_i10_index,
-                apoc.agg.median({author.prefix}.works_count) AS median_works_count,
-                apoc.agg.median({author.prefix}.`2yr_mean_citedness`) AS median_2yr_mean_citedness        
-        """
-        res = self.client(query=query)
+        res = self.client(*self.bind('summary_nodes_by_author'))
 
         # Citations per work using both median and mean values
         res['median_citations_per_work'] = (res['median_cited_by_count']/res['median_works_count'])
@@ -211,11 +155,7 @@ class VisualizationData():
 
         res['i10_harmonic_mean'] = (2*res['mean_i10_index']*res['mean_works_count'])/(res['mean_i10_index']+res['mean_works_count'])
 
-        path = VisualizationDataPaths.summary_nodes_by_institution_authors.value
-        print("Writing dataframe to directory ", path)
-        path.parent.mkdir(parents=True, exist_ok=True)
-        
-        res.to_csv(path, index=False)
+        self.save(VisualizationDataPaths.summary_nodes_by_institution_authors, res)
 
         return
 
@@ -223,28 +163,14 @@ class VisualizationData():
         '''
         Get the number of citations and works by year per institution
         '''
-
-        sfu15 = ObjectNames[NodeType.SFU_U15_institution]
-        year = ObjectNames[NodeType.year]
-        relName = sfu15.prefix+'_'+year.prefix
-        
-        query = f"""
-            MATCH ({sfu15.prefix}:{sfu15.name} {{lineage_root: TRUE}})-[{relName}:{Relationships.RelationshipTypeMap[(NodeType.SFU_U15_institution),(NodeType.year)]}]->({year.prefix}:{year.name})
-            RETURN {sfu15.prefix}.id as id, {sfu15.prefix}.display_name as display_name,  {year.prefix}.id as year, {relName}.cited_by_count as cited_by_count, {relName}.works_count as works_count;
-        """
-
-        res = self.client(query)
+        res = self.client(*self.bind('summary_counts_by_year'))
 
         # Do not include the current year as it is in progress.
         from datetime import datetime
         res = res[res['year'] < datetime.now().year]
 
-        path = VisualizationDataPaths.summary_counts_by_year.value
-        print("Writing summary data to directory ", path)
-        path.parent.mkdir(parents=True, exist_ok=True)
-        
         res.sort_values(by=['id','year'], inplace=True)
-        res.to_csv(path, index=False)
+        self.save(VisualizationDataPaths.summary_counts_by_year, res)
         
         return
 
@@ -252,50 +178,9 @@ class VisualizationData():
         '''
         Get more in depth information relating to works by institution
         '''
-
-        sfu_15 = ObjectNames[NodeType.SFU_U15_institution]
-        afl = ObjectNames[NodeType.affiliated_institution]
-        authorship = ObjectNames[NodeType.authorship]
-        author = ObjectNames[NodeType.author]
-        paper = ObjectNames[NodeType.work]
-
-        query = f"""
-            MATCH ({sfu_15.prefix}:{sfu_15.name} {{lineage_root: TRUE}})
-            OPTIONAL MATCH ({sfu_15.prefix})<-[:{Relationships.RelationshipTypeMap[(NodeType.affiliated_institution),(NodeType.SFU_U15_institution)]}]-({afl.prefix}:{afl.name})<-[:{Relationships.RelationshipTypeMap[(NodeType.author, NodeType.affiliated_institution)]}]-({author.prefix}:{author.name})
-            OPTIONAL MATCH ({sfu_15.prefix})<-[:{Relationships.RelationshipTypeMap[(NodeType.affiliated_institution),(NodeType.SFU_U15_institution)]}]-({afl.prefix}:{afl.name})<-[:{Relationships.RelationshipTypeMap[(NodeType.authorship), (NodeType.affiliated_institution)]}]-({authorship.prefix}:{authorship.name})-[:{Relationships.RelationshipTypeMap[(NodeType.authorship),(NodeType.work)]}]->({paper.prefix}:{paper.name})
-
-            WITH DISTINCT {sfu_15.prefix}, {paper.prefix}
-            
-            RETURN
-                {sfu_15.prefix}.id as id,
-                {sfu_15.prefix}.display_name as display_name,
-                avg({paper.prefix}.countries_distinct_count) as avg_distinct_countries,
-                avg({paper.prefix}.citation_normalized_percentile) as avg_citation_normalized_percentile,
-                avg({paper.prefix}.fwci) as avg_fwci,
-                avg({paper.prefix}.institutions_distinct_count) as avg_distinct_institutions,
-                avg({paper.prefix}.apc_paid) as avg_apc_paid,
-                
-                apoc.coll.frequenciesAsMap(collect({paper.prefix}.is_oa)) as is_open_access,
-                apoc.coll.frequenciesAsMap(collect({paper.prefix}.type)) as type,
-                apoc.coll.frequenciesAsMap(collect({paper.prefix}.publication_year)) as total_by_publication_year,
-                apoc.coll.frequenciesAsMap(
-                    collect(
-                        CASE
-                            WHEN {paper.prefix}.is_oa = true THEN {paper.prefix}.oa_status
-                            ELSE null
-                        END
-                    )
-                ) as open_access_status
-
-        """
-
-        res = self.client(query)
+        res = self.fetch('works_analysis')
         
-        path = VisualizationDataPaths.work_analysis.value
-        print("Writing dataframe to directory ", path)
-        path.parent.mkdir(parents=True, exist_ok=True)
-
-        res.to_csv(path, index=False)
+        self.save(VisualizationDataPaths.work_analysis, res)
 
         return
 
@@ -305,250 +190,146 @@ class VisualizationData():
         Cited by per year
         Works Count per year
         '''
-
-        sfu_15 = ObjectNames[NodeType.SFU_U15_institution]
-        afl = ObjectNames[NodeType.affiliated_institution]
-        author = ObjectNames[NodeType.author]
-        year = ObjectNames[NodeType.year]
-        author_afl_rel = author.prefix+'_'+afl.prefix
-        author_year_rel = author.prefix+'_'+year.prefix
-
-        query = f"""
-        MATCH ({sfu_15.prefix}: {sfu_15.name} {{lineage_root: TRUE}})
-        OPTIONAL MATCH ({sfu_15.prefix})<-[:{Relationships.RelationshipTypeMap[(NodeType.affiliated_institution),(NodeType.SFU_U15_institution)]}]-({afl.prefix}:{afl.name})<-[{author_afl_rel}:{Relationships.RelationshipTypeMap[(NodeType.author, NodeType.affiliated_institution)]}]-({author.prefix}:{author.name})-[{author_year_rel}:{Relationships.RelationshipTypeMap[(NodeType.author), (NodeType.year)]}]->({year.prefix}:{year.name})
-
-        WITH {sfu_15.prefix},
-            {year.prefix}.id as year,
-            sum({author_year_rel}.works_count) as total_works,
-            sum({author_year_rel}.cited_by_count) as total_citations
-
-        WITH {sfu_15.prefix}, collect(
-            CASE
-                WHEN year IS NOT NULL THEN {{
-                    year: year,
-                    works_count: total_works,
-                    cited_by_count: total_citations
-                }}
-            END
-        ) as author_counts_by_year
-       
-        OPTIONAL MATCH ({sfu_15.prefix})<-[:{Relationships.RelationshipTypeMap[(NodeType.affiliated_institution),(NodeType.SFU_U15_institution)]}]-(:{afl.name})<-[{author_afl_rel}:{Relationships.RelationshipTypeMap[(NodeType.author, NodeType.affiliated_institution)]}]-({author.prefix}_2:{author.name})
-        
-        UNWIND {author_afl_rel}.years AS affiliation_year
-
-        WITH {sfu_15.prefix}, author_counts_by_year, affiliation_year, count({author_afl_rel}) as count_per_year
-
-        WITH {sfu_15.prefix}, author_counts_by_year, apoc.map.fromPairs(collect([affiliation_year, count_per_year])) as affiliated_per_year
-
-        RETURN 
-            {sfu_15.prefix}.id as id,
-            {sfu_15.prefix}.display_name as display_name,
-            author_counts_by_year,
-            affiliated_per_year
-        """
-
-        res = self.client(query)
+        res = self.fetch('authors_analysis')
         
-        path = VisualizationDataPaths.author_analysis.value
-        print("Writing dataframe to directory ", path)
-        path.parent.mkdir(parents=True, exist_ok=True)
-
-        res.to_csv(path, index=False)
+        self.save(VisualizationDataPaths.author_analysis, res)
         
         return
 
     def topics_works(self):
         '''
-        Get works data by institution and topic
+        Get works data by institution and topic, and roll them up to every level of the topic hierarchy
         '''
+        res = self.fetch('topics_works')
+        
+        rollup = topic_rollup(res)
+        self.save(VisualizationDataPaths.topics_works, res)
+        self.save(VisualizationDataPaths.topic_rollup, rollup)
+        
+        return
 
-        sfu_15 = ObjectNames[NodeType.SFU_U15_institution]
-        afl = ObjectNames[NodeType.affiliated_institution]
-        authorship = ObjectNames[NodeType.authorship]
-        author = ObjectNames[NodeType.author]
-        paper = ObjectNames[NodeType.work]
-
+    def geographic_collaborations(self):
         '''
-        Hierarchy is domain -> field -> subfield -> topic
+        What institutions and what countries are SFU authors working with?
         '''
-        topic = ObjectNames[NodeType.topic]
-        subfield = ObjectNames[NodeType.subfield]
-        field = ObjectNames[NodeType.field]
-        domain = ObjectNames[NodeType.domain]
-
-        topics_query = f"""
-            MATCH ({sfu_15.prefix}:{sfu_15.name} {{lineage_root: TRUE}})
-            OPTIONAL MATCH ({sfu_15.prefix})<-[:{Relationships.RelationshipTypeMap[(NodeType.affiliated_institution),(NodeType.SFU_U15_institution)]}]-({afl.prefix}:{afl.name})<-[:{Relationships.RelationshipTypeMap[(NodeType.authorship, NodeType.affiliated_institution)]}]-({authorship.prefix}:{authorship.name})-[:{Relationships.RelationshipTypeMap[(NodeType.authorship), (NodeType.work)]}]->({paper.prefix}:{paper.name})-[:{Relationships.RelationshipTypeMap[(NodeType.work), (NodeType.topic)]}]->({topic.prefix}:{topic.name})-[:{Relationships.RelationshipTypeMap[(NodeType.topic), (NodeType.subfield)]}]->({subfield.prefix}:{subfield.name})-[:{Relationships.RelationshipTypeMap[(NodeType.subfield), (NodeType.field)]}]->({field.prefix}:{field.name})-[:{Relationships.RelationshipTypeMap[(NodeType.field), (NodeType.domain)]}]->({domain.prefix}:{domain.name})
-            
-            WITH DISTINCT {sfu_15.prefix}, {domain.prefix}, {field.prefix}, {subfield.prefix}, {topic.prefix},
-                count({paper.prefix}) as total_works,
-                sum({paper.prefix}.countries_distinct_count) as sum_distinct_countries,
-                sum({paper.prefix}.citation_normalized_percentile) as sum_citation_normalized_percentile,
-                sum({paper.prefix}.fwci) as sum_fwci,
-                sum({paper.prefix}.institutions_distinct_count) as sum_distinct_institutions,
-                sum({paper.prefix}.apc_paid) as sum_apc_paid
-                
-            RETURN 
-                {sfu_15.prefix}.id as id, 
-                {sfu_15.prefix}.display_name as institution_display_name,
-                {domain.prefix}.id as domain_id,
-                {domain.prefix}.display_name as domain_display_name,
-                {field.prefix}.id as field_id,
-                {field.prefix}.display_name as field_display_name,
-                {subfield.prefix}.id as subfield_id,
-                {subfield.prefix}.display_name as subfield_display_name,
-                {topic.prefix}.id as topic_id,
-                {topic.prefix}.display_name as topic_display_name,
-                total_works,
-                sum_distinct_countries,
-                sum_distinct_institutions,
-                sum_fwci,
-                sum_citation_normalized_percentile,
-                sum_apc_paid
-
-        """
-
-        res = self.client(topics_query)
+        res = self.fetch('geographic_collaborations')
         
-        path = VisualizationDataPaths.topics_works.value
-        print("Writing dataframe to directory ", path)
-        path.parent.mkdir(parents=True, exist_ok=True)
+        self.save(VisualizationDataPaths.geographic_collaborations, res)
+        
+        return
 
-        res.to_csv(path, index=False)
+    def geographic_topics_collaborations(self):
+        res = self.fetch('geographic_topics_collaborations')
+        
+        self.save(VisualizationDataPaths.geographic_topics_collaborations, res)
         
         return
 
-    def geographic_collaborations(self):
+    def institution_ids(self) -> list[str]:
         '''
-        What institutions and what countries are SFU authors working with?
+        The top level institutions, on the backend of institution_geographic_collaborations, which compares them.
         '''
-        sfu_15 = ObjectNames[NodeType.SFU_U15_institution]
-        afl = ObjectNames[NodeType.affiliated_institution]
-        authorship = ObjectNames[NodeType.authorship]
-        paper = ObjectNames[NodeType.work]
-        geo = ObjectNames[NodeType.geographic]
-        sfu_afl = 'sfu_'+afl.prefix
-
-        query=f"""
-            MATCH ({sfu_afl}:{afl.name})-[:{Relationships.RelationshipTypeMap[(NodeType.affiliated_institution), (NodeType.SFU_U15_institution)]}]->(:{sfu_15.name} {{id: '{SFU_TARGET_INSTITUTION_ID}'}})
-            
-            MATCH ({sfu_afl})<-[:{Relationships.RelationshipTypeMap[(NodeType.authorship),(NodeType.affiliated_institution)]}]-(:{authorship.name})-[:{Relationships.RelationshipTypeMap[(NodeType.authorship),(NodeType.work)]}]->({paper.prefix}:{paper.name})
-            WITH {sfu_afl}, COLLECT(DISTINCT {paper.prefix}) AS works
+        if self.backend('institution_geographic_collaborations') == AnalyticsBackend.POLARS:
+            self._institution_ids = self.analytics.institution_ids()
+        else:
+            self._institution_ids = self.client(*self.bind('institution_ids'))['id'].tolist()
 
-            UNWIND works AS w
+        return self._institution_ids
 
-            MATCH (w)<-[:{Relationships.RelationshipTypeMap[(NodeType.authorship), (NodeType.work)]}]-(:{authorship.name})-[:{Relationships.RelationshipTypeMap[(NodeType.authorship), (NodeType.affiliated_institution)]}]->(collaborating_AFL_INS:{afl.name})-[:{Relationships.RelationshipTypeMap[(NodeType.affiliated_institution), (NodeType.geographic)]}]->({geo.prefix}:{geo.name})
+    def institution_geographic_collaborations(self,
+                                              institution_ids: Optional[list[str]] = None,
+                                              config: Optional[CollaborationFanOutConfig] = None):
+        '''
+        The geographic collaborations and geographic topic collaborations of several institutions, computed in
+        parallel batches of works, see collaborations.py.
+        @param institution_ids - Defaults to every top level institution, as found by the last call to institution_ids.
+        '''
+        if institution_ids is None:
+            institution_ids = self._institution_ids if self._institution_ids is not None else self.institution_ids()
 
-            WHERE collaborating_AFL_INS <> {sfu_afl}
+        if self.backend('institution_geographic_collaborations') == AnalyticsBackend.POLARS:
+            collaborations, topics_collaborations = self.analytics.institution_collaborations(institution_ids)
+        else:
+            collaborations, topics_collaborations = institution_collaborations(self.client, institution_ids, config)
 
-            RETURN
-                {geo.prefix}.id as id,
-                {geo.prefix}.continent as continent,
-                {geo.prefix}.country_name AS country,
-                count({geo.prefix}) AS number_of_collaborations
-            ORDER BY number_of_collaborations DESC        
-        """
-        
-        res = self.client(query)
-        
-        path = VisualizationDataPaths.geographic_collaborations.value
-        print("Writing dataframe to directory ", path)
-        path.parent.mkdir(parents=True, exist_ok=True)
+        self.save(VisualizationDataPaths.institution_geographic_collaborations, collaborations)
+        self.save(VisualizationDataPaths.institution_geographic_topics_collaborations, topics_collaborations)
 
-        res.to_csv(path, index=False)
-        
         return
 
-    def geographic_topics_collaborations(self):
-        # Define your object prefixes and the target institution ID
-        sfu_15 = ObjectNames[NodeType.SFU_U15_institution]
-        afl = ObjectNames[NodeType.affiliated_institution]
-        authorship = ObjectNames[NodeType.authorship]
-        paper = ObjectNames[NodeType.work]
-        topic = ObjectNames[NodeType.topic]
-        subfield = ObjectNames[NodeType.subfield]
-        field = ObjectNames[NodeType.field]
-        domain = ObjectNames[NodeType.domain]
-        geo = ObjectNames[NodeType.geographic]
-        sfu_afl = 'sfu_afl' # A specific variable name for the starting institution
-
-        query = f"""
-        MATCH ({sfu_afl}:{afl.name})-[:{Relationships.RelationshipTypeMap[(NodeType.affiliated_institution), (NodeType.SFU_U15_institution)]}]->(:{sfu_15.name} {{id: '{SFU_TARGET_INSTITUTION_ID}'}})
-        MATCH ({sfu_afl})<-[:{Relationships.RelationshipTypeMap[(NodeType.authorship),(NodeType.affiliated_institution)]}]-(:{authorship.name})-[:{Relationships.RelationshipTypeMap[(NodeType.authorship),(NodeType.work)]}]->(w:{paper.name})
-        WITH {sfu_afl}, COLLECT(DISTINCT w) AS works
-
-        UNWIND works AS w
-        MATCH (w)-[:{Relationships.RelationshipTypeMap[(NodeType.work), (NodeType.topic)]}]->(t:{topic.name})
-        WITH {sfu_afl}, w, t
-
-        MATCH (w)<-[:{Relationships.RelationshipTypeMap[(NodeType.authorship), (NodeType.work)]}]-(:{authorship.name})-[:{Relationships.RelationshipTypeMap[(NodeType.authorship), (NodeType.affiliated_institution)]}]->(collaborating_AFL_INS:{afl.name})-[:{Relationships.RelationshipTypeMap[(NodeType.affiliated_institution), (NodeType.geographic)]}]->(g:{geo.name})
-
-        WHERE collaborating_AFL_INS <> {sfu_afl}
-
-        WITH w, t, g
-        MATCH (t)-[:{Relationships.RelationshipTypeMap[(NodeType.topic), (NodeType.subfield)]}]->(sf:{subfield.name})-[:{Relationships.RelationshipTypeMap[(NodeType.subfield), (NodeType.field)]}]->(f:{field.name})-[:{Relationships.RelationshipTypeMap[(NodeType.field), (NodeType.domain)]}]->(d:{domain.name})
-
-        RETURN
-            d.id AS domain_id,
-            d.display_name AS domain_display_name,
-            f.id AS field_id,
-            f.display_name AS field_display_name,
-            sf.id AS subfield_id,
-            sf.display_name AS subfield_display_name,
-            t.id AS topic_id,
-            t.display_name AS topic_display_name,
-            g.id as country_id,
-            g.continent as continent,
-            g.country_name AS country_name,
-            count(g) AS number_of_collaborations,
-            avg(w.countries_distinct_count) as avg_distinct_countries,
-            avg(w.citation_normalized_percentile) as avg_citation_normalized_percentile,
-            avg(w.fwci) as avg_fwci,
-            avg(w.institutions_distinct_count) as avg_distinct_institutions,
-            avg(w.apc_paid) as avg_apc_paid
-        ORDER BY
-            domain_display_name, field_display_name, subfield_display_name, topic_display_name, number_of_collaborations DESC
-        """
-        res = self.client(query)
-        
-        path = VisualizationDataPaths.geographic_topics_collaborations.value
-        print("Writing dataframe to directory ", path)
-        path.parent.mkdir(parents=True, exist_ok=True)
+    def graph_algorithms(self, mode: GraphAlgorithmMode = GraphAlgorithmMode.STREAM, refresh: bool = False):
+        '''
+        PageRank, Louvain, node similarity and weakly connected components of the collaboration graphs, see graph_algorithms.py.
+        @param refresh - Project the graphs again instead of reusing the projections of earlier runs.
+        '''
+        if self._graph_algorithms is None:
+            self._graph_algorithms = GraphAlgorithmRunner(self.client, self.store)
+        self._graph_algorithms.run_all(mode=mode, refresh=refresh)
 
-        res.to_csv(path, index=False)
-        
         return
 
-    def query_all_information(self):
+    def profile_queries(self, run_log: Optional[Path] = QUERY_PROFILE_LOG) -> PlanProfiler:
+        '''
+        Run the statement of every scheduled aggregation with PROFILE, and append the operators of their plans to the
+        run log. Compare two runs with query_profiles.py.
+        '''
+        profiler = PlanProfiler(self.client, run_log)
+        for scheduled in self.aggregation_schedule():
+            if scheduled.name in Statements:
+                profiler.profile(scheduled.name, *self.bind(scheduled.name))
+        profiler.save()
+
+        return profiler
+
+    def aggregation_schedule(self) -> list[ScheduledQuery]:
+        '''
+        The aggregation queries with their dependencies, the longest queries first so they start first.
+        The collaborations of every institution read the institution ids, so they start once those are found.
+        '''
+        def timed(name: str, aggregation: Callable[[], None], backend: Optional[str] = None) -> Callable[[Optional[float]], None]:
+            def run(timeout: Optional[float]):
+                # The queries that do not run on the database stop before saving once they timed out, see save
+                if self.backend(backend or name) == AnalyticsBackend.POLARS:
+                    aggregation()
+                    return
+                with self.client.timeout(timeout):
+                    aggregation()
+            return run
+
+        return [
+            ScheduledQuery('institution_ids', timed('institution_ids', self.institution_ids, 'institution_geographic_collaborations')),
+            ScheduledQuery('institution_geographic_collaborations',
+                           timed('institution_geographic_collaborations', self.institution_geographic_collaborations),
+                           depends_on=('institution_ids',))
+        ] + [
+            ScheduledQuery(name, timed(name, getattr(self, name))) for name in (
+                'geographic_topics_collaborations',
+                'topics_works',
+                'geographic_collaborations',
+                'summary_nodes_by_institution',
+                'works_analysis',
+                'authors_analysis',
+                'summary_nodes_by_author',
+                'summary_counts_by_year',
+                'summary_node_information'
+            )
+        ]
+
+    def query_all_information(self, config: Optional[QueryScheduleConfig] = None) -> dict[str, QueryOutcome]:
+        '''
+        Run every aggregation, concurrently on separate read sessions, see schedule.py.
+        @param config - Concurrency cap and timeouts of the queries.
+        '''
         print("Performing all aggregations.")
-        print("Starting summary node information.")
-        self.summary_node_information()
-        print("Finished summary node information.")
-        print("Starting summary nodes by institution")
-        self.summary_nodes_by_institution()
-        print("Finished summary nodes by institution.")
-        print("Starting summary nodes by author.")
-        self.summary_nodes_by_author()
-        print("Finished summary nodes by author")
-        print("Starting summary counts by year.")
-        self.summary_counts_by_year()
-        print("Finished summary counts by year.")
-        print("Starting works analysis.")
-        self.works_analysis()
-        print("Finished works analysis.")
-        print("Starting authors analysis.")
-        self.authors_analysis()
-        print("Finished authors analysis.")
-        print("Start topics works analysis.")
-        self.topics_works()
-        print("Finished topics works analysis.")
-        print("Starting geographic collaboration analysis.")
-        self.geographic_collaborations()
-        print("Finished geographic collaboration analysis.")
-        print("Starting geographic topics analysis.")
-        self.geographic_topics_collaborations()
-        print("Finished geographic topics analysis.")
-        print("Finished aggregations.")
+        start = time.perf_counter()
+        outcomes = run_schedule(self.aggregation_schedule(), config)
+        print(f"Finished aggregations in {time.perf_counter() - start:.1f}s.")
+
+        failed = [outcome for outcome in outcomes.values() if outcome.status != QueryStatus.FINISHED]
+        for outcome in failed:
+            print(f"    {outcome.name} {outcome.status.value}: {outcome.error}")
+        return outcomes
+
 
 class VisualizationType(Enum):
     BUBBLE_CHART = 'Bubble Chart'
@@ -1520,13 +1301,12 @@ class GraphVisualization:
         subfield = param.Selector(label='Subfield')
         topic = param.Selector(label='Topic')
 
-        def __init__(self, graph_types: Iterable[VisualizationType], dataframes: dict, filters: list, **params):
+        def __init__(self, graph_types: Iterable[VisualizationType], cube: TopicCube, **params):
             super().__init__(**params) # Call parent constructor first
 
             # --- Setup ---
-            self.dataframes = dataframes
-            # Create a more accessible dictionary for filter column names
-            self.filters = {item[0].split('_')[0]: (item[0], item[1]) for item in filters}
+            # The rollup of every level, the selectors look up its rows and options by id
+            self.cube = cube
             self.placeholder = '-'*15+' Not Available '+'-'*15
             self.viz_methods = GraphVisualization() # To access create_graph
 
@@ -1538,30 +1318,15 @@ class GraphVisualization:
             # Populate the first selector in the hierarchy
             self._update_domain_options()
 
-        def _get_options(self, df, name_col, value_col):
-            """Helper to create a dictionary of {display_name: id} for selectors."""
-            if df.empty or name_col not in df.columns or value_col not in df.columns:
-                return {}
-            # Get unique pairs and sort by the display name
-            unique_df = df[[name_col, value_col]].drop_duplicates().sort_values(by=name_col)
-            return dict(zip(unique_df[name_col], unique_df[value_col]))
-
         def _update_domain_options(self):
-            name_col, val_col = self.filters['domain']
-            domain_df = self.dataframes['domain']
-            options = self._get_options(domain_df, name_col, val_col)
+            options = self.cube.options('domain')
             self.param.domain.objects = options
             self.domain = next(iter(options.values()), None)
 
         @param.depends('domain', watch=True)
         def _update_field_options(self):
             domain_id = self.domain
-            field_df = self.dataframes['field']
-            domain_id_col = self.filters['domain'][1] # e.g., 'domain_id'
-            name_col, val_col = self.filters['field']
-
-            filtered_df = field_df[field_df[domain_id_col] == domain_id]
-            options = {'--No Selection -- ' : None, **self._get_options(filtered_df, name_col, val_col)}
+            options = {'--No Selection -- ' : None, **self.cube.options('field', domain_id)}
 
 
             self.param.field.objects = options if options else {self.placeholder: None}
@@ -1575,12 +1340,7 @@ class GraphVisualization:
                 self.subfield = self.placeholder
                 return
 
-            subfield_df = self.dataframes['subfield']
-            field_id_col = self.filters['field'][1] # e.g., 'field_id'
-            name_col, val_col = self.filters['subfield']
-
-            filtered_df = subfield_df[subfield_df[field_id_col] == field_id]
-            options = {'--No Selection -- ' : None, **self._get_options(filtered_df, name_col, val_col)}
+            options = {'--No Selection -- ' : None, **self.cube.options('subfield', field_id)}
 
             self.param.subfield.objects = options if options else {self.placeholder: None}
             self.subfield = next(iter(options.values()), self.placeholder)
@@ -1593,12 +1353,7 @@ class GraphVisualization:
                 self.topic = self.placeholder
                 return
 
-            topic_df = self.dataframes['topic']
-            subfield_id_col = self.filters['subfield'][1] # e.g., 'subfield_id'
-            name_col, val_col = self.filters['topic']
-
-            filtered_df = topic_df[topic_df[subfield_id_col] == subfield_id]
-            options = {'--No Selection -- ' : None, **self._get_options(filtered_df, name_col, val_col)}
+            options = {'--No Selection -- ' : None, **self.cube.options('topic', subfield_id)}
 
             self.param.topic.objects = options if options else {self.placeholder: self.placeholder}
             self.topic = next(iter(options.values()), self.placeholder)
@@ -1622,11 +1377,8 @@ class GraphVisualization:
                     scope = level
                     break
 
-            data_df = self.dataframes[scope]
-            data_id_col = self.filters[scope][1]   
-
-            # Filter for all institutions' data for the one selected topic
-            selected_topic_data = data_df[data_df[data_id_col] == self.__getattribute__(scope)].copy()
+            # All institutions' data for the one selected topic
+            selected_topic_data = self.cube.rows(scope, self.__getattribute__(scope)).copy()
 
             # The create_graph function expects a 'display_name' column for labels.
             selected_topic_data.rename(columns={'institution_display_name': 'display_name'}, inplace=True)
@@ -1634,7 +1386,7 @@ class GraphVisualization:
             if selected_topic_data.empty:
                 return pn.pane.Markdown(f"No data available for the selected {scope} (ID: {self.__getattribute__(scope)}).")
 
-            # 2. Use the correct metric column names produced by process_topics_dataframes
+            # 2. Use the metric column names of the TopicCube
             metric_columns = [
                 'total_works',
                 'avg_distinct_countries',
@@ -0,0 +1,129 @@
+'''
+neo4j_standin.py
+A local stand-in for the database used by the loading tests and benchmarks.
+It accepts every query without executing it and records the rows sent by each session.
+replayed_graph rebuilds the graph the node and relationship load queries recorded by the stand-in would write.
+'''
+import re, threading
+from neo4j.exceptions import TransientError
+
+def deadlock() -> TransientError:
+    return TransientError._hydrate_neo4j(code='Neo.TransientError.Transaction.DeadlockDetected', message='Deadlock detected')
+
+class StandInResult:
+    def consume(self):
+        return None
+
+class StandInTransaction:
+    def __init__(self, session: 'StandInSession'):
+        self.session = session
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def run(self, query: str, parameters: dict | None = None, **kwargs) -> StandInResult:
+        self.session.driver.deadlock()
+        return self.session.run(query, parameters, **kwargs)
+
+    def commit(self):
+        pass
+
+class StandInSession:
+    def __init__(self, driver: 'StandInDriver'):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def close(self):
+        pass
+
+    def run(self, query: str, parameters: dict | None = None, **kwargs) -> StandInResult:
+        rows = [row for value in {**(parameters or {}), **kwargs}.values() if isinstance(value, list) for row in value]
+        with self.driver.lock:
+            self.driver.rows += len(rows)
+            self.driver.queries += 1
+            self.driver.sessions.setdefault(id(self), []).extend(rows)
+            self.driver.runs.append((query, rows))
+        return StandInResult()
+
+    def execute_write(self, transaction_function, *args, **kwargs):
+        self.driver.deadlock()
+        return transaction_function(self, *args, **kwargs)
+
+    def begin_transaction(self) -> StandInTransaction:
+        return StandInTransaction(self)
+
+class StandInDriver:
+    def __init__(self, deadlocks: int = 0):
+        self.lock = threading.Lock()
+        self.rows = 0
+        self.queries = 0
+        self.sessions : dict[int, list[dict]] = {}
+        # Every query run, with its rows, in the order they ran
+        self.runs : list[tuple[str, list[dict]]] = []
+        # Number of write transactions that fail with a deadlock before the writes succeed
+        self.deadlocks = deadlocks
+
+    def session(self, **kwargs) -> StandInSession:
+        return StandInSession(self)
+
+    def deadlock(self):
+        '''
+        Fail the write with a deadlock while deadlocks are left.
+        '''
+        with self.lock:
+            if self.deadlocks > 0:
+                self.deadlocks -= 1
+                raise deadlock()
+
+class StandInConnection:
+    '''
+    Stands in for N4J_Connection.
+    '''
+    def __init__(self, deadlocks: int = 0):
+        self._driver = StandInDriver(deadlocks)
+        self.database = 'neo4j'
+
+    def session(self, read: bool = False) -> StandInSession:
+        return self._driver.session()
+
+_NODE_LOAD = re.compile(r'(?:MERGE|CREATE) \(\w+:(\w+)')
+_ORIGIN = re.compile(r'MATCH \(\w+: (\w+) \{id: ROW.origin_id\}\)')
+_TARGET = re.compile(r'MATCH \(\w+: (\w+) \{id: ROW.target_id\}\)')
+_RELATIONSHIP_TYPE = re.compile(r'-\[r:(\w+)\]->')
+
+def _set(properties: dict, row: dict):
+    # Setting a property to null removes it
+    for name, value in row.items():
+        if value is None:
+            properties.pop(name, None)
+        else:
+            properties[name] = value
+
+def replayed_graph(driver: StandInDriver) -> tuple[dict[str, dict], dict[tuple[str, str, str], dict]]:
+    '''
+    The nodes by label and id, and the relationships by (origin label, type, target label) and (origin id, target id),
+    with their properties, as the UNWIND load queries run on the driver write them.
+    Relationships are only written between nodes loaded before them, as their MATCH finds no node otherwise.
+    '''
+    nodes, relationships = {}, {}
+    for query, rows in driver.runs:
+        relationship_type = _RELATIONSHIP_TYPE.search(query)
+        if relationship_type is not None and 'ROW.origin_id' in query:
+            origin, target = _ORIGIN.search(query).group(1), _TARGET.search(query).group(1)
+            graph = relationships.setdefault((origin, relationship_type.group(1), target), {})
+            for row in rows:
+                if row['origin_id'] in nodes.get(origin, {}) and row['target_id'] in nodes.get(target, {}):
+                    _set(graph.setdefault((row['origin_id'], row['target_id']), {}), row['properties'])
+        elif (node_load := _NODE_LOAD.search(query)) is not None and 'UNWIND' in query:
+            graph = nodes.setdefault(node_load.group(1), {})
+            for row in rows:
+                _set(graph.setdefault(row['id'], {}), row)
+    return nodes, relationships
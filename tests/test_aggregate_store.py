@@ -0,0 +1,114 @@
+'''
+test_aggregate_store.py
+Tests for the Parquet store of the aggregation results.
+'''
+from pathlib import Path
+import pandas as pd
+import pyarrow as pa
+import src.visualization.aggregate_store as AggregateStoreModule
+from src.visualization.aggregate_store import AggregateStore, TOPIC_ROLLUP_SUMS, topic_rollup
+from src.visualization.config import VisualizationDataPaths
+
+def works() -> pd.DataFrame:
+    # As returned by works_analysis, the publication years of frequenciesAsMap are strings
+    return pd.DataFrame({
+        'id': ['I1', 'I2'],
+        'display_name': ['First', 'Second'],
+        'avg_fwci': [1.5, None],
+        'is_open_access': [{'true': 3, 'false': 1}, {'false': 2}],
+        'type': [{'article': 4}, {'article': 1, 'book': 1}],
+        'total_by_publication_year': [{'2020': 1, '2021': 3}, {'2021': 2}],
+        'open_access_status': [{'gold': 3}, None]
+    })
+
+def test_nested_columns_round_trip(tmp_path: Path):
+    store = AggregateStore(tmp_path)
+    store.save(VisualizationDataPaths.work_analysis, works())
+
+    schema = store.read(VisualizationDataPaths.work_analysis).schema
+    assert schema.field('type').type == pa.map_(pa.string(), pa.int64())
+    assert schema.field('total_by_publication_year').type == pa.map_(pa.int32(), pa.int64())
+
+    loaded = store.load(VisualizationDataPaths.work_analysis)
+    assert loaded['type'].tolist() == [{'article': 4}, {'article': 1, 'book': 1}]
+    assert loaded['open_access_status'].tolist() == [{'gold': 3}, None]
+
+    by_year = store.works_by_publication_year()
+    assert by_year.values.tolist() == [['I1', 'First', 2020, 1], ['I1', 'First', 2021, 3], ['I2', 'Second', 2021, 2]]
+
+def test_author_loaders(tmp_path: Path):
+    store = AggregateStore(tmp_path)
+    store.save(VisualizationDataPaths.author_analysis, pd.DataFrame({
+        'id': ['I1'],
+        'display_name': ['First'],
+        'author_counts_by_year': [[{'year': 2020, 'works_count': 5, 'cited_by_count': 7}]],
+        'affiliated_per_year': [{'2019': 2, '2020': 4}]
+    }))
+
+    assert store.authors_by_year().to_dict('records') == \
+        [{'cited_by_count': 7, 'works_count': 5, 'year': 2020, 'id': 'I1', 'display_name': 'First'}]
+    assert store.affiliations_by_year()[['year', 'affiliations']].values.tolist() == [[2019, 2], [2020, 4]]
+
+def test_import_csv(tmp_path: Path):
+    csv = tmp_path.joinpath('work_analysis.csv')
+    works().to_csv(csv, index=False)
+    store = AggregateStore(tmp_path)
+    store.import_csv(VisualizationDataPaths.work_analysis, csv)
+
+    loaded = store.load(VisualizationDataPaths.work_analysis)
+    assert loaded['is_open_access'].tolist() == [{'true': 3, 'false': 1}, {'false': 2}]
+    assert loaded['total_by_publication_year'].tolist() == [{2020: 1, 2021: 3}, {2021: 2}]
+
+def test_outdated(tmp_path: Path, monkeypatch):
+    store = AggregateStore(tmp_path)
+    store.save(VisualizationDataPaths.work_analysis, works())
+    csv = tmp_path.joinpath('summary_counts_by_year.csv')
+    pd.DataFrame({'id': ['I1'], 'year': [2020], 'works_count': [3]}).to_csv(csv, index=False)
+    store.import_csv(VisualizationDataPaths.summary_counts_by_year, csv)
+
+    # Converted and missing aggregates are outdated
+    datasets = [VisualizationDataPaths.work_analysis, VisualizationDataPaths.summary_counts_by_year, VisualizationDataPaths.topics_works]
+    assert store.outdated(datasets) == [VisualizationDataPaths.summary_counts_by_year, VisualizationDataPaths.topics_works]
+
+    # So are those computed with other statements
+    monkeypatch.setattr(AggregateStoreModule, 'statements_fingerprint', lambda: 'changed')
+    assert store.outdated(datasets) == datasets
+
+def topics() -> pd.DataFrame:
+    # As returned by topics_works, I2 has no topic
+    hierarchy = {
+        'T1': ('D1', 'Domain 1', 'F1', 'Field 1', 'S1', 'Subfield 1', 'T1', 'Topic 1'),
+        'T2': ('D1', 'Domain 1', 'F1', 'Field 1', 'S2', 'Subfield 2', 'T2', 'Topic 2'),
+        'T3': ('D2', 'Domain 2', 'F2', 'Field 2', 'S3', 'Subfield 3', 'T3', 'Topic 3'),
+        None: (None,) * 8
+    }
+    rows = [('I1', 'First', 'T1', 3, 6, 5.0), ('I1', 'First', 'T2', 1, 2, None), ('I1', 'First', 'T3', 2, 2, 1.0),
+            ('I3', 'Third', 'T1', 1, 1, 0.5), ('I2', 'Second', None, 0, 0, 0)]
+    return pd.DataFrame([(id, name, *hierarchy[topic], works, total, total, fwci, total / 10, total * 100)
+                         for id, name, topic, works, total, fwci in rows],
+                        columns=['id', 'institution_display_name', 'domain_id', 'domain_display_name', 'field_id', 'field_display_name',
+                                 'subfield_id', 'subfield_display_name', 'topic_id', 'topic_display_name', 'total_works', *TOPIC_ROLLUP_SUMS])
+
+def test_topic_cube(tmp_path: Path):
+    store = AggregateStore(tmp_path)
+    store.save(VisualizationDataPaths.topic_rollup, topic_rollup(topics()))
+    cube = store.topic_cube()
+
+    # Every level matches the group-by of the topics it replaces
+    frame = topics()
+    for level, parent in [('domain', None), ('field', 'domain'), ('subfield', 'field'), ('topic', 'subfield')]:
+        keys = ['id', 'institution_display_name'] + ([f'{parent}_id', f'{parent}_display_name'] if parent else []) + [f'{level}_id', f'{level}_display_name']
+        expected = frame.groupby(keys).agg('sum', numeric_only=True).reset_index()
+        for column in TOPIC_ROLLUP_SUMS:
+            expected[column.replace('sum_', 'avg_', 1)] = expected.pop(column) / expected['total_works']
+        pd.testing.assert_frame_equal(cube.levels[level].sort_values(keys).reset_index(drop=True),
+                                      expected[list(cube.levels[level].columns)].sort_values(keys).reset_index(drop=True),
+                                      check_dtype=False)
+
+    assert cube.options('domain') == {'Domain 1': 'D1', 'Domain 2': 'D2'}
+    assert cube.options('subfield', 'F1') == {'Subfield 1': 'S1', 'Subfield 2': 'S2'}
+    assert cube.options('topic', 'S9') == {}
+    assert cube.rows('field', 'F1')[['id', 'total_works']].values.tolist() == [['I1', 4], ['I3', 1]]
+    assert cube.rows('domain', 'D1')['avg_fwci'].tolist() == [5.0 / 4, 0.5]
+    assert cube.institution('topic', 'I1')['topic_id'].tolist() == ['T1', 'T2', 'T3']
+    assert cube.institution('domain', 'I2').empty
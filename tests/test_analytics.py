@@ -0,0 +1,422 @@
+'''
+test_analytics.py
+Tests that the Polars backend computes the same aggregates as the Cypher statements.
+
+The processed output below is small enough to follow every Cypher pattern by hand, and the expected frames are
+what the statements of queries.py return once it is loaded. Without a database, both backends are also compared on
+the synthetic corpus: CypherReference follows the statements over the graph that loading its output with MERGE
+writes to the stand-in database. Set RUN_PARITY to also compare both backends on the database of TARGET_ADDRESS,
+which must hold the processed output in DATABASE_OUTPUT_DIR.
+'''
+import math
+from os import environ
+from pathlib import Path
+import pandas as pd
+import polars as pl
+import pytest
+from config import NodeType, GRAPH_START_ID, GRAPH_END_ID, DATABASE_OUTPUT_DIR
+import src.graphdb.setup as Setup
+from src.graphdb.conf import ObjectNames
+from src.graphdb.helpers import parquet_file_name
+from src.graphdb.relationships import Relationships
+from src.processing.raw import derive_institution_works, preprocess
+from src.processing.synthetic import generate_corpus
+from src.visualization.analytics import ParquetAnalytics
+from src.visualization.queries import GEOGRAPHIC_TOPIC_AVERAGES, Statements
+from tests.neo4j_standin import StandInConnection, replayed_graph
+from tests.test_synthetic import SMALL_CORPUS
+
+def normalized(value):
+    if hasattr(value, 'items'):
+        return tuple(sorted((str(key), normalized(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(sorted((normalized(item) for item in value), key=repr))
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return round(float(value), 9)
+    return value
+
+def assert_same(first: pd.DataFrame, second: pd.DataFrame):
+    '''
+    The same columns and rows, in any order. Nested values compare in any order, and numbers by value.
+    '''
+    assert list(first.columns) == list(second.columns)
+    rows = lambda frame: sorted((tuple(normalized(value) for value in row) for row in frame.itertuples(index=False)), key=repr)
+    assert rows(first) == rows(second)
+
+def write(output: Path, shard: str, name: str, kind: str, data: dict, *nodeTypes: NodeType):
+    directory = output.joinpath(shard, name, kind)
+    directory.mkdir(parents=True, exist_ok=True)
+    pl.DataFrame(data, strict=False).write_parquet(directory.joinpath(parquet_file_name(*nodeTypes)))
+
+def relationships(output: Path, shard: str, start: NodeType, target: NodeType, pairs: list[tuple], **properties):
+    write(output, shard, start.value, 'relationships',
+          {GRAPH_START_ID: [pair[0] for pair in pairs], GRAPH_END_ID: [pair[1] for pair in pairs], **properties}, start, target)
+
+@pytest.fixture
+def output(tmp_path: Path) -> Path:
+    '''
+    Institutions I1 and I2 with works W1, W2 and W3, collaborating with X1 in the US and X2 in France.
+    '''
+    write(tmp_path, 'institutions', 'SFU_U15_institution', 'nodes', {
+        'id': ['I1', 'I2', 'I3'], 'display_name': ['One', 'Two', 'Three'], 'lineage_root': [True, True, False], 'works_count': [10, 5, 1]
+    }, NodeType.SFU_U15_institution)
+    write(tmp_path, 'authors', 'affiliated_institution', 'nodes', {
+        'id': ['I1', 'I2', 'I3', 'X1', 'X2'], 'display_name': ['One', 'Two', 'Three', 'Ex 1', 'Ex 2']
+    }, NodeType.affiliated_institution)
+    write(tmp_path, 'geographic_data', 'geographic', 'nodes', {
+        'id': ['CA', 'US', 'FR'], 'continent': ['North America', 'North America', 'Europe'], 'country_name': ['Canada', 'United States', 'France']
+    }, NodeType.geographic)
+    write(tmp_path, 'year_data', 'year', 'nodes', {'id': pl.Series([2020, 2021], dtype=pl.Int32)}, NodeType.year)
+    write(tmp_path, 'authors', 'author', 'nodes', {'id': ['A1', 'A2', 'A3']}, NodeType.author)
+    write(tmp_path, 'works', 'authorship', 'nodes', {
+        'id': ['W1_A1', 'W1_A2', 'W2_A1', 'W2_B', 'W3_A3', 'W3_C', 'W9_A1']
+    }, NodeType.authorship)
+    write(tmp_path, 'works', 'work', 'nodes', {
+        'id': ['W1', 'W2', 'W3'],
+        'publication_year': [2020, 2021, 2021],
+        'is_oa': [True, False, True],
+        'oa_status': ['gold', 'closed', 'green'],
+        'type': ['article', 'article', 'review'],
+        'countries_distinct_count': [2, 2, 2],
+        'institutions_distinct_count': [2, 2, 2],
+        'fwci': [1.0, 3.0, None],
+        'citation_normalized_percentile': [0.5, 0.7, 0.9],
+        'apc_paid': [100, 0, 50]
+    }, NodeType.work)
+    # A shard loaded before works with a stale duplicate of W1. MERGE sets the properties of the later shard over it
+    write(tmp_path, 'work_0', 'work', 'nodes', {'id': ['W1'], 'publication_year': [1999]}, NodeType.work)
+    write(tmp_path, 'topics', 'topic', 'nodes', {'id': ['T1', 'T2'], 'display_name': ['Topic 1', 'Topic 2']}, NodeType.topic)
+    write(tmp_path, 'topics', 'subfield', 'nodes', {'id': ['S1'], 'display_name': ['Subfield']}, NodeType.subfield)
+    write(tmp_path, 'topics', 'field', 'nodes', {'id': ['F1'], 'display_name': ['Field']}, NodeType.field)
+    write(tmp_path, 'topics', 'domain', 'nodes', {'id': ['D1'], 'display_name': ['Domain']}, NodeType.domain)
+
+    relationships(tmp_path, 'institutions', NodeType.affiliated_institution, NodeType.SFU_U15_institution, [('I1', 'I1'), ('I2', 'I2'), ('I3', 'I3')])
+    relationships(tmp_path, 'authors', NodeType.affiliated_institution, NodeType.geographic, [('I1', 'CA'), ('I2', 'CA'), ('X1', 'US'), ('X2', 'FR')])
+    relationships(tmp_path, 'authors', NodeType.author, NodeType.affiliated_institution, [('A1', 'I1'), ('A2', 'I1'), ('A3', 'I2')],
+                  years=[[2020, 2021], [2021], []])
+    write(tmp_path, 'authors', 'author', 'relationships', {
+        GRAPH_START_ID: ['A1', 'A1', 'A2', 'A3'], GRAPH_END_ID: pl.Series([2020, 2021, 2021, 2020], dtype=pl.UInt32),
+        'works_count': [2, 1, 4, 1], 'cited_by_count': [5, 3, 1, 1]
+    }, NodeType.author, NodeType.year)
+    relationships(tmp_path, 'works', NodeType.authorship, NodeType.affiliated_institution, [
+        ('W1_A1', 'I1'), ('W1_A2', 'I1'), ('W1_A2', 'X1'), ('W2_A1', 'I1'), ('W2_B', 'X2'), ('W3_A3', 'I2'), ('W3_C', 'X1'), ('W9_A1', 'I1')
+    ])
+    # W9 is not a node, so its authorship is not on a work
+    relationships(tmp_path, 'works', NodeType.authorship, NodeType.work, [
+        ('W1_A1', 'W1'), ('W1_A2', 'W1'), ('W2_A1', 'W2'), ('W2_B', 'W2'), ('W3_A3', 'W3'), ('W3_C', 'W3'), ('W9_A1', 'W9')
+    ])
+    relationships(tmp_path, 'work_0', NodeType.authorship, NodeType.work, [('W1_A1', 'W1')])
+    relationships(tmp_path, 'works', NodeType.work, NodeType.topic, [('W1', 'T1'), ('W1', 'T2'), ('W2', 'T1'), ('W3', 'T2')])
+    relationships(tmp_path, 'topics', NodeType.topic, NodeType.subfield, [('T1', 'S1'), ('T2', 'S1')])
+    relationships(tmp_path, 'topics', NodeType.subfield, NodeType.field, [('S1', 'F1')])
+    relationships(tmp_path, 'topics', NodeType.field, NodeType.domain, [('F1', 'D1')])
+    derive_institution_works(tmp_path)
+    return tmp_path
+
+TOPIC_1 = ('D1', 'Domain', 'F1', 'Field', 'S1', 'Subfield', 'T1', 'Topic 1')
+TOPIC_2 = ('D1', 'Domain', 'F1', 'Field', 'S1', 'Subfield', 'T2', 'Topic 2')
+US = ('US', 'North America', 'United States')
+FR = ('FR', 'Europe', 'France')
+
+def test_institution_aggregates(output: Path):
+    analytics = ParquetAnalytics(output)
+
+    assert_same(analytics('summary_nodes_by_institution', Statements.bind('summary_nodes_by_institution')[1]), pd.DataFrame({
+        'I': [{'id': 'I1', 'display_name': 'One', 'lineage_root': True, 'works_count': 10},
+              {'id': 'I2', 'display_name': 'Two', 'lineage_root': True, 'works_count': 5}],
+        'author_count': [2, 1],
+        'authorship_count': [3, 1],
+        'openalex_paper_count': [2, 1],
+        'total_author_count': [4, 2]
+    }))
+
+    assert_same(analytics.works_analysis(), pd.DataFrame({
+        'id': ['I1', 'I2'],
+        'display_name': ['One', 'Two'],
+        'avg_distinct_countries': [2.0, 2.0],
+        'avg_citation_normalized_percentile': [0.6, 0.9],
+        'avg_fwci': [2.0, None],
+        'avg_distinct_institutions': [2.0, 2.0],
+        'avg_apc_paid': [50.0, 50.0],
+        'is_open_access': [{'true': 1, 'false': 1}, {'true': 1}],
+        'type': [{'article': 2}, {'review': 1}],
+        'total_by_publication_year': [{'2020': 1, '2021': 1}, {'2021': 1}],
+        'open_access_status': [{'gold': 1}, {'green': 1}]
+    }))
+
+    # I2 has no affiliation years, which unwind to no rows
+    assert_same(analytics.authors_analysis(), pd.DataFrame({
+        'id': ['I1'],
+        'display_name': ['One'],
+        'author_counts_by_year': [[{'year': 2020, 'works_count': 2, 'cited_by_count': 5}, {'year': 2021, 'works_count': 5, 'cited_by_count': 4}]],
+        'affiliated_per_year': [{'2020': 1, '2021': 2}]
+    }))
+
+    # Works are counted once per authorship of the institution
+    assert_same(analytics.topics_works(), pd.DataFrame([
+        ('I1', 'One', *TOPIC_1, 3, 6, 6, 5.0, 1.7, 200),
+        ('I1', 'One', *TOPIC_2, 2, 4, 4, 2.0, 1.0, 200),
+        ('I2', 'Two', *TOPIC_2, 1, 2, 2, 0, 0.9, 50)
+    ], columns=['id', 'institution_display_name', 'domain_id', 'domain_display_name', 'field_id', 'field_display_name',
+                'subfield_id', 'subfield_display_name', 'topic_id', 'topic_display_name', 'total_works', 'sum_distinct_countries',
+                'sum_distinct_institutions', 'sum_fwci', 'sum_citation_normalized_percentile', 'sum_apc_paid']))
+
+def test_lineage_works(output: Path):
+    # I2 is below I1 in its lineage, so the authorship of I2 on W3 counts for I1 with include_lineage
+    relationships(output, 'authors', NodeType.affiliated_institution, NodeType.affiliated_institution, [('I2', 'I1')])
+    derive_institution_works(output)
+    analytics = ParquetAnalytics(output)
+
+    summary = analytics.summary_nodes_by_institution()
+    assert summary['authorship_count'].tolist() == [3, 1]
+    assert summary['openalex_paper_count'].tolist() == [2, 1]
+
+    summary = analytics.summary_nodes_by_institution(include_lineage=True)
+    assert summary['authorship_count'].tolist() == [4, 1]
+    assert summary['openalex_paper_count'].tolist() == [3, 1]
+    assert analytics.works_analysis(include_lineage=True)['total_by_publication_year'].tolist() == [{'2020': 1, '2021': 2}, {'2021': 1}]
+
+def test_geographic_collaborations(output: Path):
+    analytics = ParquetAnalytics(output)
+    topic_columns = ['domain_id', 'domain_display_name', 'field_id', 'field_display_name', 'subfield_id', 'subfield_display_name',
+                     'topic_id', 'topic_display_name', 'country_id', 'continent', 'country_name', 'number_of_collaborations',
+                     'avg_distinct_countries', 'avg_citation_normalized_percentile', 'avg_fwci', 'avg_distinct_institutions', 'avg_apc_paid']
+
+    collaborations = analytics('geographic_collaborations', {'target_id': 'I1'})
+    assert_same(collaborations, pd.DataFrame([(*FR, 1), (*US, 1)], columns=['id', 'continent', 'country', 'number_of_collaborations']))
+
+    topics = analytics('geographic_topics_collaborations', {'target_id': 'I1'})
+    assert_same(topics, pd.DataFrame([
+        (*TOPIC_1, *FR, 1, 2.0, 0.7, 3.0, 2.0, 0.0),
+        (*TOPIC_1, *US, 1, 2.0, 0.5, 1.0, 2.0, 100.0),
+        (*TOPIC_2, *US, 1, 2.0, 0.5, 1.0, 2.0, 100.0)
+    ], columns=topic_columns))
+    assert topics['topic_id'].tolist() == ['T1', 'T1', 'T2']
+
+    # The collaborations of every institution match those of each institution on its own
+    institutions, institution_topics = analytics.institution_collaborations(analytics.institution_ids())
+    assert institutions.columns[0] == institution_topics.columns[0] == 'institution_id'
+    assert_same(institutions[institutions['institution_id'] == 'I1'].drop(columns='institution_id'), collaborations)
+    assert_same(institution_topics[institution_topics['institution_id'] == 'I1'].drop(columns='institution_id'), topics)
+    assert_same(institutions[institutions['institution_id'] == 'I2'].drop(columns='institution_id'),
+                pd.DataFrame([(*US, 1)], columns=['id', 'continent', 'country', 'number_of_collaborations']))
+
+    with pytest.raises(Exception):
+        analytics('summary_node_information')
+
+@pytest.mark.skipif(not environ.get('RUN_PARITY'), reason='Set RUN_PARITY to compare the backends on a database')
+@pytest.mark.parametrize('name', ParquetAnalytics.queries)
+def test_backends_match_on_database(name: str):
+    from src.visualization.client import Client
+
+    query, parameters = Statements.bind(name)
+    assert_same(Client()(query, parameters), ParquetAnalytics(DATABASE_OUTPUT_DIR)(name, parameters))
+
+def _cypher_key(value) -> str:
+    # Map keys are strings, as apoc.coll.frequenciesAsMap and apoc.map.fromPairs return them
+    return str(value).lower() if isinstance(value, bool) else str(value)
+
+def _average(values: list):
+    values = [value for value in values if value is not None]
+    return sum(values) / len(values) if values else None
+
+def _frequencies(values: list) -> dict:
+    counts = {}
+    for value in values:
+        if value is not None:
+            counts[_cypher_key(value)] = counts.get(_cypher_key(value), 0) + 1
+    return counts
+
+class CypherReference:
+    '''
+    Follows the patterns of the statements of queries.py, row by row, over the graph the loaders write, with the
+    default parameters. Reference for the Polars backend when no database is available.
+    '''
+
+    def __init__(self, nodes: dict[str, dict], relationships: dict[tuple[str, str, str], dict]):
+        self.nodes = nodes
+        self.relationships = relationships
+
+    def node(self, nodeType: NodeType, id) -> dict:
+        return self.nodes.get(ObjectNames[nodeType].name, {}).get(id, {})
+
+    def edges(self, start: NodeType, target: NodeType) -> list[tuple]:
+        '''
+        The (origin id, target id, properties) of the relationships from start to target.
+        '''
+        key = (ObjectNames[start].name, Relationships.RelationshipTypeMap[(start, target)], ObjectNames[target].name)
+        return [(origin, end, properties) for (origin, end), properties in self.relationships.get(key, {}).items()]
+
+    def outgoing(self, start: NodeType, target: NodeType) -> dict:
+        edges = {}
+        for origin, end, properties in self.edges(start, target):
+            edges.setdefault(origin, []).append((end, properties))
+        return edges
+
+    def incoming(self, start: NodeType, target: NodeType) -> dict:
+        edges = {}
+        for origin, end, properties in self.edges(start, target):
+            edges.setdefault(end, []).append((origin, properties))
+        return edges
+
+    def institutions(self) -> list[tuple[str, dict]]:
+        return sorted((id, properties) for id, properties in self.nodes[ObjectNames[NodeType.SFU_U15_institution].name].items()
+                      if properties.get('lineage_root') is True)
+
+    def memberships(self, institution: str) -> list[tuple[str, dict]]:
+        # WHERE m.authorships > 0, which is null and filters the row when authorships is null
+        return [(work, membership) for work, membership in self.outgoing(NodeType.SFU_U15_institution, NodeType.work).get(institution, [])
+                if membership.get('authorships') is not None and membership['authorships'] > 0]
+
+    def authors(self, institution: str) -> list[tuple[str, dict]]:
+        '''
+        The (author, AFFILIATED_WITH properties) rows of (I)<-[]-(:affiliated_institution)<-[]-(:author).
+        '''
+        affiliated = self.incoming(NodeType.author, NodeType.affiliated_institution)
+        return [row for afl, _ in self.incoming(NodeType.affiliated_institution, NodeType.SFU_U15_institution).get(institution, [])
+                for row in affiliated.get(afl, [])]
+
+    def summary_nodes_by_institution(self) -> pd.DataFrame:
+        authorships_of = self.incoming(NodeType.authorship, NodeType.work)
+        rows = []
+        for id, properties in self.institutions():
+            memberships = self.memberships(id)
+            works = {work for work, _ in memberships}
+            # UNWIND of the empty list of works removes the institution
+            if not works:
+                continue
+            rows.append((properties, len({author for author, _ in self.authors(id)}),
+                         sum(membership['authorships'] for _, membership in memberships), len(works),
+                         len({authorship for work in works for authorship, _ in authorships_of.get(work, [])})))
+        return pd.DataFrame(rows, columns=['I', 'author_count', 'authorship_count', 'openalex_paper_count', 'total_author_count'])
+
+    def works_analysis(self) -> pd.DataFrame:
+        rows = []
+        for id, properties in self.institutions():
+            works = [self.node(NodeType.work, work) for work in {work for work, _ in self.memberships(id)}]
+            values = lambda name: [work.get(name) for work in works]
+            rows.append((id, properties.get('display_name'),
+                         _average(values('countries_distinct_count')), _average(values('citation_normalized_percentile')),
+                         _average(values('fwci')), _average(values('institutions_distinct_count')), _average(values('apc_paid')),
+                         _frequencies(values('is_oa')), _frequencies(values('type')), _frequencies(values('publication_year')),
+                         _frequencies([work.get('oa_status') if work.get('is_oa') is True else None for work in works])))
+        return pd.DataFrame(rows, columns=['id', 'display_name', 'avg_distinct_countries', 'avg_citation_normalized_percentile', 'avg_fwci',
+                                           'avg_distinct_institutions', 'avg_apc_paid', 'is_open_access', 'type',
+                                           'total_by_publication_year', 'open_access_status'])
+
+    def authors_analysis(self) -> pd.DataFrame:
+        years_of = self.outgoing(NodeType.author, NodeType.year)
+        rows = []
+        for id, properties in self.institutions():
+            authors = self.authors(id)
+            by_year = {}
+            for author, _ in authors:
+                for year, counts in years_of.get(author, []):
+                    totals = by_year.setdefault(year, [0, 0])
+                    totals[0] += counts.get('works_count') or 0
+                    totals[1] += counts.get('cited_by_count') or 0
+            counts_by_year = [{'year': year, 'works_count': works, 'cited_by_count': cited} for year, (works, cited) in by_year.items()]
+
+            # UNWIND of the affiliation years removes the institution when none of its authors has any
+            affiliation_years = [year for _, affiliation in authors for year in affiliation.get('years') or []]
+            if affiliation_years:
+                rows.append((id, properties.get('display_name'), counts_by_year, _frequencies(affiliation_years)))
+        return pd.DataFrame(rows, columns=['id', 'display_name', 'author_counts_by_year', 'affiliated_per_year'])
+
+    def topic_paths(self, topic: str) -> list[tuple[str, str, str, str]]:
+        '''
+        The (topic, subfield, field, domain) ids of the hierarchy above a topic.
+        '''
+        subfields, fields = self.outgoing(NodeType.topic, NodeType.subfield), self.outgoing(NodeType.subfield, NodeType.field)
+        domains = self.outgoing(NodeType.field, NodeType.domain)
+        return [(topic, subfield, field, domain) for subfield, _ in subfields.get(topic, [])
+                for field, _ in fields.get(subfield, []) for domain, _ in domains.get(field, [])]
+
+    def topic_columns(self, path: tuple) -> tuple:
+        topic, subfield, field, domain = path
+        return tuple(value for nodeType, id in [(NodeType.domain, domain), (NodeType.field, field), (NodeType.subfield, subfield), (NodeType.topic, topic)]
+                     for value in (id, self.node(nodeType, id).get('display_name')))
+
+    def topics_works(self) -> pd.DataFrame:
+        topics_of = self.outgoing(NodeType.work, NodeType.topic)
+        sums = ['countries_distinct_count', 'institutions_distinct_count', 'fwci', 'citation_normalized_percentile', 'apc_paid']
+        rows = []
+        for id, properties in self.institutions():
+            groups = {}
+            for work, membership in self.memberships(id):
+                for topic, _ in topics_of.get(work, []):
+                    for path in self.topic_paths(topic):
+                        group = groups.setdefault(path, [0] + [[] for _ in sums])
+                        group[0] += membership['authorships']
+                        for index, name in enumerate(sums, start=1):
+                            value = self.node(NodeType.work, work).get(name)
+                            group[index].append(value * membership['authorships'] if value is not None else None)
+            if not groups:
+                # OPTIONAL MATCH without a match keeps the institution with null topics
+                rows.append((id, properties.get('display_name'), *[None] * 8, 0, *[0] * len(sums)))
+            for path, (total, *values) in groups.items():
+                rows.append((id, properties.get('display_name'), *self.topic_columns(path), total,
+                             *[sum(value for value in column if value is not None) for column in values]))
+        return pd.DataFrame(rows, columns=['id', 'institution_display_name', 'domain_id', 'domain_display_name', 'field_id', 'field_display_name',
+                                           'subfield_id', 'subfield_display_name', 'topic_id', 'topic_display_name', 'total_works',
+                                           'sum_distinct_countries', 'sum_distinct_institutions', 'sum_fwci',
+                                           'sum_citation_normalized_percentile', 'sum_apc_paid'])
+
+    def collaborations(self, target_id: str) -> list[tuple[str, str]]:
+        '''
+        The (work, geographic) rows of the works of the target and the countries of their other institutions.
+        '''
+        authorships_of = self.incoming(NodeType.authorship, NodeType.work)
+        institutions_of = self.outgoing(NodeType.authorship, NodeType.affiliated_institution)
+        countries_of = self.outgoing(NodeType.affiliated_institution, NodeType.geographic)
+        return [(work, country) for work, _ in self.memberships(target_id)
+                for authorship, _ in authorships_of.get(work, [])
+                for institution, _ in institutions_of.get(authorship, []) if institution != target_id
+                for country, _ in countries_of.get(institution, [])]
+
+    def country_columns(self, country: str) -> tuple:
+        geographic = self.node(NodeType.geographic, country)
+        return (country, geographic.get('continent'), geographic.get('country_name'))
+
+    def geographic_collaborations(self, target_id: str) -> pd.DataFrame:
+        counts = {}
+        for _, country in self.collaborations(target_id):
+            counts[self.country_columns(country)] = counts.get(self.country_columns(country), 0) + 1
+        return pd.DataFrame([(*columns, count) for columns, count in counts.items()],
+                            columns=['id', 'continent', 'country', 'number_of_collaborations'])
+
+    def geographic_topics_collaborations(self, target_id: str) -> pd.DataFrame:
+        topics_of = self.outgoing(NodeType.work, NodeType.topic)
+        groups = {}
+        for work, country in self.collaborations(target_id):
+            for topic, _ in topics_of.get(work, []):
+                for path in self.topic_paths(topic):
+                    groups.setdefault((*self.topic_columns(path), *self.country_columns(country)), []).append(self.node(NodeType.work, work))
+        return pd.DataFrame([(*key, len(works), *[_average([work.get(name) for work in works]) for name, _ in GEOGRAPHIC_TOPIC_AVERAGES])
+                             for key, works in groups.items()],
+                            columns=['domain_id', 'domain_display_name', 'field_id', 'field_display_name', 'subfield_id', 'subfield_display_name',
+                                     'topic_id', 'topic_display_name', 'country_id', 'continent', 'country_name', 'number_of_collaborations',
+                                     *[column for _, column in GEOGRAPHIC_TOPIC_AVERAGES]])
+
+def test_backends_match_offline(tmp_path: Path):
+    '''
+    The Polars backend over the processed synthetic corpus matches the Cypher statements followed over the graph
+    that loading the same output with MERGE writes.
+    '''
+    generate_corpus(tmp_path.joinpath('raw'), SMALL_CORPUS)
+    output = tmp_path.joinpath('output')
+    preprocess(tmp_path.joinpath('raw'), output)
+
+    connection = StandInConnection()
+    Setup.load_into_db(connection, output, remote=True)
+    reference = CypherReference(*replayed_graph(connection._driver))
+    analytics = ParquetAnalytics(output)
+    target_id = analytics.institution_ids()[0]
+
+    for name in ParquetAnalytics.queries:
+        parameters = Statements.bind(name, target_id=target_id)[1]
+        expected = getattr(reference, name)(target_id) if 'target_id' in parameters else getattr(reference, name)()
+        assert len(expected) > 0, name
+        assert_same(analytics(name, parameters), expected)
@@ -0,0 +1,163 @@
+'''
+test_benchmarks.py
+Throughput benchmarks of the ETL on fixed synthetic corpora, run with pytest-benchmark.
+
+The benchmarks only run when RUN_BENCHMARKS is set, e.g.:
+    RUN_BENCHMARKS=1 pytest tests/test_benchmarks.py --benchmark-json=benchmarks.json
+
+Every benchmark records its throughput in rows per second in extra_info. When BENCHMARK_BASELINE points to the
+--benchmark-json output of an earlier run, a benchmark fails once its throughput drops more than BENCHMARK_THRESHOLD
+(a fraction, 0.2 by default) below the baseline. BENCHMARK_SCALE multiplies the size of the synthetic corpus.
+
+Loading runs the remote code path of graphdb.setup against tests.neo4j_standin, a local stand-in for the database
+that accepts every batch without executing it, so the loading benchmarks measure the client side of the load.
+'''
+import json, shutil
+from os import environ
+from pathlib import Path
+import polars as pl
+import pytest
+import src.processing.raw as ProcessingRaw
+import src.graphdb.setup as Setup
+from src.processing.conf import GraphTable, designatedDirectories, schemas
+from src.processing.pruning_conf import SecondaryInformation
+from src.processing.streaming import stage_compressed_ndjson
+from src.graphdb.conf import ConcurrentLoadConfig
+from src.processing.synthetic import SyntheticCorpusConfig, generate_corpus
+from tests.neo4j_standin import StandInConnection
+
+pytestmark = pytest.mark.skipif(not environ.get('RUN_BENCHMARKS'), reason='Set RUN_BENCHMARKS to run the benchmarks')
+
+ENTITIES = ['works', 'authors', 'institutions', 'sources', 'funders', 'topics']
+BENCHMARK_CONFIG = SyntheticCorpusConfig(seed=2024, works=2000, authors=500, external_institutions=200, sources=100)\
+    .scale(float(environ.get('BENCHMARK_SCALE', 1.0)))
+BENCHMARK_THRESHOLD = float(environ.get('BENCHMARK_THRESHOLD', 0.2))
+ROUNDS = 3
+
+def _baseline() -> dict[str, float]:
+    path = environ.get('BENCHMARK_BASELINE')
+    if not path:
+        return {}
+
+    benchmarks = json.loads(Path(path).read_text()).get('benchmarks', [])
+    return {
+        benchmark['fullname']: benchmark['extra_info']['throughput']
+        for benchmark in benchmarks if 'throughput' in benchmark.get('extra_info', {})
+    }
+
+def record_throughput(benchmark, rows: int):
+    '''
+    Store the throughput of the benchmark and compare it with the baseline.
+    '''
+    throughput = rows / benchmark.stats.stats.mean
+    benchmark.extra_info['rows'] = rows
+    benchmark.extra_info['throughput'] = throughput
+
+    baseline = _baseline().get(benchmark.fullname)
+    if baseline is not None:
+        assert throughput >= baseline * (1 - BENCHMARK_THRESHOLD), \
+            f'Throughput of {throughput:.0f} rows/s regressed more than {BENCHMARK_THRESHOLD:.0%} from the baseline of {baseline:.0f} rows/s'
+
+def fresh_directory(parent: Path, name: str) -> Path:
+    directory = parent.joinpath(name)
+    shutil.rmtree(directory, ignore_errors=True)
+    directory.mkdir(parents=True)
+    return directory
+
+def parquet_rows(files: list[Path]) -> int:
+    return sum(pl.scan_parquet(file).select(pl.len()).collect().item() for file in files)
+
+@pytest.fixture(scope='module')
+def corpus(tmp_path_factory) -> tuple[Path, dict[str, int]]:
+    directory = tmp_path_factory.mktemp('corpus')
+    counts = generate_corpus(directory, BENCHMARK_CONFIG)
+    return directory, counts
+
+@pytest.fixture(scope='module')
+def processed(corpus, tmp_path_factory) -> Path:
+    directory, _ = corpus
+    output = tmp_path_factory.mktemp('processed')
+    ProcessingRaw.process_data(directory, output)
+    return output
+
+@pytest.mark.parametrize('entity', ENTITIES)
+def test_process_files(benchmark, corpus, tmp_path: Path, entity: str):
+    directory, counts = corpus
+
+    benchmark.pedantic(
+        ProcessingRaw.process_files,
+        setup=lambda: ((directory.joinpath(entity), fresh_directory(tmp_path, 'output')), {}),
+        rounds=ROUNDS
+    )
+    record_throughput(benchmark, counts[entity])
+
+@pytest.mark.parametrize('entity', ENTITIES)
+def test_derive(benchmark, corpus, tmp_path: Path, entity: str):
+    directory, _ = corpus
+    staged = stage_compressed_ndjson(
+        next(directory.joinpath(entity).glob('*.json.zst')), tmp_path.joinpath('staged'),
+        schemas.get(entity), 16 * 1024 * 1024
+    )
+    table = ProcessingRaw.clean_data(designatedDirectories[entity], staged)
+    cleaned = table.data.collect()
+
+    def derive(table: GraphTable):
+        collections = SecondaryInformation().derive(table)
+        frames = [t.data for c in collections for t in [*c.nodes, *c.relationships]]
+        return pl.collect_all(frames)
+
+    # derive replaces the data of the table, so every round gets a fresh table
+    benchmark.pedantic(derive, setup=lambda: ((GraphTable(table.name, table.type, cleaned.lazy()),), {}), rounds=ROUNDS)
+    record_throughput(benchmark, cleaned.height)
+
+def test_save_as_parquet(benchmark, processed, tmp_path: Path):
+    works = pl.read_parquet(next(processed.glob('*/works/nodes/work_0.parquet')))
+
+    benchmark.pedantic(
+        ProcessingRaw.save_as_parquet,
+        setup=lambda: ((works.lazy(), fresh_directory(tmp_path, 'output').joinpath('work.parquet')), {}),
+        rounds=ROUNDS
+    )
+    record_throughput(benchmark, works.height)
+
+def test_load_nodes(benchmark, processed):
+    node_dirs = list(processed.glob('*/*/nodes'))
+    rows = parquet_rows([file for node_dir in node_dirs for file in node_dir.glob('*.parquet')])
+
+    def load():
+        connection = StandInConnection()
+        for node_dir in node_dirs:
+            Setup.load_nodes_into_db(connection, node_dir, remote=True)
+        return connection
+
+    connection = benchmark.pedantic(load, rounds=ROUNDS)
+    assert connection._driver.rows == rows
+    record_throughput(benchmark, rows)
+
+def test_load_relationships(benchmark, processed):
+    relationship_dirs = list(processed.glob('*/*/relationships'))
+    rows = parquet_rows([file for relationship_dir in relationship_dirs for file in relationship_dir.glob('*.parquet')])
+
+    def load():
+        connection = StandInConnection()
+        for relationship_dir in relationship_dirs:
+            Setup.load_relationships_into_db(connection, relationship_dir, remote=True)
+        return connection
+
+    connection = benchmark.pedantic(load, rounds=ROUNDS)
+    assert connection._driver.rows == rows
+    record_throughput(benchmark, rows)
+
+def test_load_relationships_concurrent(benchmark, processed):
+    relationship_dirs = list(processed.glob('*/*/relationships'))
+    rows = parquet_rows([file for relationship_dir in relationship_dirs for file in relationship_dir.glob('*.parquet')])
+
+    def load():
+        connection = StandInConnection()
+        for relationship_dir in relationship_dirs:
+            Setup.load_relationships_into_db(connection, relationship_dir, remote=True, concurrency=ConcurrentLoadConfig())
+        return connection
+
+    connection = benchmark.pedantic(load, rounds=ROUNDS)
+    assert connection._driver.rows == rows
+    record_throughput(benchmark, rows)
@@ -0,0 +1,83 @@
+'''
+test_bulk_import.py
+Tests for the neo4j-admin bulk import export.
+'''
+from pathlib import Path
+import polars as pl
+import pytest
+from config import GRAPH_START_ID, GRAPH_END_ID, NodeType
+import src.processing.raw as ProcessingRaw
+from src.graphdb.relationships import PropertyRelationship, PropertyType, Relationships
+from src.utils.graph_data import parquet_file_name
+from src.graphdb.bulk_import import export_bulk_import, export_nodes, export_relationships, import_command, import_type
+from src.processing.synthetic import SyntheticCorpusConfig, generate_corpus
+
+@pytest.fixture(scope='module')
+def processed(tmp_path_factory) -> Path:
+    directory = tmp_path_factory.mktemp('bulk')
+    generate_corpus(directory.joinpath('raw'), SyntheticCorpusConfig(works=200, authors=50, external_institutions=30, sources=10, root_institutions=2,
+                                                                     domains=2, fields_per_domain=2, subfields_per_field=2, topics_per_subfield=2))
+    ProcessingRaw.process_data(directory.joinpath('raw'), directory.joinpath('imports'))
+    ProcessingRaw.generate_years(directory.joinpath('imports', 'year_data', 'year'))
+    return directory.joinpath('imports')
+
+def test_import_type():
+    assert import_type(pl.Int32) == 'long'
+    assert import_type(pl.Float32) == 'double'
+    assert import_type(pl.List(pl.String)) == 'string[]'
+    assert import_type(pl.List(pl.List(pl.Int64))) is None
+    assert import_type(pl.Struct({'a': pl.Int64})) is None
+
+def test_export_nodes(processed: Path, tmp_path: Path):
+    nodes = {node.name: node for node in export_nodes(processed, tmp_path)}
+
+    # Affiliated institutions are derived from both works and authors
+    institution_ids = pl.concat([pl.scan_parquet(file).select('id') for file in processed.glob('*/*/nodes/affiliated__institution_*.parquet')])
+    assert nodes['affiliated_institution'].rows == institution_ids.unique().collect().height
+
+    header = nodes['work'].header.read_text().strip().split(',')
+    assert header[0] == ':ID(work)'
+    assert 'id:string' in header and 'cited_by_count:long' in header
+
+    assert nodes['year'].header.read_text().strip() == ':ID(year),id:long'
+
+def test_export_relationships(processed: Path, tmp_path: Path):
+    relationships = export_relationships(processed, tmp_path)
+    in_year = [rel for rel in relationships if rel.name == 'IN_YEAR']
+
+    # Every start label gets its own IN_YEAR file
+    headers = {rel.header.read_text().split(',')[0] for rel in in_year}
+    assert headers == {f':START_ID({label})' for label in ['work', 'author', 'source', 'funder', 'SFU_U15_institution']}
+    assert all(rel.header.read_text().split(',')[1] == ':END_ID(year)' for rel in in_year)
+
+def test_export_property_relationships(tmp_path: Path):
+    data = tmp_path.joinpath('imports', 'institution_data')
+    for folder in ['nodes', 'relationships']:
+        data.joinpath('institution', folder).mkdir(parents=True)
+    pl.DataFrame({'id': ['I1', 'I2', 'I3'], 'country_code': ['CA', 'CA', 'US']})\
+        .write_parquet(data.joinpath('institution', 'nodes', parquet_file_name(NodeType.SFU_U15_institution)))
+    pl.DataFrame({'id': ['CA', 'US']}).write_parquet(data.joinpath('institution', 'nodes', parquet_file_name(NodeType.geographic)))
+    # Derived while preprocessing for one of the pairs the join finds again
+    pl.DataFrame({GRAPH_START_ID: ['I1'], GRAPH_END_ID: ['CA']})\
+        .write_parquet(data.joinpath('institution', 'relationships', parquet_file_name(NodeType.SFU_U15_institution, NodeType.geographic)))
+
+    relationship = Relationships().createRelationshipObject(NodeType.SFU_U15_institution, NodeType.geographic)
+    joined = PropertyRelationship(relationship, {'country_code': 'id'}, PropertyType.ONE_TO_ONE)
+    situated_in = [rel for rel in export_relationships(tmp_path.joinpath('imports'), tmp_path.joinpath('out'), [joined]) if rel.name == 'SITUATED_IN']
+
+    assert len(situated_in) == 1
+    pairs = pl.read_csv(situated_in[0].data, has_header=False, new_columns=[GRAPH_START_ID, GRAPH_END_ID])
+    assert sorted(pairs.rows()) == [('I1', 'CA'), ('I2', 'CA'), ('I3', 'US')]
+
+def test_import_command(processed: Path):
+    command = export_bulk_import(processed)
+    output = processed.joinpath('bulk_import')
+
+    assert output.joinpath('import.sh').read_text().endswith(command+'\n')
+    assert command.startswith('neo4j-admin database import full')
+    assert '--nodes=work=/var/lib/neo4j/import/bulk_import/nodes/work.header.csv,/var/lib/neo4j/import/bulk_import/nodes/work.csv' in command
+    assert '--relationships=AUTHORSHIP_ON_WORK=' in command
+    assert command.endswith('neo4j')
+
+    local = import_command([], [], 'neo4j', processed, None)
+    assert '/var/lib/neo4j' not in local
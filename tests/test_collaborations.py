@@ -0,0 +1,85 @@
+'''
+test_collaborations.py
+Tests for the batched geographic collaborations of several institutions.
+'''
+import numpy as np
+import pandas as pd
+from src.visualization.collaborations import GEOGRAPHIC_KEYS, GEOGRAPHIC_TOPIC_KEYS, institution_collaborations, work_id_ranges
+from src.visualization.config import CollaborationFanOutConfig
+from src.visualization.queries import GEOGRAPHIC_TOPIC_AVERAGES, Statements
+
+def collaboration_rows(institution: str, works: int) -> pd.DataFrame:
+    '''
+    One row per collaborating work, topic and country, as matched by the collaboration queries.
+    '''
+    rng = np.random.default_rng(len(institution))
+    rows = pd.DataFrame({
+        'institution': institution,
+        'work': [f'W{index:04d}' for index in rng.integers(0, works, works * 3)],
+        'topic': rng.choice(['T1', 'T2'], works * 3),
+        'country': rng.choice(['CA', 'US', 'FR'], works * 3)
+    })
+    for property, _ in GEOGRAPHIC_TOPIC_AVERAGES:
+        rows[property] = rng.random(len(rows))
+    rows.loc[rows.sample(frac=0.2, random_state=0).index, 'fwci'] = np.nan
+
+    topics = {'T1': ('D1', 'Domain', 'F1', 'Field', 'S1', 'Subfield', 'T1', 'Topic 1'),
+              'T2': ('D1', 'Domain', 'F2', 'Field 2', 'S2', 'Subfield 2', 'T2', 'Topic 2')}
+    for index, key in enumerate(GEOGRAPHIC_TOPIC_KEYS[:8]):
+        rows[key] = rows['topic'].map(lambda topic: topics[topic][index])
+    rows['country_id'] = rows['id'] = rows['country']
+    rows['continent'] = rows['country'].map({'CA': 'North America', 'US': 'North America', 'FR': 'Europe'})
+    rows['country_name'] = rows['country']
+    return rows
+
+class BatchClient:
+    '''
+    Answers the fan-out statements from the collaboration rows.
+    '''
+    def __init__(self, rows: pd.DataFrame):
+        self.rows = rows
+        self.batches = 0
+
+    def read_all(self, queries: dict, workers: int | None = None) -> dict[str, pd.DataFrame]:
+        return {name: self.read(*query) for name, query in queries.items()}
+
+    def read(self, query: str, parameters: dict) -> pd.DataFrame:
+        rows = self.rows[self.rows['institution'] == parameters['target_id']]
+        if query == Statements['institution_work_ids'].text:
+            return pd.DataFrame({'id': sorted(rows['work'].unique())})
+
+        self.batches += 1
+        rows = rows[(rows['work'] >= parameters['from_id']) & (rows['work'] <= parameters['to_id'])]
+        if query == Statements['geographic_collaborations_batch'].text:
+            return rows.groupby(GEOGRAPHIC_KEYS, as_index=False).size().rename(columns={'size': 'number_of_collaborations'})
+
+        grouped = rows.groupby(GEOGRAPHIC_TOPIC_KEYS)
+        result = grouped.size().rename('number_of_collaborations').to_frame()
+        for property, column in GEOGRAPHIC_TOPIC_AVERAGES:
+            result[column.replace('avg_', 'sum_', 1)] = grouped[property].sum()
+            result[column.replace('avg_', 'count_', 1)] = grouped[property].count()
+        return result.reset_index()
+
+def test_work_id_ranges():
+    assert work_id_ranges(['W1', 'W2', 'W3', 'W4', 'W5'], 2) == [('W1', 'W2'), ('W3', 'W4'), ('W5', 'W5')]
+    assert work_id_ranges([], 2) == []
+
+def test_batches_merge_to_the_full_aggregates():
+    rows = pd.concat([collaboration_rows('I1', 50), collaboration_rows('I22', 30)], ignore_index=True)
+    client = BatchClient(rows)
+
+    collaborations, topics = institution_collaborations(client, ['I1', 'I22', 'I333'], CollaborationFanOutConfig(batch_size=7))
+    assert client.batches == 2 * (len(work_id_ranges(sorted(rows[rows['institution'] == 'I1']['work'].unique()), 7)) +
+                                  len(work_id_ranges(sorted(rows[rows['institution'] == 'I22']['work'].unique()), 7)))
+
+    expected = rows.groupby(['institution'] + GEOGRAPHIC_KEYS).size()
+    merged = collaborations.set_index(['institution_id'] + GEOGRAPHIC_KEYS)['number_of_collaborations']
+    assert merged.sort_index().tolist() == expected.sort_index().tolist()
+    assert collaborations.columns[0] == 'institution_id'
+
+    full = rows.groupby(['institution'] + GEOGRAPHIC_TOPIC_KEYS)
+    merged = topics.set_index(['institution_id'] + GEOGRAPHIC_TOPIC_KEYS).sort_index()
+    assert merged['number_of_collaborations'].tolist() == full.size().sort_index().tolist()
+    for property, column in GEOGRAPHIC_TOPIC_AVERAGES:
+        assert np.allclose(merged[column], full[property].mean().sort_index(), equal_nan=True)
+    assert set(topics['institution_id']) == {'I1', 'I22'}
@@ -0,0 +1,89 @@
+'''
+test_concurrent_loader.py
+Tests for loading relationship files concurrently.
+'''
+from pathlib import Path
+import polars as pl
+import pytest
+from neo4j.exceptions import ClientError, TransientError
+from config import GRAPH_START_ID, GRAPH_END_ID, NodeType
+from src.graphdb.conf import ConcurrentLoadConfig, RemoteLoadConfig
+from src.graphdb.load_report import LoadStatistics
+import src.graphdb.concurrent_loader as ConcurrentLoader
+from src.graphdb.concurrent_loader import load_relationships_local, load_relationships_remote, partition_relationships, with_retries
+from src.graphdb.relationships import Relationships
+from tests.neo4j_standin import StandInConnection, deadlock
+
+relationshipObj = Relationships().createRelationshipObject(NodeType.work, NodeType.year)
+
+def relationships(rows: int) -> pl.DataFrame:
+    return pl.DataFrame({GRAPH_START_ID: [f'W{i % 500}' for i in range(rows)], GRAPH_END_ID: [2000 + i % 25 for i in range(rows)]})
+
+def test_partitions_do_not_share_start_nodes():
+    partitions = list(partition_relationships(relationships(5000), relationshipObj, 8).values())
+
+    assert sum(partition.height for partition in partitions) == 5000
+    start_nodes = [set(partition.get_column(GRAPH_START_ID)) for partition in partitions]
+    assert sum(len(nodes) for nodes in start_nodes) == len(set.union(*start_nodes))
+
+def test_with_retries():
+    config = ConcurrentLoadConfig(retries=2, backoff=0.001)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise deadlock()
+        return 'done'
+
+    assert with_retries(config, flaky) == 'done'
+    assert len(attempts) == 3
+
+    attempts.clear()
+    with pytest.raises(TransientError):
+        with_retries(ConcurrentLoadConfig(retries=1, backoff=0.001), flaky)
+
+    def client_error():
+        attempts.append(1)
+        raise ClientError()
+
+    attempts.clear()
+    with pytest.raises(ClientError):
+        with_retries(config, client_error)
+    assert len(attempts) == 1
+
+def test_load_relationships_remote(tmp_path: Path):
+    file = tmp_path.joinpath('work_year_relationship_0.parquet')
+    relationships(5000).write_parquet(file, row_group_size=500)
+    connection = StandInConnection(deadlocks=3)
+    statistics = LoadStatistics(file.name, 'relationship', 'IN_YEAR', 'remote')
+
+    loaded = load_relationships_remote(connection, file, relationshipObj, ConcurrentLoadConfig(workers=4, backoff=0.001),
+                                       RemoteLoadConfig(max_batch_rows=200), statistics=statistics)
+
+    assert loaded == connection._driver.rows == 5000
+    # Every deadlock is retried once, by with_retries
+    assert statistics.retries == 3
+    assert statistics.rows == 5000 and statistics.batches >= 25
+    sessions = [{row['origin_id'] for row in rows} for rows in connection._driver.sessions.values()]
+    assert len(sessions) == 4
+    assert sum(len(nodes) for nodes in sessions) == len(set.union(*sessions))
+
+def test_load_relationships_local(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(ConcurrentLoader, 'DATABASE_OUTPUT_DIR', tmp_path)
+    monkeypatch.setattr(ConcurrentLoader, 'PARTITION_DIRECTORY', tmp_path.joinpath('.partitions'))
+    file = tmp_path.joinpath('work_year_relationship_0.parquet')
+    relationships(5000).write_parquet(file)
+
+    # The start nodes of the partition files loaded by every apoc call
+    loaded : list[set[str]] = []
+    def execute_apoc_iterate(connection, query: str) -> dict:
+        rows = pl.read_parquet(tmp_path.joinpath(query.split('file:///')[1].split("'")[0]))
+        loaded.append(set(rows.get_column(GRAPH_START_ID)))
+        return {'total': rows.height, 'batches': 1}
+    monkeypatch.setattr(ConcurrentLoader, 'execute_apoc_iterate', execute_apoc_iterate)
+
+    assert load_relationships_local(StandInConnection(), file, relationshipObj, ConcurrentLoadConfig(workers=4)) == 5000
+    assert len(loaded) >= 4
+    assert sum(len(nodes) for nodes in loaded) == len(set.union(*loaded)) == 500
+    assert not tmp_path.joinpath('.partitions', file.stem).exists()
@@ -0,0 +1,100 @@
+'''
+test_fresh_load.py
+Tests for the CREATE fast path of loads into an empty database.
+'''
+from pathlib import Path
+import polars as pl
+from config import GRAPH_START_ID, GRAPH_END_ID, NodeType
+import src.graphdb.setup as Setup
+from src.graphdb.conf import LoadMode, ObjectNames
+from src.graphdb.relationships import Relationships
+from src.graphdb.remote_loader import node_query, relationship_query
+from tests.neo4j_standin import StandInConnection
+
+def write_shards(input_dir: Path):
+    for shard, ids in [('works-0', ['W1', 'W2', 'W3']), ('works-1', ['W3', 'W4'])]:
+        nodes = input_dir.joinpath(shard, 'works', 'nodes')
+        relationships = input_dir.joinpath(shard, 'works', 'relationships')
+        nodes.mkdir(parents=True)
+        relationships.mkdir(parents=True)
+        pl.DataFrame({'id': ids, 'title': ids}).write_parquet(nodes.joinpath('work_0.parquet'))
+        pl.DataFrame({GRAPH_START_ID: ids, GRAPH_END_ID: [2020] * len(ids)})\
+            .write_parquet(relationships.joinpath('work_year_relationship.parquet'))
+
+    years = input_dir.joinpath('year_data', 'year', 'nodes')
+    years.mkdir(parents=True)
+    pl.DataFrame({'id': [2020, 2020]}, schema={'id': pl.Int32}).write_parquet(years.joinpath('year.parquet'))
+
+def test_staging_deduplicates_across_shards(tmp_path: Path):
+    write_shards(tmp_path)
+    staging_dir = Setup.stage_fresh_load(tmp_path)
+
+    works = pl.read_parquet(staging_dir.joinpath('nodes', 'work.parquet'))
+    assert works['id'].to_list() == ['W1', 'W2', 'W3', 'W4']
+    assert pl.read_parquet(staging_dir.joinpath('nodes', 'year.parquet')).height == 1
+    assert pl.read_parquet(staging_dir.joinpath('relationships', 'work_year.parquet')).height == 4
+
+def test_create_load(tmp_path: Path):
+    write_shards(tmp_path)
+    connection = StandInConnection()
+
+    Setup.load_into_db(connection, tmp_path, remote=True, mode=LoadMode.CREATE)
+    assert connection._driver.rows == 4 + 1 + 4
+    assert not tmp_path.joinpath('.staged').exists()
+
+    connection = StandInConnection()
+    Setup.load_into_db(connection, tmp_path, remote=True)
+    assert connection._driver.rows == 5 + 2 + 5
+
+def test_create_queries():
+    relationshipObj = Relationships().createRelationshipObject(NodeType.work, NodeType.year)
+
+    assert 'CREATE' in node_query(ObjectNames[NodeType.work], LoadMode.CREATE)
+    assert 'MERGE' not in relationship_query(relationshipObj, LoadMode.CREATE)
+    assert 'MERGE' in relationship_query(relationshipObj)
+
+def loaded_graph(connection: StandInConnection) -> tuple[dict, dict]:
+    '''
+    The nodes and relationships the queries sent to the stand-in build, following CREATE, SET = and SET +=.
+    '''
+    nodes, relationships = {}, {}
+    for query, rows in connection._driver.runs:
+        for row in rows:
+            if 'origin_id' in row:
+                graph, key, properties = relationships, (row['origin_id'], row['target_id']), row['properties']
+            else:
+                graph, key, properties = nodes, row['id'], row
+            if 'CREATE' in query and 'ON CREATE' not in query:
+                assert key not in graph, f'{key} created twice'
+            # Setting a property to null removes it
+            current = graph.setdefault(key, {})
+            for name, value in properties.items():
+                if value is None:
+                    current.pop(name, None)
+                else:
+                    current[name] = value
+    return nodes, relationships
+
+def test_create_matches_merge(tmp_path: Path):
+    # W3 is in both shards. The second shard updates its title, clears its cited_by_count and adds an fwci,
+    # while its doi only exists in the first shard
+    for shard, data, weights in [
+        ('works-0', {'id': ['W1', 'W3'], 'title': ['one', 'old'], 'doi': ['d1', 'd3'], 'cited_by_count': [1, 3]}, [1, 1]),
+        ('works-1', {'id': ['W3', 'W4'], 'title': ['new', 'four'], 'cited_by_count': [None, 4], 'fwci': [0.5, 1.5]}, [2, 4])
+    ]:
+        nodes = tmp_path.joinpath(shard, 'works', 'nodes')
+        relationships = tmp_path.joinpath(shard, 'works', 'relationships')
+        nodes.mkdir(parents=True)
+        relationships.mkdir(parents=True)
+        pl.DataFrame(data).write_parquet(nodes.joinpath('work_0.parquet'))
+        pl.DataFrame({GRAPH_START_ID: data['id'], GRAPH_END_ID: [2020] * 2, 'weight': weights})\
+            .write_parquet(relationships.joinpath('work_year_relationship.parquet'))
+
+    created, merged = StandInConnection(), StandInConnection()
+    Setup.load_into_db(created, tmp_path, remote=True, mode=LoadMode.CREATE)
+    Setup.load_into_db(merged, tmp_path, remote=True)
+
+    nodes, relationships = loaded_graph(created)
+    assert (nodes, relationships) == loaded_graph(merged)
+    assert nodes['W3'] == {'id': 'W3', 'title': 'new', 'doi': 'd3', 'fwci': 0.5}
+    assert relationships[('W3', 2020)] == {'weight': 2}
@@ -0,0 +1,123 @@
+'''
+test_graph_algorithms.py
+Tests for the Graph Data Science projections and algorithms, run against a stand-in of the GDS client.
+'''
+from pathlib import Path
+import pandas as pd
+from src.visualization.aggregate_store import AggregateStore
+from src.visualization.config import GraphAlgorithmMode, VisualizationDataPaths
+from src.visualization.graph_algorithms import GraphAlgorithmRunner, GraphAlgorithms, GraphProjections
+
+# Results of every algorithm on any projection, by internal node id
+STREAMED = {
+    'pageRank': pd.DataFrame({'nodeId': [0, 1, 2], 'score': [0.5, 0.3, 0.2]}),
+    'louvain': pd.DataFrame({'nodeId': [0, 1, 2], 'communityId': [7, 7, 9], 'intermediateCommunityIds': [None] * 3}),
+    'nodeSimilarity': pd.DataFrame({'node1': [0, 1], 'node2': [1, 0], 'similarity': [0.25, 0.25]}),
+    'wcc': pd.DataFrame({'nodeId': [0, 1, 2], 'componentId': [0, 0, 0]})
+}
+
+class StandInAlgorithm:
+    def __init__(self, gds: 'StandInGDS', procedure: str):
+        self.gds = gds
+        self.procedure = procedure
+
+    def stream(self, graph: str, **configuration) -> pd.DataFrame:
+        self.gds.calls.append((self.procedure, 'stream', graph, configuration))
+        return STREAMED[self.procedure]
+
+    def write(self, graph: str, **configuration) -> pd.Series:
+        self.gds.calls.append((self.procedure, 'write', graph, configuration))
+        return pd.Series({'nodePropertiesWritten': 3})
+
+class StandInCatalog:
+    def __init__(self, gds: 'StandInGDS'):
+        self.gds = gds
+        self.graphs : set[str] = set()
+        self.cypher = self
+
+    def exists(self, name: str) -> pd.Series:
+        return pd.Series({'graphName': name, 'exists': name in self.graphs})
+
+    def get(self, name: str) -> str:
+        return name
+
+    def drop(self, name: str):
+        self.graphs.discard(name)
+
+    def project(self, query: str, graph_name: str) -> tuple[str, pd.Series]:
+        self.gds.calls.append(('project', graph_name))
+        self.graphs.add(graph_name)
+        return graph_name, pd.Series({'nodeCount': 3, 'relationshipCount': 4, 'projectMillis': 1})
+
+class StandInGDS:
+    '''
+    Stands in for GraphDataScience, recording the projections and algorithms it runs.
+    '''
+    def __init__(self):
+        self.calls : list[tuple] = []
+        self.graph = StandInCatalog(self)
+        for procedure in STREAMED:
+            setattr(self, procedure, StandInAlgorithm(self, procedure))
+
+    def run_cypher(self, query: str):
+        self.calls.append(('cypher', query))
+
+class StandInClient:
+    def __init__(self):
+        self.gds = StandInGDS()
+
+    def __call__(self, query: str, parameters: dict | None = None) -> pd.DataFrame:
+        if query.startswith('UNWIND $nodeIds'):
+            return pd.DataFrame({'nodeId': parameters['nodeIds'], 'id': [f'I{id}' for id in parameters['nodeIds']]})
+        # Properties written by write mode, read back by id
+        if 'AS node1' in query:
+            return pd.DataFrame({'node1': ['I0'], 'node2': ['I1'], 'similarity': [0.25]})
+        column = query.split(' AS ')[-1].strip()
+        return pd.DataFrame({'nodeId': ['I0', 'I1'], column: [1, 2]})
+
+def test_stream_results_are_stored(tmp_path: Path):
+    client = StandInClient()
+    store = AggregateStore(tmp_path)
+    GraphAlgorithmRunner(client, store).run_all()
+
+    # Every projection is projected once, for all the algorithms
+    assert [call for call in client.gds.calls if call[0] == 'project'] == [('project', name) for name in GraphProjections]
+    configurations = {(call[0], call[2]): call[3] for call in client.gds.calls if call[0] in STREAMED}
+    assert configurations[('pageRank', 'institution_collaborations')] == {'relationshipWeightProperty': 'shared_works'}
+    assert configurations[('wcc', 'institution_collaborations')] == {}
+
+    pagerank = store.load(VisualizationDataPaths.graph_pagerank)
+    assert pagerank.columns.tolist() == ['graph', 'id', 'score']
+    assert pagerank[pagerank['graph'] == 'institution_collaborations'][['id', 'score']].values.tolist() == [['I0', 0.5], ['I1', 0.3], ['I2', 0.2]]
+    assert store.load(VisualizationDataPaths.graph_louvain).columns.tolist() == ['graph', 'id', 'communityId']
+    similarity = store.load(VisualizationDataPaths.graph_node_similarity)
+    assert similarity[['node1', 'node2']].values.tolist()[:2] == [['I0', 'I1'], ['I1', 'I0']]
+
+def test_projections_are_reused(tmp_path: Path):
+    client = StandInClient()
+    runner = GraphAlgorithmRunner(client, AggregateStore(tmp_path))
+    projection = GraphProjections['institution_collaborations']
+    runner.run(GraphAlgorithms['pagerank'], projection)
+
+    # A later runner finds the projection in the graph catalog
+    GraphAlgorithmRunner(client, AggregateStore(tmp_path)).run(GraphAlgorithms['wcc'], projection)
+    assert [call for call in client.gds.calls if call[0] == 'project'] == [('project', projection.name)]
+
+    runner.run_all(['pagerank'], [projection.name], refresh=True)
+    assert [call for call in client.gds.calls if call[0] == 'project'] == [('project', projection.name)] * 2
+
+def test_write_mode(tmp_path: Path):
+    client = StandInClient()
+    store = AggregateStore(tmp_path)
+    GraphAlgorithmRunner(client, store, GraphAlgorithmMode.WRITE).run_all(['louvain', 'node_similarity'], ['institution_collaborations'])
+
+    writes = [call for call in client.gds.calls if call[1:2] == ('write',)]
+    assert writes[0][3] == {'writeProperty': 'institution_collaborations_community', 'relationshipWeightProperty': 'shared_works'}
+    assert writes[1][3]['writeRelationshipType'] == 'INSTITUTION_COLLABORATIONS_SIMILAR'
+    # The similarities of the previous run are deleted before writing
+    deletes = [call for call in client.gds.calls if call[0] == 'cypher']
+    assert len(deletes) == 1 and 'INSTITUTION_COLLABORATIONS_SIMILAR' in deletes[0][1]
+
+    assert store.load(VisualizationDataPaths.graph_louvain).values.tolist() == \
+        [['institution_collaborations', 'I0', 1], ['institution_collaborations', 'I1', 2]]
+    assert store.load(VisualizationDataPaths.graph_node_similarity).values.tolist() == [['institution_collaborations', 'I0', 'I1', 0.25]]
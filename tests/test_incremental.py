@@ -0,0 +1,64 @@
+'''
+test_incremental.py
+Tests for the delta between two processed outputs and its application.
+'''
+from pathlib import Path
+import polars as pl
+from config import GRAPH_START_ID, GRAPH_END_ID
+from src.graphdb.incremental import compute_delta, load_delta
+from tests.neo4j_standin import StandInConnection
+
+def write_output(output_dir: Path, works: dict[str, str], years: dict[str, int]):
+    nodes = output_dir.joinpath('works-0', 'works', 'nodes')
+    relationships = output_dir.joinpath('works-0', 'works', 'relationships')
+    nodes.mkdir(parents=True)
+    relationships.mkdir(parents=True)
+    pl.DataFrame({'id': list(works), 'title': list(works.values())}).write_parquet(nodes.joinpath('work_0.parquet'))
+    pl.DataFrame({GRAPH_START_ID: list(years), GRAPH_END_ID: list(years.values())}, schema_overrides={GRAPH_END_ID: pl.Int32})\
+        .write_parquet(relationships.joinpath('work_year_relationship.parquet'))
+
+def test_delta(tmp_path: Path):
+    previous, current, delta = tmp_path.joinpath('previous'), tmp_path.joinpath('current'), tmp_path.joinpath('delta')
+    write_output(previous, {'W1': 'a', 'W2': 'b', 'W3': 'c'}, {'W1': 2020, 'W2': 2021, 'W3': 2022})
+    write_output(current, {'W1': 'a', 'W2': 'B', 'W4': 'd'}, {'W1': 2020, 'W2': 2023, 'W4': 2024})
+
+    counts = compute_delta(current, delta, previous)
+    assert counts == {'nodes': 2, 'tombstones': 1, 'stale': 3, 'relationships': 2}
+
+    assert pl.read_parquet(delta.joinpath('nodes', 'work.parquet')).sort('id').to_dict(as_series=False) == \
+        {'id': ['W2', 'W4'], 'title': ['B', 'd']}
+    assert pl.read_parquet(delta.joinpath('tombstones', 'work.parquet'))['id'].to_list() == ['W3']
+    stale = pl.read_parquet(delta.joinpath('stale', 'work_year.parquet')).sort('id')
+    assert stale.to_dict(as_series=False) == {'id': ['W2', 'W3', 'W4'], 'targets': [[2023], [], [2024]]}
+
+    connection = StandInConnection()
+    assert load_delta(connection, delta) == counts
+    assert connection._driver.rows == sum(counts.values())
+
+def test_unchanged_output_has_empty_delta(tmp_path: Path):
+    previous, current = tmp_path.joinpath('previous'), tmp_path.joinpath('current')
+    write_output(previous, {'W1': 'a'}, {'W1': 2020})
+    write_output(current, {'W1': 'a'}, {'W1': 2020})
+
+    assert compute_delta(current, tmp_path.joinpath('delta'), previous) == {'nodes': 0, 'tombstones': 0, 'stale': 0, 'relationships': 0}
+
+def test_removed_properties_are_sent_as_nulls(tmp_path: Path):
+    previous, current, delta = tmp_path.joinpath('previous'), tmp_path.joinpath('current'), tmp_path.joinpath('delta')
+    write_output(previous, {'W1': 'a', 'W2': 'b'}, {'W1': 2020, 'W2': 2021})
+    write_output(current, {'W1': 'a', 'W2': 'b'}, {'W1': 2020, 'W2': 2021})
+    # The previous output had a doi for both works, the current one has no doi column and lost the cited_by_count of W2
+    pl.DataFrame({'id': ['W1', 'W2'], 'title': ['a', 'b'], 'doi': ['d1', 'd2'], 'cited_by_count': [1, 2]})\
+        .write_parquet(previous.joinpath('works-0', 'works', 'nodes', 'work_0.parquet'))
+    pl.DataFrame({'id': ['W1', 'W2'], 'title': ['a', 'b'], 'cited_by_count': [1, None]})\
+        .write_parquet(current.joinpath('works-0', 'works', 'nodes', 'work_0.parquet'))
+
+    assert compute_delta(current, delta, previous)['nodes'] == 2
+
+    connection = StandInConnection()
+    load_delta(connection, delta)
+    query, rows = connection._driver.runs[0]
+    assert '+= row' in query
+    assert sorted(rows, key=lambda row: row['id']) == [
+        {'id': 'W1', 'title': 'a', 'cited_by_count': 1, 'doi': None},
+        {'id': 'W2', 'title': 'b', 'cited_by_count': None, 'doi': None}
+    ]
@@ -0,0 +1,55 @@
+'''
+test_index_advisor.py
+Tests for the index proposals made from report queries.
+'''
+from src.graphdb.conf import GraphType
+from src.graphdb.index_advisor import advise_indexes, query_predicates
+
+SUMMARY_COUNTS_BY_YEAR = """
+MATCH (I:SFU_U15_institution {lineage_root: TRUE})-[I_YR:IN_YEAR]->(YR:year)
+RETURN I.id as id, I.display_name as display_name, YR.id as year, I_YR.cited_by_count as cited_by_count, I_YR.works_count as works_count;
+"""
+
+AUTHORS_ANALYSIS = """
+MATCH (I: SFU_U15_institution {lineage_root: TRUE})
+OPTIONAL MATCH (I)<-[:INSTITUTION_IS_THE_SAME_AS]-(AFL_INS:affiliated_institution)<-[A_AFL:AFFILIATED_WITH]-(A:author)
+// Only authors with works
+WHERE A.works_count > 0 AND A.i10_index IS NOT NULL
+UNWIND A_AFL.years AS affiliation_year
+RETURN I.id, affiliation_year, count(DISTINCT A) AS authors
+"""
+
+GEOGRAPHIC_COLLABORATIONS = """
+MATCH (sfu:affiliated_institution)-[:INSTITUTION_IS_THE_SAME_AS]->(:SFU_U15_institution {id: 'I18014758'})
+RETURN sfu.display_name
+"""
+
+def proposal_fields(proposals) -> set[tuple[GraphType, str, tuple[str, ...]]]:
+    return {(proposal.type, proposal.name, proposal.fields) for proposal in proposals}
+
+def test_query_predicates():
+    predicates = query_predicates(AUTHORS_ANALYSIS)
+
+    assert sorted(map(sorted, predicates.values())) == [['i10_index', 'works_count'], ['lineage_root'], ['years']]
+    assert (GraphType.RELATIONSHIP, 'AFFILIATED_WITH') in {key[:2] for key in predicates}
+    assert query_predicates(GEOGRAPHIC_COLLABORATIONS) == {}
+
+def test_advise_indexes():
+    proposals = advise_indexes({
+        'summary_counts_by_year': SUMMARY_COUNTS_BY_YEAR,
+        'authors_analysis': AUTHORS_ANALYSIS,
+        'geographic_collaborations': GEOGRAPHIC_COLLABORATIONS
+    })
+
+    assert proposals[0].fields == ('lineage_root',)
+    assert proposals[0].queries == ['summary_counts_by_year', 'authors_analysis']
+    assert proposal_fields(proposals) == {
+        (GraphType.NODE, 'SFU_U15_institution', ('lineage_root',)),
+        (GraphType.NODE, 'author', ('works_count',)),
+        (GraphType.NODE, 'author', ('i10_index',)),
+        (GraphType.NODE, 'author', ('i10_index', 'works_count')),
+        (GraphType.RELATIONSHIP, 'AFFILIATED_WITH', ('years',)),
+        (GraphType.RELATIONSHIP, 'IN_YEAR', ('cited_by_count',)),
+        (GraphType.RELATIONSHIP, 'IN_YEAR', ('works_count',)),
+        (GraphType.RELATIONSHIP, 'IN_YEAR', ('cited_by_count', 'works_count'))
+    }
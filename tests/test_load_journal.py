@@ -0,0 +1,149 @@
+'''
+test_load_journal.py
+Tests for skipping and resuming loads with the load journal.
+'''
+import re
+from collections import Counter
+from pathlib import Path
+import polars as pl
+import pytest
+import src.graphdb.setup as Setup
+from src.graphdb.conf import ConcurrentLoadConfig, LoadMode, ObjectNames, RemoteLoadConfig
+from src.graphdb.helpers import CypherQueryCollection
+from src.graphdb.load_journal import JournalStatus, LoadJournal, file_hash, load_mode
+from src.graphdb.remote_loader import load_file, node_query, node_rows
+from config import NodeType
+from tests.neo4j_standin import StandInConnection, StandInDriver, StandInSession
+from tests.test_fresh_load import write_shards
+
+class FailingSession(StandInSession):
+    '''
+    Fails the write after the given number of committed batches.
+    '''
+    def __init__(self, connection: StandInConnection, commits: int):
+        super().__init__(connection._driver)
+        self.commits = commits
+
+    def execute_write(self, transaction_function, *args, **kwargs):
+        if self.commits == 0:
+            raise ConnectionError('Connection lost')
+        self.commits -= 1
+        return super().execute_write(transaction_function, *args, **kwargs)
+
+def test_resume_from_last_committed_batch(tmp_path: Path):
+    file = tmp_path.joinpath('work.parquet')
+    pl.DataFrame({'id': [f'W{i}' for i in range(1000)]}).write_parquet(file, row_group_size=250)
+    journal = LoadJournal(tmp_path.joinpath('journal.sqlite'))
+    config, query = RemoteLoadConfig(max_batch_rows=100), node_query(ObjectNames[NodeType.work])
+
+    connection = StandInConnection()
+    failing = FailingSession(connection, commits=3)
+    with pytest.raises(ConnectionError):
+        load_file(failing, file, query, node_rows, config, journal)
+    entry = journal.entry(file)
+    assert (entry.status, entry.batch_offset, entry.rows, entry.hash) == (JournalStatus.PENDING, 300, 1000, file_hash(file))
+
+    resumed = StandInSession(connection._driver)
+    assert load_file(resumed, file, query, node_rows, config, journal) == 700
+    assert connection._driver.sessions[id(resumed)][0] == {'id': 'W300'}
+    assert journal.entry(file).status == JournalStatus.COMMITTED
+
+    assert load_file(resumed, file, query, node_rows, config, journal) == 0
+
+    pl.DataFrame({'id': ['W1']}).write_parquet(file)
+    assert load_file(resumed, file, query, node_rows, config, journal) == 1
+
+def test_rerun_skips_committed_files(tmp_path: Path):
+    write_shards(tmp_path)
+    journal = LoadJournal(tmp_path.joinpath('journal.sqlite'))
+
+    connection = StandInConnection()
+    Setup.load_into_db(connection, tmp_path, remote=True, journal=journal)
+    assert connection._driver.rows == 12
+
+    connection = StandInConnection()
+    Setup.load_into_db(connection, tmp_path, remote=True, journal=journal)
+    assert connection._driver.rows == 0
+
+class GraphSession(StandInSession):
+    '''
+    Applies the CREATE and MERGE of the load queries to the graph of its connection. The connection is lost after
+    the given number of writes, once the last write is committed but before the loader learns of it.
+    '''
+    def __init__(self, connection: 'GraphConnection'):
+        super().__init__(connection._driver)
+        self.connection = connection
+
+    def run(self, query: str, parameters: dict | None = None, **kwargs):
+        rows = kwargs.get('rows', (parameters or {}).get('rows', []))
+        create = 'CREATE (' in query
+        if relationship := re.search(r'-\[r:(\w+)\]->', query):
+            keys = [(relationship.group(1), row['origin_id'], row['target_id']) for row in rows]
+        else:
+            label = re.search(r'(?:CREATE|MERGE) \(\w+:(\w+)', query).group(1)
+            keys = [(label, row['id']) for row in rows]
+
+        graph = self.connection.graph
+        for key in keys:
+            graph[key] = graph[key] + 1 if create else max(graph[key], 1)
+
+        self.connection.writes += 1
+        if self.connection.writes == self.connection.fail_after:
+            raise ConnectionError('Connection lost')
+        return super().run(query, parameters, **kwargs)
+
+class GraphConnection:
+    def __init__(self, fail_after: int | None = None):
+        self._driver = StandInDriver()
+        self.graph : Counter = Counter()
+        self.writes = 0
+        self.fail_after = fail_after
+
+    def session(self, read: bool = False) -> GraphSession:
+        return GraphSession(self)
+
+    def execute_cypher_query(self, query: str, parameters: dict | None = None):
+        if query == CypherQueryCollection.DELETE_NODES.value:
+            self.graph.clear()
+
+    def create_node_constraints(self, fullName: str, pfx: str, constraints: dict[str, str]):
+        # Creating a uniqueness constraint fails on duplicate nodes
+        duplicates = [key for key, count in self.graph.items() if key[0] == fullName and count > 1]
+        if duplicates:
+            raise Exception(f'Duplicate {fullName} nodes: {duplicates}')
+
+    def create_relationship_constraints(self, *args):
+        pass
+
+    def create_indexes(self, *args):
+        pass
+
+@pytest.mark.parametrize('concurrency', [None, ConcurrentLoadConfig(workers=2, backoff=0.001)])
+@pytest.mark.parametrize('fail_after', [2, 5, 7])
+def test_resumed_create_load_has_no_duplicates(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, fail_after: int, concurrency):
+    # 4 work nodes, 1 year node and 4 IN_YEAR relationships, one row per batch
+    write_shards(tmp_path)
+    monkeypatch.setattr(Setup, 'DATABASE_OUTPUT_DIR', tmp_path)
+    journal = LoadJournal(tmp_path.joinpath('journal.sqlite'))
+    config = RemoteLoadConfig(max_batch_rows=1)
+
+    connection = GraphConnection(fail_after)
+    with pytest.raises(ConnectionError):
+        Setup.setup_full(connection, True, remote=True, remote_config=config, concurrency=concurrency, journal=journal)
+
+    connection.fail_after = None
+    Setup.setup_full(connection, True, remote=True, remote_config=config, concurrency=concurrency, journal=journal, resume=True)
+
+    expected = [('work', f'W{i}') for i in range(1, 5)] + [('year', 2020)] + [('IN_YEAR', f'W{i}', 2020) for i in range(1, 5)]
+    assert sorted(connection.graph.items(), key=str) == sorted([(key, 1) for key in expected], key=str)
+
+def test_load_mode(tmp_path: Path):
+    file = tmp_path.joinpath('work.parquet')
+    pl.DataFrame({'id': ['W1']}).write_parquet(file)
+    journal = LoadJournal(tmp_path.joinpath('journal.sqlite'))
+
+    assert load_mode(journal, file, LoadMode.CREATE) == LoadMode.CREATE
+    assert load_mode(None, file, LoadMode.CREATE) == LoadMode.CREATE
+    journal.start(file)
+    assert load_mode(journal, file, LoadMode.CREATE) == LoadMode.MERGE
+    assert load_mode(journal, file, LoadMode.MERGE) == LoadMode.MERGE
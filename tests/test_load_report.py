@@ -0,0 +1,100 @@
+'''
+test_load_report.py
+Tests for the per-file load statistics.
+'''
+from pathlib import Path
+import polars as pl
+import pytest
+import src.graphdb.setup as Setup
+from src.graphdb.conf import ConcurrentLoadConfig
+import src.graphdb.load_report as LoadReportModule
+from src.graphdb.load_report import LoadReport, load_apoc_file
+from tests.neo4j_standin import StandInConnection
+from tests.test_fresh_load import write_shards
+
+def test_remote_load_report(tmp_path: Path):
+    write_shards(tmp_path)
+    report = LoadReport(tmp_path.joinpath('report.parquet'))
+
+    connection = StandInConnection()
+    Setup.load_into_db(connection, tmp_path, remote=True, load_relationships=False, report=report)
+    # The concurrent relationship load retries the deadlocks
+    connection._driver.deadlocks = 2
+    Setup.load_into_db(connection, tmp_path, remote=True, load_nodes=False,
+                       concurrency=ConcurrentLoadConfig(workers=2, backoff=0), report=report)
+    data = report.to_dataframe()
+
+    assert data.height == 5
+    assert data.filter(pl.col('kind') == 'nodes')['rows'].sum() == 7
+    relationships = data.filter(pl.col('kind') == 'relationships')
+    assert relationships['name'].unique().to_list() == ['(work)-[IN_YEAR]->(year)']
+    assert relationships['method'].unique().to_list() == ['concurrent remote']
+    assert relationships['rows'].sum() == 5
+    assert relationships['retries'].sum() == 2
+
+    report.save()
+    report.save()
+    assert pl.read_parquet(report.report_log).height == 10
+    assert '(work)-[IN_YEAR]->(year)' in report.summary()
+
+def test_apoc_statistics(tmp_path: Path):
+    file = tmp_path.joinpath('work.parquet')
+    pl.DataFrame({'id': ['W1', 'W2', 'W3']}).write_parquet(file)
+    report = LoadReport()
+
+    with report.file(file, 'nodes', 'work', 'apoc') as statistics:
+        statistics.add_apoc({'batches': 3, 'total': 3, 'timeTaken': 1, 'failedOperations': 1, 'failedBatches': 1,
+                             'retries': 0, 'errorMessages': {'Node already exists': 1}})
+
+    record = report.records[0]
+    assert (record.rows, record.batches, record.failed_batches, record.failed_operations) == (2, 3, 1, 1)
+    assert record.errors == '{"Node already exists": 1}'
+
+def test_apoc_progress_per_chunk(tmp_path: Path, monkeypatch):
+    file = tmp_path.joinpath('openalex', 'works', 'nodes', 'work.parquet')
+    file.parent.mkdir(parents=True)
+    pl.DataFrame({'id': [f'W{i}' for i in range(25)]}).write_parquet(file)
+    report = LoadReport(progress_interval=0)
+
+    loaded = []
+    def execute_apoc_iterate(connection, query: str) -> dict:
+        chunk = tmp_path.joinpath(query)
+        loaded.append((query, pl.read_parquet(chunk).height))
+        return {'batches': 1, 'total': loaded[-1][1]}
+    monkeypatch.setattr(LoadReportModule, 'execute_apoc_iterate', execute_apoc_iterate)
+
+    with report.file(file, 'nodes', 'work', 'apoc') as statistics:
+        load_apoc_file(None, file, lambda path: path, tmp_path, statistics, chunk_rows=10)
+
+    # Each chunk is loaded and recorded on its own, then removed
+    chunks = [(f'.chunks/openalex_works_nodes_work/{index}.parquet', rows) for index, rows in enumerate([10, 10, 5])]
+    assert loaded == chunks
+    assert (report.records[0].rows, report.records[0].batches) == (25, 3)
+    assert not tmp_path.joinpath('.chunks').exists()
+
+    # Files are chunked the same way without a report
+    loaded.clear()
+    load_apoc_file(None, file, lambda path: path, tmp_path, chunk_rows=10)
+    assert loaded == chunks
+
+    # Small files are loaded in one call
+    loaded.clear()
+    load_apoc_file(None, file, lambda path: path, tmp_path, chunk_rows=100)
+    assert loaded == [('openalex/works/nodes/work.parquet', 25)]
+
+def test_failed_load_is_recorded(tmp_path: Path):
+    file = tmp_path.joinpath('work.parquet')
+    pl.DataFrame({'id': ['W1', 'W2']}).write_parquet(file)
+    report = LoadReport(tmp_path.joinpath('report.parquet'))
+
+    with pytest.raises(ConnectionError):
+        with report.file(file, 'nodes', 'work', 'remote') as statistics:
+            statistics.add_batch(1)
+            raise ConnectionError('Connection lost')
+    with report.file(file, 'nodes', 'work', 'remote') as statistics:
+        statistics.add_batch(2)
+
+    assert [(record.status, record.rows) for record in report.records] == [('failed', 1), ('loaded', 2)]
+    assert report.records[0].errors == '{"ConnectionError: Connection lost": 1}'
+    report.save()
+    assert pl.read_parquet(report.report_log)['status'].to_list() == ['failed', 'loaded']
@@ -0,0 +1,100 @@
+'''
+test_network.py
+Tests for the co-authorship matrices and their metrics.
+'''
+from pathlib import Path
+import numpy as np
+import polars as pl
+import scipy.sparse as sp
+from config import NodeType, GRAPH_START_ID, GRAPH_END_ID
+from src.graphdb.helpers import parquet_file_name
+from src.network.conf import NetworkConfig
+from src.network.matrices import CoauthorshipNetwork, author_network, institution_network
+from src.network.metrics import betweenness, louvain, modularity, network_metrics, pagerank
+
+def relationships(output: Path, start: NodeType, target: NodeType, pairs: list[tuple]):
+    directory = output.joinpath('works', start.value, 'relationships')
+    directory.mkdir(parents=True, exist_ok=True)
+    pl.DataFrame({GRAPH_START_ID: [pair[0] for pair in pairs], GRAPH_END_ID: [pair[1] for pair in pairs]})\
+        .write_parquet(directory.joinpath(parquet_file_name(start, target)))
+
+def bridged_cliques() -> sp.csr_array:
+    '''
+    Two cliques of five nodes, joined by an edge between nodes 4 and 5.
+    '''
+    adjacency = np.zeros((10, 10))
+    for clique in (range(5), range(5, 10)):
+        for i in clique:
+            adjacency[i, [j for j in clique if j != i]] = 1
+    adjacency[4, 5] = adjacency[5, 4] = 1
+    return sp.csr_array(adjacency)
+
+def test_coauthorship_matrices(tmp_path: Path):
+    # W1 by A1, A2 and A3, W2 by A1 and A2, W3 by A3 alone
+    relationships(tmp_path, NodeType.author, NodeType.authorship, [
+        ('A1', 'W1_A1'), ('A2', 'W1_A2'), ('A3', 'W1_A3'), ('A1', 'W2_A1'), ('A2', 'W2_A2'), ('A3', 'W3_A3')
+    ])
+    relationships(tmp_path, NodeType.authorship, NodeType.work, [
+        ('W1_A1', 'W1'), ('W1_A2', 'W1'), ('W1_A3', 'W1'), ('W2_A1', 'W2'), ('W2_A2', 'W2'), ('W3_A3', 'W3')
+    ])
+    # Both authorships of W2 are affiliated with I1, which is counted once on the work
+    relationships(tmp_path, NodeType.authorship, NodeType.affiliated_institution, [
+        ('W1_A1', 'I1'), ('W1_A2', 'I2'), ('W1_A3', 'I3'), ('W2_A1', 'I1'), ('W2_A2', 'I1'), ('W2_A2', 'I2'), ('W3_A3', 'I3')
+    ])
+
+    authors = author_network(tmp_path)
+    assert authors.ids.tolist() == ['A1', 'A2', 'A3']
+    assert authors.adjacency.toarray().tolist() == [[0, 2, 1], [2, 0, 1], [1, 1, 0]]
+
+    institutions = institution_network(tmp_path)
+    assert institutions.ids.tolist() == ['I1', 'I2', 'I3']
+    assert institutions.adjacency.toarray().tolist() == [[0, 2, 1], [2, 0, 1], [1, 1, 0]]
+
+    # W1 has too many authors, leaving only A1 and A2 connected by W2
+    authors = author_network(tmp_path, NetworkConfig(max_authors_per_work=2))
+    assert authors.ids.tolist() == ['A1', 'A2', 'A3']
+    assert authors.adjacency.toarray().tolist() == [[0, 1, 0], [1, 0, 0], [0, 0, 0]]
+
+def test_centrality():
+    adjacency = bridged_cliques()
+
+    # Every shortest path between the cliques passes through both ends of the bridge
+    assert np.allclose(betweenness(adjacency), [0, 0, 0, 0, 20 / 36, 20 / 36, 0, 0, 0, 0])
+    star = sp.csr_array(np.array([[0, 1, 1, 1], [1, 0, 0, 0], [1, 0, 0, 0], [1, 0, 0, 0]], dtype=float))
+    assert np.allclose(betweenness(star, batch=2), [1, 0, 0, 0])
+    sampled = betweenness(adjacency, samples=5, seed=1)
+    assert sampled.shape == (10,) and (sampled >= 0).all()
+
+    scores = pagerank(adjacency)
+    assert np.isclose(scores.sum(), 1)
+    assert np.isclose(scores[4], scores[5]) and np.isclose(scores[4], scores.max())
+    assert np.allclose(scores[[0, 1, 2, 3]], scores[[6, 7, 8, 9]])
+
+    # The walk follows the heavier edge more often
+    weighted = pagerank(sp.csr_array(np.array([[0, 3, 1], [3, 0, 0], [1, 0, 0]], dtype=float)))
+    assert weighted[1] > weighted[2]
+
+def test_communities():
+    adjacency = bridged_cliques()
+    communities = louvain(adjacency)
+    assert communities.tolist() == [0, 0, 0, 0, 0, 1, 1, 1, 1, 1]
+    assert np.isclose(modularity(adjacency, communities), modularity(adjacency, np.repeat([0, 1], 5)))
+
+    # Planted communities of a sparse random graph are recovered
+    rng = np.random.default_rng(0)
+    blocks = np.repeat(np.arange(20), 50)
+    start = rng.integers(0, 1000, 20000)
+    end = np.where(rng.random(20000) < 0.9, blocks[start] * 50 + rng.integers(0, 50, 20000), rng.integers(0, 1000, 20000))
+    graph = sp.coo_array((np.ones(20000), (start, end)), shape=(1000, 1000))
+    graph = (graph + graph.T).tocsr()
+    graph = (graph - sp.diags_array(graph.diagonal())).tocsr()
+    assert modularity(graph, louvain(graph)) >= modularity(graph, blocks) - 0.01
+
+    # Nodes without edges stay on their own
+    assert louvain(sp.csr_array((3, 3))).tolist() == [0, 1, 2]
+
+def test_network_metrics():
+    metrics = network_metrics(CoauthorshipNetwork(np.array([f'A{i}' for i in range(10)]), bridged_cliques()))
+    assert metrics.columns.tolist() == ['id', 'degree', 'strength', 'pagerank', 'betweenness', 'community']
+    assert metrics['degree'].tolist() == [4, 4, 4, 4, 5, 5, 4, 4, 4, 4]
+    assert metrics['community'].nunique() == 2
@@ -0,0 +1,98 @@
+'''
+test_out_of_core.py
+The out-of-core authorship derivation must produce the same tables as the in-memory derivation
+'''
+import polars as pl
+import pytest
+from src.processing.conf import GraphTable, OutOfCoreConfig, schemas
+from src.processing.pruning_conf import SecondaryInformation
+from src.processing.out_of_core import HashPartitionedSpill, decompressed_size, split_by_weight
+from config import NodeType
+
+def authorship(author: int, institutions: list[int]) -> dict:
+    return {
+        'author': {'id': f'A{author}', 'display_name': f'Author {author}', 'orcid': None},
+        'institutions': [
+            {
+                'id': f'I{i}',
+                'display_name': f'Institution {i}',
+                'ror': None,
+                'country_code': 'CA' if i % 2 else 'US',
+                'type': 'education',
+                'lineage': [f'I{i}'] if i % 3 else [f'I{i}', f'I{i+1}']
+            } for i in institutions
+        ]
+    }
+
+@pytest.fixture
+def works() -> pl.LazyFrame:
+    rows = [
+        {'id': f'W{w}', 'authorships': [authorship(w % 7 + a, [a % 5, (w + a) % 5]) for a in range(w % 4)]}
+        for w in range(40)
+    ]
+    # A consortium paper with a very large number of authors, and a duplicated work
+    rows.append({'id': 'W1000', 'authorships': [authorship(a, [a % 11]) for a in range(500)]})
+    rows.append(rows[3])
+
+    schema = {'id': pl.String, 'authorships': schemas['works']['authorships']}
+    return pl.DataFrame(rows, schema=schema).lazy()
+
+def collect_sorted(data: pl.LazyFrame) -> pl.DataFrame:
+    frame = data.collect()
+    return frame.sort(frame.columns)
+
+def test_split_by_weight():
+    data = pl.DataFrame({'a': range(5)})
+    weights = pl.Series([1, 1, 10, 1, 1])
+
+    slices = list(split_by_weight(data, weights, 3))
+    assert [s['a'].to_list() for s in slices] == [[0, 1], [2], [3, 4]]
+
+def test_out_of_core_matches_in_memory(works: pl.LazyFrame, tmp_path):
+    in_memory = SecondaryInformation().derivedFunctions[NodeType.authorship](
+        GraphTable(NodeType.work.value, NodeType.work, works), works
+    )
+
+    # A small budget forces many batches, with the consortium paper split on its own
+    info = SecondaryInformation(OutOfCoreConfig(memory_budget=64 * 1024, batch_size=8, partitions=4, spill_directory=tmp_path))
+    out_of_core = info._deriveAuthorshipsOutOfCore(GraphTable(NodeType.work.value, NodeType.work, works), works)
+
+    for expected, calculated in zip(in_memory.nodes, out_of_core.nodes):
+        assert expected.type == calculated.type
+        assert collect_sorted(expected.data).equals(collect_sorted(calculated.data))
+
+    for expected, calculated in zip(in_memory.relationships, out_of_core.relationships):
+        assert (expected.start_type, expected.target_type) == (calculated.start_type, calculated.target_type)
+        assert collect_sorted(expected.data).equals(collect_sorted(calculated.data))
+
+    info.cleanup()
+    assert not any(tmp_path.iterdir())
+
+def test_large_partitions_are_split(tmp_path):
+    spill = HashPartitionedSpill(tmp_path, partitions=2, memory_budget=16 * 1024)
+    rows = pl.DataFrame({'id': [f'A{i % 3000}' for i in range(6000)], 'value': [i % 3000 for i in range(6000)]})
+    for batch in rows.iter_slices(1000):
+        spill.write('authors', batch, 'id')
+
+    deduplicated = spill.deduplicate('authors', ['id'])
+    assert collect_sorted(deduplicated).equals(collect_sorted(rows.lazy().unique()))
+
+    # Both partitions outgrow the budget, so more than two partitions are deduplicated
+    files = list(tmp_path.joinpath('authors_deduplicated').glob('*.parquet'))
+    assert len(files) > 2
+    assert all(decompressed_size([file]) <= 16 * 1024 for file in files)
+
+def test_partitions_that_cannot_shrink(tmp_path, capsys):
+    spill = HashPartitionedSpill(tmp_path, partitions=2, memory_budget=4 * 1024)
+    # Every row shares one key, so splitting never brings the partition under the budget
+    rows = pl.DataFrame({'id': ['A1'] * 3000, 'value': range(3000)})
+    spill.sink('authors', rows.lazy(), 'id')
+    spill.write('authors', rows.head(10), 'id')
+
+    # Rows written and sunk share one layout
+    files = sorted(tmp_path.joinpath('authors').glob('*/*.parquet'))
+    assert len(files) > 1 and len({file.parent for file in files}) == 1
+
+    deduplicated = spill.deduplicate('authors', ['id']).collect()
+    assert deduplicated.height == 1
+    assert 'over the memory budget' in capsys.readouterr().out
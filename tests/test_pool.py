@@ -0,0 +1,44 @@
+'''
+test_pool.py
+Tests for the drivers shared by the connection pools. Drivers connect lazily, so no database is needed.
+'''
+import time
+from src.graphdb.conf import PoolConfig
+from src.graphdb.pool import ConnectionPool
+
+def test_pools_share_driver():
+    first = ConnectionPool('bolt://localhost:7687', ('neo4j', 'password'))
+    second = ConnectionPool('bolt://localhost:7687', ('neo4j', 'password'), database='other')
+    other_user = ConnectionPool('bolt://localhost:7687', ('reader', 'password'))
+    other_password = ConnectionPool('bolt://localhost:7687', ('neo4j', 'changed'))
+    other_pool_size = ConnectionPool('bolt://localhost:7687', ('neo4j', 'password'), config=PoolConfig(max_connection_pool_size=4))
+    other_session_settings = ConnectionPool('bolt://localhost:7687', ('neo4j', 'password'), config=PoolConfig(fetch_size=10))
+
+    assert first.driver is second.driver
+    assert first.driver is not other_user.driver
+    # A driver is only shared with the same credentials and driver settings
+    assert first.driver is not other_password.driver
+    assert first.driver is not other_pool_size.driver
+    assert first.driver is other_session_settings.driver
+    assert first.bookmark_manager is not second.bookmark_manager
+
+    first.close()
+    first.close()
+    assert ConnectionPool('bolt://localhost:7687', ('neo4j', 'password')).driver is second.driver
+
+    for pool in (second, other_user, other_password, other_pool_size, other_session_settings):
+        pool.close()
+
+def test_read_all_runs_in_parallel():
+    pool = ConnectionPool('bolt://localhost:7687', config=PoolConfig(read_workers=4))
+
+    def read(query: str, parameters: dict | None = None, timeout: float | None = None):
+        time.sleep(0.2)
+        return (query, parameters, timeout)
+    pool.read = read
+
+    start = time.perf_counter()
+    results = pool.read_all({'a': 'RETURN 1', 'b': ('RETURN $x', {'x': 2}), 'c': 'RETURN 3', 'd': 'RETURN 4'}, timeout=5.0)
+    assert time.perf_counter() - start < 0.6
+    assert results == {'a': ('RETURN 1', None, 5.0), 'b': ('RETURN $x', {'x': 2}, 5.0), 'c': ('RETURN 3', None, 5.0), 'd': ('RETURN 4', None, 5.0)}
+    pool.close()
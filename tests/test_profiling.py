@@ -0,0 +1,74 @@
+'''
+test_profiling.py
+Tests for the stages recorded by the pipeline profiler and its run log.
+'''
+import time
+from pathlib import Path
+import polars as pl
+import src.processing.raw as ProcessingRaw
+from src.processing.profiling import PipelineProfiler, hotspots, summarize
+from src.processing.synthetic import SyntheticCorpusConfig, generate_corpus
+
+def test_stages(tmp_path: Path):
+    profiler = PipelineProfiler()
+    profiler.entity = 'work'
+    with profiler.stage('plan'):
+        time.sleep(0.02)
+
+    path = tmp_path.joinpath('table.parquet')
+    with profiler.sink('derive', path):
+        pl.DataFrame({'id': range(10)}).write_parquet(path)
+
+    plan, sink = profiler.records
+    assert (plan.entity, plan.stage, plan.table, plan.kind, plan.rows_out) == ('work', 'plan', '', 'plan', None)
+    assert plan.wall_time >= 0.02 and plan.peak_rss > 0
+    assert (sink.stage, sink.table, sink.kind, sink.rows_out, sink.bytes_written) == ('derive', 'table', 'sink', 10, path.stat().st_size)
+
+def test_runs_are_appended(tmp_path: Path):
+    run_log = tmp_path.joinpath('profiles', 'run_log.parquet')
+    runs = []
+    for _ in range(2):
+        profiler = PipelineProfiler(run_log)
+        with profiler.stage('plan'):
+            pass
+        profiler.save()
+        runs.append(profiler.run_id)
+
+    log = pl.read_parquet(run_log)
+    assert log.get_column('run_id').to_list() == runs
+
+    # Without a run log, nothing is written
+    PipelineProfiler().save()
+
+def test_hotspots():
+    profiler = PipelineProfiler()
+    profiler.entity = 'work'
+    for stage, seconds in [('fast', 0.0), ('slow', 0.03), ('slow', 0.03)]:
+        with profiler.stage(stage):
+            time.sleep(seconds)
+
+    ranked = hotspots(profiler.to_dataframe())
+    assert ranked.get_column('stage').to_list() == ['slow', 'fast']
+    assert ranked.get_column('calls').to_list() == [2, 1]
+    assert abs(ranked.get_column('share').sum() - 100) < 1e-9
+
+    lines = summarize(profiler.to_dataframe(), top=1).splitlines()
+    assert len(lines) == 3 and 'slow' in lines[2]
+
+def test_string_processing_is_its_own_stage(tmp_path: Path):
+    config = SyntheticCorpusConfig(works=100, authors=20, external_institutions=10, sources=5, root_institutions=2,
+                                   domains=1, fields_per_domain=1, subfields_per_field=1, topics_per_subfield=2, shard_size=50)
+    generate_corpus(tmp_path.joinpath('raw'), config)
+    profiler = PipelineProfiler()
+    ProcessingRaw.process_data(tmp_path.joinpath('raw'), tmp_path.joinpath('output'), 'works', profiler=profiler)
+
+    sinks = profiler.to_dataframe().filter(pl.col('kind') == 'sink')
+    stages = sinks.group_by('stage').agg(pl.len().alias('calls'), pl.col('rows_out').sum())
+    calls = dict(stages.select('stage', 'calls').iter_rows())
+    # Both shards are cleaned once, the derived tables read the cleaned rows. The pruned rows and the nodes are sunk
+    # by the pruning stage
+    assert calls['process_strings'] == 2
+    assert calls['PruningFunction'] == 2 * 2
+    assert calls['_deriveAuthorships'] > 2
+    rows = dict(stages.select('stage', 'rows_out').iter_rows())
+    assert rows['process_strings'] == 100
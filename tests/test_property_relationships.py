@@ -0,0 +1,73 @@
+'''
+test_property_relationships.py
+Tests for the relationships derived from shared property values.
+'''
+from pathlib import Path
+import polars as pl
+from config import GEOGRAPHIC_DATA_LOCATION, GRAPH_START_ID, GRAPH_END_ID, NodeType
+import src.graphdb.setup as Setup
+from src.graphdb.relationships import PropertyRelationship, PropertyType, Relationships
+from src.processing.conf import PropertyJoin, PropertyJoins
+from src.processing.raw import derive_property_relationships, process_data, process_geographic_data
+from src.processing.synthetic import SyntheticCorpusConfig, generate_corpus
+from src.utils.graph_data import property_join
+from tests.neo4j_standin import StandInConnection
+
+def write_nodes(output_path: Path):
+    institutions = output_path.joinpath('institutions-0', 'institutions', 'nodes')
+    geographic = output_path.joinpath('geographic_data', 'geographic', 'nodes')
+    institutions.mkdir(parents=True)
+    geographic.mkdir(parents=True)
+    pl.DataFrame({'id': ['I1', 'I2', 'I3'], 'country_code': ['CA', 'US', None]})\
+        .write_parquet(institutions.joinpath('affiliated__institution_0.parquet'))
+    pl.DataFrame({'id': ['NA', 'EU'], 'countries': [['CA', 'US'], ['FR']], 'code': ['CA', 'FR']})\
+        .write_parquet(geographic.joinpath('geographic.parquet'))
+
+def test_property_join():
+    start = pl.LazyFrame({'id': ['I1', 'I2', 'I3'], 'country_code': ['CA', 'US', None]})
+    target = pl.LazyFrame({'id': ['NA', 'EU'], 'countries': [['CA', 'US', 'CA'], ['FR']], 'code': ['CA', 'FR']})
+
+    contained = property_join(start, target, {'country_code': 'countries'}).sort(GRAPH_START_ID).collect()
+    assert contained.rows() == [('I1', 'NA'), ('I2', 'NA')]
+
+    equal = property_join(start, target, {'country_code': 'code'}, contained=False).collect()
+    assert equal.rows() == [('I1', 'NA')]
+
+def test_derived_in_preprocessing(tmp_path: Path):
+    write_nodes(tmp_path)
+    derive_property_relationships(tmp_path, [
+        PropertyJoin(NodeType.affiliated_institution, NodeType.geographic, {'country_code': 'countries'}),
+        PropertyJoin(NodeType.work, NodeType.geographic, {'country_code': 'countries'})
+    ])
+
+    files = list(tmp_path.glob('*/*/relationships/*.parquet'))
+    assert [file.relative_to(tmp_path).as_posix() for file in files] == \
+        ['property_data/affiliated_institution/relationships/affiliated__institution_geographic_relationship_0.parquet']
+    assert pl.read_parquet(files[0]).sort(GRAPH_START_ID).rows() == [('I1', 'NA'), ('I2', 'NA')]
+
+def test_loaded_by_id(tmp_path: Path):
+    write_nodes(tmp_path)
+    relationship = Relationships().createRelationshipObject(NodeType.affiliated_institution, NodeType.geographic)
+    connection = StandInConnection()
+
+    Setup.load_into_db(connection, tmp_path, load_nodes=False, remote=True, propertyRelationships=[
+        PropertyRelationship(relationship, {'country_code': 'countries'}, PropertyType.CONTAINED)
+    ])
+
+    rows = [row for rows in connection._driver.sessions.values() for row in rows]
+    assert sorted((row['origin_id'], row['target_id']) for row in rows) == [('I1', 'NA'), ('I2', 'NA')]
+    assert not tmp_path.joinpath('.property').exists()
+
+def test_default_joins(tmp_path: Path):
+    config = SyntheticCorpusConfig(works=20, authors=10, external_institutions=5, sources=2, root_institutions=3,
+                                   domains=1, fields_per_domain=1, subfields_per_field=1, topics_per_subfield=1)
+    generate_corpus(tmp_path.joinpath('raw'), config)
+    output = tmp_path.joinpath('output')
+    process_data(tmp_path.joinpath('raw'), output, 'institutions')
+    process_geographic_data(GEOGRAPHIC_DATA_LOCATION, output.joinpath('geographic_data', NodeType.geographic.value))
+    derive_property_relationships(output, PropertyJoins)
+
+    # Every institution is situated in the country of its country code
+    institutions = pl.read_parquet(list(output.glob('*/institutions/nodes/*.parquet'))).select('id', 'country_code')
+    situated = pl.read_parquet(list(output.glob('property_data/*/relationships/SFU__U15__institution_geographic_*.parquet')))
+    assert sorted(situated.rows()) == sorted(institutions.rows())
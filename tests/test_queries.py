@@ -0,0 +1,39 @@
+'''
+test_queries.py
+Tests for the parameterized statements of the aggregation queries.
+'''
+import pytest
+from src.graphdb.index_advisor import VISUALIZATION_QUERIES, visualization_queries
+from src.visualization.config import SFU_TARGET_INSTITUTION_ID
+from src.visualization.queries import QueryRegistry, Statements, warmup
+
+def test_statements_are_parameterized():
+    assert {statement.name for statement in Statements} == set(VISUALIZATION_QUERIES)
+    for statement in Statements:
+        assert SFU_TARGET_INSTITUTION_ID not in statement.text
+        assert 'TRUE' not in statement.text
+
+    assert Statements['geographic_collaborations'].parameters == ('target_id', 'include_lineage')
+    assert Statements['works_analysis'].parameters == ('lineage_root', 'include_lineage')
+    assert visualization_queries()['topics_works'] == Statements['topics_works'].text
+
+def test_bind():
+    assert Statements.bind('geographic_topics_collaborations')[1] == {'target_id': SFU_TARGET_INSTITUTION_ID, 'include_lineage': False}
+    assert Statements.bind('geographic_topics_collaborations', target_id='I1')[1] == {'target_id': 'I1', 'include_lineage': False}
+    assert Statements.bind('summary_node_information')[1] == {}
+
+    registry = QueryRegistry({})
+    registry.register('by_id', 'MATCH (n {id: $id}) RETURN n')
+    with pytest.raises(Exception, match='Missing parameters'):
+        registry.bind('by_id')
+    with pytest.raises(Exception, match='already registered'):
+        registry.register('by_id', 'RETURN 1')
+
+def test_warmup_explains_every_statement():
+    planned = {}
+    warmup(lambda queries: planned.update(queries) or {})
+
+    assert planned.keys() == set(VISUALIZATION_QUERIES)
+    text, parameters = planned['geographic_collaborations']
+    assert text == 'EXPLAIN ' + Statements['geographic_collaborations'].text
+    assert parameters == {'target_id': SFU_TARGET_INSTITUTION_ID, 'include_lineage': False}
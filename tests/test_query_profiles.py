@@ -0,0 +1,103 @@
+'''
+test_query_profiles.py
+Tests for the recorded query plans and their diff, against a plan recorded from works_analysis.
+'''
+import copy, json
+from pathlib import Path
+import polars as pl
+from src.visualization.query_profiles import PlanProfiler, diff_plans, format_plan, plan_operators, plan_totals, removed_operators, summarize
+
+RECORDED = json.loads(Path(__file__).parent.joinpath('data', 'profiles', 'works_analysis.json').read_text())
+
+def without_index(profile: dict) -> dict:
+    '''
+    The recorded plan once the index on lineage_root is dropped: the seek becomes a label scan and a filter.
+    '''
+    profile = copy.deepcopy(profile)
+    expand = profile['children'][0]['children'][0]['children'][0]
+    expand['children'] = [{
+        'operatorType': 'Filter@neo4j',
+        'args': {'Details': 'i.lineage_root = $lineage_root'},
+        'identifiers': ['i'],
+        'dbHits': 1218, 'rows': 16, 'pageCacheHits': 40, 'pageCacheMisses': 2, 'time': 301,
+        'children': [{
+            'operatorType': 'NodeByLabelScan@neo4j',
+            'args': {'Details': 'i:SFU_U15_institution'},
+            'identifiers': ['i'],
+            'dbHits': 1219, 'rows': 1218, 'pageCacheHits': 22, 'pageCacheMisses': 1, 'time': 190,
+            'children': []
+        }]
+    }]
+    # The expand starts from unordered nodes, reading a few more relationship chains
+    expand['dbHits'] = 91350
+    return profile
+
+class StandInClient:
+    def __init__(self, profile: dict):
+        self.plan = profile
+        self.queries : list[str] = []
+
+    def profile(self, query: str, parameters: dict | None = None) -> dict:
+        self.queries.append(query)
+        return self.plan
+
+def test_plan_operators():
+    operators = plan_operators(RECORDED)
+    assert [operator['path'] for operator in operators] == ['0', '0.0', '0.0.0', '0.0.0.0', '0.0.0.0.0']
+    assert [operator['operator'] for operator in operators] == ['ProduceResults', 'EagerAggregation', 'Filter', 'Expand(All)', 'NodeIndexSeek']
+    assert operators[3]['details'] == '(i)-[r:HAS_AFFILIATED_WORK]->(w)'
+    assert operators[3]['identifiers'] == 'i, r, w'
+    assert [operator['depth'] for operator in operators] == [0, 1, 2, 3, 4]
+
+def test_runs_are_appended(tmp_path: Path):
+    run_log = tmp_path.joinpath('query_profiles.parquet')
+    baseline = PlanProfiler(StandInClient(RECORDED), run_log)
+    recorded = baseline.profile('works_analysis', 'MATCH (i) RETURN i', {'lineage_root': True})
+    assert baseline.client.queries == ['MATCH (i) RETURN i']
+    assert recorded.height == 5
+    baseline.save()
+
+    current = PlanProfiler(StandInClient(without_index(RECORDED)), run_log)
+    current.profile('works_analysis', 'MATCH (i) RETURN i')
+    current.save()
+
+    log = pl.read_parquet(run_log)
+    assert log.get_column('run_id').unique(maintain_order=True).to_list() == [baseline.run_id, current.run_id]
+
+    totals = plan_totals(log.filter(pl.col('run_id') == baseline.run_id)).row(0, named=True)
+    assert totals['db_hits'] == 0 + 91284 + 91284 + 91300 + 17
+    assert totals['rows'] == 16
+    assert totals['page_cache_hits'] == 90412 + 45671 + 3
+    assert totals['page_cache_misses'] == 872 + 12
+
+    # Without a run log, nothing is written
+    PlanProfiler(StandInClient(RECORDED)).save()
+
+def test_diff_plans():
+    baseline = PlanProfiler(StandInClient(RECORDED))
+    baseline.profile('works_analysis', '')
+    current = PlanProfiler(StandInClient(without_index(RECORDED)))
+    current.profile('works_analysis', '')
+    before, after = baseline.to_dataframe(), current.to_dataframe()
+
+    grown = diff_plans(before, after)
+    # The operators of the label scan are new, and the expand grew a little
+    assert grown.select('path', 'operator', 'db_hits_baseline', 'growth').rows() == [
+        ('0.0.0.0.0.0', 'NodeByLabelScan', None, 1219),
+        ('0.0.0.0.0', 'Filter', None, 1218),
+        ('0.0.0.0', 'Expand(All)', 91300, 50)
+    ]
+    assert diff_plans(before, after, min_growth=100).get_column('operator').to_list() == ['NodeByLabelScan', 'Filter']
+    assert diff_plans(before, before).is_empty()
+
+    removed = removed_operators(before, after)
+    assert removed.select('path', 'operator').rows() == [('0.0.0.0.0', 'NodeIndexSeek')]
+
+    summary = summarize(before, after)
+    assert 'works_analysis' in summary
+    assert 'NodeByLabelScan i:SFU_U15_institution: new -> 1,219 (+1,219)' in summary
+    assert 'Operators no longer in the plans:' in summary and 'NodeIndexSeek' in summary
+
+    tree = format_plan(after).splitlines()
+    assert len(tree) == 6
+    assert tree[-1].startswith(' ' * 10 + 'NodeByLabelScan')
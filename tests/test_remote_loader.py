@@ -0,0 +1,36 @@
+'''
+test_remote_loader.py
+Tests for the Arrow batching of the remote loader.
+'''
+from pathlib import Path
+import polars as pl
+from config import GRAPH_START_ID, GRAPH_END_ID, NodeType
+from src.graphdb.conf import RemoteLoadConfig
+from src.graphdb.relationships import Relationships
+from src.graphdb.remote_loader import iter_record_batches, node_rows, relationship_rows
+
+def test_batches_are_sized_by_bytes(tmp_path: Path):
+    file = tmp_path.joinpath('work.parquet')
+    pl.DataFrame({'id': [f'W{i}' for i in range(1000)], 'abstract': ['x' * 1000] * 1000}).write_parquet(file)
+
+    batches = list(iter_record_batches(file, RemoteLoadConfig(max_batch_bytes=100_000, max_batch_rows=500)))
+    assert sum(batch.num_rows for batch in batches) == 1000
+    assert max(batch.num_rows for batch in batches) < 100
+    assert all(batch.nbytes <= 110_000 for batch in batches)
+
+    batches = list(iter_record_batches(file, RemoteLoadConfig(max_batch_bytes=10**9, max_batch_rows=300)))
+    assert [batch.num_rows for batch in batches] == [300, 300, 300, 100]
+
+def test_rows(tmp_path: Path):
+    relationshipObj = Relationships().createRelationshipObject(NodeType.work, NodeType.year)
+
+    file = tmp_path.joinpath('work_year_relationship.parquet')
+    pl.DataFrame({GRAPH_START_ID: ['W1', 'W2'], GRAPH_END_ID: [2020, 2021], 'cited_by_count': [3, None]}).write_parquet(file)
+    batch = next(iter_record_batches(file, RemoteLoadConfig()))
+
+    assert relationship_rows(batch, relationshipObj) == [
+        {'origin_id': 'W1', 'target_id': 2020, 'properties': {'cited_by_count': 3}},
+        {'origin_id': 'W2', 'target_id': 2021, 'properties': {'cited_by_count': None}}
+    ]
+    assert relationship_rows(batch.select([GRAPH_START_ID, GRAPH_END_ID]), relationshipObj)[0]['properties'] == {}
+    assert node_rows(batch.select([GRAPH_START_ID]))[1] == {GRAPH_START_ID: 'W2'}
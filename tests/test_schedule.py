@@ -0,0 +1,90 @@
+'''
+test_schedule.py
+Tests for the concurrent schedule of the aggregation queries.
+'''
+import threading, time
+import pytest
+from src.visualization.config import QueryScheduleConfig
+from src.visualization.schedule import QueryCancelled, QueryStatus, ScheduledQuery, raise_if_cancelled, run_schedule
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+        self.finished : list[str] = []
+        self.timeouts : dict[str, float | None] = {}
+
+    def query(self, name: str, seconds: float = 0.1, error: bool = False):
+        def run(timeout: float | None):
+            with self.lock:
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+                self.timeouts[name] = timeout
+            time.sleep(seconds)
+            with self.lock:
+                self.active -= 1
+                self.finished.append(name)
+            if error:
+                raise Exception(f'{name} failed')
+        return run
+
+def test_concurrency_cap_and_dependencies():
+    recorder = Recorder()
+    queries = [ScheduledQuery(name, recorder.query(name, 0.2)) for name in ['a', 'b', 'c', 'd']]
+    queries.append(ScheduledQuery('e', recorder.query('e', 0.05), depends_on=('a', 'b')))
+
+    start = time.perf_counter()
+    outcomes = run_schedule(queries, QueryScheduleConfig(max_concurrency=2, timeout=None, timeouts={'e': 5.0}))
+
+    assert time.perf_counter() - start < 0.6
+    assert recorder.peak == 2
+    assert all(outcome.status == QueryStatus.FINISHED for outcome in outcomes.values())
+    assert recorder.finished.index('e') > max(recorder.finished.index('a'), recorder.finished.index('b'))
+    assert recorder.timeouts == {'a': None, 'b': None, 'c': None, 'd': None, 'e': 5.0}
+
+def test_failures_and_timeouts_skip_dependents():
+    recorder = Recorder()
+    outcomes = run_schedule([
+        ScheduledQuery('slow', recorder.query('slow', 1.0)),
+        ScheduledQuery('broken', recorder.query('broken', error=True)),
+        ScheduledQuery('after_slow', recorder.query('after_slow'), depends_on=('slow',)),
+        ScheduledQuery('after_broken', recorder.query('after_broken'), depends_on=('broken',)),
+        ScheduledQuery('independent', recorder.query('independent'))
+    ], QueryScheduleConfig(max_concurrency=4, timeouts={'slow': 0.2}))
+
+    assert outcomes['slow'].status == QueryStatus.TIMED_OUT
+    assert outcomes['broken'].status == QueryStatus.FAILED and outcomes['broken'].error == 'broken failed'
+    assert outcomes['after_slow'].status == QueryStatus.SKIPPED
+    assert outcomes['after_broken'].status == QueryStatus.SKIPPED
+    assert outcomes['independent'].status == QueryStatus.FINISHED
+
+def test_timed_out_queries_do_not_write():
+    written, cancelled = [], []
+    def aggregation(name: str, seconds: float):
+        def run(timeout: float | None):
+            time.sleep(seconds)
+            try:
+                raise_if_cancelled()
+            except QueryCancelled:
+                cancelled.append(name)
+                raise
+            written.append(name)
+        return run
+
+    outcomes = run_schedule([ScheduledQuery('late', aggregation('late', 0.4)), ScheduledQuery('on_time', aggregation('on_time', 0.1))],
+                            QueryScheduleConfig(max_concurrency=2, timeouts={'late': 0.1}))
+    assert outcomes['late'].status == QueryStatus.TIMED_OUT
+
+    # The late query still runs on its thread, but stops before writing
+    time.sleep(0.5)
+    assert written == ['on_time']
+    assert cancelled == ['late']
+    # Outside of a scheduled query nothing is cancelled
+    raise_if_cancelled()
+
+def test_invalid_schedules():
+    with pytest.raises(Exception, match='cycle'):
+        run_schedule([ScheduledQuery('a', lambda _: None, ('b',)), ScheduledQuery('b', lambda _: None, ('a',))])
+    with pytest.raises(Exception, match='unknown'):
+        run_schedule([ScheduledQuery('a', lambda _: None, ('missing',))])
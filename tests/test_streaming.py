@@ -0,0 +1,79 @@
+'''
+test_streaming.py
+Tests for running the preprocessing sinks on the streaming engine.
+
+The memory test processes a multi-GB synthetic works shard and only runs when RUN_MEMORY_TESTS is set.
+MEMORY_TEST_SHARD_BYTES and MEMORY_TEST_RSS_LIMIT (both in bytes) adjust the shard size and the RSS limit.
+'''
+import json, resource, subprocess, sys
+from os import environ
+from pathlib import Path
+import polars as pl
+import pytest
+import zstandard
+import src.processing.raw as ProcessingRaw
+from src.processing.streaming import StreamingVerifier, inspect_streaming_plan
+from src.processing.synthetic import SyntheticCorpus, SyntheticCorpusConfig
+from config import BASE_DIR
+
+def write_works_shard(path: Path, target_bytes: int, authors: int = 20):
+    '''
+    Write compressed synthetic works until the uncompressed size reaches target_bytes
+    '''
+    config = SyntheticCorpusConfig(works=sys.maxsize, authorship_mean=authors, authorship_sigma=0.0, consortium_rate=0.0)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    written = 0
+    with open(path, 'wb') as f, zstandard.ZstdCompressor(level=1).stream_writer(f) as writer:
+        for work in SyntheticCorpus(config).work_records():
+            line = (json.dumps(work)+'\n').encode('utf-8')
+            writer.write(line)
+            written += len(line)
+            if written >= target_bytes:
+                break
+
+def test_inspect_streaming_plan():
+    data = pl.LazyFrame({'id': ['a', 'b'], 'values': [[1, 2], [3]]})
+
+    report = inspect_streaming_plan('streams', data.explode('values'))
+    assert report.streams
+
+    report = inspect_streaming_plan('fallback', data.map_batches(lambda df: df))
+    assert not report.streams
+    assert report.fallback_nodes
+
+def test_preprocess_reports_every_sink(tmp_path: Path):
+    write_works_shard(tmp_path.joinpath('raw', 'works', 'part-1.json.zst'), 200_000)
+
+    verifier = StreamingVerifier()
+    ProcessingRaw.process_files(tmp_path.joinpath('raw', 'works'), tmp_path.joinpath('output'), streaming=verifier)
+
+    written = list(tmp_path.joinpath('output').glob('**/*.parquet'))
+    assert len(verifier.reports) == len(written)
+    assert 'tables run fully on the streaming engine' in verifier.summary()
+
+@pytest.mark.skipif(not environ.get('RUN_MEMORY_TESTS'), reason='Set RUN_MEMORY_TESTS to run the memory tests')
+def test_streaming_memory_limit(tmp_path: Path):
+    shard_bytes = int(environ.get('MEMORY_TEST_SHARD_BYTES', 2 * 1024**3))
+    rss_limit = int(environ.get('MEMORY_TEST_RSS_LIMIT', 1024**3))
+
+    write_works_shard(tmp_path.joinpath('raw', 'works', 'part-1.json.zst'), shard_bytes)
+
+    # Run in a child process so the peak RSS only covers the preprocessing
+    script = f'''
+import sys
+sys.path[:0] = [{str(BASE_DIR)!r}, {str(BASE_DIR.joinpath('src'))!r}]
+from pathlib import Path
+import src.processing.raw as ProcessingRaw
+from src.processing.conf import OutOfCoreConfig
+from src.processing.streaming import StreamingVerifier
+verifier = StreamingVerifier()
+ProcessingRaw.process_files(Path({str(tmp_path.joinpath('raw', 'works'))!r}), Path({str(tmp_path.joinpath('output'))!r}),
+                            out_of_core=OutOfCoreConfig(memory_budget={rss_limit // 8}, spill_directory=Path({str(tmp_path.joinpath('spill'))!r})),
+                            streaming=verifier)
+print(verifier.summary())
+'''
+    subprocess.run([sys.executable, '-c', script], check=True)
+
+    # ru_maxrss is reported in kilobytes on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+    assert peak_rss < rss_limit, f'Peak RSS {peak_rss} exceeded the limit of {rss_limit}'
@@ -0,0 +1,61 @@
+'''
+test_synthetic.py
+Tests for the synthetic OpenAlex corpus generator.
+'''
+from pathlib import Path
+import polars as pl
+import src.processing.raw as ProcessingRaw
+from src.processing.conf import schemas
+from src.processing.synthetic import SyntheticCorpusConfig, generate_corpus
+
+SMALL_CORPUS = SyntheticCorpusConfig(works=300, authors=60, external_institutions=40, sources=20, root_institutions=3,
+                                     domains=2, fields_per_domain=2, subfields_per_field=2, topics_per_subfield=3, shard_size=100)
+
+def test_generation_is_reproducible(tmp_path: Path):
+    generate_corpus(tmp_path.joinpath('a'), SMALL_CORPUS)
+    generate_corpus(tmp_path.joinpath('b'), SMALL_CORPUS)
+    generate_corpus(tmp_path.joinpath('c'), SyntheticCorpusConfig(**{**SMALL_CORPUS.__dict__, 'seed': 1}))
+
+    shards = sorted(path.relative_to(tmp_path.joinpath('a')) for path in tmp_path.joinpath('a').glob('**/*.json.zst'))
+    assert len(shards) == len(list(tmp_path.joinpath('b').glob('**/*.json.zst')))
+    assert all(tmp_path.joinpath('a', shard).read_bytes() == tmp_path.joinpath('b', shard).read_bytes() for shard in shards)
+
+    works = lambda name: pl.read_ndjson(next(tmp_path.joinpath(name, 'works').glob('*.json.zst')), schema=schemas['works'])
+    assert not works('a').equals(works('c'))
+
+def test_corpus_matches_config(tmp_path: Path):
+    counts = generate_corpus(tmp_path, SMALL_CORPUS)
+
+    # 3 roots with 3 children each over 2 lineage levels, 2 * 2 * 2 * 3 topics
+    assert counts == {'topics': 24, 'institutions': 39, 'sources': 20, 'funders': 16, 'authors': 60, 'works': 300}
+    assert len(list(tmp_path.joinpath('works').glob('*.json.zst'))) == 3
+
+    works = pl.read_ndjson(tmp_path.joinpath('works', 'synthetic-0-1.json.zst'), schema=schemas['works'])
+    assert works.select(pl.col('authorships').list.len().min()).item() >= 1
+    assert works.select(pl.col('topics').list.len().min()).item() == SMALL_CORPUS.topics_per_work
+
+    institutions = pl.read_ndjson(tmp_path.joinpath('institutions', 'synthetic-0-1.json.zst'))
+    assert institutions.select(pl.col('lineage').list.len().max()).item() == SMALL_CORPUS.lineage_depth + 1
+
+def test_single_institution(tmp_path: Path):
+    # Fewer target institutions than an author can be affiliated with
+    config = SyntheticCorpusConfig(**{**SMALL_CORPUS.__dict__, 'works': 50, 'authors': 20, 'root_institutions': 1, 'lineage_depth': 0})
+    counts = generate_corpus(tmp_path, config)
+    assert counts['authors'] == 20 and counts['works'] == 50
+
+    works = pl.concat([pl.read_ndjson(shard, schema=schemas['works']) for shard in tmp_path.joinpath('works').glob('*.json.zst')])
+    assert works.select(pl.col('authorships').list.len().min()).item() >= 1
+
+def test_scale():
+    scaled = SMALL_CORPUS.scale(10)
+    assert (scaled.works, scaled.authors, scaled.sources) == (3000, 600, 200)
+    assert scaled.root_institutions == SMALL_CORPUS.root_institutions
+
+def test_preprocess_generated_corpus(tmp_path: Path):
+    generate_corpus(tmp_path.joinpath('raw'), SMALL_CORPUS)
+    ProcessingRaw.process_data(tmp_path.joinpath('raw'), tmp_path.joinpath('output'))
+
+    for entity in ['works', 'authors', 'institutions', 'sources', 'funders', 'topics']:
+        tables = list(tmp_path.joinpath('output').glob(f'*/{entity}/**/*.parquet'))
+        assert tables, f'No tables written for {entity}'
+        assert all(pl.scan_parquet(table).select(pl.len()).collect().item() > 0 for table in tables)